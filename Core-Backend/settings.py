@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     'corsheaders',
     
     # Local apps
+    'ModuloCompartido',
     'ModuloEmergencia',
     'ModuloBoletas',
 ]
@@ -177,5 +178,172 @@ RAG_CONFIG = {
     'chunk_overlap': 200,
     'top_k_results': 5,
     'embedding_model': 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2',
+    # Función de embeddings de ambas colecciones (sentence-transformers en CPU).
+    # cache_dir guarda el modelo para cargarlo sin red (local_files_only=True en producción).
+    # Al cambiar embedding_model: python manage.py reembed_knowledge_base
+    # backend 'onnx': el mismo modelo en int8 con onnxruntime, sin torch en los workers
+    # (exportar antes con: python manage.py export_onnx_embeddings)
+    'embedding': {
+        'backend': os.getenv('EMBEDDING_BACKEND', 'sentence_transformers'),  # sentence_transformers | onnx
+        'cache_dir': os.getenv('EMBEDDING_CACHE_DIR', str(BASE_DIR / 'models')),
+        'local_files_only': os.getenv('EMBEDDING_OFFLINE', 'False').lower() == 'true',
+        'device': 'cpu',
+        'batch_size': int(os.getenv('EMBEDDING_BATCH_SIZE', '32')),  # Textos por lote
+        'threads': int(os.getenv('EMBEDDING_THREADS', '0')),  # Hilos de torch (0 = default de torch)
+        'normalize': True,  # Vectores de norma 1
+        'onnx_dir': None,  # Modelos exportados (None = cache_dir/onnx)
+        'onnx_quantized': True,  # int8 dinámico; False = ONNX float32
+    },
     'gemini_model': 'gemini-2.5-flash',  # Modelo Gemini 2.5 Flash
+    # Backend del LLM de ambos chatbots:
+    #   gemini: API de Gemini (producción)
+    #   stub: servidor local 'python manage.py run_llm_stub' (pruebas de carga sin cuota)
+    #   cassette: respuestas grabadas en un archivo (record | replay | auto)
+    'llm_provider': {
+        'backend': os.getenv('LLM_PROVIDER', 'gemini'),
+        'stub_url': 'http://127.0.0.1:8765',
+        'stub_timeout': 30,
+        'cassette_path': BASE_DIR / 'cassettes' / 'llm.json',
+        'cassette_mode': 'replay',
+        'replay_latency': False,  # Reproducir la latencia grabada (benchmarks realistas)
+    },
+    # Extracción local de datos en Boletas: Gemini solo si la confianza es baja
+    'local_extraction': {
+        'enabled': True,
+        'confidence_threshold': 0.8,
+    },
+    # Respuestas deterministas (sin LLM) a preguntas frecuentes sobre la boleta
+    'answer_engine': {
+        'enabled': True,
+        'max_words': 14,  # Mensajes más largos se consideran preguntas abiertas
+    },
+    # Clasificador local del motivo de consulta (TF-IDF + centroide más cercano)
+    'intent_classifier': {
+        'enabled': True,
+        'model_path': BASE_DIR / 'ModuloBoletas' / 'services' / 'intent_data' / 'intent_classifier.npz',
+        'training_file': BASE_DIR / 'ModuloBoletas' / 'services' / 'intent_data' / 'motivos_consulta.jsonl',
+        'temperature': 0.05,  # Softmax sobre similitudes (menor = probabilidades más extremas)
+        'min_similarity': 0.15,  # Bajo esta similitud no se predice motivo
+    },
+    # Caché semántica de respuestas del chat público anónimo
+    'public_answer_cache': {
+        'enabled': True,
+        'similarity_threshold': 0.92,  # Similitud coseno mínima para reutilizar una respuesta
+        'ttl_seconds': 3600,
+        'max_entries': 256,
+    },
+    # Caché exacta de prompts/respuestas de Gemini (ambos módulos)
+    'llm_cache': {
+        'enabled': True,
+        'backend': 'memory',  # memory | django | sqlite
+        'max_entries': 512,  # Solo backend memory
+        'django_cache_alias': 'default',  # Solo backend django (clear() solo invalida las entradas LLM)
+        'sqlite_path': BASE_DIR / 'llm_cache.sqlite3',  # Solo backend sqlite
+        'default_ttl': 300,
+        # TTL (segundos) por punto de llamada
+        'ttls': {
+            'boletas_extraction': 3600,
+            'boletas_contextual': 300,
+            'boletas_comparative': 300,
+            'public_chat': 600,
+            'public_chat_continuation': 600,
+            'emergencias_extraction': 3600,
+        },
+    },
+    # Coalescencia de llamadas idénticas concurrentes (LLM y búsqueda vectorial)
+    'single_flight': {
+        'enabled': True,
+        'cross_process': False,  # Lock file entre workers (requiere llm_cache django/sqlite)
+        'lock_dir': BASE_DIR / 'locks',
+        'wait_timeout': 30,  # Segundos que un hilo espera al que ejecuta la llamada
+    },
+    # Control de admisión de Gemini compartido por todos los workers (token bucket)
+    'gemini_quota': {
+        'enabled': False,  # Activar en producción con los límites del plan contratado
+        'path': BASE_DIR / 'gemini_quota.sqlite3',
+        'requests_per_minute': 15,
+        'tokens_per_minute': 1000000,
+        'cooldown_seconds': 30,  # Pausa global tras un 429 real de la API
+    },
+    # Circuit breaker de Gemini (un circuito por servicio: boletas y emergencias)
+    'circuit_breaker': {
+        'enabled': True,
+        'failure_rate_threshold': 0.5,  # Tasa de fallos que abre el circuito
+        'slow_call_seconds': 15,  # Llamadas más lentas cuentan como lentas
+        'slow_call_rate_threshold': 0.8,  # Tasa de llamadas lentas que abre el circuito
+        'window_size': 20,  # Llamadas recientes evaluadas
+        'minimum_calls': 5,  # Llamadas mínimas antes de evaluar
+        'open_seconds': 30,  # Tiempo abierto antes de probar (semiabierto)
+        'half_open_max_calls': 1,
+    },
+    # Presupuesto de tokens de entrada por punto de llamada. Se llena por prioridad:
+    # instrucciones > datos de la boleta > historial reciente > fragmentos RAG
+    'prompt_budget': {
+        'enabled': True,
+        'default_budget': 1500,
+        'budgets': {
+            'boletas_extraction': 1000,
+            'boletas_contextual': 1200,
+            'boletas_comparative': 800,
+            'public_chat': 1000,
+        },
+        'history_messages': 10,  # Mensajes candidatos; el presupuesto decide cuántos entran
+    },
+    # Backend del vector store: chroma (SQLite + HNSW) o numpy (matriz en memoria,
+    # búsqueda exacta; adecuado para bases de conocimiento de pocos cientos de chunks)
+    'vector_store': {
+        'backend': os.getenv('VECTOR_STORE_BACKEND', 'chroma'),
+    },
+    # Caché LRU de embeddings de consultas (clave: texto sin tildes, en minúsculas)
+    'query_embedding_cache': {
+        'enabled': True,
+        'max_entries': 1024,
+    },
+    # Caché de resultados de RAGRetriever.retrieve; se invalida al cambiar la
+    # versión de la colección (cada add o reset de la ingesta)
+    'retrieval_cache': {
+        'enabled': True,
+        'max_entries': 512,
+    },
+    # Ingesta: procesos que cargan y dividen archivos en paralelo
+    # (1 = en el mismo proceso, 0 = uno por CPU)
+    'ingest': {
+        'workers': int(os.getenv('INGEST_WORKERS', '1')),
+    },
+    # Warm-up al arrancar cada worker: vector stores, modelo de embeddings,
+    # índice léxico y servicios de chat de ambos módulos (ver /api/ready/)
+    'warmup': {
+        'enabled': os.getenv('WARMUP_ON_STARTUP', 'False').lower() == 'true',
+    },
+    # Búsqueda híbrida: vectorial + BM25 (índice léxico construido al ingestar),
+    # combinadas con reciprocal-rank fusion. 'candidates' resultados por búsqueda
+    'hybrid_search': {
+        'enabled': True,
+        'candidates': 10,
+        'rrf_k': 60,
+        'latency_budget_ms': 5,
+    },
+    # Selección del contexto antes de armar el prompt: MMR sobre los embeddings
+    # guardados, descarte de chunks casi duplicados (chunk_overlap=200) y unión
+    # de chunks contiguos del mismo archivo
+    'context_selection': {
+        'enabled': True,
+        'fetch_k': 10,  # Candidatos recuperados antes de elegir top_k
+        'mmr_lambda': 0.7,  # 1 = solo relevancia, 0 = solo diversidad
+        'max_overlap': 0.6,  # Fracción de trigramas compartidos para descartar un chunk
+        'merge_adjacent': True,
+    },
+    # Límites de generación del chat público. Si Gemini corta la respuesta
+    # (finish_reason MAX_TOKENS) se pide una continuación acotada
+    'public_chat': {
+        'max_output_tokens': 400,
+        'continuation_tokens': 200,
+        'max_continuations': 1,
+    },
+    # Etapas independientes de un turno en paralelo (RAG/LLM en hilos, ORM en la petición)
+    'turn_pipeline': {
+        'enabled': True,
+        'max_workers': 4,  # Hilos compartidos por todo el proceso
+        'stage_timeout': 10,  # Segundos; una etapa opcional más lenta se omite
+    },
 }
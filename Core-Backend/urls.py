@@ -19,6 +19,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from ModuloBoletas import views as boletas_views
+from ModuloCompartido import views as compartido_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -26,6 +27,9 @@ urlpatterns = [
     path('api/boletas/', include('ModuloBoletas.urls')),
     # Endpoint público anónimo para preguntas generales (RAG-only)
     path('api/public/chat/message/', boletas_views.public_chat_message),
+    path('api/public/chat/message/stream/', boletas_views.public_chat_message_stream),
+    # Readiness del worker (estado del warm-up del stack RAG/LLM)
+    path('api/ready/', compartido_views.readiness),
 ]
 
 # Servir archivos media en desarrollo
@@ -4,11 +4,13 @@ Script para inicializar la base de conocimientos de boletas
 """
 import logging
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from django.conf import settings
 
+from ModuloCompartido.services.kb_ingest import IncrementalIngester
+
 from .vector_store import get_vector_store
-from .embeddings import get_document_processor
+from .embeddings import get_document_processor, load_and_split_file
 
 logger = logging.getLogger(__name__)
 
@@ -27,12 +29,17 @@ class DocumentIngester:
         
         logger.info("DocumentIngester inicializado")
     
-    def ingest_knowledge_base(self, force_reset: bool = False) -> Dict[str, Any]:
+    def ingest_knowledge_base(self, force_reset: bool = False, workers: Optional[int] = None) -> Dict[str, Any]:
         """
-        Ingesta todos los documentos del directorio knowledge_base
+        Ingesta el directorio knowledge_base de forma incremental
+        
+        Los archivos sin cambios desde la última ingesta no se vuelven a
+        leer ni a embeber; los chunks de archivos editados o eliminados se
+        borran de la colección.
         
         Args:
             force_reset: Si True, reinicia la colección antes de ingestar
+            workers: Procesos para cargar archivos (None = RAG_CONFIG['ingest']['workers'])
             
         Returns:
             Dict con resultados de la ingesta
@@ -50,13 +57,10 @@ class DocumentIngester:
                 'documents_processed': 0
             }
         
-        # Verificar si hay documentos
-        supported_files = list(kb_path.rglob('*.txt')) + \
-                         list(kb_path.rglob('*.pdf')) + \
-                         list(kb_path.rglob('*.md')) + \
-                         list(kb_path.rglob('*.docx'))
+        ingester = self._get_incremental_ingester(kb_path)
         
-        if not supported_files:
+        # Verificar si hay documentos (una carpeta vacía no borra la colección)
+        if not ingester.scan():
             logger.warning("No se encontraron documentos en knowledge_base")
             return {
                 'success': False,
@@ -64,50 +68,14 @@ class DocumentIngester:
                 'documents_processed': 0
             }
         
-        # Reiniciar colección si se solicita
-        if force_reset:
-            logger.info("Reiniciando colección...")
-            self.vector_store.reset_collection()
-        
         try:
-            # Procesar documentos
-            logger.info(f"Procesando {len(supported_files)} archivos...")
-            chunks = self.document_processor.process_knowledge_base(str(kb_path))
-            
-            if not chunks:
-                return {
-                    'success': False,
-                    'message': 'No se generaron chunks de los documentos',
-                    'documents_processed': 0
-                }
-            
-            # Preparar datos para ChromaDB
-            documents = [chunk['content'] for chunk in chunks]
-            metadatas = [chunk['metadata'] for chunk in chunks]
-            ids = [chunk['id'] for chunk in chunks]
+            # Solo se embeben los archivos nuevos o modificados (manifiesto con hashes)
+            result = ingester.run(force_reset=force_reset, workers=workers)
+            result.setdefault('files_processed', result.get('files_total', 0))
+            result.setdefault('chunks_generated', result.get('chunks_total', 0))
+            result.setdefault('documents_added', result.get('chunks_upserted', 0))
+            return result
             
-            # Agregar a vector store
-            success = self.vector_store.add_documents(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            
-            if success:
-                return {
-                    'success': True,
-                    'message': 'Documentos ingestados exitosamente',
-                    'files_processed': len(supported_files),
-                    'chunks_generated': len(chunks),
-                    'documents_added': len(documents)
-                }
-            else:
-                return {
-                    'success': False,
-                    'message': 'Error al agregar documentos al vector store',
-                    'chunks_generated': len(chunks)
-                }
-                
         except Exception as e:
             logger.error(f"Error en ingesta: {e}")
             return {
@@ -116,6 +84,17 @@ class DocumentIngester:
                 'documents_processed': 0
             }
     
+    def _get_incremental_ingester(self, kb_path: Path) -> IncrementalIngester:
+        """
+        Crea el ingestor incremental de la colección de boletas
+        """
+        return IncrementalIngester(
+            vector_store=self.vector_store,
+            kb_path=kb_path,
+            chunk_file=load_and_split_file,
+            id_prefix='boleta_chunk'
+        )
+    
     def ingest_single_file(self, file_path: str) -> Dict[str, Any]:
         """
         Ingesta un archivo individual
@@ -198,15 +177,16 @@ def get_document_ingester() -> DocumentIngester:
 
 
 # Script de inicialización
-def initialize_knowledge_base(force_reset: bool = False) -> Dict[str, Any]:
+def initialize_knowledge_base(force_reset: bool = False, workers: Optional[int] = None) -> Dict[str, Any]:
     """
     Función de utilidad para inicializar la base de conocimientos
     
     Args:
         force_reset: Si True, reinicia la colección
+        workers: Procesos para cargar archivos
         
     Returns:
         Dict con resultados
     """
     ingester = get_document_ingester()
-    return ingester.ingest_knowledge_base(force_reset=force_reset)
+    return ingester.ingest_knowledge_base(force_reset=force_reset, workers=workers)
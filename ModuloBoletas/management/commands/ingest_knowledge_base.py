@@ -2,14 +2,16 @@
 Management command para poblar la base de conocimientos RAG con documentos.
 
 Uso:
-    python manage.py ingest_knowledge_base                # Ingesta incremental
+    python manage.py ingest_knowledge_base                # Ingesta incremental (solo archivos modificados)
     python manage.py ingest_knowledge_base --reset        # Resetea y vuelve a ingerir
     python manage.py ingest_knowledge_base --stats        # Muestra estadísticas solamente
+    python manage.py ingest_knowledge_base --workers 4    # Carga y divide archivos en 4 procesos
 """
 
 from django.core.management.base import BaseCommand, CommandError
 from ModuloBoletas.RAG.ingest_documents import get_document_ingester, initialize_knowledge_base
 from ModuloBoletas.RAG.retriever import get_rag_retriever
+from ModuloCompartido.services.kb_ingest import format_ingest_report
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,6 +31,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Muestra estadísticas de la colección sin ingerir',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Procesos para cargar y dividir archivos (0 = uno por CPU; default: RAG_CONFIG)',
+        )
         parser.add_argument(
             '--verbose',
             action='store_true',
@@ -86,14 +94,13 @@ class Command(BaseCommand):
         
         try:
             # Ejecutar ingesta
-            result = initialize_knowledge_base(force_reset=force_reset)
+            result = initialize_knowledge_base(force_reset=force_reset, workers=options['workers'])
             
             # Mostrar resultados
             if result['success']:
                 self.stdout.write(self.style.SUCCESS('\n✅ Ingesta completada exitosamente!\n'))
-                self.stdout.write(f"  📁 Archivos procesados: {result['files_processed']}")
-                self.stdout.write(f"  📄 Chunks generados: {result['chunks_generated']}")
-                self.stdout.write(f"  💾 Documentos agregados: {result['documents_added']}")
+                for line in format_ingest_report(result):
+                    self.stdout.write(line)
                 
                 # Obtener estadísticas finales
                 self.stdout.write(self.style.HTTP_INFO('\n📊 Estadísticas finales:\n'))
@@ -108,9 +115,11 @@ class Command(BaseCommand):
                     )
                 )
             else:
+                for line in format_ingest_report(result):
+                    self.stdout.write(line)
                 self.stdout.write(
                     self.style.ERROR(
-                        f'\n❌ Error durante la ingesta: {result.get("error", "Error desconocido")}\n'
+                        f'\n❌ Error durante la ingesta: {result.get("message", "Error desconocido")}\n'
                     )
                 )
                 raise CommandError('Ingesta fallida')
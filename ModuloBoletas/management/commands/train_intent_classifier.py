@@ -0,0 +1,171 @@
+"""
+Management command para entrenar el clasificador local de motivos de consulta.
+
+Uso:
+    python manage.py train_intent_classifier                 # Frases etiquetadas + historial
+    python manage.py train_intent_classifier --no-history    # Solo el archivo de frases
+    python manage.py train_intent_classifier --folds 10      # Validación cruzada con 10 particiones
+"""
+
+from pathlib import Path
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from ModuloBoletas.services.chatbot_service import ChatbotService
+from ModuloBoletas.services.intent_classifier import (
+    DEFAULT_MODEL_PATH,
+    DEFAULT_TRAINING_FILE,
+    IntentClassifier,
+    load_history_examples,
+    load_training_file,
+)
+
+
+class Command(BaseCommand):
+    help = 'Entrena, evalúa y guarda el clasificador local de motivos de consulta'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-history',
+            action='store_true',
+            help='No usa el historial de ChatMessage como datos de entrenamiento',
+        )
+        parser.add_argument(
+            '--folds',
+            type=int,
+            default=5,
+            help='Particiones de la validación cruzada (default: 5)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Repeticiones del benchmark de latencia (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        config = getattr(settings, 'RAG_CONFIG', {}).get('intent_classifier', {})
+        training_file = Path(config.get('training_file') or DEFAULT_TRAINING_FILE)
+        model_path = Path(config.get('model_path') or DEFAULT_MODEL_PATH)
+        temperature = config.get('temperature', 0.05)
+        min_similarity = config.get('min_similarity', 0.15)
+
+        if not training_file.exists():
+            raise CommandError(f'No existe el archivo de frases: {training_file}')
+
+        examples = load_training_file(training_file)
+        self.stdout.write(f"  📄 Frases etiquetadas: {len(examples)} ({training_file.name})")
+
+        if not options['no_history']:
+            try:
+                history = load_history_examples(ChatbotService.MOTIVOS_CONSULTA)
+            except DatabaseError as e:
+                self.stdout.write(self.style.WARNING(f"  ⚠️  Historial no disponible: {e}"))
+                history = []
+            examples += history
+            self.stdout.write(f"  💬 Frases del historial: {len(history)}")
+
+        texts = [text for text, _ in examples]
+        labels = [label for _, label in examples]
+
+        # Evaluación: validación cruzada del clasificador vs ruta regex/keywords
+        folds = max(2, options['folds'])
+        predicted = [None] * len(examples)
+        probabilities = [0.0] * len(examples)
+        for fold in range(folds):
+            train = [i for i in range(len(examples)) if i % folds != fold]
+            classifier = IntentClassifier(temperature, min_similarity).fit(
+                [texts[i] for i in train], [labels[i] for i in train]
+            )
+            for i in range(fold, len(examples), folds):
+                label, probabilities[i] = classifier.predict(texts[i])
+                predicted[i] = label or 'otro'
+
+        regex_predicted = [self._regex_intent(text) for text in texts]
+
+        self.stdout.write(self.style.HTTP_INFO(f'\n📊 Exactitud por motivo ({folds}-fold):\n'))
+        self.stdout.write(f"  {'motivo':<22}{'n':>5}{'clasificador':>15}{'regex':>10}")
+        for label in sorted(set(labels)):
+            indices = [i for i, y in enumerate(labels) if y == label]
+            model_acc = sum(predicted[i] == label for i in indices) / len(indices)
+            regex_acc = sum(regex_predicted[i] == label for i in indices) / len(indices)
+            self.stdout.write(f"  {label:<22}{len(indices):>5}{model_acc:>15.1%}{regex_acc:>10.1%}")
+        model_total = sum(p == y for p, y in zip(predicted, labels)) / len(labels)
+        regex_total = sum(p == y for p, y in zip(regex_predicted, labels)) / len(labels)
+        self.stdout.write(f"  {'TOTAL':<22}{len(labels):>5}{model_total:>15.1%}{regex_total:>10.1%}")
+
+        supported = [
+            ChatbotService._supported_motivos(
+                text,
+                ChatbotService._extract_data_with_regex(text, {}).get('motivo_consulta'),
+                ChatbotService._extract_simple_intent(text)
+            )
+            for text in texts
+        ]
+        self._report_calibration(labels, predicted, probabilities, supported)
+
+        # Modelo final con todos los datos
+        classifier = IntentClassifier(temperature, min_similarity).fit(texts, labels)
+        classifier.save(model_path)
+
+        # Benchmark de latencia por mensaje
+        model_times = self._benchmark(classifier.predict, texts, options['repeat'])
+        regex_times = self._benchmark(self._regex_intent, texts, options['repeat'])
+        self.stdout.write(self.style.HTTP_INFO('\n⏱️  Latencia por mensaje (ms):\n'))
+        self.stdout.write(f"  {'ruta':<15}{'media':>10}{'p50':>10}{'p99':>10}")
+        for name, times in (('clasificador', model_times), ('regex', regex_times)):
+            p99 = sorted(times)[int(len(times) * 0.99) - 1]
+            self.stdout.write(
+                f"  {name:<15}{statistics.mean(times):>10.3f}"
+                f"{statistics.median(times):>10.3f}{p99:>10.3f}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Modelo guardado en {model_path}\n'))
+
+    def _regex_intent(self, text: str) -> str:
+        """
+        Motivo según la ruta actual sin LLM (keywords + intención simple)
+        """
+        motivo = ChatbotService._extract_data_with_regex(text, {}).get('motivo_consulta')
+        return motivo or ChatbotService._extract_simple_intent(text) or 'otro'
+
+    def _report_calibration(self, labels, predicted, probabilities, supported):
+        """
+        Exactitud por tramo de probabilidad y precisión sobre el umbral de la
+        extracción local, sola y con el respaldo de palabras clave que
+        ChatbotService._extract_data_locally exige para saltarse Gemini
+        """
+        threshold = getattr(settings, 'RAG_CONFIG', {}).get('local_extraction', {}).get('confidence_threshold', 0.8)
+        self.stdout.write(self.style.HTTP_INFO('\n📐 Calibración del clasificador:\n'))
+        self.stdout.write(f"  {'probabilidad':<16}{'n':>5}{'p media':>10}{'exactitud':>11}")
+        edges = [0.0, 0.5, threshold, 0.9, 0.99, 1.01]
+        for low, high in zip(edges, edges[1:]):
+            indices = [i for i, p in enumerate(probabilities) if low <= p < high]
+            if not indices:
+                continue
+            mean_p = statistics.mean(probabilities[i] for i in indices)
+            accuracy = sum(predicted[i] == labels[i] for i in indices) / len(indices)
+            self.stdout.write(f"  [{low:.2f}, {min(high, 1.0):.2f}){'':<3}{len(indices):>5}{mean_p:>10.2f}{accuracy:>11.1%}")
+
+        confident = [i for i, p in enumerate(probabilities) if p >= threshold]
+        agreed = [i for i in confident if predicted[i] in supported[i]]
+        for name, indices in ((f'p ≥ {threshold}', confident), (f'p ≥ {threshold} y palabras clave', agreed)):
+            if indices:
+                precision = sum(predicted[i] == labels[i] for i in indices) / len(indices)
+                self.stdout.write(
+                    f"  Precisión con {name}: {precision:.1%} "
+                    f"({len(indices)} de {len(labels)} mensajes, {sum(predicted[i] != labels[i] for i in indices)} errores)"
+                )
+
+    def _benchmark(self, predict, texts, repeat):
+        times = []
+        for _ in range(repeat):
+            for text in texts:
+                started = time.perf_counter()
+                predict(text)
+                times.append((time.perf_counter() - started) * 1000)
+        return times
@@ -0,0 +1,213 @@
+"""
+Answer Engine - Respuestas deterministas a preguntas frecuentes sobre la boleta
+Las preguntas de seguimiento que se responden con un campo de la boleta
+("¿cuándo vence?", "¿cuánto debo?", "¿está pagada?", "¿cuánto consumí?") se
+contestan con reglas y plantillas, sin llamar al LLM. Las preguntas abiertas
+("¿por qué subió mi consumo?") siguen yendo a Gemini.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.utils import timezone
+import logging
+import re
+import threading
+
+from ..models import Boleta
+from .intent_classifier import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class BoletaAnswerEngine:
+    """
+    Motor de reglas: tipo de pregunta → plantilla con los datos de la boleta
+    """
+
+    # Reglas sobre el texto normalizado (minúsculas, sin tildes ni signos)
+    RULES: List[Tuple[str, re.Pattern]] = [
+        ('vencimiento', re.compile(
+            r'\b(vence|vencen|vencimiento|vencer|vencio|plazo|fecha limite|hasta cuando)\b'
+        )),
+        ('estado_pago', re.compile(
+            r'\b(pagada|pagado|pague|esta paga|al dia|debo algo|tengo deuda|mi deuda|quedo pagada|'
+            r'estado de (mi|la) (boleta|cuenta|pago))\b'
+        )),
+        # Solo lo que el usuario debe pagar: "¿cuánto cuesta...?" o "valor"
+        # sueltos suelen preguntar por la tarifa, no por la boleta
+        ('monto', re.compile(
+            r'\b(cuanto (debo|pago|tengo que pagar|hay que pagar)|total a pagar|monto|'
+            r'cuanto (es|sale) (mi|la) (boleta|cuenta)|valor de (mi|la) (boleta|cuenta))\b'
+        )),
+        ('consumo', re.compile(
+            r'\b(cuanto consum\w*|consumo|consumi|gaste|gasto de agua|metros cubicos|m3)\b'
+        )),
+    ]
+
+    # Preguntas abiertas: explicación, consejos o comparación → LLM. También
+    # las que nombran componentes de la tarifa o el medidor: ningún campo de
+    # la boleta las responde
+    OPEN_ENDED = re.compile(
+        r'\b(por que|porque|como|explica\w*|significa|recomienda\w*|consejo\w*|'
+        r'reducir|ahorrar|disminuir|compar\w*|diferencia|aumento|subio|bajo|alto|normal|'
+        r'cargo\w*|tarifa\w*|deuda anterior|medidor\w*|metro cubico|precio\w*|cuesta|costo\w*|'
+        r'valor (del|de un|por) (m3|metro))\b'
+    )
+
+    ESTADO_EMOJI = {
+        'pendiente': '⏳',
+        'pagada': '✅',
+        'vencida': '⚠️',
+        'anulada': '❌'
+    }
+
+    def __init__(self, max_words: int = 14):
+        """
+        Args:
+            max_words: Mensajes más largos se consideran abiertos
+        """
+        self.max_words = max_words
+        self.answered = 0
+        self.fallbacks = 0
+        self._stats_lock = threading.Lock()
+
+    def match(self, question: str) -> List[str]:
+        """
+        Identifica los tipos de pregunta respondibles sin LLM
+
+        Args:
+            question: Mensaje del usuario
+
+        Returns:
+            Tipos de pregunta en orden de las reglas ([] si es abierta)
+        """
+        text = normalize_text(question)
+        if not text or len(text.split()) > self.max_words or self.OPEN_ENDED.search(text):
+            return []
+
+        kinds = [kind for kind, pattern in self.RULES if pattern.search(text)]
+        # "¿cuánto debo?" de una boleta pagada ya se responde con el estado
+        if 'monto' in kinds and 'estado_pago' in kinds:
+            kinds.remove('estado_pago')
+        return kinds
+
+    def answer(self, question: str, boleta: Boleta) -> Optional[str]:
+        """
+        Responde la pregunta con los campos de la boleta
+
+        Args:
+            question: Mensaje del usuario
+            boleta: Boleta principal de la conversación
+
+        Returns:
+            Respuesta, o None si la pregunta requiere el LLM
+        """
+        kinds = self.match(question)
+        with self._stats_lock:
+            if kinds:
+                self.answered += 1
+            else:
+                self.fallbacks += 1
+        if not kinds:
+            return None
+
+        logger.info(f"⚡ Respuesta determinista ({', '.join(kinds)}) sin LLM")
+        return "\n\n".join(getattr(self, f"_answer_{kind}")(boleta) for kind in kinds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene cuántas preguntas se respondieron sin LLM
+
+        Returns:
+            Dict con estadísticas
+        """
+        with self._stats_lock:
+            total = self.answered + self.fallbacks
+            return {
+                'answered': self.answered,
+                'llm_fallbacks': self.fallbacks,
+                'answer_rate': round(self.answered / total, 3) if total else 0.0
+            }
+
+    def _answer_vencimiento(self, boleta: Boleta) -> str:
+        periodo = boleta.periodo_facturacion
+        if not boleta.fecha_vencimiento:
+            return f"Tu boleta del período {periodo} no tiene fecha de vencimiento registrada."
+
+        fecha = boleta.fecha_vencimiento.strftime('%d/%m/%Y')
+        if boleta.estado_pago == 'pagada':
+            return f"Tu boleta del período {periodo} vencía el **{fecha}** y ya está pagada ✅"
+        if boleta.estado_pago == 'anulada':
+            return f"Tu boleta del período {periodo} fue anulada ❌, no tiene vencimiento vigente."
+
+        dias = (boleta.fecha_vencimiento - timezone.now().date()).days
+        if dias < 0:
+            return (f"⚠️ Tu boleta del período {periodo} venció el **{fecha}** (hace {-dias} días). "
+                    "Te recomendamos pagarla lo antes posible para evitar cortes de servicio.")
+        if dias == 0:
+            return f"📅 Tu boleta del período {periodo} vence **hoy** ({fecha})."
+        return f"📅 Tu boleta del período {periodo} vence el **{fecha}** (en {dias} días)."
+
+    def _answer_monto(self, boleta: Boleta) -> str:
+        periodo = boleta.periodo_facturacion
+        monto = f"${boleta.monto:,.0f}"
+        if boleta.estado_pago == 'pagada':
+            return f"✅ Tu boleta del período {periodo} por **{monto}** ya está pagada: no tienes monto pendiente."
+        if boleta.estado_pago == 'anulada':
+            return f"❌ Tu boleta del período {periodo} fue anulada, no tienes monto por pagar."
+
+        mensaje = f"💵 El monto a pagar de tu boleta del período {periodo} es **{monto}**."
+        if boleta.esta_vencida() or boleta.estado_pago == 'vencida':
+            mensaje += " ⚠️ La boleta está vencida."
+        elif boleta.fecha_vencimiento:
+            mensaje += f" Vence el {boleta.fecha_vencimiento.strftime('%d/%m/%Y')}."
+        return mensaje
+
+    def _answer_estado_pago(self, boleta: Boleta) -> str:
+        periodo = boleta.periodo_facturacion
+        estado = boleta.estado_pago
+        if estado == 'pendiente' and boleta.esta_vencida():
+            estado = 'vencida'
+        emoji = self.ESTADO_EMOJI.get(estado, '📄')
+
+        if estado == 'pagada':
+            return f"{emoji} Sí, tu boleta del período {periodo} está **pagada**."
+        if estado == 'anulada':
+            return f"{emoji} Tu boleta del período {periodo} fue **anulada**."
+        if estado == 'vencida':
+            return (f"{emoji} Tu boleta del período {periodo} está **vencida** y tiene "
+                    f"**${boleta.monto:,.0f}** pendientes de pago.")
+        return (f"{emoji} Tu boleta del período {periodo} está **pendiente de pago** "
+                f"(**${boleta.monto:,.0f}**).")
+
+    def _answer_consumo(self, boleta: Boleta) -> str:
+        promedio = boleta.get_consumo_promedio_diario()
+        mensaje = (f"📊 En el período {boleta.periodo_facturacion} consumiste **{boleta.consumo} m³**, "
+                   f"un promedio de **{promedio:.2f} m³/día**.")
+        if boleta.lectura_anterior is not None and boleta.lectura_actual is not None:
+            mensaje += (f" Lectura anterior: {boleta.lectura_anterior} m³, "
+                        f"lectura actual: {boleta.lectura_actual} m³.")
+        return mensaje
+
+
+def _get_config() -> Dict[str, Any]:
+    return getattr(settings, 'RAG_CONFIG', {}).get('answer_engine', {})
+
+
+# Singleton
+_answer_engine_instance = None
+
+
+def get_answer_engine() -> Optional[BoletaAnswerEngine]:
+    """
+    Obtiene la instancia singleton del motor de respuestas
+
+    Returns:
+        BoletaAnswerEngine o None si está deshabilitado en RAG_CONFIG
+    """
+    global _answer_engine_instance
+    config = _get_config()
+    if not config.get('enabled', True):
+        return None
+    if _answer_engine_instance is None:
+        _answer_engine_instance = BoletaAnswerEngine(max_words=config.get('max_words', 14))
+    return _answer_engine_instance
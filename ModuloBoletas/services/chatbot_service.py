@@ -8,20 +8,38 @@ Implementa el flujo del diagrama:
 5. Si SÍ tiene boleta → rescatar datos y responder
 6. Verificar si consulta es comparativa → responder acorde
 """
-import google.generativeai as genai
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Set, Tuple, Iterator, Callable
 from django.conf import settings
 from django.utils import timezone
 from datetime import datetime, timedelta
+import itertools
 import logging
 import json
 import re
 
 from ..models import ChatConversation, ChatMessage, Boleta
 from ..RAG.retriever import get_rag_retriever
+from .answer_engine import get_answer_engine
+from .intent_classifier import get_intent_classifier
+from ModuloCompartido.services.lazy_import import lazy_module
+from ModuloCompartido.services.llm_cache import wrap_model
+from ModuloCompartido.services.llm_providers import build_llm_model, get_finish_reason
+from ModuloCompartido.services.prompt_budget import (
+    PRIORITY_FACTS,
+    PRIORITY_HISTORY,
+    PRIORITY_RAG,
+    PromptAssembler,
+    get_history_window,
+)
+from ModuloCompartido.services.quota import is_quota_error
+from ModuloCompartido.services.turn_pipeline import TurnPipeline
 
 logger = logging.getLogger(__name__)
 
+# Diferido hasta crear el ChatbotService: importar el SDK toma ~1 s y las
+# vistas cargan este módulo en cada comando de manage.py
+genai = lazy_module('google.generativeai')
+
 
 class ChatbotService:
     """
@@ -53,6 +71,18 @@ class ChatbotService:
         'otro'
     ]
     
+    # Palabras clave por motivo (extracción local)
+    MOTIVOS_KEYWORDS = {
+        'consultar_monto': ['monto', 'pagar', 'pago', 'cuanto', 'cuánto', 'debo', 'valor', 'precio'],
+        'consultar_consumo': ['consumo', 'gasto', 'metros', 'm3', 'm³', 'cuanto gaste', 'cuánto gaste'],
+        'comparar_periodos': ['comparar', 'comparación', 'diferencia', 'meses', 'períodos', 'periodos'],
+        'ver_boleta': ['ver', 'mostrar', 'boleta', 'factura', 'estado'],
+        'estado_pago': ['estado', 'pagada', 'pendiente', 'vencida', 'pague', 'pagué']
+    }
+    
+    # Patrón de RUT (con o sin guión/punto antes del dígito verificador)
+    RUT_PATTERN = r'\b(\d{7,8}[-\.]?\d)\b'
+    
     def __init__(self):
         """
         Inicializa el servicio del chatbot
@@ -65,7 +95,10 @@ class ChatbotService:
         genai.configure(api_key=api_key)
         # Usar Gemini 2.5 Flash desde configuración
         gemini_model = getattr(settings, 'RAG_CONFIG', {}).get('gemini_model', 'gemini-2.5-flash')
-        self.model = genai.GenerativeModel(gemini_model)
+        # Backend configurable (gemini | stub | cassette) detrás de la misma interfaz
+        llm = build_llm_model(gemini_model, lambda: genai.GenerativeModel(gemini_model))
+        # Envolver con la caché exacta de prompts/respuestas y el circuit breaker
+        self.model = wrap_model(llm, gemini_model, 'boletas')
         
         # Inicializar RAG
         try:
@@ -75,6 +108,9 @@ class ChatbotService:
             logger.warning(f"No se pudo inicializar RAG: {e}")
             self.rag_retriever = None
         
+        # Respuestas deterministas para preguntas frecuentes sobre la boleta
+        self.answer_engine = get_answer_engine()
+        
         logger.info("ChatbotService (Boletas) inicializado")
     
     def start_conversation(self, session_id: str) -> Tuple[ChatConversation, str]:
@@ -138,21 +174,7 @@ class ChatbotService:
             )
             
             # Procesar según estado actual
-            if conversation.estado == self.STATE_RECOLECTANDO:
-                response = self._handle_data_collection(conversation, user_message)
-            
-            elif conversation.estado == self.STATE_CONSULTANDO:
-                response = self._handle_consultation(conversation, user_message)
-            
-            elif conversation.estado == self.STATE_COMPARANDO:
-                response = self._handle_comparison(conversation, user_message)
-            
-            else:
-                response = {
-                    'message': 'Conversación finalizada. Puedes iniciar una nueva conversación.',
-                    'estado': conversation.estado,
-                    'completed': True
-                }
+            response = self._dispatch_message(conversation, user_message)
             
             # Guardar respuesta del asistente
             ChatMessage.objects.create(
@@ -178,6 +200,199 @@ class ChatbotService:
                 'estado': 'error'
             }
     
+    def process_message_stream(
+        self,
+        session_id: str,
+        user_message: str
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Variante en streaming de process_message
+        
+        Emite eventos a medida que Gemini genera la respuesta y guarda el
+        ChatMessage del asistente solo cuando el stream termina.
+        
+        Args:
+            session_id: ID de la sesión
+            user_message: Mensaje del usuario
+            
+        Yields:
+            Dict con 'event' ('token', 'done' o 'error') y 'data'
+        """
+        try:
+            conversation = ChatConversation.objects.get(session_id=session_id)
+        except ChatConversation.DoesNotExist:
+            logger.error(f"Conversación no encontrada: {session_id}")
+            yield {
+                'event': 'error',
+                'data': {
+                    'error': 'Sesión no encontrada',
+                    'message': 'Por favor inicia una nueva conversación',
+                    'estado': 'error'
+                }
+            }
+            return
+        
+        try:
+            # Guardar mensaje del usuario
+            ChatMessage.objects.create(
+                conversation=conversation,
+                rol='usuario',
+                contenido=user_message
+            )
+            
+            text_stream, response = self._prepare_stream(conversation, user_message)
+            
+            parts = []
+            for chunk in text_stream:
+                if not chunk:
+                    continue
+                parts.append(chunk)
+                yield {'event': 'token', 'data': {'text': chunk}}
+            
+            response['message'] = ''.join(parts)
+            
+            # Guardar respuesta del asistente una vez completo el stream
+            ChatMessage.objects.create(
+                conversation=conversation,
+                rol='asistente',
+                contenido=response['message']
+            )
+            
+            yield {'event': 'done', 'data': response}
+            
+        except Exception as e:
+            logger.error(f"Error procesando mensaje en streaming: {e}")
+            yield {
+                'event': 'error',
+                'data': {
+                    'error': str(e),
+                    'message': 'Ocurrió un error procesando tu mensaje. Por favor intenta nuevamente.',
+                    'estado': 'error'
+                }
+            }
+    
+    def stream_generation(
+        self,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        on_error: Optional[Callable[[Exception], str]] = None,
+        on_finish: Optional[Callable[[str], None]] = None,
+        call_site: str = 'default'
+    ) -> Iterator[str]:
+        """
+        Genera texto con Gemini en modo streaming
+        
+        Args:
+            prompt: Prompt a enviar al modelo (texto o lista de turnos)
+            generation_config: Configuración de generación (opcional)
+            on_error: Función que traduce un error en texto de respaldo
+            on_finish: Recibe el finish_reason del último fragmento ('STOP', 'MAX_TOKENS', ...)
+            call_site: Punto de llamada (para los contadores de la caché)
+            
+        Yields:
+            Fragmentos de texto a medida que llegan
+        """
+        emitted = False
+        finish_reason = 'STOP'
+        try:
+            kwargs = {'stream': True, 'call_site': call_site}
+            if generation_config:
+                kwargs['generation_config'] = generation_config
+            
+            for chunk in self.model.generate_content(prompt, **kwargs):
+                finish_reason = get_finish_reason(chunk)
+                try:
+                    text = chunk.text
+                except (ValueError, AttributeError):
+                    # Chunks sin texto (p.ej. solo metadata de finalización)
+                    continue
+                if text:
+                    emitted = True
+                    yield text
+            
+            if on_finish is not None:
+                on_finish(finish_reason)
+                    
+        except Exception as e:
+            if emitted:
+                # El cliente ya recibió parte de la respuesta; cortar aquí
+                logger.error(f"Stream de Gemini interrumpido: {e}")
+                return
+            if on_error is None:
+                raise
+            yield on_error(e)
+    
+    def _dispatch_message(
+        self,
+        conversation: ChatConversation,
+        user_message: str
+    ) -> Dict[str, Any]:
+        """
+        Enruta el mensaje al manejador del estado actual
+        """
+        if conversation.estado == self.STATE_RECOLECTANDO:
+            return self._handle_data_collection(conversation, user_message)
+        
+        if conversation.estado == self.STATE_CONSULTANDO:
+            return self._handle_consultation(conversation, user_message)
+        
+        if conversation.estado == self.STATE_COMPARANDO:
+            return self._handle_comparison(conversation, user_message)
+        
+        return {
+            'message': 'Conversación finalizada. Puedes iniciar una nueva conversación.',
+            'estado': conversation.estado,
+            'completed': True
+        }
+    
+    def _prepare_stream(
+        self,
+        conversation: ChatConversation,
+        user_message: str
+    ) -> Tuple[Iterator[str], Dict[str, Any]]:
+        """
+        Prepara el stream de texto y la respuesta (sin 'message') para el estado actual
+        
+        Solo las respuestas generadas por Gemini (consulta y comparación) se
+        transmiten token a token; el resto se emite como un único fragmento.
+        """
+        # Con el circuito abierto se responde por plantilla en un solo fragmento
+        llm_available = not self.model.circuit_open()
+        
+        if (llm_available and conversation.estado == self.STATE_CONSULTANDO
+                and conversation.boleta_principal and not self._is_deterministic(user_message)):
+            boleta = conversation.boleta_principal
+            prompt = self._build_contextual_prompt(user_message, boleta, conversation)
+            text_stream = itertools.chain(
+                self.stream_generation(
+                    prompt, on_error=self._contextual_error_message, call_site='boletas_contextual'
+                ),
+                ["\n\n¿Hay algo más en lo que pueda ayudarte con tu boleta?"]
+            )
+            return text_stream, {
+                'estado': conversation.estado,
+                'boleta_id': str(boleta.id_boleta),
+                'completed': False
+            }
+        
+        if llm_available and conversation.estado == self.STATE_COMPARANDO:
+            boletas = self._get_boletas_para_comparar(conversation)
+            if len(boletas) >= 2:
+                prompt = self._build_comparative_prompt(user_message, boletas)
+                text_stream = self.stream_generation(
+                    prompt,
+                    on_error=lambda e: self._comparative_error_message(e, boletas),
+                    call_site='boletas_comparative'
+                )
+                return text_stream, {
+                    'estado': conversation.estado,
+                    'es_consulta_comparativa': True,
+                    'completed': False
+                }
+        
+        response = self._dispatch_message(conversation, user_message)
+        return iter([response.pop('message')]), response
+    
     def _handle_data_collection(
         self,
         conversation: ChatConversation,
@@ -195,13 +410,37 @@ class ChatbotService:
             Dict con respuesta
         """
         datos = conversation.datos_recolectados
-        
-        # Extraer información usando LLM
-        extracted_data = self._extract_data_with_llm(
-            user_message,
-            datos,
-            conversation
+        pipeline = TurnPipeline('boletas_recoleccion')
+        
+        rut_hint = datos.get('rut') or self._find_rut(user_message)
+        boletas = None
+        # Extracción local en el hilo de la petición (microsegundos): si basta,
+        # no se consulta el historial ni se pasa por el pool
+        extracted_data = pipeline.run(
+            'local_extraction',
+            lambda: self._extract_data_if_confident(user_message, datos)
         )
+        if extracted_data is None and rut_hint and not self.model.circuit_open():
+            # Gemini: la búsqueda de boletas del RUT conocido se solapa con la extracción
+            history = pipeline.run(
+                'history',
+                lambda: self._get_conversation_history(conversation, last_n=get_history_window())
+            )
+            pipeline.submit(
+                'extraction',
+                lambda: self._extract_data_with_llm(
+                    user_message, datos, conversation, history=history, try_local=False
+                ),
+                wait_forever=True
+            )
+            boletas = pipeline.run('boleta_lookup', lambda: self._fetch_boletas(rut_hint))
+            extracted_data = pipeline.result('extraction')
+        elif extracted_data is None:
+            extracted_data = pipeline.run(
+                'extraction',
+                lambda: self._extract_data_with_llm(user_message, datos, conversation, try_local=False)
+            )
+        pipeline.finish()
         
         # Actualizar datos recolectados
         datos.update(extracted_data)
@@ -243,20 +482,28 @@ class ChatbotService:
             }
         
         # Ya tenemos motivo y RUT, verificar si tiene boleta
-        return self._verificar_boleta_en_sistema(conversation)
+        if datos.get('rut') != rut_hint:
+            boletas = None
+        return self._verificar_boleta_en_sistema(conversation, boletas)
     
     def _verificar_boleta_en_sistema(
         self,
-        conversation: ChatConversation
+        conversation: ChatConversation,
+        boletas: Optional[Any] = None
     ) -> Dict[str, Any]:
         """
         Verifica si el RUT tiene boletas en el sistema (Paso 3 del diagrama)
+        
+        Args:
+            conversation: Conversación activa
+            boletas: Boletas del RUT ya consultadas (opcional)
         """
         datos = conversation.datos_recolectados
         rut = datos.get('rut')
         
         # Buscar boletas del RUT
-        boletas = Boleta.objects.filter(rut=rut).order_by('-fecha_emision')
+        if boletas is None:
+            boletas = self._fetch_boletas(rut)
         
         if not boletas.exists():
             # NO tiene boleta → solicitar imagen (Paso 4 del diagrama)
@@ -296,6 +543,17 @@ class ChatbotService:
             # Responder según el motivo
             return self._responder_segun_motivo(conversation, boleta_reciente, boletas)
     
+    def _fetch_boletas(self, rut: str) -> Any:
+        """
+        Boletas del RUT (más recientes primero) ya evaluadas
+        
+        El queryset queda en caché: exists(), first(), count() y los slices
+        posteriores no vuelven a consultar la base de datos.
+        """
+        boletas = Boleta.objects.filter(rut=rut).order_by('-fecha_emision')
+        len(boletas)
+        return boletas
+    
     def _responder_segun_motivo(
         self,
         conversation: ChatConversation,
@@ -374,12 +632,18 @@ class ChatbotService:
                 'completed': False
             }
         
+        # Preguntas respondibles con los campos de la boleta no usan el LLM
+        response_text = None
+        if self.answer_engine is not None:
+            response_text = self.answer_engine.answer(user_message, boleta)
+        
         # Generar respuesta contextual con LLM
-        response_text = self._generate_contextual_response(
-            user_message,
-            boleta,
-            conversation
-        )
+        if response_text is None:
+            response_text = self._generate_contextual_response(
+                user_message,
+                boleta,
+                conversation
+            )
         
         # Preguntar si necesita algo más
         response_text += "\n\n¿Hay algo más en lo que pueda ayudarte con tu boleta?"
@@ -391,6 +655,12 @@ class ChatbotService:
             'completed': False
         }
     
+    def _is_deterministic(self, user_message: str) -> bool:
+        """
+        Indica si el motor de reglas responde la pregunta sin LLM
+        """
+        return self.answer_engine is not None and bool(self.answer_engine.match(user_message))
+    
     def _handle_comparison(
         self,
         conversation: ChatConversation,
@@ -399,12 +669,7 @@ class ChatbotService:
         """
         Maneja consultas comparativas
         """
-        # Prefer boletas previamente seleccionadas/adjuntadas a la conversación
-        boletas = list(conversation.boletas_comparadas.all().order_by('-fecha_emision')) if hasattr(conversation, 'boletas_comparadas') else []
-        if not boletas:
-            rut = conversation.datos_recolectados.get('rut')
-            if rut:
-                boletas = list(Boleta.objects.filter(rut=rut).order_by('-fecha_emision')[:6])
+        boletas = self._get_boletas_para_comparar(conversation)
 
         if len(boletas) < 2:
             mensaje = "Solo tienes una boleta registrada. Para comparaciones necesitas al menos dos boletas."
@@ -419,11 +684,25 @@ class ChatbotService:
             'completed': False
         }
     
+    def _get_boletas_para_comparar(self, conversation: ChatConversation) -> List[Boleta]:
+        """
+        Obtiene las boletas a comparar en la conversación
+        """
+        # Prefer boletas previamente seleccionadas/adjuntadas a la conversación
+        boletas = list(conversation.boletas_comparadas.all().order_by('-fecha_emision')) if hasattr(conversation, 'boletas_comparadas') else []
+        if not boletas:
+            rut = conversation.datos_recolectados.get('rut')
+            if rut:
+                boletas = list(Boleta.objects.filter(rut=rut).order_by('-fecha_emision')[:6])
+        return boletas
+    
     def _extract_data_with_llm(
         self,
         user_message: str,
         current_data: Dict,
-        conversation: ChatConversation
+        conversation: ChatConversation,
+        history: Optional[List[Dict[str, str]]] = None,
+        try_local: bool = True
     ) -> Dict[str, Any]:
         """
         Extrae información del mensaje usando Gemini (primario) con fallback a regex
@@ -432,36 +711,99 @@ class ChatbotService:
             user_message: Mensaje del usuario
             current_data: Datos ya recolectados
             conversation: Conversación actual
+            history: Historial ya consultado (permite ejecutar fuera del hilo de la petición)
+            try_local: Si False, el llamador ya probó _extract_data_if_confident
             
         Returns:
             Dict con los datos extraídos
         """
         extracted_data = {}
         
-        # MÉTODO PRIMARIO: Extracción con LLM (Gemini)
+        if try_local:
+            local_data = self._extract_data_if_confident(user_message, current_data)
+            if local_data is not None:
+                return local_data
+        
+        # MÉTODO PRIMARIO: Extracción con LLM (Gemini), salvo con el circuito abierto
+        if self.model.circuit_open():
+            logger.info("⚡ Circuito de Gemini abierto: usando extractores locales")
+        else:
+            extracted_data.update(
+                self._extract_data_with_gemini(user_message, current_data, conversation, history)
+            )
+            
+            # Si tenemos datos completos, retornar
+            if 'rut' in extracted_data or 'motivo_consulta' in extracted_data:
+                return extracted_data
+        
+        # FALLBACK: Extracción por regex si Gemini falla o no retorna datos completos
+        logger.info("🔄 Usando regex como fallback...")
+        regex_data = self._extract_data_with_regex(user_message, current_data)
+        
+        # Combinar datos (LLM tiene prioridad si existe, sino usar regex)
+        for key, value in regex_data.items():
+            if key not in extracted_data:
+                extracted_data[key] = value
+        
+        if regex_data:
+            logger.info(f"✅ Datos extraídos con regex (fallback): {regex_data}")
+        
+        # Si aún no tenemos datos, intentar extracción simple basada en keywords
+        if not extracted_data.get('motivo_consulta'):
+            motivo_simple = self._extract_simple_intent(user_message)
+            if motivo_simple:
+                extracted_data['motivo_consulta'] = motivo_simple
+                logger.info(f"✅ Motivo extraído con análisis simple: {motivo_simple}")
+        
+        return extracted_data
+    
+    def _extract_data_if_confident(self, user_message: str, current_data: Dict) -> Optional[Dict[str, Any]]:
+        """
+        Extracción local si su confianza alcanza local_extraction.confidence_threshold
+        
+        Mensajes triviales ("12345678-9", "quiero ver mi boleta") no necesitan LLM.
+        
+        Returns:
+            Datos extraídos, o None si hay que consultar a Gemini
+        """
+        config = getattr(settings, 'RAG_CONFIG', {}).get('local_extraction', {})
+        if not config.get('enabled', True):
+            return None
+        local_data, confidence = self._extract_data_locally(user_message, current_data)
+        if confidence < config.get('confidence_threshold', 0.8):
+            return None
+        logger.info(f"⚡ Extracción local con confianza {confidence:.2f}: {local_data}")
+        return local_data
+    
+    def _extract_data_with_gemini(
+        self,
+        user_message: str,
+        current_data: Dict,
+        conversation: ChatConversation,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Extrae información del mensaje con Gemini (sin fallback)
+        
+        Returns:
+            Dict con los datos extraídos por el LLM ({} si falla)
+        """
         logger.info("🤖 Intentando extracción con Gemini API...")
         
         try:
             # Obtener historial reciente
-            history = self._get_conversation_history(conversation, last_n=3)
+            if history is None:
+                history = self._get_conversation_history(conversation, last_n=get_history_window())
             
             # Obtener contexto del RAG si está disponible
-            rag_context = ""
-            if self.rag_retriever:
-                try:
-                    rag_context = self.rag_retriever.get_relevant_context_text(
-                        query=user_message,
-                        max_length=1000
-                    )
-                except Exception as e:
-                    logger.warning(f"Error obteniendo contexto RAG: {e}")
+            rag_snippets = self._get_rag_snippets(user_message)
             
             # Construir prompt
             prompt = self._build_extraction_prompt(
                 user_message,
                 current_data,
                 history,
-                rag_context
+                rag_snippets
             )
             
             # Llamar a Gemini con timeout
@@ -470,7 +812,8 @@ class ChatbotService:
                 generation_config={
                     'temperature': 0.1,
                     'max_output_tokens': 200
-                }
+                },
+                call_site='boletas_extraction'
             )
             
             # Parsear respuesta JSON
@@ -481,49 +824,27 @@ class ChatbotService:
             
             # Parsear JSON
             llm_data = json.loads(response_text)
+            if not isinstance(llm_data, dict):
+                raise json.JSONDecodeError("Se esperaba un objeto JSON", response_text, 0)
             
-            # Usar datos del LLM como primarios
-            extracted_data.update(llm_data)
             logger.info(f"✅ Datos extraídos con Gemini API: {llm_data}")
-            
-            # Si tenemos datos completos, retornar
-            if 'rut' in extracted_data or 'motivo_consulta' in extracted_data:
-                return extracted_data
+            return llm_data
             
         except json.JSONDecodeError as e:
             logger.warning(f"⚠️  Respuesta de Gemini no es JSON válido: {e}")
             logger.warning(f"Respuesta recibida: {response_text[:200] if 'response_text' in locals() else 'N/A'}")
         except Exception as e:
             # Detectar errores de cuota/429 y dejar que el fallback por regex maneje la extracción
-            msg = str(e).lower()
-            if 'quota' in msg or '429' in msg or 'rate limit' in msg or 'quota exceeded' in msg:
+            if is_quota_error(e):
                 logger.warning(f"❌ Gemini quota/rate-limit error detected: {e}")
             else:
                 logger.error(f"❌ Error en extracción con Gemini API: {e}")
         
-        # FALLBACK: Extracción por regex si Gemini falla o no retorna datos completos
-        logger.info("🔄 Usando regex como fallback...")
-        regex_data = self._extract_data_with_regex(user_message, current_data)
-        
-        # Combinar datos (LLM tiene prioridad si existe, sino usar regex)
-        for key, value in regex_data.items():
-            if key not in extracted_data:
-                extracted_data[key] = value
-        
-        if regex_data:
-            logger.info(f"✅ Datos extraídos con regex (fallback): {regex_data}")
-        
-        # Si aún no tenemos datos, intentar extracción simple basada en keywords
-        if not extracted_data.get('motivo_consulta'):
-            motivo_simple = self._extract_simple_intent(user_message)
-            if motivo_simple:
-                extracted_data['motivo_consulta'] = motivo_simple
-                logger.info(f"✅ Motivo extraído con análisis simple: {motivo_simple}")
-        
-        return extracted_data
+        return {}
     
+    @classmethod
     def _extract_data_with_regex(
-        self,
+        cls,
         user_message: str,
         current_data: Dict
     ) -> Dict[str, Any]:
@@ -541,33 +862,16 @@ class ChatbotService:
         message_lower = user_message.lower()
         
         # Extraer RUT con regex
-        rut_pattern = r'\b(\d{7,8}[-\.]?\d)\b'
-        rut_match = re.search(rut_pattern, user_message)
-        if rut_match:
-            rut = rut_match.group(1)
-            # Normalizar formato (agregar guión si no lo tiene)
-            if '-' not in rut and '.' not in rut:
-                rut = f"{rut[:-1]}-{rut[-1]}"
-            else:
-                rut = rut.replace('.', '-')
+        rut = cls._find_rut(user_message)
+        if rut:
             extracted['rut'] = rut
             logger.info(f"RUT extraído por regex: {rut}")
         
         # Extraer motivo de consulta por palabras clave
-        motivos_keywords = {
-            'consultar_monto': ['monto', 'pagar', 'pago', 'cuanto', 'cuánto', 'debo', 'valor', 'precio'],
-            'consultar_consumo': ['consumo', 'gasto', 'metros', 'm3', 'm³', 'cuanto gaste', 'cuánto gaste'],
-            'comparar_periodos': ['comparar', 'comparación', 'diferencia', 'meses', 'períodos', 'periodos'],
-            'ver_boleta': ['ver', 'mostrar', 'boleta', 'factura', 'estado'],
-            'estado_pago': ['estado', 'pagada', 'pendiente', 'vencida', 'pague', 'pagué']
-        }
-        
-        # Buscar coincidencias
         max_matches = 0
         best_motivo = None
         
-        for motivo, keywords in motivos_keywords.items():
-            matches = sum(1 for keyword in keywords if keyword in message_lower)
+        for motivo, matches in cls._score_motivos(message_lower).items():
             if matches > max_matches:
                 max_matches = matches
                 best_motivo = motivo
@@ -582,7 +886,124 @@ class ChatbotService:
         
         return extracted
     
-    def _extract_simple_intent(self, user_message: str) -> Optional[str]:
+    @classmethod
+    def _find_rut(cls, user_message: str) -> Optional[str]:
+        """
+        Busca un RUT en el mensaje y lo normaliza al formato 12345678-9
+        """
+        rut_match = re.search(cls.RUT_PATTERN, user_message)
+        if not rut_match:
+            return None
+        rut = rut_match.group(1)
+        # Normalizar formato (agregar guión si no lo tiene)
+        if '-' not in rut and '.' not in rut:
+            return f"{rut[:-1]}-{rut[-1]}"
+        return rut.replace('.', '-')
+    
+    @classmethod
+    def _score_motivos(cls, message_lower: str) -> Dict[str, int]:
+        """
+        Cuenta las palabras clave de cada motivo presentes en el mensaje
+        """
+        return {
+            motivo: sum(1 for keyword in keywords if keyword in message_lower)
+            for motivo, keywords in cls.MOTIVOS_KEYWORDS.items()
+        }
+    
+    @classmethod
+    def _supported_motivos(
+        cls,
+        user_message: str,
+        keyword_motivo: Optional[str],
+        simple_intent: Optional[str]
+    ) -> Set[str]:
+        """
+        Motivos respaldados por palabras clave específicas del mensaje
+        
+        "boleta" aparece en casi cualquier mensaje, así que sola no respalda
+        ver_boleta ("me llegó muy cara la boleta").
+        
+        Args:
+            user_message: Mensaje del usuario
+            keyword_motivo: Motivo de _extract_data_with_regex
+            simple_intent: Motivo de _extract_simple_intent
+            
+        Returns:
+            Conjunto de motivos (vacío si no hay evidencia específica)
+        """
+        scores = cls._score_motivos(user_message.lower().replace('boleta', ''))
+        return {motivo for motivo in (keyword_motivo, simple_intent) if motivo and scores.get(motivo)}
+    
+    def _extract_data_locally(
+        self,
+        user_message: str,
+        current_data: Dict
+    ) -> Tuple[Dict[str, Any], float]:
+        """
+        Extracción local (RUT, palabras clave e intención simple) con confianza
+        
+        La confianza es la del dato menos seguro: un RUT encontrado por regex
+        es casi seguro; el motivo depende de cuánto gana el mejor motivo al
+        segundo (sin contar la palabra "boleta") y de si coincide con
+        _extract_simple_intent. El clasificador local solo sube la confianza
+        cuando coincide con las palabras clave o la intención simple; si no,
+        queda bajo el umbral y decide Gemini (su softmax es casi 1.0 también
+        cuando se equivoca). Sin datos, 0.0.
+        
+        Args:
+            user_message: Mensaje del usuario
+            current_data: Datos ya recolectados
+            
+        Returns:
+            Tupla (datos extraídos, confianza entre 0 y 1)
+        """
+        extracted = self._extract_data_with_regex(user_message, current_data)
+        message_lower = user_message.lower()
+        simple_intent = self._extract_simple_intent(user_message)
+        confidences = []
+        
+        if 'rut' in extracted:
+            # Un mensaje que es solo el RUT no deja dudas
+            only_rut = re.fullmatch(r'\s*(rut:?\s*)?' + self.RUT_PATTERN + r'\s*\.?\s*', message_lower)
+            confidences.append(1.0 if only_rut else 0.95)
+        
+        supported = self._supported_motivos(user_message, extracted.get('motivo_consulta'), simple_intent)
+        
+        motivo, motivo_confidence = extracted.pop('motivo_consulta', None), 0.0
+        if motivo in supported:
+            # "boleta" aparece en casi cualquier mensaje: no cuenta para el margen
+            ranking = sorted(self._score_motivos(message_lower.replace('boleta', '')).values(), reverse=True)
+            margin = ranking[0] - ranking[1]
+            motivo_confidence = 0.5 + 0.2 * margin
+            if simple_intent == motivo:
+                motivo_confidence += 0.1
+            motivo_confidence = round(min(motivo_confidence, 0.95), 2)
+        elif motivo or simple_intent:
+            motivo, motivo_confidence = motivo or simple_intent, 0.5
+        
+        # Clasificador local: confirma el motivo de las palabras clave o lo
+        # propone con confianza bajo el umbral
+        label, probability = None, 0.0
+        classifier = get_intent_classifier()
+        if classifier is not None:
+            label, probability = classifier.predict(user_message)
+        if label is not None:
+            if label in supported:
+                motivo = label
+                motivo_confidence = max(motivo_confidence, round(probability, 2))
+            elif probability > motivo_confidence:
+                threshold = getattr(settings, 'RAG_CONFIG', {}).get('local_extraction', {}).get('confidence_threshold', 0.8)
+                motivo = label
+                motivo_confidence = round(min(probability, threshold - 0.05), 2)
+        
+        if motivo:
+            extracted['motivo_consulta'] = motivo
+            confidences.append(motivo_confidence)
+        
+        return extracted, (min(confidences) if confidences else 0.0)
+    
+    @staticmethod
+    def _extract_simple_intent(user_message: str) -> Optional[str]:
         """
         Extrae intención simple cuando regex y LLM fallan
         Método ultra-simple basado en palabras clave principales
@@ -622,34 +1043,14 @@ class ChatbotService:
         user_message: str,
         current_data: Dict,
         history: List[Dict],
-        rag_context: str = ""
+        rag_snippets: Optional[List[str]] = None
     ) -> str:
         """
-        Construye el prompt para extracción de datos
+        Construye el prompt para extracción de datos (acotado por presupuesto de tokens)
         """
-        history_text = "\n".join([
-            f"{msg['rol']}: {msg['contenido']}"
-            for msg in history
-        ])
         current_data_text = json.dumps(current_data, indent=2, ensure_ascii=False)
         
-        # Agregar contexto RAG si está disponible
-        rag_section = ""
-        if rag_context:
-            rag_section = f"\n{rag_context}\n"
-        
-        prompt = f"""Eres un asistente especializado en consultas de boletas de agua potable.
-{rag_section}
-HISTORIAL DE CONVERSACIÓN:
-{history_text}
-
-DATOS YA RECOLECTADOS:
-{current_data_text}
-
-MENSAJE ACTUAL DEL USUARIO:
-{user_message}
-
-Tu tarea es extraer la siguiente información del mensaje del usuario:
+        instructions = """Tu tarea es extraer la siguiente información del mensaje del usuario:
 
 1. **motivo_consulta**: Clasifica en uno de estos:
    - "ver_boleta": Quiere ver su boleta
@@ -674,14 +1075,29 @@ INSTRUCCIONES:
 - Si un dato no está presente, no lo incluyas en el JSON
 
 Ejemplo de respuesta:
-{{
+{
   "motivo_consulta": "consultar_monto",
   "rut": "12345678-9"
-}}
+}
 
 Responde SOLO con JSON:"""
         
-        return prompt
+        assembler = PromptAssembler('boletas_extraction')
+        assembler.add('rol', "Eres un asistente especializado en consultas de boletas de agua potable.", required=True)
+        # Agregar contexto RAG si está disponible
+        assembler.add_items(
+            'rag', rag_snippets or [], PRIORITY_RAG,
+            header="INFORMACIÓN RELEVANTE (fragmentos y fuentes):", separator="\n\n", truncate=True
+        )
+        assembler.add_items(
+            'historial', self._format_history(history), PRIORITY_HISTORY,
+            header="HISTORIAL DE CONVERSACIÓN:", keep='last'
+        )
+        assembler.add('datos', current_data_text, PRIORITY_FACTS, header="DATOS YA RECOLECTADOS:", required=True)
+        assembler.add('mensaje', user_message, header="MENSAJE ACTUAL DEL USUARIO:", required=True)
+        assembler.add('instrucciones', instructions, required=True)
+        
+        return assembler.build()
     
     def _formatear_info_boleta(self, boleta: Boleta) -> str:
         """
@@ -759,9 +1175,83 @@ Responde SOLO con JSON:"""
         """
         Genera una respuesta contextual usando Gemini con información de la boleta
         """
+        if self.model.circuit_open():
+            return self._template_response(conversation, boleta)
+        
+        prompt = self._build_contextual_prompt(user_message, boleta, conversation)
+        
+        try:
+            response = self.model.generate_content(prompt, call_site='boletas_contextual')
+            return response.text.strip()
+        except Exception as e:
+            return self._contextual_error_message(e)
+    
+    def _template_response(self, conversation: ChatConversation, boleta: Boleta) -> str:
+        """
+        Respuesta por plantilla (sin LLM) según el motivo de la conversación
+        """
+        boletas = Boleta.objects.filter(rut=boleta.rut).order_by('-fecha_emision')
+        return self._responder_segun_motivo(conversation, boleta, boletas)['message']
+    
+    def _build_contextual_prompt(
+        self,
+        user_message: str,
+        boleta: Boleta,
+        conversation: ChatConversation
+    ) -> str:
+        """
+        Construye el prompt de respuesta contextual con la boleta, historial y RAG
+        (acotado por presupuesto de tokens)
+        """
+        pipeline = TurnPipeline('boletas_contextual')
+        
+        # La recuperación RAG corre en el pool mientras se consulta el historial
+        pipeline.submit('rag', lambda: self._get_rag_snippets(user_message), default=[])
+        
+        # Historial
+        history = pipeline.run(
+            'history',
+            lambda: self._get_conversation_history(conversation, last_n=get_history_window())
+        )
+        
         # Información de la boleta para contexto
+        boleta_context = pipeline.run('boleta', lambda: self._format_boleta_context(boleta))
+        
+        # Obtener contexto del RAG
+        rag_snippets = pipeline.result('rag')
+        pipeline.finish()
+        
+        assembler = PromptAssembler('boletas_contextual')
+        assembler.add(
+            'rol', "Eres un asistente virtual especializado en consultas de boletas de agua potable.",
+            required=True
+        )
+        assembler.add_items(
+            'rag', rag_snippets, PRIORITY_RAG,
+            header="INFORMACIÓN RELEVANTE (fragmentos y fuentes):", separator="\n\n", truncate=True
+        )
+        assembler.add('boleta', boleta_context, PRIORITY_FACTS)
+        assembler.add_items(
+            'historial', self._format_history(history), PRIORITY_HISTORY,
+            header="HISTORIAL DE CONVERSACIÓN:", keep='last'
+        )
+        assembler.add('pregunta', user_message, header="PREGUNTA DEL USUARIO:", required=True)
+        assembler.add(
+            'instrucciones',
+            "Responde de manera clara, concisa y amigable. Si la pregunta está relacionada con la boleta, "
+            "usa la información proporcionada. Si no tienes información específica, indícalo amablemente.\n\n"
+            "Responde en máximo 3-4 líneas:",
+            required=True
+        )
+        
+        return assembler.build()
+    
+    def _format_boleta_context(self, boleta: Boleta) -> str:
+        """
+        Información de la boleta para el prompt
+        """
         consumo_m3 = f"{boleta.consumo} m³"
-        boleta_context = (
+        return (
             f"Información de la boleta del usuario:\n"
             f"- RUT: {boleta.rut}\n"
             f"- Nombre: {boleta.nombre}\n"
@@ -770,49 +1260,34 @@ Responde SOLO con JSON:"""
             f"- Monto: ${boleta.monto}\n"
             f"- Estado de pago: {boleta.get_estado_pago_display()}\n"
         )
-        # Historial
-        history = self._get_conversation_history(conversation, last_n=5)
-        history_text = "\n".join([
-            f"{msg['rol']}: {msg['contenido']}"
-            for msg in history
-        ])
-        
-        # Obtener contexto del RAG
-        rag_context = ""
-        if self.rag_retriever:
-            try:
-                rag_context = self.rag_retriever.get_relevant_context_text(
-                    query=user_message,
-                    max_length=1500
-                )
-            except Exception as e:
-                logger.warning(f"Error obteniendo contexto RAG: {e}")
-        
-        prompt = f"""Eres un asistente virtual especializado en consultas de boletas de agua potable.
-{rag_context}
-
-{boleta_context}
-
-HISTORIAL DE CONVERSACIÓN:
-{history_text}
-
-PREGUNTA DEL USUARIO:
-{user_message}
-
-Responde de manera clara, concisa y amigable. Si la pregunta está relacionada con la boleta, usa la información proporcionada. Si no tienes información específica, indícalo amablemente.
-
-Responde en máximo 3-4 líneas:"""
-        
+    
+    def _get_rag_snippets(self, query: str) -> List[str]:
+        """
+        Fragmentos RAG con su fuente ([] si no hay retriever o falla)
+        """
+        if not self.rag_retriever:
+            return []
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return list(self.rag_retriever.get_relevant_snippets(query=query))
         except Exception as e:
-            msg = str(e).lower()
-            if 'quota' in msg or '429' in msg or 'rate limit' in msg or 'quota exceeded' in msg:
-                logger.warning(f"Generación contextual falló por cuota/rate-limit: {e}")
-                return "Disculpa, el servicio de generación está temporalmente limitado. Intenta nuevamente en unos segundos o usa la sección anónima para información general."
-            logger.error(f"Error generando respuesta contextual: {e}")
-            return "Disculpa, tuve un problema procesando tu consulta. ¿Podrías reformular tu pregunta?"
+            logger.warning(f"Error obteniendo contexto RAG: {e}")
+            return []
+    
+    def _format_history(self, history: List[Dict[str, str]]) -> List[str]:
+        """
+        Mensajes del historial como líneas "rol: contenido"
+        """
+        return [f"{msg['rol']}: {msg['contenido']}" for msg in history]
+    
+    def _contextual_error_message(self, error: Exception) -> str:
+        """
+        Mensaje de respaldo cuando falla la generación contextual
+        """
+        if is_quota_error(error):
+            logger.warning(f"Generación contextual falló por cuota/rate-limit: {error}")
+            return "Disculpa, el servicio de generación está temporalmente limitado. Intenta nuevamente en unos segundos o usa la sección anónima para información general."
+        logger.error(f"Error generando respuesta contextual: {error}")
+        return "Disculpa, tuve un problema procesando tu consulta. ¿Podrías reformular tu pregunta?"
     
     def _generate_comparative_analysis(
         self,
@@ -823,46 +1298,69 @@ Responde en máximo 3-4 líneas:"""
         """
         Genera análisis comparativo usando Gemini
         """
-        # Preparar datos de boletas
-        boletas_data = []
-        for boleta in boletas:
-            boletas_data.append({
-                'periodo': boleta.periodo_facturacion,
-                'consumo': float(boleta.consumo),
-                'monto': float(boleta.monto),
-                'estado': boleta.estado_pago
-            })
+        if self.model.circuit_open():
+            return self._generar_comparacion(boletas)
         
-        boletas_json = json.dumps(boletas_data, indent=2, ensure_ascii=False)
-        
-        prompt = f"""Eres un asistente especializado en análisis de consumo de agua potable.
-
-BOLETAS DEL USUARIO (últimos 6 períodos):
-{boletas_json}
-
-PREGUNTA DEL USUARIO:
-{user_message}
-
-Genera un análisis comparativo de las boletas. Incluye:
-1. Tendencias de consumo (si aumenta, disminuye o se mantiene)
-2. Variaciones significativas entre períodos
-3. Recomendaciones si hay consumo excesivo
-4. Respuesta específica a la pregunta del usuario
-
-Formato de respuesta: Texto claro con emojis, máximo 8 líneas.
-
-Responde:"""
+        prompt = self._build_comparative_prompt(user_message, boletas)
         
         try:
-            response = self.model.generate_content(prompt)
+            response = self.model.generate_content(prompt, call_site='boletas_comparative')
             return response.text.strip()
         except Exception as e:
-            msg = str(e).lower()
-            if 'quota' in msg or '429' in msg or 'rate limit' in msg or 'quota exceeded' in msg:
-                logger.warning(f"Análisis comparativo falló por cuota/rate-limit: {e}")
-                return "Lo siento, el servicio de generación está limitado temporalmente; aquí tienes un resumen básico:" + self._generar_comparacion(boletas)
-            logger.error(f"Error generando análisis comparativo: {e}")
-            return self._generar_comparacion(boletas)
+            return self._comparative_error_message(e, boletas)
+    
+    def _build_comparative_prompt(
+        self,
+        user_message: str,
+        boletas: List[Boleta]
+    ) -> str:
+        """
+        Construye el prompt de análisis comparativo (acotado por presupuesto de tokens)
+        """
+        # Preparar datos de boletas (una por línea, más recientes primero)
+        boletas_data = [
+            json.dumps({
+                'periodo': boleta.periodo_facturacion,
+                'consumo': float(boleta.consumo),
+                'monto': float(boleta.monto),
+                'estado': boleta.estado_pago
+            }, ensure_ascii=False)
+            for boleta in boletas
+        ]
+        
+        assembler = PromptAssembler('boletas_comparative')
+        assembler.add(
+            'rol', "Eres un asistente especializado en análisis de consumo de agua potable.",
+            required=True
+        )
+        assembler.add_items(
+            'boletas', boletas_data, PRIORITY_FACTS,
+            header=f"BOLETAS DEL USUARIO (últimos {len(boletas)} períodos, más recientes primero):"
+        )
+        assembler.add('pregunta', user_message, header="PREGUNTA DEL USUARIO:", required=True)
+        assembler.add(
+            'instrucciones',
+            "Genera un análisis comparativo de las boletas. Incluye:\n"
+            "1. Tendencias de consumo (si aumenta, disminuye o se mantiene)\n"
+            "2. Variaciones significativas entre períodos\n"
+            "3. Recomendaciones si hay consumo excesivo\n"
+            "4. Respuesta específica a la pregunta del usuario\n\n"
+            "Formato de respuesta: Texto claro con emojis, máximo 8 líneas.\n\n"
+            "Responde:",
+            required=True
+        )
+        
+        return assembler.build()
+    
+    def _comparative_error_message(self, error: Exception, boletas: List[Boleta]) -> str:
+        """
+        Respuesta de respaldo cuando falla el análisis comparativo
+        """
+        if is_quota_error(error):
+            logger.warning(f"Análisis comparativo falló por cuota/rate-limit: {error}")
+            return "Lo siento, el servicio de generación está limitado temporalmente; aquí tienes un resumen básico:" + self._generar_comparacion(boletas)
+        logger.error(f"Error generando análisis comparativo: {error}")
+        return self._generar_comparacion(boletas)
     
     def _get_initial_message(self) -> str:
         """
@@ -0,0 +1,267 @@
+"""
+Intent Classifier - Clasificador local del motivo de consulta
+Clasifica los mensajes en los MOTIVOS_CONSULTA del chatbot de boletas con
+TF-IDF (palabras, bigramas y n-gramas de caracteres) y centroide más cercano.
+Se entrena con un archivo de frases etiquetadas y con el historial de
+ChatMessage, se guarda en disco y se carga una vez por proceso.
+"""
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from django.conf import settings
+import json
+import logging
+import math
+import re
+import unicodedata
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent / 'intent_data'
+DEFAULT_TRAINING_FILE = DATA_DIR / 'motivos_consulta.jsonl'
+DEFAULT_MODEL_PATH = DATA_DIR / 'intent_classifier.npz'
+
+_RUT_ONLY = re.compile(r'^\s*(rut:?\s*)?\d{1,2}\.?\d{3}\.?\d{3}[-\.]?[\dkK]\s*$', re.IGNORECASE)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Minúsculas, sin tildes y solo letras/dígitos separados por un espacio
+    """
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def extract_features(text: str) -> List[str]:
+    """
+    Palabras, bigramas de palabras y trigramas de caracteres por palabra
+    """
+    words = normalize_text(text).split()
+    features = [f"w:{word}" for word in words]
+    features += [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return features
+
+
+class IntentClassifier:
+    """
+    Clasificador TF-IDF + centroide más cercano
+    """
+
+    def __init__(self, temperature: float = 0.05, min_similarity: float = 0.15):
+        """
+        Args:
+            temperature: Temperatura del softmax sobre similitudes (menor = más seguro)
+            min_similarity: Similitud mínima con el mejor centroide para predecir
+        """
+        self.temperature = temperature
+        self.min_similarity = min_similarity
+        self.vocabulary: Dict[str, int] = {}
+        self.idf: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.labels: List[str] = []
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def fit(self, texts: List[str], labels: List[str]) -> 'IntentClassifier':
+        """
+        Entrena el clasificador
+
+        Args:
+            texts: Frases de entrenamiento
+            labels: Motivo de cada frase
+
+        Returns:
+            El propio clasificador
+        """
+        documents = [Counter(extract_features(text)) for text in texts]
+
+        document_frequency = Counter()
+        for counts in documents:
+            document_frequency.update(counts.keys())
+
+        self.vocabulary = {feature: i for i, feature in enumerate(sorted(document_frequency))}
+        n_documents = len(documents)
+        self.idf = np.array([
+            math.log((1 + n_documents) / (1 + document_frequency[feature])) + 1
+            for feature in sorted(document_frequency)
+        ], dtype=np.float32)
+
+        self.labels = sorted(set(labels))
+        self.centroids = np.zeros((len(self.labels), len(self.vocabulary)), dtype=np.float32)
+        for counts, label in zip(documents, labels):
+            self.centroids[self.labels.index(label)] += self._vectorize(counts)
+
+        norms = np.linalg.norm(self.centroids, axis=1, keepdims=True)
+        self.centroids /= np.where(norms == 0, 1, norms)
+
+        logger.info(
+            f"IntentClassifier entrenado: {n_documents} frases, "
+            f"{len(self.labels)} motivos, {len(self.vocabulary)} features"
+        )
+        return self
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """
+        Predice el motivo de un mensaje
+
+        Args:
+            text: Mensaje del usuario
+
+        Returns:
+            Tupla (motivo o None, probabilidad)
+        """
+        if not self.is_trained or _RUT_ONLY.match(text):
+            return None, 0.0
+
+        vector = self._vectorize(Counter(extract_features(text)))
+        if not vector.any():
+            return None, 0.0
+
+        similarities = self.centroids @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.min_similarity:
+            return None, 0.0
+
+        scaled = (similarities - similarities[best]) / self.temperature
+        probabilities = np.exp(scaled) / np.exp(scaled).sum()
+        return self.labels[best], float(probabilities[best])
+
+    def save(self, path: Path) -> None:
+        """
+        Guarda el modelo en un archivo .npz
+        """
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path,
+            vocabulary=np.array(vocabulary),
+            idf=self.idf,
+            centroids=self.centroids,
+            labels=np.array(self.labels),
+            params=np.array([self.temperature, self.min_similarity], dtype=np.float32)
+        )
+        logger.info(f"IntentClassifier guardado en {path}")
+
+    @classmethod
+    def load(cls, path: Path) -> 'IntentClassifier':
+        """
+        Carga un modelo guardado con save()
+        """
+        with np.load(path, allow_pickle=False) as data:
+            temperature, min_similarity = (float(v) for v in data['params'])
+            classifier = cls(temperature=temperature, min_similarity=min_similarity)
+            classifier.vocabulary = {feature: i for i, feature in enumerate(data['vocabulary'].tolist())}
+            classifier.idf = data['idf']
+            classifier.centroids = data['centroids']
+            classifier.labels = data['labels'].tolist()
+        return classifier
+
+    def _vectorize(self, counts: Counter) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for feature, count in counts.items():
+            index = self.vocabulary.get(feature)
+            if index is not None:
+                vector[index] = (1 + math.log(count)) * self.idf[index]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def load_training_file(path: Path = DEFAULT_TRAINING_FILE) -> List[Tuple[str, str]]:
+    """
+    Lee frases etiquetadas en formato JSONL ({"text": ..., "label": ...})
+    """
+    examples = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                examples.append((row['text'], row['label']))
+    return examples
+
+
+def load_history_examples(valid_labels: Iterable[str]) -> List[Tuple[str, str]]:
+    """
+    Obtiene frases etiquetadas del historial de conversaciones
+
+    Usa el primer mensaje del usuario con texto (no solo un RUT) de cada
+    conversación cuyo motivo_consulta quedó registrado.
+
+    Args:
+        valid_labels: Motivos aceptados
+
+    Returns:
+        Lista de (texto, motivo)
+    """
+    from ..models import ChatConversation
+
+    valid_labels = set(valid_labels)
+    examples = []
+    conversations = ChatConversation.objects.filter(
+        datos_recolectados__has_key='motivo_consulta'
+    ).prefetch_related('mensajes')
+
+    for conversation in conversations:
+        label = conversation.datos_recolectados.get('motivo_consulta')
+        if label not in valid_labels:
+            continue
+        for message in sorted(conversation.mensajes.all(), key=lambda m: m.timestamp):
+            if message.rol != 'usuario' or _RUT_ONLY.match(message.contenido):
+                continue
+            if re.search(r'[^\W\d_]', message.contenido):
+                examples.append((message.contenido, label))
+                break
+
+    return examples
+
+
+def _get_config() -> Dict[str, Any]:
+    return getattr(settings, 'RAG_CONFIG', {}).get('intent_classifier', {})
+
+
+# Singleton
+_intent_classifier_instance = None
+
+
+def get_intent_classifier() -> Optional[IntentClassifier]:
+    """
+    Obtiene la instancia singleton del clasificador de motivos
+
+    Carga el modelo guardado; si no existe, lo entrena con el archivo de
+    frases etiquetadas (unos milisegundos).
+
+    Returns:
+        IntentClassifier o None si está deshabilitado o no se pudo cargar
+    """
+    global _intent_classifier_instance
+    config = _get_config()
+    if not config.get('enabled', True):
+        return None
+
+    if _intent_classifier_instance is None:
+        model_path = Path(config.get('model_path') or DEFAULT_MODEL_PATH)
+        try:
+            if model_path.exists():
+                _intent_classifier_instance = IntentClassifier.load(model_path)
+                logger.info(f"IntentClassifier cargado desde {model_path}")
+            else:
+                texts, labels = zip(*load_training_file(
+                    Path(config.get('training_file') or DEFAULT_TRAINING_FILE)
+                ))
+                _intent_classifier_instance = IntentClassifier(
+                    temperature=config.get('temperature', 0.05),
+                    min_similarity=config.get('min_similarity', 0.15)
+                ).fit(list(texts), list(labels))
+        except Exception as e:
+            logger.warning(f"No se pudo inicializar el clasificador de motivos: {e}")
+            return None
+
+    return _intent_classifier_instance
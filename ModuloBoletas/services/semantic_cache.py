@@ -0,0 +1,196 @@
+"""
+Semantic Response Cache - Caché de respuestas por similitud semántica
+Reutiliza respuestas del chat público cuando llega una pregunta casi
+idéntica a una ya respondida (p.ej. "horario de atención" vs
+"¿cuál es el horario de atención?"), sin volver a llamar a Gemini.
+"""
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from django.conf import settings
+import threading
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticResponseCache:
+    """
+    Caché LRU de respuestas indexada por el embedding de la consulta
+
+    Cada entrada guarda la versión de la colección con la que se generó;
+    al re-ingestar la base de conocimientos la versión cambia y todas las
+    entradas anteriores quedan invalidadas.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: int = 3600,
+        max_entries: int = 256
+    ):
+        """
+        Inicializa la caché
+
+        Args:
+            similarity_threshold: Similitud coseno mínima para considerar un acierto
+            ttl_seconds: Tiempo de vida de cada respuesta
+            max_entries: Máximo de entradas antes de desalojar la menos usada
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_key = 0
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        logger.info(
+            f"SemanticResponseCache inicializada (umbral={similarity_threshold}, "
+            f"ttl={ttl_seconds}s, max={max_entries})"
+        )
+
+    def get(self, embedding: List[float], version: str) -> Optional[str]:
+        """
+        Busca una respuesta para una consulta semánticamente equivalente
+
+        Args:
+            embedding: Embedding de la consulta
+            version: Versión actual de la colección
+
+        Returns:
+            Respuesta cacheada o None
+        """
+        query = self._normalize(embedding)
+
+        with self._lock:
+            self._check_version(version)
+            self._purge_expired()
+
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            keys = list(self._entries.keys())
+            matrix = np.stack([self._entries[k]['embedding'] for k in keys])
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            key = keys[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            logger.info(f"Acierto en caché semántica (similitud={similarities[best]:.3f})")
+            return self._entries[key]['answer']
+
+    def set(self, embedding: List[float], answer: str, version: str) -> None:
+        """
+        Guarda una respuesta asociada al embedding de la consulta
+
+        Args:
+            embedding: Embedding de la consulta
+            answer: Respuesta generada
+            version: Versión de la colección usada para generarla
+        """
+        vector = self._normalize(embedding)
+
+        with self._lock:
+            self._check_version(version)
+            self._entries[self._next_key] = {
+                'embedding': vector,
+                'answer': answer,
+                'created_at': time.monotonic()
+            }
+            self._next_key += 1
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Elimina todas las entradas
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene estadísticas de uso de la caché
+
+        Returns:
+            Dict con estadísticas
+        """
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'similarity_threshold': self.similarity_threshold,
+            'ttl_seconds': self.ttl_seconds
+        }
+
+    def _check_version(self, version: str) -> None:
+        """
+        Vacía la caché si la colección cambió desde la última operación
+        """
+        if version != self._version:
+            if self._entries:
+                logger.info("Base de conocimientos re-ingestada: invalidando caché semántica")
+            self._entries.clear()
+            self._version = version
+
+    def _purge_expired(self) -> None:
+        """
+        Elimina las entradas cuyo TTL expiró
+        """
+        now = time.monotonic()
+        expired = [
+            key for key, entry in self._entries.items()
+            if now - entry['created_at'] > self.ttl_seconds
+        ]
+        for key in expired:
+            del self._entries[key]
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """
+        Normaliza el embedding para comparar por producto punto
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+# Singleton
+_semantic_cache_instance = None
+
+
+def get_semantic_cache() -> Optional[SemanticResponseCache]:
+    """
+    Obtiene la instancia singleton de la caché semántica del chat público
+
+    Returns:
+        SemanticResponseCache o None si está deshabilitada en RAG_CONFIG
+    """
+    global _semantic_cache_instance
+    config = getattr(settings, 'RAG_CONFIG', {}).get('public_answer_cache', {})
+    if not config.get('enabled', True):
+        return None
+    if _semantic_cache_instance is None:
+        _semantic_cache_instance = SemanticResponseCache(
+            similarity_threshold=config.get('similarity_threshold', 0.92),
+            ttl_seconds=config.get('ttl_seconds', 3600),
+            max_entries=config.get('max_entries', 256)
+        )
+    return _semantic_cache_instance
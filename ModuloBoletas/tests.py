@@ -2,6 +2,8 @@
 Tests unitarios para el Módulo de Boletas
 """
 import json
+import os
+import tempfile
 from unittest.mock import Mock, patch, MagicMock
 from django.test import TestCase, Client
 from django.urls import reverse
@@ -12,7 +14,15 @@ from decimal import Decimal
 from datetime import date, timedelta
 
 from ModuloBoletas.models import Boleta, ChatConversation, ChatMessage
+from ModuloBoletas.services.answer_engine import BoletaAnswerEngine
 from ModuloBoletas.services.chatbot_service import ChatbotService
+from ModuloBoletas.services.intent_classifier import (
+    IntentClassifier,
+    load_history_examples,
+    load_training_file,
+)
+from ModuloCompartido.services.llm_providers import LLMResponse
+from ModuloCompartido.services.prompt_budget import count_tokens, get_budget
 
 
 class BoletaModelTests(TestCase):
@@ -327,6 +337,140 @@ class ChatbotServiceTests(TestCase):
         self.assertIn('boleta', message.lower())
         self.assertIn('consultar', message.lower())
 
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_extraccion_local_evita_llm_en_mensajes_triviales(self, mock_rag, mock_genai):
+        """Test: RUT solo o motivo claro se extraen sin llamar a Gemini"""
+        mock_rag_instance = Mock()
+        mock_rag.return_value = mock_rag_instance
+        mock_model = Mock()
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        service = ChatbotService()
+        conversation = ChatConversation.objects.create(session_id=self.session_id)
+
+        datos = service._extract_data_with_llm('12345678-9', {'motivo_consulta': 'ver_boleta'}, conversation)
+        self.assertEqual(datos, {'rut': '12345678-9'})
+
+        datos = service._extract_data_with_llm('quiero ver mi boleta', {}, conversation)
+        self.assertEqual(datos['motivo_consulta'], 'ver_boleta')
+
+        mock_model.generate_content.assert_not_called()
+        mock_rag_instance.get_relevant_context_text.assert_not_called()
+
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_extraccion_ambigua_consulta_llm(self, mock_rag, mock_genai):
+        """Test: Con baja confianza local se llama a Gemini"""
+        mock_rag.return_value = Mock(get_relevant_context_text=Mock(return_value=''))
+        mock_model = Mock()
+        mock_model.generate_content.return_value = Mock(text='{"motivo_consulta": "estado_pago"}')
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        service = ChatbotService()
+        _, confidence = service._extract_data_locally('el estado de la boleta', {})
+        self.assertLess(confidence, 0.8)
+
+        conversation = ChatConversation.objects.create(session_id=self.session_id)
+        datos = service._extract_data_with_llm('el estado de la boleta', {}, conversation)
+
+        self.assertEqual(datos['motivo_consulta'], 'estado_pago')
+        mock_model.generate_content.assert_called_once()
+
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_circuito_abierto_usa_extractores_locales(self, mock_rag, mock_genai):
+        """Test: Con el circuito abierto no se llama a Gemini ni al RAG"""
+        mock_rag_instance = Mock()
+        mock_rag.return_value = mock_rag_instance
+        mock_model = Mock()
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        service = ChatbotService()
+        service.model.breaker.open_seconds = 60
+        for _ in range(service.model.breaker.minimum_calls):
+            service.model.breaker.record_failure()
+
+        conversation = ChatConversation.objects.create(session_id=self.session_id)
+        datos = service._extract_data_with_llm(
+            'Quiero saber cuánto debo pagar, mi RUT es 12345678-9', {}, conversation
+        )
+
+        self.assertEqual(datos.get('rut'), '12345678-9')
+        self.assertIn('motivo_consulta', datos)
+        mock_model.generate_content.assert_not_called()
+        mock_rag_instance.get_relevant_context_text.assert_not_called()
+
+        comparacion = service._generate_comparative_analysis('compara', [self.boleta, self.boleta], conversation)
+        self.assertIn('Comparación', comparacion)
+        mock_model.generate_content.assert_not_called()
+
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_prompt_contextual_respeta_presupuesto(self, mock_rag, mock_genai):
+        """Test: Con mucho contexto RAG el prompt queda dentro del presupuesto y conserva la boleta"""
+        fragmentos = [f"[{i}] Fuente: doc{i}.md\n" + 'información de pagos y cortes ' * 60 for i in range(1, 6)]
+        mock_rag.return_value = Mock(get_relevant_snippets=Mock(return_value=fragmentos))
+        mock_genai.GenerativeModel.return_value = Mock()
+
+        service = ChatbotService()
+        conversation = ChatConversation.objects.create(session_id=self.session_id)
+        prompt = service._build_contextual_prompt('¿Qué pasa si no pago?', self.boleta, conversation)
+
+        self.assertLessEqual(count_tokens(prompt), get_budget('boletas_contextual'))
+        self.assertIn('Monto: $18000.00', prompt)
+        self.assertIn('¿Qué pasa si no pago?', prompt)
+        self.assertIn('[1] Fuente: doc1.md', prompt)
+        self.assertNotIn('[5] Fuente', prompt)
+
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_recoleccion_consulta_boletas_una_vez(self, mock_rag, mock_genai):
+        """Test: La búsqueda de boletas se hace en paralelo a la extracción y se reutiliza"""
+        mock_rag.return_value = Mock(get_relevant_context_text=Mock(return_value=''))
+        mock_model = Mock()
+        mock_model.generate_content.return_value = Mock(
+            text='{"motivo_consulta": "consultar_monto", "rut": "12345678-9"}'
+        )
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        service = ChatbotService()
+        conversation = ChatConversation.objects.create(
+            session_id=self.session_id,
+            estado='recolectando_datos'
+        )
+
+        with patch.object(service, '_fetch_boletas', wraps=service._fetch_boletas) as fetch:
+            response = service._handle_data_collection(conversation, 'mi rut es 12345678-9, una consulta')
+
+        fetch.assert_called_once_with('12345678-9')
+        self.assertEqual(conversation.datos_recolectados['rut'], '12345678-9')
+        self.assertIn('18', response['message'])
+
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_recoleccion_rut_solo_no_consulta_historial(self, mock_rag, mock_genai):
+        """Test: Un turno resuelto por la extracción local no lee el historial ni llama a Gemini"""
+        mock_rag.return_value = Mock()
+        mock_model = Mock()
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        service = ChatbotService()
+        conversation = ChatConversation.objects.create(
+            session_id=self.session_id,
+            estado='recolectando_datos',
+            datos_recolectados={'motivo_consulta': 'consultar_monto'}
+        )
+
+        with patch.object(service, '_get_conversation_history') as history, \
+                patch.object(service, '_fetch_boletas', wraps=service._fetch_boletas) as fetch:
+            service._handle_data_collection(conversation, '12345678-9')
+
+        history.assert_not_called()
+        mock_model.generate_content.assert_not_called()
+        fetch.assert_called_once_with('12345678-9')
+        self.assertEqual(conversation.datos_recolectados['rut'], '12345678-9')
+
 
 class ChatAPITests(APITestCase):
     """Tests para los endpoints de la API de chat"""
@@ -578,6 +722,81 @@ class BoletaViewSetTests(APITestCase):
         self.assertGreater(len(response.data), 0)
 
 
+class BoletaAnswerEngineTests(TestCase):
+    """Tests para las respuestas deterministas sobre la boleta"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.engine = BoletaAnswerEngine()
+        self.boleta = Boleta.objects.create(
+            rut='12345678-9',
+            nombre='Juan Pérez',
+            direccion='Calle Test 123',
+            periodo_facturacion='2024-12',
+            fecha_emision=date(2024, 12, 1),
+            fecha_vencimiento=date.today() + timedelta(days=10),
+            consumo=Decimal('15.0'),
+            monto=Decimal('18000.00'),
+            estado_pago='pendiente'
+        )
+
+    def test_clasifica_preguntas_frecuentes(self):
+        """Test: Las preguntas frecuentes se mapean a su tipo"""
+        self.assertEqual(self.engine.match('¿Cuándo vence?'), ['vencimiento'])
+        self.assertEqual(self.engine.match('¿cuánto debo?'), ['monto'])
+        self.assertEqual(self.engine.match('¿Está pagada?'), ['estado_pago'])
+        self.assertEqual(self.engine.match('¿Cuánto consumí?'), ['consumo'])
+        self.assertEqual(self.engine.match('¿cuánto debo y cuándo vence?'), ['vencimiento', 'monto'])
+        self.assertEqual(self.engine.match('¿Cuál es el total a pagar?'), ['monto'])
+        self.assertEqual(self.engine.match('¿Mi boleta está pagada?'), ['estado_pago'])
+        self.assertEqual(self.engine.match('¿Cuántos m3 consumí?'), ['consumo'])
+
+    def test_preguntas_abiertas_van_al_llm(self):
+        """Test: Explicaciones y consejos no se responden por reglas"""
+        self.assertEqual(self.engine.match('¿Por qué mi consumo está tan alto?'), [])
+        self.assertEqual(self.engine.match('¿Cómo puedo reducir mi consumo?'), [])
+        # Tarifa y medidor: ningún campo de la boleta las responde
+        self.assertEqual(self.engine.match('¿cuánto cuesta el metro cúbico?'), [])
+        self.assertEqual(self.engine.match('¿cuánto es el cargo fijo?'), [])
+        self.assertEqual(self.engine.match('¿qué es la deuda anterior?'), [])
+        self.assertEqual(self.engine.match('¿cuál es el valor del m3?'), [])
+        self.assertEqual(self.engine.match('¿en qué estado está mi medidor?'), [])
+        self.assertIsNone(self.engine.answer('Hola, gracias', self.boleta))
+
+    def test_respuestas_usan_campos_de_la_boleta(self):
+        """Test: Las plantillas muestran fecha, monto, estado y consumo"""
+        vence = self.engine.answer('¿Cuándo vence?', self.boleta)
+        self.assertIn(self.boleta.fecha_vencimiento.strftime('%d/%m/%Y'), vence)
+        self.assertIn('en 10 días', vence)
+        self.assertIn('$18,000', self.engine.answer('¿Cuánto debo?', self.boleta))
+        self.assertIn('pendiente de pago', self.engine.answer('¿Está pagada?', self.boleta))
+        self.assertIn('0.50 m³/día', self.engine.answer('¿Cuánto consumí?', self.boleta))
+
+        self.boleta.estado_pago = 'pagada'
+        self.assertIn('no tienes monto pendiente', self.engine.answer('¿Cuánto debo?', self.boleta))
+        self.assertEqual(self.engine.get_stats()['answered'], 5)
+
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_consulta_frecuente_no_llama_a_gemini(self, mock_rag, mock_genai):
+        """Test: En estado consultando las preguntas frecuentes no usan el LLM"""
+        mock_rag.return_value = Mock()
+        mock_model = Mock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        conversation = ChatConversation.objects.create(
+            session_id=str(uuid.uuid4()),
+            estado='consultando',
+            boleta_principal=self.boleta,
+            datos_recolectados={'rut': '12345678-9'}
+        )
+
+        service = ChatbotService()
+        events = list(service.process_message_stream(conversation.session_id, '¿Cuándo vence?'))
+
+        self.assertIn('vence el', events[-1]['data']['message'])
+        mock_model.generate_content.assert_not_called()
+
+
 class IntegrationTests(APITestCase):
     """Tests de integración end-to-end"""
 
@@ -642,3 +861,362 @@ class IntegrationTests(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('collection_name', response.data)
+
+
+class ChatStreamTests(APITestCase):
+    """Tests para los endpoints de chat en streaming (SSE)"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        self.session_id = str(uuid.uuid4())
+        self.boleta = Boleta.objects.create(
+            rut='12345678-9',
+            nombre='Juan Pérez',
+            direccion='Calle Test 123',
+            periodo_facturacion='2024-12',
+            fecha_emision=date(2024, 12, 1),
+            fecha_vencimiento=date.today() + timedelta(days=10),
+            consumo=Decimal('15.0'),
+            lectura_anterior=Decimal('100.0'),
+            lectura_actual=Decimal('115.0'),
+            monto=Decimal('18000.00'),
+            estado_pago='pendiente'
+        )
+        ChatConversation.objects.create(
+            session_id=self.session_id,
+            estado='consultando',
+            boleta_principal=self.boleta,
+            datos_recolectados={'rut': '12345678-9', 'motivo_consulta': 'consultar_monto'}
+        )
+
+    def _parse_events(self, response):
+        """Convierte el cuerpo SSE en una lista de (evento, datos)"""
+        body = b''.join(response.streaming_content).decode('utf-8')
+        events = []
+        for block in body.strip().split('\n\n'):
+            lines = dict(line.split(': ', 1) for line in block.split('\n'))
+            events.append((lines['event'], json.loads(lines['data'])))
+        return events
+
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_stream_consulta_emite_tokens_y_guarda_mensaje(self, mock_rag, mock_genai):
+        """Test: El stream emite tokens y guarda la respuesta completa al final"""
+        mock_rag_instance = Mock()
+        mock_rag_instance.get_relevant_context_text.return_value = "Contexto"
+        mock_rag.return_value = mock_rag_instance
+
+        chunks = [Mock(text='Tu boleta '), Mock(text='vence pronto.')]
+        mock_model = Mock()
+        mock_model.generate_content.return_value = iter(chunks)
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        from ModuloBoletas.services.chatbot_service import ChatbotService as _Service
+        service = _Service()
+        with patch('ModuloBoletas.views.get_chatbot_service', return_value=service), \
+                patch.object(service, 'stream_generation', wraps=service.stream_generation) as spy:
+            response = self.client.post(
+                reverse('chat-message-stream'),
+                {'session_id': self.session_id, 'message': '¿Cómo puedo pagar mi boleta?'},
+                format='json'
+            )
+            events = self._parse_events(response)
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(spy.call_args.kwargs['call_site'], 'boletas_contextual')
+        tokens = [data['text'] for name, data in events if name == 'token']
+        self.assertEqual(tokens[:2], ['Tu boleta ', 'vence pronto.'])
+        self.assertEqual(events[-1][0], 'done')
+        self.assertEqual(events[-1][1]['session_id'], self.session_id)
+        self.assertTrue(events[-1][1]['message'].startswith('Tu boleta vence pronto.'))
+
+        _, kwargs = mock_model.generate_content.call_args
+        self.assertTrue(kwargs.get('stream'))
+
+        ultimo = ChatMessage.objects.filter(rol='asistente').latest('timestamp')
+        self.assertEqual(ultimo.contenido, events[-1][1]['message'])
+
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_stream_error_de_cuota_usa_mensaje_de_respaldo(self, mock_rag, mock_genai):
+        """Test: Un error de cuota antes del primer token emite el mensaje de respaldo"""
+        mock_rag.return_value = None
+        mock_model = Mock()
+        mock_model.generate_content.side_effect = Exception('429 quota exceeded')
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        from ModuloBoletas.services.chatbot_service import ChatbotService as _Service
+        service = _Service()
+        events = list(service.process_message_stream(self.session_id, '¿Por qué subió mi boleta?'))
+
+        self.assertEqual(events[-1]['event'], 'done')
+        self.assertIn('temporalmente limitado', events[-1]['data']['message'])
+
+    def test_stream_sesion_inexistente(self):
+        """Test: Sesión inexistente emite un evento de error"""
+        with patch('ModuloBoletas.services.chatbot_service.genai'):
+            with patch('ModuloBoletas.services.chatbot_service.get_rag_retriever'):
+                from ModuloBoletas.services.chatbot_service import ChatbotService as _Service
+                events = list(_Service().process_message_stream('no-existe', 'Hola'))
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['event'], 'error')
+
+
+class PublicChatContinuationTests(APITestCase):
+    """Tests para la continuación de respuestas públicas cortadas por MAX_TOKENS"""
+
+    def _service(self, *responses):
+        service = Mock()
+        service.model.generate_content.side_effect = list(responses)
+        return service
+
+    def test_respuesta_cortada_se_continua_una_vez(self):
+        """Test: finish_reason MAX_TOKENS pide una continuación y une el texto"""
+        from ModuloBoletas import views
+        service = self._service(
+            LLMResponse('Puedes pagar en la oficina o en', 'MAX_TOKENS'),
+            LLMResponse('línea con tu número de cliente.', 'STOP')
+        )
+        antes = views.get_public_chat_stats()
+
+        texto = views._generate_public_answer(service, 'prompt')
+
+        self.assertEqual(texto, 'Puedes pagar en la oficina o en línea con tu número de cliente.')
+        self.assertEqual(service.model.generate_content.call_count, 2)
+        args, kwargs = service.model.generate_content.call_args
+        self.assertEqual(args[0][1], {'role': 'model', 'parts': ['Puedes pagar en la oficina o en']})
+        self.assertEqual(kwargs['call_site'], 'public_chat_continuation')
+        self.assertEqual(kwargs['generation_config']['max_output_tokens'], 200)
+
+        despues = views.get_public_chat_stats()
+        self.assertEqual(despues['truncated'], antes['truncated'] + 1)
+        self.assertEqual(despues['continuations'], antes['continuations'] + 1)
+
+    def test_respuesta_sin_punto_final_no_se_regenera(self):
+        """Test: Una respuesta completa (STOP) sin punto final no dispara otra llamada"""
+        from ModuloBoletas import views
+        service = self._service(LLMResponse('Fuentes: [1] https://cooperativa.cl', 'STOP'))
+        antes = views.get_public_chat_stats()
+
+        texto = views._generate_public_answer(service, 'prompt')
+
+        self.assertEqual(texto, 'Fuentes: [1] https://cooperativa.cl')
+        self.assertEqual(service.model.generate_content.call_count, 1)
+        despues = views.get_public_chat_stats()
+        self.assertEqual(despues['responses'], antes['responses'] + 1)
+        self.assertEqual(despues['truncated'], antes['truncated'])
+
+    def test_union_de_continuacion(self):
+        """Test: Solo se agrega un espacio cuando el corte queda entre palabras"""
+        from ModuloBoletas.views import _join_continuation
+        self.assertEqual(_join_continuation('Paga en', 'línea.'), 'Paga en línea.')
+        self.assertEqual(_join_continuation('Paga en ', ' línea.'), 'Paga en línea.')
+        self.assertEqual(_join_continuation('Paga en línea', '.'), 'Paga en línea.')
+
+    @patch('ModuloBoletas.views._public_cache_lookup', return_value=(None, None, None))
+    @patch('ModuloBoletas.views._build_public_prompt', return_value='prompt')
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_stream_continua_respuesta_cortada(self, mock_rag, mock_genai, mock_prompt, mock_lookup):
+        """Test: El stream público continúa si el último fragmento informa MAX_TOKENS"""
+        mock_model = Mock()
+        mock_model.generate_content.side_effect = [
+            iter([LLMResponse('Puedes pagar ', 'FINISH_REASON_UNSPECIFIED'), LLMResponse('en', 'MAX_TOKENS')]),
+            iter([LLMResponse('línea.', 'STOP')]),
+        ]
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        with patch('ModuloBoletas.views.get_chatbot_service', return_value=ChatbotService()):
+            response = self.client.post(
+                '/api/public/chat/message/stream/', {'message': '¿Cómo pago?'}, format='json'
+            )
+        body = b''.join(response.streaming_content).decode('utf-8')
+
+        self.assertEqual(mock_model.generate_content.call_count, 2)
+        self.assertIn('"message": "Puedes pagar en línea."', body)
+
+    @patch('ModuloBoletas.views._public_cache_lookup', return_value=(None, None, None))
+    @patch('ModuloBoletas.views._build_public_prompt', return_value='prompt')
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_stream_continuacion_fallida_no_se_reintenta(self, mock_rag, mock_genai, mock_prompt, mock_lookup):
+        """Test: Si la continuación falla se corta el bucle sin emitir tokens vacíos"""
+        mock_model = Mock()
+        mock_model.generate_content.side_effect = [
+            iter([LLMResponse('Puedes pagar en', 'MAX_TOKENS')]),
+            Exception('503 servicio no disponible'),
+            iter([LLMResponse('línea.', 'STOP')]),
+        ]
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        with patch('ModuloBoletas.views.get_chatbot_service', return_value=ChatbotService()):
+            response = self.client.post(
+                '/api/public/chat/message/stream/', {'message': '¿Cómo pago?'}, format='json'
+            )
+        body = b''.join(response.streaming_content).decode('utf-8')
+
+        self.assertEqual(mock_model.generate_content.call_count, 2)
+        self.assertNotIn('data: {"text": ""}', body)
+        self.assertIn('"message": "Puedes pagar en"', body)
+
+    @patch('ModuloBoletas.views._public_cache_lookup', return_value=(None, None, None))
+    @patch('ModuloBoletas.views._build_public_prompt', return_value='prompt')
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_stream_acepta_cabecera_event_stream(self, mock_rag, mock_genai, mock_prompt, mock_lookup):
+        """Test: Un cliente SSE (Accept: text/event-stream) recibe el stream, no un 406"""
+        mock_model = Mock()
+        mock_model.generate_content.return_value = iter([LLMResponse('Puedes pagar en línea.', 'STOP')])
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        with patch('ModuloBoletas.views.get_chatbot_service', return_value=ChatbotService()):
+            response = self.client.post(
+                '/api/public/chat/message/stream/', {'message': '¿Cómo pago?'},
+                format='json', HTTP_ACCEPT='text/event-stream'
+            )
+        body = b''.join(response.streaming_content).decode('utf-8')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: done\ndata: {"message": "Puedes pagar en línea."}', body)
+        error = self.client.post('/api/public/chat/message/stream/', {}, format='json', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(error.status_code, 400)
+
+    @patch('ModuloBoletas.views._public_cache_lookup', return_value=(None, None, None))
+    @patch('ModuloBoletas.views._build_public_prompt', return_value='prompt')
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_cassette_reproduce_continuacion(self, mock_rag, mock_genai, mock_prompt, mock_lookup):
+        """Test: Un stream grabado con MAX_TOKENS se continúa también al reproducir la cassette"""
+        from ModuloCompartido.services.llm_providers import CassetteModel
+        path = os.path.join(tempfile.mkdtemp(), 'llm.json')
+        mock_model = Mock()
+        mock_model.generate_content.side_effect = [
+            iter([LLMResponse('Puedes pagar ', 'FINISH_REASON_UNSPECIFIED'), LLMResponse('en', 'MAX_TOKENS')]),
+            iter([LLMResponse('línea.', 'STOP')]),
+        ]
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        for mode in ('record', 'replay'):
+            cassette = lambda name, factory: CassetteModel(path, name, mode=mode, inner_factory=factory)
+            with patch('ModuloBoletas.services.chatbot_service.build_llm_model', side_effect=cassette), \
+                    patch('ModuloBoletas.views.get_chatbot_service', return_value=ChatbotService()):
+                response = self.client.post(
+                    '/api/public/chat/message/stream/', {'message': '¿Cómo pago?'}, format='json'
+                )
+            body = b''.join(response.streaming_content).decode('utf-8')
+            self.assertIn('"message": "Puedes pagar en línea."', body, mode)
+
+        self.assertEqual(mock_model.generate_content.call_count, 2)
+
+
+class SemanticResponseCacheTests(TestCase):
+    """Tests para la caché semántica del chat público"""
+
+    def setUp(self):
+        from ModuloBoletas.services.semantic_cache import SemanticResponseCache
+        self.cache = SemanticResponseCache(similarity_threshold=0.9, ttl_seconds=60, max_entries=2)
+
+    def test_acierto_por_consulta_similar(self):
+        """Test: Una consulta con embedding casi idéntico reutiliza la respuesta"""
+        self.cache.set([1.0, 0.0, 0.0], 'Atendemos de 08:00 a 17:00.', 'v1')
+
+        self.assertEqual(self.cache.get([0.99, 0.05, 0.0], 'v1'), 'Atendemos de 08:00 a 17:00.')
+        self.assertIsNone(self.cache.get([0.0, 1.0, 0.0], 'v1'))
+        self.assertEqual(self.cache.get_stats()['hits'], 1)
+        self.assertEqual(self.cache.get_stats()['misses'], 1)
+
+    def test_invalidacion_por_nueva_version(self):
+        """Test: Re-ingestar la colección invalida las respuestas previas"""
+        self.cache.set([1.0, 0.0], 'respuesta', 'v1')
+
+        self.assertIsNone(self.cache.get([1.0, 0.0], 'v2'))
+        self.assertEqual(self.cache.get_stats()['entries'], 0)
+
+    def test_expiracion_por_ttl(self):
+        """Test: Las entradas expiradas no se devuelven"""
+        self.cache.set([1.0, 0.0], 'respuesta', 'v1')
+
+        with patch('ModuloBoletas.services.semantic_cache.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(self.cache.get([1.0, 0.0], 'v1'))
+
+    def test_desalojo_lru(self):
+        """Test: Al superar el máximo se desaloja la entrada menos usada"""
+        self.cache.set([1.0, 0.0, 0.0], 'a', 'v1')
+        self.cache.set([0.0, 1.0, 0.0], 'b', 'v1')
+        self.cache.get([1.0, 0.0, 0.0], 'v1')  # 'a' pasa a ser la más reciente
+        self.cache.set([0.0, 0.0, 1.0], 'c', 'v1')
+
+        self.assertEqual(self.cache.get([1.0, 0.0, 0.0], 'v1'), 'a')
+        self.assertIsNone(self.cache.get([0.0, 1.0, 0.0], 'v1'))
+
+
+class IntentClassifierTests(TestCase):
+    """Tests para el clasificador local de motivos de consulta"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        texts, labels = zip(*load_training_file())
+        cls.classifier = IntentClassifier().fit(list(texts), list(labels))
+
+    def test_predice_motivos_validos(self):
+        """Test: Las etiquetas son motivos de consulta del chatbot"""
+        self.assertTrue(set(self.classifier.labels) <= set(ChatbotService.MOTIVOS_CONSULTA))
+
+        label, probability = self.classifier.predict('¿cuántos metros cúbicos consumí?')
+        self.assertEqual(label, 'consultar_consumo')
+        self.assertGreater(probability, 0.5)
+
+    def test_rut_o_texto_sin_features_no_predice(self):
+        """Test: Un RUT solo o texto desconocido no tiene motivo"""
+        self.assertEqual(self.classifier.predict('12.345.678-9'), (None, 0.0))
+        self.assertEqual(self.classifier.predict('xq zzv'), (None, 0.0))
+
+    def test_guardar_y_cargar(self):
+        """Test: El modelo guardado predice igual al cargarlo"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'modelo.npz')
+            self.classifier.save(path)
+            loaded = IntentClassifier.load(path)
+
+        for text in ['quiero comparar mis boletas', 'ya pagué', 'dónde puedo pagar']:
+            self.assertEqual(loaded.predict(text)[0], self.classifier.predict(text)[0])
+
+    def test_historial_como_datos_de_entrenamiento(self):
+        """Test: Usa el primer mensaje con texto de conversaciones con motivo"""
+        conversation = ChatConversation.objects.create(
+            session_id=str(uuid.uuid4()),
+            datos_recolectados={'motivo_consulta': 'estado_pago', 'rut': '12345678-9'}
+        )
+        ChatMessage.objects.create(conversation=conversation, rol='asistente', contenido='Hola')
+        ChatMessage.objects.create(conversation=conversation, rol='usuario', contenido='12345678-9')
+        ChatMessage.objects.create(conversation=conversation, rol='usuario', contenido='¿ya quedó pagada?')
+        ChatConversation.objects.create(session_id=str(uuid.uuid4()), datos_recolectados={})
+
+        examples = load_history_examples(ChatbotService.MOTIVOS_CONSULTA)
+
+        self.assertEqual(examples, [('¿ya quedó pagada?', 'estado_pago')])
+
+    @patch('ModuloBoletas.services.chatbot_service.genai')
+    @patch('ModuloBoletas.services.chatbot_service.get_rag_retriever')
+    def test_clasificador_sin_respaldo_no_evita_gemini(self, mock_rag, mock_genai):
+        """Test: La probabilidad del clasificador solo supera el umbral si coincide con las palabras clave"""
+        service = ChatbotService()
+        predictions = {
+            'me llegó muy cara la boleta': ('ver_boleta', 0.91),
+            'tengo una fuga en la casa': ('otro', 0.93),
+            'quiero ver mi boleta': ('ver_boleta', 0.99),
+        }
+        classifier = Mock(predict=Mock(side_effect=lambda text: predictions[text]))
+
+        with patch('ModuloBoletas.services.chatbot_service.get_intent_classifier', return_value=classifier):
+            cara = service._extract_data_locally('me llegó muy cara la boleta', {})
+            fuga = service._extract_data_locally('tengo una fuga en la casa', {})
+            ver = service._extract_data_locally('quiero ver mi boleta', {})
+
+        self.assertLess(cara[1], 0.8)
+        self.assertEqual(fuga, ({'motivo_consulta': 'otro'}, 0.75))
+        self.assertEqual(ver, ({'motivo_consulta': 'ver_boleta'}, 0.99))
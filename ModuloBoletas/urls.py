@@ -22,6 +22,7 @@ urlpatterns = [
     # Endpoints de chat
     path('chat/init/', views.init_chat, name='chat-init'),
     path('chat/message/', views.chat_message, name='chat-message'),
+    path('chat/message/stream/', views.chat_message_stream, name='chat-message-stream'),
     path('chat/status/<str:session_id>/', views.chat_status, name='chat-status'),
     
     # Endpoint de estadísticas RAG
@@ -2,14 +2,20 @@
 Views para el módulo de boletas
 """
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, action
+from rest_framework.decorators import api_view, action, renderer_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.db.models import Count, Avg, Sum, Q
+from django.http import StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from datetime import datetime, timedelta
 import uuid
+import json
 import logging
+import threading
 
 from .models import Boleta, ChatConversation, ChatMessage
 from .serializers import (
@@ -25,11 +31,39 @@ from .serializers import (
     BoletaConsultaSerializer
 )
 from .services.chatbot_service import get_chatbot_service
+from .services.answer_engine import get_answer_engine
+from .services.semantic_cache import get_semantic_cache
+from ModuloCompartido.services.chroma_registry import get_chroma_registry_stats
+from ModuloCompartido.services.circuit_breaker import CircuitOpenError, get_circuit_breaker_status
+from ModuloCompartido.services.turn_pipeline import get_turn_pipeline_stats
+from ModuloCompartido.services.llm_cache import get_llm_cache_stats
+from ModuloCompartido.services.llm_providers import get_finish_reason
+from ModuloCompartido.services.prompt_budget import PRIORITY_RAG, PromptAssembler, get_prompt_budget_stats
+from ModuloCompartido.services.quota import get_quota_stats, is_quota_error
+from ModuloCompartido.services.single_flight import get_single_flight
 import unicodedata
 
 logger = logging.getLogger(__name__)
 
 
+class EventStreamRenderer(BaseRenderer):
+    """
+    Acepta 'Accept: text/event-stream' en los endpoints de streaming
+    
+    El stream lo arma _sse_response (StreamingHttpResponse); este renderer solo
+    evita el 406 de la negociación de contenido y serializa como JSON las
+    respuestas de error que se devuelven antes de empezar el stream.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False, cls=DjangoJSONEncoder).encode(self.charset)
+
+
 class BoletaPagination(PageNumberPagination):
     """
     Paginación personalizada para boletas
@@ -526,45 +560,11 @@ def chat_message(request):
     
     user_message = serializer.validated_data['message']
 
-    # Support passing boletas_ids from frontend to provide immediate context
-    boletas_ids = request.data.get('boletas_ids', [])
-
     try:
         # Ensure we have a chatbot service instance
         chatbot_service = get_chatbot_service()
 
-        # session_id may be optional from frontend; create one if missing
-        session_id = serializer.validated_data.get('session_id')
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            # start a conversation so it's available for processing
-            try:
-                conversation, initial_message = chatbot_service.start_conversation(session_id)
-            except Exception as e:
-                logger.warning(f"No se pudo iniciar conversación automáticamente: {e}")
-        
-
-        # If boletas_ids provided, attach boletas to the conversation for context
-        if boletas_ids:
-            try:
-                conversation = ChatConversation.objects.get(session_id=session_id)
-                from .models import Boleta as _Boleta
-                boletas_qs = _Boleta.objects.filter(id_boleta__in=boletas_ids).order_by('-fecha_emision')
-                if boletas_qs.exists():
-                    # set boleta_principal to the most recent selected
-                    first = boletas_qs.first()
-                    datos = conversation.datos_recolectados or {}
-                    datos['rut'] = first.rut
-                    conversation.datos_recolectados = datos
-                    conversation.boleta_principal = first
-                    # set many-to-many of compared boletas
-                    conversation.boletas_comparadas.set(boletas_qs)
-                    conversation.es_consulta_comparativa = boletas_qs.count() > 1
-                    # set state accordingly
-                    conversation.estado = 'comparando' if boletas_qs.count() > 1 else 'consultando'
-                    conversation.save()
-            except Exception as e:
-                logger.warning(f"No se pudo adjuntar boletas al contexto de la conversación: {e}")
+        session_id = _prepare_chat_session(chatbot_service, serializer, request)
 
         # Procesar mensaje con el servicio de chatbot
         response_data = chatbot_service.process_message(session_id, user_message)
@@ -584,6 +584,50 @@ def chat_message(request):
         )
 
 
+@api_view(['POST'])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def chat_message_stream(request):
+    """
+    Variante en streaming (Server-Sent Events) de chat_message
+    
+    POST /api/boletas/chat/message/stream/
+    Body: igual que /api/boletas/chat/message/
+    
+    Response (text/event-stream):
+        event: token
+        data: {"text": "fragmento de la respuesta"}
+        
+        event: done
+        data: {"message": "respuesta completa", "estado": "...", "session_id": "uuid", ...}
+    
+    El mensaje del asistente se guarda cuando termina el stream.
+    """
+    serializer = ChatRequestSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    
+    user_message = serializer.validated_data['message']
+
+    try:
+        chatbot_service = get_chatbot_service()
+        session_id = _prepare_chat_session(chatbot_service, serializer, request)
+    except Exception as e:
+        logger.error(f"Error preparando stream de chat: {e}")
+        return Response(
+            {'error': 'Error al procesar mensaje', 'detail': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    def event_stream():
+        for event in chatbot_service.process_message_stream(session_id, user_message):
+            data = event['data']
+            if event['event'] == 'done':
+                data['session_id'] = session_id
+                data = ChatResponseSerializer(data).data
+            yield _sse_event(event['event'], data)
+
+    return _sse_response(event_stream())
+
+
 @api_view(['GET'])
 def chat_status(request, session_id):
     """
@@ -634,6 +678,21 @@ def rag_stats(request):
         rag_retriever = get_rag_retriever()
         collection_info = rag_retriever.get_collection_stats()
         
+        semantic_cache = get_semantic_cache()
+        if semantic_cache is not None:
+            collection_info['public_answer_cache'] = semantic_cache.get_stats()
+        collection_info['llm_cache'] = get_llm_cache_stats()
+        collection_info['single_flight'] = get_single_flight().get_stats()
+        collection_info['gemini_quota'] = get_quota_stats()
+        collection_info['circuit_breakers'] = get_circuit_breaker_status()
+        collection_info['turn_pipeline'] = get_turn_pipeline_stats()
+        collection_info['prompt_budget'] = get_prompt_budget_stats()
+        collection_info['public_chat'] = get_public_chat_stats()
+        collection_info['chroma_registry'] = get_chroma_registry_stats()
+        answer_engine = get_answer_engine()
+        if answer_engine is not None:
+            collection_info['answer_engine'] = answer_engine.get_stats()
+        
         return Response(collection_info)
         
     except Exception as e:
@@ -662,64 +721,363 @@ def public_chat_message(request):
         if not user_message:
             return Response({'error': 'message field requerido'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Obtener contexto RAG (si está disponible)
-        try:
-            from .RAG.retriever import get_rag_retriever
-            rag_retriever = get_rag_retriever()
-            rag_context = rag_retriever.get_relevant_context_text(query=user_message, max_length=1500)
-        except Exception as e:
-            logger.warning(f"No se pudo obtener contexto RAG: {e}")
-            rag_context = ""
-
-        # Construir prompt para respuesta anónima y breve
-        prompt = f"""Eres un asistente público y anónimo para la Cooperativa de Agua.
-    Usa únicamente la información pública disponible (si existe) y responde de forma clara y útil.
-    No pidas ni solicites datos personales (RUT, número de cliente, teléfono, etc.).
+        # Preguntas casi idénticas a otras ya respondidas salen de la caché semántica
+        cached_answer, cache_embedding, cache_version = _public_cache_lookup(user_message)
+        if cached_answer is not None:
+            return Response({'message': cached_answer})
 
-    Contexto recuperado (fragmentos con fuente):
-    {rag_context}
-
-    Pregunta del usuario:
-    {user_message}
-
-    Instrucciones de formato:
-    - Responde en 4-6 oraciones claras y útiles.
-    - Incluye al final una línea corta con referencias a las fuentes usadas en formato: "Fuentes: [1] URL, [2] URL" (usa los índices provistos en el contexto si están disponibles).
-    - Si no hay información en la base de conocimientos, indica que no se encontró y sugiere cómo el usuario puede contactar a la cooperativa.
-    - No solicites datos personales en ningún caso."""
+        # Construir prompt para respuesta anónima y breve (con contexto RAG)
+        prompt = _build_public_prompt(user_message)
 
         # Generar respuesta usando el modelo (sin crear conversaciones)
         chatbot_service = get_chatbot_service()
         try:
-            # Increase allowed tokens to reduce chance of truncated replies
-            response = chatbot_service.model.generate_content(prompt, generation_config={'temperature': 0.1, 'max_output_tokens': 400})
-            bot_text = response.text.strip()
-            # If the response looks too short or abruptly cut, do one retry asking to expand
-            short_threshold = 40
-            ends_proper = bot_text.endswith('.') or bot_text.endswith('!') or bot_text.endswith('?')
-            if (not bot_text) or (len(bot_text) < short_threshold) or (not ends_proper):
-                logger.info('Public chat response appears short or incomplete; attempting one retry to expand it')
-                followup_prompt = f"""La respuesta anterior fue:
-{bot_text}
-
-Por favor, completa y expande la respuesta anterior en 3-4 frases útiles, sin pedir datos personales, manteniendo el mismo tono amistoso y claro."""
-                try:
-                    follow_resp = chatbot_service.model.generate_content(followup_prompt, generation_config={'temperature': 0.15, 'max_output_tokens': 300})
-                    follow_text = follow_resp.text.strip()
-                    if follow_text:
-                        bot_text = follow_text
-                except Exception as re:
-                    logger.warning(f"Retry to expand public response failed: {re}")
+            bot_text = _generate_public_answer(chatbot_service, prompt)
         except Exception as e:
-            msg = str(e).lower()
-            if 'quota' in msg or '429' in msg or 'rate limit' in msg or 'quota exceeded' in msg:
+            if is_quota_error(e) or isinstance(e, CircuitOpenError):
                 logger.warning(f"Public chat generation failed due to quota/rate-limit: {e}")
                 return Response({'message': 'Disculpa, el servicio de generación está temporalmente limitado por cuota. Por favor intenta de nuevo en unos segundos.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
             logger.error(f"Error generando respuesta pública: {e}")
             return Response({'error': 'Error generando respuesta', 'detail': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        _public_cache_store(cache_embedding, cache_version, bot_text)
         return Response({'message': bot_text})
 
     except Exception as e:
         logger.error(f"Error en public_chat_message: {e}")
         return Response({'error': 'Error procesando petición', 'detail': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def public_chat_message_stream(request):
+    """
+    Variante en streaming (Server-Sent Events) del endpoint público.
+
+    POST /api/public/chat/message/stream/
+    Body: { "message": "texto de la consulta" }
+
+    Emite eventos 'token' con fragmentos de texto y un evento 'done' final
+    con la respuesta completa. No persiste conversaciones.
+    """
+    data = request.data or {}
+    user_message = data.get('message', '')
+    if not user_message:
+        return Response({'error': 'message field requerido'}, status=status.HTTP_400_BAD_REQUEST)
+
+    cached_answer, cache_embedding, cache_version = _public_cache_lookup(user_message)
+    if cached_answer is not None:
+        return _sse_response(iter([
+            _sse_event('token', {'text': cached_answer}),
+            _sse_event('done', {'message': cached_answer})
+        ]))
+
+    try:
+        chatbot_service = get_chatbot_service()
+        prompt = _build_public_prompt(user_message)
+    except Exception as e:
+        logger.error(f"Error en public_chat_message_stream: {e}")
+        return Response({'error': 'Error procesando petición', 'detail': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    generation_failed = False
+
+    def on_error(e):
+        nonlocal generation_failed
+        generation_failed = True
+        if is_quota_error(e) or isinstance(e, CircuitOpenError):
+            logger.warning(f"Public chat stream failed due to quota/rate-limit: {e}")
+            return 'Disculpa, el servicio de generación está temporalmente limitado por cuota. Por favor intenta de nuevo en unos segundos.'
+        logger.error(f"Error generando respuesta pública en streaming: {e}")
+        return 'Disculpa, tuve un problema generando la respuesta. Por favor intenta nuevamente.'
+
+    config = _get_public_chat_config()
+    finish_reasons = []
+
+    def on_continuation_error(e):
+        logger.warning(f"No se pudo continuar la respuesta pública: {e}")
+        return ''
+
+    def event_stream():
+        parts = []
+        try:
+            for chunk in chatbot_service.stream_generation(
+                prompt,
+                generation_config={'temperature': 0.1, 'max_output_tokens': config['max_output_tokens']},
+                on_error=on_error,
+                on_finish=finish_reasons.append,
+                call_site='public_chat'
+            ):
+                parts.append(chunk)
+                yield _sse_event('token', {'text': chunk})
+
+            # Solo se continúa si el modelo informó que se cortó por límite de tokens
+            truncated = finish_reasons[-1:] == ['MAX_TOKENS']
+            continuations = 0
+            while finish_reasons[-1:] == ['MAX_TOKENS'] and continuations < config['max_continuations']:
+                continuations += 1
+                partial = ''.join(parts)
+                reasons_before = len(finish_reasons)
+                joined = False
+                for chunk in chatbot_service.stream_generation(
+                    _continuation_contents(prompt, partial),
+                    generation_config={'temperature': 0.1, 'max_output_tokens': config['continuation_tokens']},
+                    on_error=on_continuation_error,
+                    on_finish=finish_reasons.append,
+                    call_site='public_chat_continuation'
+                ):
+                    if not joined:
+                        chunk = _join_continuation(partial, chunk)[len(partial):]
+                    if not chunk:
+                        continue
+                    joined = True
+                    parts.append(chunk)
+                    yield _sse_event('token', {'text': chunk})
+                # Sin on_finish la continuación falló (antes o durante el stream): no se reintenta
+                if not joined or len(finish_reasons) == reasons_before:
+                    break
+            _record_public_answer(truncated, continuations)
+        except Exception as e:
+            logger.error(f"Error en public_chat_message_stream: {e}")
+            yield _sse_event('error', {'error': 'Error generando respuesta', 'detail': str(e)})
+            return
+        bot_text = ''.join(parts).strip()
+        if not generation_failed:
+            _public_cache_store(cache_embedding, cache_version, bot_text)
+        yield _sse_event('done', {'message': bot_text})
+
+    return _sse_response(event_stream())
+
+
+def _prepare_chat_session(chatbot_service, serializer, request) -> str:
+    """
+    Resuelve el session_id del request y adjunta boletas_ids a la conversación.
+
+    Si el frontend no envía session_id, se inicia una conversación nueva.
+    """
+    # Support passing boletas_ids from frontend to provide immediate context
+    boletas_ids = request.data.get('boletas_ids', [])
+
+    # session_id may be optional from frontend; create one if missing
+    session_id = serializer.validated_data.get('session_id')
+    if not session_id:
+        session_id = str(uuid.uuid4())
+        # start a conversation so it's available for processing
+        try:
+            conversation, initial_message = chatbot_service.start_conversation(session_id)
+        except Exception as e:
+            logger.warning(f"No se pudo iniciar conversación automáticamente: {e}")
+
+    # If boletas_ids provided, attach boletas to the conversation for context
+    if boletas_ids:
+        try:
+            conversation = ChatConversation.objects.get(session_id=session_id)
+            boletas_qs = Boleta.objects.filter(id_boleta__in=boletas_ids).order_by('-fecha_emision')
+            if boletas_qs.exists():
+                # set boleta_principal to the most recent selected
+                first = boletas_qs.first()
+                datos = conversation.datos_recolectados or {}
+                datos['rut'] = first.rut
+                conversation.datos_recolectados = datos
+                conversation.boleta_principal = first
+                # set many-to-many of compared boletas
+                conversation.boletas_comparadas.set(boletas_qs)
+                conversation.es_consulta_comparativa = boletas_qs.count() > 1
+                # set state accordingly
+                conversation.estado = 'comparando' if boletas_qs.count() > 1 else 'consultando'
+                conversation.save()
+        except Exception as e:
+            logger.warning(f"No se pudo adjuntar boletas al contexto de la conversación: {e}")
+
+    return session_id
+
+
+def _public_cache_lookup(user_message: str):
+    """
+    Busca una respuesta pública cacheada para una pregunta equivalente.
+
+    Returns:
+        Tupla (respuesta o None, embedding, versión de la colección). Si la
+        caché está deshabilitada o no se puede calcular el embedding, la
+        respuesta y el embedding son None y la petición sigue sin caché.
+    """
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is None:
+        return None, None, None
+    try:
+        from .RAG.retriever import get_rag_retriever
+        vector_store = get_rag_retriever().vector_store
+        embedding = vector_store.embed_query(user_message)
+        version = vector_store.get_collection_version()
+    except Exception as e:
+        logger.warning(f"Caché semántica no disponible: {e}")
+        return None, None, None
+    return semantic_cache.get(embedding, version), embedding, version
+
+
+def _public_cache_store(embedding, version, answer: str) -> None:
+    """
+    Guarda una respuesta pública en la caché semántica (si está disponible).
+    """
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is None or embedding is None or not answer:
+        return
+    semantic_cache.set(embedding, answer, version)
+
+
+def _get_public_chat_config() -> dict:
+    """
+    Límites de generación del endpoint público (RAG_CONFIG['public_chat']).
+    """
+    config = getattr(settings, 'RAG_CONFIG', {}).get('public_chat', {})
+    return {
+        'max_output_tokens': config.get('max_output_tokens', 400),
+        'continuation_tokens': config.get('continuation_tokens', 200),
+        'max_continuations': config.get('max_continuations', 1),
+    }
+
+
+# Respuestas públicas generadas y cuántas se cortaron por límite de tokens
+_public_answer_stats = {'responses': 0, 'truncated': 0, 'continuations': 0}
+_public_answer_lock = threading.Lock()
+
+
+def _record_public_answer(truncated: bool, continuations: int) -> None:
+    with _public_answer_lock:
+        _public_answer_stats['responses'] += 1
+        _public_answer_stats['truncated'] += int(truncated)
+        _public_answer_stats['continuations'] += continuations
+
+
+def get_public_chat_stats() -> dict:
+    """
+    Obtiene cuántas respuestas públicas se cortaron (MAX_TOKENS) y se continuaron.
+    """
+    with _public_answer_lock:
+        stats = dict(_public_answer_stats)
+    responses = stats['responses']
+    stats['continuation_rate'] = round(stats['truncated'] / responses, 3) if responses else 0.0
+    return stats
+
+
+def _continuation_contents(prompt: str, partial: str) -> list:
+    """
+    Conversación que pide al modelo continuar una respuesta cortada.
+    """
+    return [
+        {'role': 'user', 'parts': [prompt]},
+        {'role': 'model', 'parts': [partial]},
+        {'role': 'user', 'parts': [
+            "Tu respuesta anterior se cortó. Continúa exactamente donde quedó, "
+            "sin repetir lo ya escrito ni agregar introducciones."
+        ]},
+    ]
+
+
+def _join_continuation(partial: str, continuation: str) -> str:
+    """
+    Une la respuesta cortada con su continuación (agrega un espacio solo si
+    el corte quedó entre dos palabras).
+    """
+    continuation = continuation.lstrip() if partial.endswith((' ', '\n')) else continuation
+    if partial and continuation and partial[-1].isalnum() and continuation[0].isalnum():
+        return f"{partial} {continuation}"
+    return partial + continuation
+
+
+def _generate_public_answer(chatbot_service, prompt: str) -> str:
+    """
+    Genera la respuesta del endpoint público. Si el modelo informa que la
+    cortó por límite de tokens (finish_reason MAX_TOKENS), pide una
+    continuación acotada en vez de regenerarla completa.
+
+    Raises:
+        Exception: El error de la primera generación (cuota, circuito, etc.)
+    """
+    config = _get_public_chat_config()
+    response = chatbot_service.model.generate_content(
+        prompt,
+        generation_config={'temperature': 0.1, 'max_output_tokens': config['max_output_tokens']},
+        call_site='public_chat'
+    )
+    bot_text = response.text
+    truncated = get_finish_reason(response) == 'MAX_TOKENS'
+
+    continuations = 0
+    while get_finish_reason(response) == 'MAX_TOKENS' and continuations < config['max_continuations']:
+        continuations += 1
+        logger.info(f"Respuesta pública cortada por MAX_TOKENS; continuación {continuations}")
+        try:
+            response = chatbot_service.model.generate_content(
+                _continuation_contents(prompt, bot_text),
+                generation_config={'temperature': 0.1, 'max_output_tokens': config['continuation_tokens']},
+                call_site='public_chat_continuation'
+            )
+            bot_text = _join_continuation(bot_text, response.text)
+        except Exception as e:
+            logger.warning(f"No se pudo continuar la respuesta pública: {e}")
+            break
+
+    _record_public_answer(truncated, continuations)
+    return bot_text.strip()
+
+
+def _build_public_prompt(user_message: str) -> str:
+    """
+    Construye el prompt del endpoint público con el contexto RAG disponible
+    (acotado por el presupuesto de tokens de 'public_chat').
+    """
+    # Obtener contexto RAG (si está disponible)
+    try:
+        from .RAG.retriever import get_rag_retriever
+        rag_retriever = get_rag_retriever()
+        rag_snippets = rag_retriever.get_relevant_snippets(query=user_message)
+    except Exception as e:
+        logger.warning(f"No se pudo obtener contexto RAG: {e}")
+        rag_snippets = []
+    if not rag_snippets:
+        rag_snippets = ["No se encontró información relevante en la base de conocimientos."]
+
+    assembler = PromptAssembler('public_chat')
+    assembler.add(
+        'rol',
+        "Eres un asistente público y anónimo para la Cooperativa de Agua.\n"
+        "Usa únicamente la información pública disponible (si existe) y responde de forma clara y útil.\n"
+        "No pidas ni solicites datos personales (RUT, número de cliente, teléfono, etc.).",
+        required=True
+    )
+    assembler.add_items(
+        'rag', rag_snippets, PRIORITY_RAG,
+        header="Contexto recuperado (fragmentos con fuente):", separator="\n\n", truncate=True
+    )
+    assembler.add('pregunta', user_message, header="Pregunta del usuario:", required=True)
+    assembler.add(
+        'instrucciones',
+        "- Responde en 4-6 oraciones claras y útiles.\n"
+        "- Incluye al final una línea corta con referencias a las fuentes usadas en formato: "
+        "\"Fuentes: [1] URL, [2] URL\" (usa los índices provistos en el contexto si están disponibles).\n"
+        "- Si no hay información en la base de conocimientos, indica que no se encontró y sugiere "
+        "cómo el usuario puede contactar a la cooperativa.\n"
+        "- No solicites datos personales en ningún caso.",
+        header="Instrucciones de formato:",
+        required=True
+    )
+    return assembler.build()
+
+
+def _sse_event(event: str, data) -> str:
+    """
+    Serializa un evento en formato Server-Sent Events.
+    """
+    payload = json.dumps(data, ensure_ascii=False, cls=DjangoJSONEncoder)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def _sse_response(events) -> StreamingHttpResponse:
+    """
+    Envuelve un iterador de eventos SSE en una respuesta sin buffering.
+    """
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evitar que nginx acumule la respuesta antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,3 @@
+"""
+Módulo compartido - Infraestructura común a los módulos de Boletas y Emergencias
+"""
@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class ModulocompartidoConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'ModuloCompartido'
+    verbose_name = 'Módulo Compartido'
+
+    def ready(self):
+        # Warm-up opcional del stack RAG/LLM (RAG_CONFIG['warmup'])
+        from .services.warmup import should_warm_on_startup, start_warmup_in_background
+
+        if should_warm_on_startup():
+            start_warmup_in_background()
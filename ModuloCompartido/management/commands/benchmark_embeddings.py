@@ -0,0 +1,134 @@
+"""
+Management command para comparar los backends de embeddings (torch vs ONNX int8).
+
+Uso:
+    python manage.py benchmark_embeddings                             # sentence_transformers y onnx
+    python manage.py benchmark_embeddings --backend onnx --backend onnx_float
+    python manage.py benchmark_embeddings --iterations 500
+
+Cada backend se mide en un proceso nuevo (como un worker recién iniciado):
+tiempo de carga, latencia por consulta (p50/p95), throughput en lote, RSS del
+proceso y si torch quedó importado. Al final compara los vectores de cada
+backend con los del modelo float (coseno por consulta).
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ModuloCompartido.management.commands.benchmark_vector_store import _percentile, _rss_mb
+from ModuloCompartido.services.embedding_function import (
+    OnnxEmbedder,
+    SentenceTransformerEmbedder,
+    get_embedding_config,
+)
+from ModuloCompartido.services.onnx_embedding import SAMPLE_TEXTS, cosine_agreement
+
+BACKENDS = ['sentence_transformers', 'onnx', 'onnx_float']
+
+
+def _build(backend, config):
+    tuning = {
+        'batch_size': config['batch_size'],
+        'threads': config['threads'],
+        'normalize': config['normalize'],
+    }
+    if backend == 'sentence_transformers':
+        return SentenceTransformerEmbedder(
+            config['model'],
+            cache_dir=config['cache_dir'],
+            local_files_only=config['local_files_only'],
+            **tuning
+        )
+    return OnnxEmbedder(config['model'], onnx_dir=config['onnx_dir'], quantized=backend == 'onnx', **tuning)
+
+
+class Command(BaseCommand):
+    help = 'Mide carga, latencia por consulta y memoria de cada backend de embeddings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', action='append', choices=BACKENDS, help='Repetible (default: sentence_transformers y onnx)')
+        parser.add_argument('--iterations', type=int, default=200, help='Consultas individuales por backend (default: 200)')
+        parser.add_argument('--worker', choices=BACKENDS, help='Uso interno: mide un backend en este proceso')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.stdout.write(json.dumps(self._measure(options['worker'], options['iterations'])))
+            return
+
+        backends = options['backend'] or ['sentence_transformers', 'onnx']
+        results = {}
+        for backend in backends:
+            process = subprocess.run(
+                [sys.executable, 'manage.py', 'benchmark_embeddings', '--worker', backend,
+                 '--iterations', str(options['iterations'])],
+                cwd=str(settings.BASE_DIR),
+                capture_output=True,
+                text=True,
+            )
+            if process.returncode != 0:
+                error = (process.stderr.strip().splitlines() or ['sin salida'])[-1]
+                self.stdout.write(self.style.ERROR(f"  {backend}: {error}"))
+                continue
+            results[backend] = json.loads(process.stdout.strip().splitlines()[-1])
+
+        if not results:
+            raise CommandError('Ningún backend pudo cargarse')
+
+        self.stdout.write(f"\n⏱️  {get_embedding_config()['model']} ({options['iterations']} consultas)\n")
+        self.stdout.write(
+            f"  {'backend':<22} {'carga ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'lote ms/texto':>14} "
+            f"{'RSS MB':>8} {'+RSS MB':>8}  torch"
+        )
+        for backend, r in results.items():
+            self.stdout.write(
+                f"  {backend:<22} {r['load_ms']:>9.0f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                f"{r['batch_ms_per_text']:>14.2f} {r['rss_mb']:>8.0f} {r['rss_delta_mb']:>8.0f}  "
+                f"{'sí' if r['torch_loaded'] else 'no'}"
+            )
+
+        reference = 'sentence_transformers' if 'sentence_transformers' in results else 'onnx_float'
+        if reference in results:
+            for backend, r in results.items():
+                if backend != reference:
+                    agreement = cosine_agreement(results[reference]['embeddings'], r['embeddings'])
+                    self.stdout.write(
+                        f"\n  Coseno {backend} vs {reference}: min {agreement['min']}, promedio {agreement['mean']}"
+                    )
+
+    def _measure(self, backend, iterations):
+        rss_before = _rss_mb()
+        embedder = _build(backend, get_embedding_config())
+
+        started = time.perf_counter()
+        embedder(['carga del modelo'])
+        load_ms = (time.perf_counter() - started) * 1000
+
+        latencies = []
+        for i in range(iterations):
+            started = time.perf_counter()
+            embedder([SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]])
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        batch = SAMPLE_TEXTS * 10
+        started = time.perf_counter()
+        embedder(batch)
+        batch_ms = (time.perf_counter() - started) * 1000
+
+        rss_after = _rss_mb()
+        return {
+            'load_ms': load_ms,
+            'p50_ms': _percentile(latencies, 0.5),
+            'p95_ms': _percentile(latencies, 0.95),
+            'mean_ms': statistics.mean(latencies),
+            'batch_ms_per_text': batch_ms / len(batch),
+            'rss_mb': rss_after or 0,
+            'rss_delta_mb': (rss_after or 0) - (rss_before or 0),
+            'torch_loaded': 'torch' in sys.modules,
+            'embeddings': [[float(x) for x in vector] for vector in embedder(SAMPLE_TEXTS)],
+        }
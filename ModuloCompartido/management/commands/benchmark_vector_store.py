@@ -0,0 +1,208 @@
+"""
+Management command para comparar los backends del vector store (ChromaDB vs NumPy).
+
+Uso:
+    python manage.py benchmark_vector_store                       # ambas bases de conocimiento
+    python manage.py benchmark_vector_store --module boletas --iterations 1000
+    python manage.py benchmark_vector_store --fake-embeddings     # sin descargar el modelo
+    python manage.py benchmark_vector_store --replicate 20        # simula una base 20 veces mayor
+
+Los embeddings de documentos y consultas se calculan una sola vez y se
+entregan a ambos backends, de modo que se mide solo la carga y la búsqueda.
+"""
+
+from pathlib import Path
+import hashlib
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ModuloCompartido.services.vector_backends import NumpyCollection
+
+MODULES = {
+    'boletas': 'ModuloBoletas',
+    'emergencia': 'ModuloEmergencia',
+}
+
+QUERIES = {
+    'boletas': [
+        '¿Cuándo vence mi boleta?',
+        '¿Cómo puedo pagar la boleta?',
+        '¿Cuánto cuesta el metro cúbico de agua?',
+        '¿Qué hago si mi boleta llegó muy alta?',
+        'Horario de atención de la cooperativa',
+        '¿Qué significa el cargo fijo?',
+    ],
+    'emergencia': [
+        'Tengo una fuga de agua en la calle',
+        '¿A qué número llamo por un corte de agua?',
+        'No tengo agua en mi casa desde la mañana',
+        '¿Qué sectores atiende la cooperativa?',
+        'El agua sale turbia, ¿es segura?',
+        'Se rompió una cañería en la vereda',
+    ],
+}
+
+
+def _rss_mb():
+    """RSS actual del proceso en MB (None fuera de Linux)."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _fake_embedding_function(dimensions=384):
+    """Embeddings deterministas por hash (vectores unitarios), sin modelo."""
+    def embed(texts):
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+            vectors.append(vector / np.linalg.norm(vector))
+        return vectors
+    return embed
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = 'Compara latencia y memoria de ChromaDB y de la colección NumPy en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', choices=['boletas', 'emergencia', 'all'], default='all')
+        parser.add_argument('--iterations', type=int, default=300, help='Consultas por backend (default: 300)')
+        parser.add_argument('--top-k', type=int, default=settings.RAG_CONFIG.get('top_k_results', 5))
+        parser.add_argument('--replicate', type=int, default=1, help='Multiplica los chunks (bases más grandes)')
+        parser.add_argument(
+            '--fake-embeddings',
+            action='store_true',
+            help='Usa embeddings aleatorios por hash en vez del modelo de ChromaDB',
+        )
+
+    def handle(self, *args, **options):
+        if options['fake_embeddings']:
+            embedding_function = _fake_embedding_function()
+        else:
+            from chromadb.utils import embedding_functions
+            embedding_function = embedding_functions.DefaultEmbeddingFunction()
+
+        modules = list(MODULES) if options['module'] == 'all' else [options['module']]
+        for module in modules:
+            self._benchmark_module(module, embedding_function, options)
+
+    def _load_chunks(self, module, replicate):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=settings.RAG_CONFIG.get('chunk_size', 1000),
+            chunk_overlap=settings.RAG_CONFIG.get('chunk_overlap', 200),
+        )
+        kb_path = Path(settings.BASE_DIR) / MODULES[module] / 'RAG' / 'knowledge_base'
+        documents, metadatas = [], []
+        total_bytes = 0
+        for path in sorted(kb_path.glob('*')):
+            if path.suffix not in ('.md', '.txt'):
+                continue
+            text = path.read_text(encoding='utf-8')
+            total_bytes += len(text.encode('utf-8'))
+            for chunk in splitter.split_text(text):
+                documents.append(chunk)
+                metadatas.append({'source_file': path.name})
+
+        if replicate > 1:
+            documents = [f"{doc}\n[{i}]" for i in range(replicate) for doc in documents]
+            metadatas = [dict(meta) for _ in range(replicate) for meta in metadatas]
+        ids = [f"{module}_{i}" for i in range(len(documents))]
+        return documents, metadatas, ids, total_bytes
+
+    def _benchmark_module(self, module, embedding_function, options):
+        documents, metadatas, ids, total_bytes = self._load_chunks(module, options['replicate'])
+        if not documents:
+            self.stdout.write(self.style.WARNING(f'{module}: knowledge_base vacía, se omite'))
+            return
+
+        replicated = f", x{options['replicate']}" if options['replicate'] > 1 else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'\n📚 {module}: {len(documents)} chunks ({total_bytes / 1024:.1f} KB de texto{replicated})'
+        ))
+
+        started = time.perf_counter()
+        embeddings = [list(map(float, e)) for e in embedding_function(documents)]
+        queries = [list(map(float, e)) for e in embedding_function(QUERIES[module])]
+        self.stdout.write(f'  Embeddings calculados en {(time.perf_counter() - started) * 1000:.0f} ms (no se mide)')
+
+        where = {'source_file': metadatas[0]['source_file']}
+        top_k = options['top_k']
+        rows = []
+        top_ids = {}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for backend in ('numpy', 'chroma'):
+                rss_before = _rss_mb()
+                started = time.perf_counter()
+                collection = self._build(backend, Path(tmp), module, embedding_function)
+                collection.add(documents=documents, metadatas=metadatas, ids=ids, embeddings=embeddings)
+                load_ms = (time.perf_counter() - started) * 1000
+                rss_after = _rss_mb()
+
+                latencies = self._time_queries(collection, queries, options['iterations'], top_k, None)
+                filtered = self._time_queries(collection, queries, options['iterations'], top_k, where)
+                top_ids[backend] = [
+                    collection.query(query_embeddings=[q], n_results=top_k)['ids'][0] for q in queries
+                ]
+                rows.append((backend, load_ms, latencies, filtered, rss_before, rss_after, collection))
+
+        self.stdout.write(
+            f"\n  {'backend':<8} {'carga ms':>9} {'p50 µs':>8} {'p95 µs':>8} "
+            f"{'p50 where µs':>13} {'RSS +MB':>8}"
+        )
+        for backend, load_ms, latencies, filtered, rss_before, rss_after, collection in rows:
+            rss = f'{rss_after - rss_before:.1f}' if rss_before is not None else 'n/d'
+            self.stdout.write(
+                f'  {backend:<8} {load_ms:>9.1f} {_percentile(latencies, 0.5):>8.0f} '
+                f'{_percentile(latencies, 0.95):>8.0f} {_percentile(filtered, 0.5):>13.0f} {rss:>8}'
+            )
+
+        numpy_collection = rows[0][6]
+        self.stdout.write(f'\n  Matriz NumPy: {numpy_collection.memory_bytes() / 1024:.1f} KB')
+        recall = statistics.mean(
+            len(set(exact) & set(approx)) / max(len(exact), 1)
+            for exact, approx in zip(top_ids['numpy'], top_ids['chroma'])
+        )
+        self.stdout.write(f'  Coincidencia top-{top_k} Chroma (HNSW) vs búsqueda exacta: {recall:.1%}')
+        self.stdout.write('  (RSS +MB es aproximado: incluye la carga de librerías en el primer uso)')
+
+    def _build(self, backend, tmp_path, module, embedding_function):
+        name = f'benchmark_{module}'
+        if backend == 'numpy':
+            return NumpyCollection(name, tmp_path / f'{name}.npz', embedding_function)
+
+        import chromadb
+        from chromadb.config import Settings
+
+        client = chromadb.PersistentClient(
+            path=str(tmp_path / 'chroma'),
+            settings=Settings(anonymized_telemetry=False, allow_reset=True),
+        )
+        # Los embeddings se entregan ya calculados: la colección no necesita función propia
+        return client.create_collection(name=name, embedding_function=None)
+
+    def _time_queries(self, collection, queries, iterations, top_k, where):
+        latencies = []
+        for i in range(iterations):
+            query = queries[i % len(queries)]
+            started = time.perf_counter()
+            collection.query(query_embeddings=[query], n_results=top_k, where=where)
+            latencies.append((time.perf_counter() - started) * 1_000_000)
+        return latencies
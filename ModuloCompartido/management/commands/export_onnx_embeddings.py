@@ -0,0 +1,76 @@
+"""
+Management command para exportar el modelo de embeddings a ONNX int8.
+
+Uso:
+    python manage.py export_onnx_embeddings                      # RAG_CONFIG['embedding_model']
+    python manage.py export_onnx_embeddings --no-quantize
+    python manage.py export_onnx_embeddings --model sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2
+
+Requiere torch, sentence-transformers y onnx (solo en la máquina que exporta,
+p. ej. al construir la imagen). Los workers con EMBEDDING_BACKEND=onnx solo
+necesitan onnxruntime y tokenizers. Al terminar compara los embeddings int8
+con los del modelo float sobre consultas de ejemplo.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ModuloCompartido.services.embedding_function import get_embedding_config
+from ModuloCompartido.services.onnx_embedding import (
+    SAMPLE_TEXTS,
+    OnnxSentenceEncoder,
+    cosine_agreement,
+    export_onnx_model,
+    get_onnx_model_dir,
+)
+
+
+class Command(BaseCommand):
+    help = 'Exporta el modelo de embeddings a ONNX con cuantización dinámica int8'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=None, help='Modelo (default: RAG_CONFIG[embedding_model])')
+        parser.add_argument('--output', default=None, help="Directorio base (default: RAG_CONFIG['embedding']['onnx_dir'])")
+        parser.add_argument('--no-quantize', action='store_true', help='Exporta solo el modelo float32')
+        parser.add_argument(
+            '--min-cosine',
+            type=float,
+            default=0.99,
+            help='Coseno mínimo int8 vs float aceptado (default: 0.99)',
+        )
+
+    def handle(self, *args, **options):
+        config = get_embedding_config()
+        model_name = options['model'] or config['model']
+        output_dir = get_onnx_model_dir(model_name, options['output'] or config['onnx_dir'])
+
+        self.stdout.write(f"\n📦 Exportando {model_name} a {output_dir}...")
+        try:
+            manifest = export_onnx_model(
+                model_name,
+                output_dir,
+                cache_dir=config['cache_dir'],
+                quantize=not options['no_quantize']
+            )
+        except ImportError as e:
+            raise CommandError(f"Exportar requiere torch, sentence-transformers y onnx: {e}")
+
+        self.stdout.write(
+            f"  float32: {manifest['float_mb']} MB"
+            + (f", int8: {manifest['int8_mb']} MB" if 'int8_mb' in manifest else '')
+            + f" ({manifest['export_ms'] / 1000:.1f} s)"
+        )
+        if options['no_quantize']:
+            return
+
+        # Paridad: el modelo int8 debe dar los mismos vectores que el float
+        from sentence_transformers import SentenceTransformer
+
+        reference = SentenceTransformer(model_name, device='cpu', cache_folder=config['cache_dir']).encode(
+            SAMPLE_TEXTS, normalize_embeddings=True
+        )
+        quantized = OnnxSentenceEncoder(output_dir, quantized=True).encode(SAMPLE_TEXTS, normalize_embeddings=True)
+        agreement = cosine_agreement(reference, quantized)
+        line = f"  Coseno int8 vs float: min {agreement['min']}, promedio {agreement['mean']}"
+        if agreement['min'] < options['min_cosine']:
+            raise CommandError(f"{line} (< {options['min_cosine']}): no usar el modelo int8")
+        self.stdout.write(self.style.SUCCESS(f"{line}\n✅ Listo: EMBEDDING_BACKEND=onnx"))
@@ -0,0 +1,102 @@
+"""
+Management command para medir el tiempo de importación al arrancar Django.
+
+Uso:
+    python manage.py importtime                                    # URLconf (ROOT_URLCONF)
+    python manage.py importtime --module ModuloBoletas.views --top 30
+    python manage.py importtime --module ModuloBoletas.services.chatbot_service --self
+
+Lanza un intérprete nuevo con `python -X importtime`, hace django.setup() e
+importa el módulo indicado; luego resume el desglose y avisa si alguna
+dependencia pesada (Gemini, ChromaDB, LangChain, torch...) se importó sin
+usarse.
+"""
+
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Dependencias que deben cargarse solo al usarse (ver services/lazy_import.py)
+HEAVY_MODULES = [
+    'google.generativeai',
+    'chromadb',
+    'sentence_transformers',
+    'langchain_community',
+    'langchain_text_splitters',
+    'unstructured',
+    'nltk',
+    'torch',
+    'onnxruntime',
+]
+
+SCRIPT = (
+    "import importlib, django; "
+    "django.setup(); "
+    "importlib.import_module({module!r})"
+)
+
+
+def parse_importtime(stderr):
+    """Convierte la salida de -X importtime en [(módulo, propio µs, acumulado µs, nivel)]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            own, cumulative, name = line[len('import time:'):].split('|', 2)
+            rows.append((name.strip(), int(own), int(cumulative), (len(name) - len(name.lstrip())) // 2))
+        except ValueError:
+            continue
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Muestra el desglose de python -X importtime al cargar Django y un módulo del proyecto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default=None, help='Módulo a importar (default: ROOT_URLCONF)')
+        parser.add_argument('--top', type=int, default=20, help='Módulos a mostrar (default: 20)')
+        parser.add_argument(
+            '--self',
+            action='store_true',
+            dest='by_self',
+            help='Ordena por tiempo propio en vez de acumulado',
+        )
+
+    def handle(self, *args, **options):
+        module = options['module'] or settings.ROOT_URLCONF
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'Core-Backend.settings'))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', SCRIPT.format(module=module)],
+            cwd=str(settings.BASE_DIR),
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        rows = parse_importtime(result.stderr)
+        if result.returncode != 0 or not rows:
+            raise CommandError(f'No se pudo importar {module}:\n{result.stderr[-2000:]}')
+
+        # Los módulos de nivel superior suman el total del proceso
+        total_us = sum(cumulative for _, _, cumulative, level in rows if level == 0)
+        self.stdout.write(self.style.SUCCESS(
+            f'\n⏱️  django.setup() + import {module}: {total_us / 1000:.0f} ms ({len(rows)} módulos)'
+        ))
+
+        key = 1 if options['by_self'] else 2
+        column = 'propio' if options['by_self'] else 'acumulado'
+        self.stdout.write(f"\n  {column + ' ms':>13}  módulo")
+        for row in sorted(rows, key=lambda r: r[key], reverse=True)[:options['top']]:
+            self.stdout.write(f'  {row[key] / 1000:>13.1f}  {row[0]}')
+
+        imported = {name for name, _, _, _ in rows}
+        eager = [name for name in HEAVY_MODULES if name in imported]
+        if eager:
+            self.stdout.write(self.style.WARNING(
+                f"\n  ⚠️  Dependencias pesadas importadas al cargar {module}: {', '.join(eager)}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n  ✅ Ninguna dependencia pesada se importa al arrancar'))
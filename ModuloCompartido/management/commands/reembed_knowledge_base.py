@@ -0,0 +1,86 @@
+"""
+Management command para reembeber las colecciones con RAG_CONFIG['embedding_model'].
+
+Uso:
+    python manage.py reembed_knowledge_base --check              # solo muestra qué falta migrar
+    python manage.py reembed_knowledge_base                      # ambas colecciones
+    python manage.py reembed_knowledge_base --module boletas --no-input
+
+Reutiliza los chunks guardados en la colección (no vuelve a leer los archivos).
+Antes de borrar nada verifica que el modelo nuevo cargue, respalda los chunks
+en CHROMADB_PATH/<colección>.reembed.json y retoma desde ahí si se interrumpe.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ModuloCompartido.services.embedding_migration import get_reembed_status, reembed_collection
+
+
+def _get_vector_store(module):
+    if module == 'boletas':
+        from ModuloBoletas.RAG.vector_store import get_vector_store
+    else:
+        from ModuloEmergencia.RAG.vector_store import get_vector_store
+    return get_vector_store()
+
+
+class Command(BaseCommand):
+    help = 'Vuelve a embeber las bases de conocimientos con el modelo de RAG_CONFIG'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--module',
+            choices=['boletas', 'emergencia'],
+            action='append',
+            help='Colección a migrar (repetible; default: ambas)',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Muestra el modelo actual y el configurado sin modificar nada',
+        )
+        parser.add_argument(
+            '--no-input',
+            action='store_true',
+            help='No pide confirmación',
+        )
+
+    def handle(self, *args, **options):
+        modules = options['module'] or ['boletas', 'emergencia']
+        pending = []
+        for module in modules:
+            vector_store = _get_vector_store(module)
+            status = get_reembed_status(vector_store)
+            line = (
+                f"  {status['collection']:<28} {status['document_count']:>5} chunks  "
+                f"{status['current_model']} → {status['target_model']}"
+            )
+            if status['pending']:
+                pending.append(vector_store)
+                suffix = ' (migración interrumpida)' if status['interrupted'] else ''
+                self.stdout.write(self.style.WARNING(f"{line}{suffix}"))
+            else:
+                self.stdout.write(f"{line}  ✅ al día")
+
+        if options['check'] or not pending:
+            return
+
+        if not options['no_input']:
+            confirm = input(f"\n¿Reembeber {len(pending)} colección(es)? (sí/no): ")
+            if confirm.lower() not in ['sí', 'si', 's', 'yes', 'y']:
+                self.stdout.write(self.style.ERROR('❌ Operación cancelada'))
+                return
+
+        failed = False
+        for vector_store in pending:
+            result = reembed_collection(vector_store)
+            if result['success']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"  ✅ {result['collection']}: {result['message']} "
+                    f"(modelo {result.get('load_ms', 0):.0f} ms, embeddings {result.get('embed_ms', 0):.0f} ms)"
+                ))
+            else:
+                failed = True
+                self.stdout.write(self.style.ERROR(f"  ❌ {result['collection']}: {result['message']}"))
+        if failed:
+            raise CommandError('Hay colecciones sin reembeber')
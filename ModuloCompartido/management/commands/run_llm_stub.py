@@ -0,0 +1,61 @@
+"""
+Management command para levantar el servidor stub de LLM (pruebas de carga sin Gemini).
+
+Uso:
+    python manage.py run_llm_stub                                  # 127.0.0.1:8765, ~800 ms
+    python manage.py run_llm_stub --latency-ms 1500 --jitter-ms 500 --distribution lognormal
+    python manage.py run_llm_stub --failure-rate 0.05 --rate-limit-rate 0.02 --seed 42
+
+Con RAG_CONFIG['llm_provider']['backend'] = 'stub' ambos chatbots usan este servidor.
+"""
+
+from django.core.management.base import BaseCommand
+
+from ModuloCompartido.services.llm_stub_server import StubConfig, make_server
+
+
+class Command(BaseCommand):
+    help = 'Levanta un servidor HTTP local que imita a Gemini con latencia y fallos configurables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Interfaz (default: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8765, help='Puerto (default: 8765)')
+        parser.add_argument('--latency-ms', type=float, default=800.0, help='Latencia media (default: 800)')
+        parser.add_argument('--jitter-ms', type=float, default=200.0, help='Dispersión de la latencia (default: 200)')
+        parser.add_argument(
+            '--distribution',
+            choices=['fixed', 'normal', 'lognormal'],
+            default='normal',
+            help='Distribución de la latencia (default: normal)',
+        )
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Probabilidad de 503 (default: 0)')
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Probabilidad de 429 (default: 0)')
+        parser.add_argument('--chunk-delay-ms', type=float, default=30.0, help='Pausa entre fragmentos en streaming')
+        parser.add_argument('--seed', type=int, default=None, help='Semilla para reproducir la secuencia')
+
+    def handle(self, *args, **options):
+        config = StubConfig(
+            latency_ms=options['latency_ms'],
+            latency_jitter_ms=options['jitter_ms'],
+            latency_distribution=options['distribution'],
+            failure_rate=options['failure_rate'],
+            rate_limit_rate=options['rate_limit_rate'],
+            chunk_delay_ms=options['chunk_delay_ms'],
+            seed=options['seed'],
+        )
+        server = make_server(options['host'], options['port'], config)
+        host, port = server.server_address[:2]
+
+        self.stdout.write(self.style.SUCCESS(f'\n🧪 LLM stub escuchando en http://{host}:{port}/generate'))
+        self.stdout.write(
+            f"  ⏱️  Latencia: {options['distribution']} {options['latency_ms']:.0f}±{options['jitter_ms']:.0f} ms"
+        )
+        self.stdout.write(
+            f"  ❌ Fallos: 503 {options['failure_rate']:.1%}, 429 {options['rate_limit_rate']:.1%}\n"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('\nDeteniendo el servidor stub...')
+        finally:
+            server.server_close()
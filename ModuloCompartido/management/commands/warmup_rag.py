@@ -0,0 +1,43 @@
+"""
+Management command para calentar el stack RAG/LLM y reportar los tiempos de inicialización.
+
+Uso:
+    python manage.py warmup_rag                                   # todos los componentes
+    python manage.py warmup_rag --component boletas_embeddings    # solo algunos
+
+Útil para medir el arranque en frío de un worker o para precalentar el modelo
+de embeddings (descarga) al construir la imagen.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ModuloCompartido.services.warmup import COMPONENTS, run_warmup
+
+COMPONENT_NAMES = [name for name, _ in COMPONENTS]
+
+
+class Command(BaseCommand):
+    help = 'Inicializa vector stores, embeddings, índice léxico y servicios de chat de ambos módulos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--component',
+            action='append',
+            choices=COMPONENT_NAMES,
+            help='Componente a calentar (repetible; default: todos)',
+        )
+
+    def handle(self, *args, **options):
+        state = run_warmup(options['component'])
+
+        for name, values in state['components'].items():
+            line = f"  {name:<28} {values['status']:<8} {values.get('init_ms', 0):>9.1f} ms"
+            if values['status'] == 'ready':
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.ERROR(f"{line}  {values.get('error', '')}"))
+
+        self.stdout.write(f"\n  Total: {state['init_ms']:.1f} ms")
+        if not state['ready']:
+            raise CommandError('Warm-up incompleto: hay componentes con error')
+        self.stdout.write(self.style.SUCCESS('✅ Stack RAG/LLM listo'))
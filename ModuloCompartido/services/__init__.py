@@ -0,0 +1,3 @@
+"""
+Servicios compartidos (LLM, cachés) entre módulos
+"""
@@ -0,0 +1,153 @@
+"""
+Chroma Registry - Un cliente de ChromaDB por ruta y por proceso
+Boletas y Emergencia guardan sus colecciones en el mismo CHROMADB_PATH. Con
+un PersistentClient por módulo cada worker mantenía dos clientes, dos
+conexiones a chroma.sqlite3 y cachés duplicadas sobre el mismo archivo. El
+registro entrega un único cliente por ruta y las colecciones por nombre.
+"""
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+import threading
+
+from .lazy_import import lazy_module
+
+logger = logging.getLogger(__name__)
+
+# Diferido hasta abrir el primer cliente
+chromadb = lazy_module('chromadb')
+
+_clients: Dict[str, Any] = {}
+_collections: Dict[Tuple[str, str], Any] = {}
+_lock = threading.Lock()
+
+
+def _key(path: Path) -> str:
+    return str(Path(path).resolve())
+
+
+def get_chroma_client(path: Path) -> Any:
+    """
+    Obtiene el cliente persistente compartido de una ruta
+
+    Args:
+        path: Directorio de ChromaDB (settings.CHROMADB_PATH)
+
+    Returns:
+        chromadb.PersistentClient (el mismo para todos los módulos del proceso)
+    """
+    key = _key(path)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            Path(key).mkdir(parents=True, exist_ok=True)
+            client = chromadb.PersistentClient(
+                path=key,
+                settings=chromadb.config.Settings(
+                    anonymized_telemetry=False,
+                    allow_reset=True
+                )
+            )
+            _clients[key] = client
+            logger.info(f"Cliente ChromaDB creado para {key}")
+        return client
+
+
+def get_chroma_collection(
+    path: Path,
+    name: str,
+    embedding_function: Optional[Callable] = None,
+    metadata: Optional[Dict[str, Any]] = None
+) -> Any:
+    """
+    Obtiene (o crea) una colección del cliente compartido
+
+    Args:
+        path: Directorio de ChromaDB
+        name: Nombre de la colección
+        embedding_function: Función de embeddings de la colección
+        metadata: Metadatos si hay que crearla
+
+    Returns:
+        Colección de ChromaDB
+    """
+    client = get_chroma_client(path)
+    key = (_key(path), name)
+    with _lock:
+        collection = _collections.get(key)
+        if collection is not None:
+            return collection
+        try:
+            collection = client.get_collection(name=name, embedding_function=embedding_function)
+            logger.info(f"Colección existente cargada: {name}")
+        except Exception:
+            collection = client.create_collection(
+                name=name,
+                embedding_function=embedding_function,
+                metadata=metadata
+            )
+            logger.info(f"Nueva colección creada: {name}")
+        _collections[key] = collection
+        return collection
+
+
+def get_chroma_collection_info(path: Path, name: str) -> Optional[Dict[str, Any]]:
+    """
+    Metadatos y función de embeddings persistidos de una colección, sin abrirla
+
+    Args:
+        path: Directorio de ChromaDB
+        name: Nombre de la colección
+
+    Returns:
+        Dict con 'metadata' y 'embedding_function', o None si no existe
+    """
+    client = get_chroma_client(path)
+    try:
+        collections = list(client.list_collections())
+    except Exception as e:
+        logger.warning(f"No se pudieron listar las colecciones: {e}")
+        return None
+    for collection in collections:
+        if collection.name == name:
+            return {
+                'metadata': dict(collection.metadata or {}),
+                'embedding_function': (collection.configuration_json or {}).get('embedding_function'),
+            }
+    return None
+
+
+def delete_chroma_collection(path: Path, name: str) -> None:
+    """
+    Elimina una colección y la quita del registro
+
+    Raises:
+        Exception: El error de ChromaDB si no se pudo eliminar
+    """
+    client = get_chroma_client(path)
+    with _lock:
+        _collections.pop((_key(path), name), None)
+    client.delete_collection(name=name)
+
+
+def get_chroma_registry_stats() -> Dict[str, Any]:
+    """
+    Obtiene los clientes y colecciones abiertos en el proceso
+
+    Returns:
+        Dict con estadísticas
+    """
+    with _lock:
+        return {
+            'clients': len(_clients),
+            'collections': sorted(name for _, name in _collections)
+        }
+
+
+def reset_chroma_registry() -> None:
+    """
+    Olvida los clientes y colecciones registrados (tests)
+    """
+    with _lock:
+        _clients.clear()
+        _collections.clear()
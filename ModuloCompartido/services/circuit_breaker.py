@@ -0,0 +1,284 @@
+"""
+Circuit Breaker - Corte rápido de llamadas al LLM cuando Gemini está degradado
+Con el circuito abierto los servicios no esperan a que la red falle: van
+directo a los extractores locales y a las respuestas por plantilla.
+"""
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, Optional
+from django.conf import settings
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """
+    El circuito está abierto: la llamada se rechaza sin ir a la red
+    """
+
+    def __init__(self, name: str, retry_after: float = 0.0):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit '{name}' open, retry after {retry_after:.1f}s")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker con estados cerrado, abierto y semiabierto
+
+    En estado cerrado se registra el resultado de las últimas llamadas; si la
+    tasa de fallos o de llamadas lentas supera su umbral el circuito se abre.
+    Tras open_seconds pasa a semiabierto y deja pasar llamadas de prueba: si
+    tienen éxito se cierra y si fallan vuelve a abrirse.
+    """
+
+    STATE_CLOSED = 'closed'
+    STATE_OPEN = 'open'
+    STATE_HALF_OPEN = 'half_open'
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 15.0,
+        slow_call_rate_threshold: float = 0.8,
+        window_size: int = 20,
+        minimum_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        """
+        Args:
+            name: Nombre del circuito (para logs y stats)
+            failure_rate_threshold: Tasa de fallos que abre el circuito
+            slow_call_seconds: Duración a partir de la cual una llamada es lenta
+            slow_call_rate_threshold: Tasa de llamadas lentas que abre el circuito
+            window_size: Número de llamadas recientes consideradas
+            minimum_calls: Llamadas mínimas en la ventana antes de evaluar
+            open_seconds: Tiempo en estado abierto antes de probar de nuevo
+            half_open_max_calls: Llamadas de prueba simultáneas en semiabierto
+        """
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._window: "deque[tuple]" = deque(maxlen=window_size)
+        self._state = self.STATE_CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._lock = threading.Lock()
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def is_open(self) -> bool:
+        """
+        Indica si una llamada sería rechazada ahora (sin consumir la prueba)
+        """
+        with self._lock:
+            self._refresh_state()
+            if self._state == self.STATE_OPEN:
+                return True
+            if self._state == self.STATE_HALF_OPEN:
+                return self._half_open_in_flight >= self.half_open_max_calls
+            return False
+
+    def before_call(self) -> None:
+        """
+        Admite o rechaza una llamada
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto
+        """
+        with self._lock:
+            self._refresh_state()
+            if self._state == self.STATE_CLOSED:
+                return
+            if (self._state == self.STATE_HALF_OPEN
+                    and self._half_open_in_flight < self.half_open_max_calls):
+                self._half_open_in_flight += 1
+                return
+            self.rejected += 1
+            retry_after = max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+        raise CircuitOpenError(self.name, retry_after)
+
+    def cancel_call(self) -> None:
+        """
+        Libera una llamada admitida que finalmente no llegó a la red
+        """
+        with self._lock:
+            if self._state == self.STATE_HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def record_success(self, duration: float) -> None:
+        """
+        Registra una llamada exitosa (lenta si supera slow_call_seconds)
+        """
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self._state == self.STATE_HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                if slow:
+                    self._open()
+                else:
+                    logger.info(f"Circuito '{self.name}' cerrado: Gemini respondió correctamente")
+                    self._state = self.STATE_CLOSED
+                    self._window.clear()
+                return
+            self._window.append((False, slow))
+            self._evaluate()
+
+    def record_failure(self) -> None:
+        """
+        Registra una llamada fallida
+        """
+        with self._lock:
+            if self._state == self.STATE_HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._open()
+                return
+            self._window.append((True, False))
+            self._evaluate()
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """
+        Ejecuta fn protegida por el circuito
+
+        Args:
+            fn: Función que realiza la llamada de red
+
+        Returns:
+            Resultado de fn
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto
+        """
+        self.before_call()
+        started = time.monotonic()
+        try:
+            result = fn()
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def track_stream(self, chunks: Iterator[Any], started: float) -> Iterator[Any]:
+        """
+        Envuelve un stream para registrar su resultado al terminar
+        """
+        try:
+            for chunk in chunks:
+                yield chunk
+        except GeneratorExit:
+            # El cliente abandonó el stream: no cuenta como éxito ni fallo
+            self.cancel_call()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success(time.monotonic() - started)
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Obtiene el estado del circuito
+
+        Returns:
+            Dict con estado y métricas de la ventana
+        """
+        with self._lock:
+            self._refresh_state()
+            calls = len(self._window)
+            failures = sum(1 for failed, _ in self._window if failed)
+            slow = sum(1 for _, is_slow in self._window if is_slow)
+            retry_after = 0.0
+            if self._state == self.STATE_OPEN:
+                retry_after = max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+            return {
+                'state': self._state,
+                'window_calls': calls,
+                'failure_rate': round(failures / calls, 3) if calls else 0.0,
+                'slow_call_rate': round(slow / calls, 3) if calls else 0.0,
+                'retry_after': round(retry_after, 1),
+                'rejected': self.rejected,
+                'times_opened': self.times_opened
+            }
+
+    def _refresh_state(self) -> None:
+        if (self._state == self.STATE_OPEN
+                and time.monotonic() - self._opened_at >= self.open_seconds):
+            self._state = self.STATE_HALF_OPEN
+            self._half_open_in_flight = 0
+
+    def _evaluate(self) -> None:
+        calls = len(self._window)
+        if calls < self.minimum_calls:
+            return
+        failures = sum(1 for failed, _ in self._window if failed)
+        slow = sum(1 for _, is_slow in self._window if is_slow)
+        if (failures / calls >= self.failure_rate_threshold
+                or slow / calls >= self.slow_call_rate_threshold):
+            self._open()
+
+    def _open(self) -> None:
+        logger.warning(
+            f"⚡ Circuito '{self.name}' abierto durante {self.open_seconds}s: "
+            f"usando respuestas locales"
+        )
+        self._state = self.STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._window.clear()
+        self.times_opened += 1
+
+
+# Circuitos por nombre (el último creado para cada servicio)
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def build_circuit_breaker(name: str) -> Optional[CircuitBreaker]:
+    """
+    Crea un circuito con la configuración de RAG_CONFIG['circuit_breaker']
+
+    Args:
+        name: Nombre del circuito (p.ej. 'boletas', 'emergencias')
+
+    Returns:
+        CircuitBreaker o None si está deshabilitado
+    """
+    config = getattr(settings, 'RAG_CONFIG', {}).get('circuit_breaker', {})
+    if not config.get('enabled', True):
+        return None
+    breaker = CircuitBreaker(
+        name,
+        failure_rate_threshold=config.get('failure_rate_threshold', 0.5),
+        slow_call_seconds=config.get('slow_call_seconds', 15.0),
+        slow_call_rate_threshold=config.get('slow_call_rate_threshold', 0.8),
+        window_size=config.get('window_size', 20),
+        minimum_calls=config.get('minimum_calls', 5),
+        open_seconds=config.get('open_seconds', 30.0),
+        half_open_max_calls=config.get('half_open_max_calls', 1)
+    )
+    _breakers[name] = breaker
+    return breaker
+
+
+def get_circuit_breaker_status() -> Dict[str, Any]:
+    """
+    Obtiene el estado de todos los circuitos registrados
+
+    Returns:
+        Dict nombre → estado
+    """
+    return {name: breaker.get_status() for name, breaker in _breakers.items()}
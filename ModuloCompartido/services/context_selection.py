@@ -0,0 +1,244 @@
+"""
+Context Selection - Selección de fragmentos antes de armar el prompt
+Los chunks se cortan con chunk_overlap=200, así que el top-k de
+RAGRetriever.retrieve suele traer el mismo texto repetido (el final de un
+chunk es el comienzo del siguiente) y el presupuesto del prompt se gasta en
+repeticiones. Entre la recuperación y el formateo del contexto:
+
+1. Se recuperan 'fetch_k' candidatos y se eligen top_k con maximal marginal
+   relevance (MMR) sobre los embeddings ya guardados en la colección (no se
+   reembebe nada; la consulta sale de la caché de embeddings).
+2. Se descartan los candidatos cuyo texto ya está casi contenido en uno
+   elegido (trigramas de palabras compartidos).
+3. Los chunks elegidos contiguos del mismo archivo (chunk_index consecutivo)
+   se unen en un solo fragmento, quitando el texto solapado.
+"""
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+from django.conf import settings
+import logging
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r'\w+')
+# Solape mínimo (caracteres) para quitar el texto repetido al unir chunks
+_MIN_MERGE_OVERLAP = 20
+
+
+def get_context_selection_config() -> Dict[str, Any]:
+    """
+    Configuración de la selección de contexto (RAG_CONFIG['context_selection'])
+    """
+    config = getattr(settings, 'RAG_CONFIG', {}).get('context_selection', {})
+    return {
+        'enabled': config.get('enabled', True),
+        'fetch_k': config.get('fetch_k', 10),
+        'mmr_lambda': config.get('mmr_lambda', 0.7),
+        'max_overlap': config.get('max_overlap', 0.6),
+        'merge_adjacent': config.get('merge_adjacent', True),
+    }
+
+
+def _shingles(text: str, size: int = 3) -> FrozenSet[Tuple[str, ...]]:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return frozenset([tuple(words)]) if words else frozenset()
+    return frozenset(tuple(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def text_overlap(a: str, b: str) -> float:
+    """
+    Fracción del texto más corto que también aparece en el otro
+
+    Args:
+        a: Primer texto
+        b: Segundo texto
+
+    Returns:
+        Trigramas de palabras compartidos / trigramas del texto más corto (0 a 1)
+    """
+    shingles_a, shingles_b = _shingles(a), _shingles(b)
+    if not shingles_a or not shingles_b:
+        return 0.0
+    return len(shingles_a & shingles_b) / min(len(shingles_a), len(shingles_b))
+
+
+def mmr_order(
+    query_embedding: Sequence[float],
+    embeddings: Sequence[Sequence[float]],
+    lambda_mult: float = 0.7
+) -> List[int]:
+    """
+    Ordena candidatos por maximal marginal relevance
+
+    El primero se conserva (es el mejor resultado de la búsqueda híbrida);
+    los siguientes maximizan λ·sim(consulta, d) − (1 − λ)·max sim(d, elegidos).
+
+    Args:
+        query_embedding: Embedding de la consulta
+        embeddings: Embeddings de los candidatos (en el orden de la búsqueda)
+        lambda_mult: 1 = solo relevancia, 0 = solo diversidad
+
+    Returns:
+        Índices de los candidatos en orden de selección
+    """
+    if not len(embeddings):
+        return []
+    matrix = np.asarray(embeddings, dtype=np.float64)
+    matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+    query = np.asarray(query_embedding, dtype=np.float64)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = matrix @ query
+    similarity = matrix @ matrix.T
+    selected = [0]
+    remaining = list(range(1, len(matrix)))
+    while remaining:
+        redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        selected.append(remaining.pop(int(np.argmax(scores))))
+    return selected
+
+
+def merge_overlapping_text(first: str, second: str) -> str:
+    """
+    Une dos chunks consecutivos quitando el texto que se repite
+
+    Args:
+        first: Chunk anterior
+        second: Chunk siguiente (empieza con el final de first)
+
+    Returns:
+        Texto unido
+    """
+    first, second = first.rstrip(), second.lstrip()
+    for size in range(min(len(first), len(second)), _MIN_MERGE_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+
+def _chunk_position(document: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+    metadata = document.get('metadata') or {}
+    source = metadata.get('source_path') or metadata.get('source_file')
+    index = metadata.get('chunk_index')
+    if source is None or index is None:
+        return None
+    return source, int(index)
+
+
+def merge_adjacent_chunks(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Une los chunks contiguos del mismo archivo
+
+    El fragmento unido ocupa la posición del mejor de sus chunks y conserva
+    su relevancia; metadata['chunk_index'] pasa a ser el primero del tramo.
+
+    Args:
+        documents: Documentos elegidos (formato de RAGRetriever._format_results)
+
+    Returns:
+        Documentos con los tramos contiguos unidos, re-rankeados desde 1
+    """
+    positions = {}
+    for i, document in enumerate(documents):
+        position = _chunk_position(document)
+        if position is not None:
+            positions[position] = i
+
+    merged, consumed = [], set()
+    for i, document in enumerate(documents):
+        if i in consumed:
+            continue
+        position = _chunk_position(document)
+        if position is None:
+            merged.append(dict(document))
+            continue
+        source, index = position
+        start = index
+        while (source, start - 1) in positions:
+            start -= 1
+        members = []
+        while (source, start) in positions:
+            members.append(positions[(source, start)])
+            start += 1
+        consumed.update(members)
+        if len(members) == 1:
+            merged.append(dict(document))
+            continue
+
+        content = documents[members[0]]['content']
+        for member in members[1:]:
+            content = merge_overlapping_text(content, documents[member]['content'])
+        merged.append({
+            **document,
+            'content': content,
+            'metadata': {**document.get('metadata', {}), 'chunk_index': documents[members[0]]['metadata']['chunk_index']},
+            'merged_ids': [documents[member].get('id') for member in members],
+        })
+
+    for rank, document in enumerate(merged, 1):
+        document['rank'] = rank
+    return merged
+
+
+def select_context_documents(
+    candidates: List[Dict[str, Any]],
+    top_k: int,
+    query_embedding: Optional[Sequence[float]] = None,
+    embeddings: Optional[Dict[str, Sequence[float]]] = None,
+    config: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Elige top_k fragmentos diversos de los candidatos de la búsqueda
+
+    Sin embeddings (o si falta alguno) se mantiene el orden de la búsqueda y
+    solo se aplica el descarte por solape de texto y la unión de contiguos.
+
+    Args:
+        candidates: Resultados de RAGRetriever.retrieve (con 'id')
+        top_k: Fragmentos a elegir antes de unir contiguos
+        query_embedding: Embedding de la consulta
+        embeddings: Embeddings guardados por id de chunk
+        config: Configuración (default: get_context_selection_config())
+
+    Returns:
+        Tupla (documentos elegidos, estadísticas)
+    """
+    config = config or get_context_selection_config()
+    order = list(range(len(candidates)))
+    vectors = [(embeddings or {}).get(doc.get('id')) for doc in candidates]
+    used_mmr = query_embedding is not None and bool(candidates) and all(v is not None for v in vectors)
+    if used_mmr:
+        order = mmr_order(query_embedding, vectors, config['mmr_lambda'])
+
+    chosen, duplicates = [], 0
+    for i in order:
+        if len(chosen) >= top_k:
+            break
+        content = candidates[i]['content']
+        if any(text_overlap(content, candidates[j]['content']) >= config['max_overlap'] for j in chosen):
+            duplicates += 1
+            continue
+        chosen.append(i)
+
+    # Se presentan en el orden original de la búsqueda (el más relevante primero)
+    selected = [candidates[i] for i in sorted(chosen)]
+    chars_before = sum(len(doc['content']) for doc in selected)
+    if config['merge_adjacent']:
+        selected = merge_adjacent_chunks(selected)
+    else:
+        selected = [{**doc, 'rank': rank} for rank, doc in enumerate(selected, 1)]
+
+    stats = {
+        'candidates': len(candidates),
+        'selected': len(selected),
+        'duplicates': duplicates,
+        'merged': sum(len(doc.get('merged_ids', [])) - 1 for doc in selected if doc.get('merged_ids')),
+        'chars_saved': chars_before - sum(len(doc['content']) for doc in selected),
+        'mmr': int(used_mmr),
+    }
+    logger.debug(f"Selección de contexto: {stats}")
+    return selected, stats
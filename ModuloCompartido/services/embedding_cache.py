@@ -0,0 +1,122 @@
+"""
+Embedding Cache - Caché LRU de embeddings de consultas
+Cada búsqueda vectorial con query_texts obliga a Chroma a calcular el
+embedding de la consulta en CPU, y un mismo turno busca varias veces con el
+mismo texto (extracción, respuesta contextual, caché semántica). La caché
+guarda el embedding por texto (con los espacios colapsados) y el vector
+store consulta con query_embeddings.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from django.conf import settings
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normaliza una consulta para usarla como clave de la caché
+
+    Solo colapsa los espacios: mayúsculas, tildes y puntuación cambian el
+    embedding, así que "¿Cuánto debo?" y "cuanto debo" no comparten vector.
+
+    Args:
+        text: Consulta del usuario
+
+    Returns:
+        Texto con los espacios colapsados
+    """
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    Caché LRU acotada de embeddings de consultas (por proceso)
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Args:
+            max_entries: Embeddings máximos guardados antes de desalojar el menos usado
+        """
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, List[float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, text: str, compute: Callable[[str], List[float]]) -> List[float]:
+        """
+        Obtiene el embedding de una consulta, calculándolo solo si no está en caché
+
+        Args:
+            text: Consulta del usuario
+            compute: Calcula el embedding de un texto (p.ej. la función de la colección)
+
+        Returns:
+            Vector de embedding
+        """
+        key = normalize_query(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            self.misses += 1
+
+        # El cálculo queda fuera del lock para no serializar las búsquedas
+        embedding = compute(text)
+
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return embedding
+
+    def clear(self) -> None:
+        """
+        Vacía la caché (p.ej. al cambiar el modelo de embeddings)
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene estadísticas de la caché
+
+        Returns:
+            Dict con estadísticas
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0
+            }
+
+
+def build_query_embedding_cache() -> Optional[QueryEmbeddingCache]:
+    """
+    Crea la caché de embeddings según RAG_CONFIG['query_embedding_cache']
+
+    Returns:
+        QueryEmbeddingCache o None si está deshabilitada
+    """
+    config = getattr(settings, 'RAG_CONFIG', {}).get('query_embedding_cache', {})
+    if not config.get('enabled', True):
+        return None
+    return QueryEmbeddingCache(max_entries=config.get('max_entries', 1024))
@@ -0,0 +1,355 @@
+"""
+Embedding Function - Embeddings de sentence-transformers para ChromaDB
+RAG_CONFIG['embedding_model'] nombra un modelo multilingüe, pero ningún
+VectorStoreManager pasaba una función de embeddings: Chroma usaba su modelo
+por defecto (all-MiniLM-L6-v2, solo inglés) y get_model_info informaba el
+modelo configurado aunque no fuera el que se usaba.
+
+SentenceTransformerEmbedder carga el modelo configurado una sola vez por
+proceso (compartido por Boletas y Emergencia), desde un directorio local
+para funcionar sin red, y embebe en lotes de tamaño configurable con vectores
+normalizados y un número fijo de hilos de CPU.
+
+Cada colección guarda en sus metadatos el modelo con que se embebió. Si no
+coincide con el configurado, el VectorStoreManager sigue usando el modelo
+guardado (mezclar modelos en una misma colección da resultados sin sentido)
+hasta que se reembebe con 'python manage.py reembed_knowledge_base'.
+
+Con RAG_CONFIG['embedding']['backend'] = 'onnx' el mismo modelo, exportado a
+ONNX int8, se ejecuta con onnxruntime sin cargar torch (ver onnx_embedding.py).
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+import logging
+import threading
+import time
+
+import numpy as np
+
+from .lazy_import import lazy_module
+from .onnx_embedding import OnnxSentenceEncoder, get_onnx_model_dir
+
+logger = logging.getLogger(__name__)
+
+# Diferidos hasta la primera llamada (torch tarda segundos en importarse)
+sentence_transformers = lazy_module('sentence_transformers')
+torch = lazy_module('torch')
+embedding_functions = lazy_module('chromadb.utils.embedding_functions')
+
+DEFAULT_MODEL = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+
+# Modelo de DefaultEmbeddingFunction de Chroma (colecciones creadas sin función explícita)
+CHROMA_DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+
+
+def get_embedding_config() -> Dict[str, Any]:
+    """
+    Configuración de embeddings (RAG_CONFIG['embedding'] + RAG_CONFIG['embedding_model'])
+
+    Returns:
+        Dict con model, backend, cache_dir, local_files_only, device, batch_size,
+        threads, normalize, onnx_dir y onnx_quantized
+    """
+    rag_config = getattr(settings, 'RAG_CONFIG', {})
+    config = {
+        'model': rag_config.get('embedding_model', DEFAULT_MODEL),
+        'backend': 'sentence_transformers',
+        'cache_dir': None,
+        'local_files_only': False,
+        'device': 'cpu',
+        'batch_size': 32,
+        'threads': 0,
+        'normalize': True,
+        'onnx_dir': None,
+        'onnx_quantized': True,
+    }
+    config.update(rag_config.get('embedding', {}))
+    if not config['onnx_dir']:
+        base_dir = Path(config['cache_dir']) if config['cache_dir'] else Path(settings.BASE_DIR) / 'models'
+        config['onnx_dir'] = str(base_dir / 'onnx')
+    return config
+
+
+class SentenceTransformerEmbedder:
+    """
+    Función de embeddings de ChromaDB sobre sentence-transformers
+
+    Implementa el protocolo EmbeddingFunction de Chroma y se registra con el
+    nombre 'sentence_transformer', así que la colección queda legible también
+    con la función equivalente de Chroma.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        cache_dir: Optional[str] = None,
+        local_files_only: bool = False,
+        device: str = 'cpu',
+        batch_size: int = 32,
+        threads: int = 0,
+        normalize: bool = True
+    ):
+        """
+        Args:
+            model_name: Modelo de sentence-transformers
+            cache_dir: Directorio donde se descarga/busca el modelo (None = caché de Hugging Face)
+            local_files_only: Si True, no descarga nada (el modelo debe estar en cache_dir)
+            device: Dispositivo de torch ('cpu')
+            batch_size: Textos por lote al embeber
+            threads: Hilos de torch en CPU (0 = valor por defecto de torch)
+            normalize: Si True, los vectores se normalizan (norma 1)
+        """
+        self.model_name = model_name
+        self.cache_dir = str(cache_dir) if cache_dir else None
+        self.local_files_only = local_files_only
+        self.device = device
+        self.batch_size = max(1, int(batch_size))
+        self.threads = int(threads)
+        self.normalize = normalize
+
+        self._model = None
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'texts': 0, 'batches': 0, 'total_ms': 0.0, 'load_ms': None}
+
+    def _load_model(self) -> Any:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    started = time.perf_counter()
+                    if self.threads > 0:
+                        torch.set_num_threads(self.threads)
+                    self._model = sentence_transformers.SentenceTransformer(
+                        self.model_name,
+                        device=self.device,
+                        cache_folder=self.cache_dir,
+                        local_files_only=self.local_files_only
+                    )
+                    self._stats['load_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                    logger.info(
+                        f"Modelo de embeddings {self.model_name} cargado en {self._stats['load_ms']:.0f} ms"
+                    )
+        return self._model
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        texts = list(input)
+        if not texts:
+            return []
+        model = self._load_model()
+        started = time.perf_counter()
+        vectors = model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=self.normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['texts'] += len(texts)
+            self._stats['batches'] += -(-len(texts) // self.batch_size)
+            self._stats['total_ms'] += elapsed_ms
+        return [np.asarray(vector, dtype=np.float32) for vector in vectors]
+
+    def embed_query(self, input: List[str]) -> List[np.ndarray]:
+        return self(input)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Llamadas, textos y lotes embebidos, y tiempo promedio por texto
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['loaded'] = self._model is not None
+        stats['avg_ms_per_text'] = round(stats['total_ms'] / stats['texts'], 2) if stats['texts'] else 0.0
+        stats['total_ms'] = round(stats['total_ms'], 1)
+        return stats
+
+    # Protocolo EmbeddingFunction de ChromaDB
+
+    @staticmethod
+    def name() -> str:
+        return 'sentence_transformer'
+
+    def get_config(self) -> Dict[str, Any]:
+        # Mismo formato que SentenceTransformerEmbeddingFunction de Chroma
+        return {
+            'model_name': self.model_name,
+            'device': self.device,
+            'normalize_embeddings': self.normalize,
+            'kwargs': {},
+        }
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> Any:
+        # Con la configuración de lotes/hilos/backend de RAG_CONFIG
+        return build_embedding_function(config.get('model_name', DEFAULT_MODEL))
+
+    def default_space(self) -> str:
+        # L2 como NumpyCollection; con vectores normalizados l2² = 2·(1 − coseno)
+        return 'l2'
+
+    def supported_spaces(self) -> List[str]:
+        return ['cosine', 'l2', 'ip']
+
+    def is_legacy(self) -> bool:
+        return False
+
+    @staticmethod
+    def validate_config(config: Dict[str, Any]) -> None:
+        if not config.get('model_name'):
+            raise ValueError("La configuración de embeddings requiere model_name")
+
+    def validate_config_update(self, old_config: Dict[str, Any], new_config: Dict[str, Any]) -> None:
+        if 'model_name' in new_config and new_config['model_name'] != old_config.get('model_name'):
+            raise ValueError("El modelo de una colección no se cambia: hay que reembeberla")
+
+
+class OnnxEmbedder(SentenceTransformerEmbedder):
+    """
+    El mismo modelo exportado a ONNX (int8) y ejecutado con onnxruntime
+
+    Se presenta a Chroma igual que SentenceTransformerEmbedder (mismo nombre y
+    modelo): los vectores coinciden con los del modelo float, así que cambiar
+    de backend no obliga a reembeber.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, onnx_dir: Optional[str] = None, quantized: bool = True, **kwargs):
+        """
+        Args:
+            model_name: Modelo de sentence-transformers exportado
+            onnx_dir: Directorio base de los modelos ONNX
+            quantized: Si True usa model_int8.onnx
+            **kwargs: batch_size, threads, normalize (como SentenceTransformerEmbedder)
+        """
+        super().__init__(model_name, **kwargs)
+        self.model_dir = get_onnx_model_dir(model_name, onnx_dir or get_embedding_config()['onnx_dir'])
+        self.quantized = quantized
+
+    def _load_model(self) -> Any:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    started = time.perf_counter()
+                    self._model = OnnxSentenceEncoder(self.model_dir, threads=self.threads, quantized=self.quantized)
+                    self._stats['load_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                    logger.info(
+                        f"Modelo ONNX {'int8' if self.quantized else 'float32'} de {self.model_name} "
+                        f"cargado en {self._stats['load_ms']:.0f} ms"
+                    )
+        return self._model
+
+
+def get_embedding_model_name(embedding_function: Any) -> str:
+    """
+    Nombre del modelo de una función de embeddings (la de Chroma por defecto no lo expone)
+    """
+    return getattr(embedding_function, 'model_name', CHROMA_DEFAULT_MODEL)
+
+
+def get_stored_embedding_model(metadata: Optional[Dict[str, Any]], ef_config: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Modelo con el que se embebió una colección existente
+
+    Args:
+        metadata: Metadatos de la colección ('embedding_model' desde esta versión)
+        ef_config: Función de embeddings persistida por Chroma (configuration_json)
+
+    Returns:
+        Nombre del modelo (CHROMA_DEFAULT_MODEL para colecciones anteriores)
+    """
+    if metadata and metadata.get('embedding_model'):
+        return metadata['embedding_model']
+    if ef_config and ef_config.get('name') == 'sentence_transformer':
+        return (ef_config.get('config') or {}).get('model_name', CHROMA_DEFAULT_MODEL)
+    return CHROMA_DEFAULT_MODEL
+
+
+def build_embedding_function(model_name: str) -> Any:
+    """
+    Crea la función de embeddings de un modelo con la configuración de lotes/hilos
+
+    Args:
+        model_name: Modelo (CHROMA_DEFAULT_MODEL = DefaultEmbeddingFunction de Chroma)
+
+    Returns:
+        Función de embeddings
+    """
+    if model_name == CHROMA_DEFAULT_MODEL:
+        return embedding_functions.DefaultEmbeddingFunction()
+    config = get_embedding_config()
+    if config['backend'] == 'onnx':
+        return OnnxEmbedder(
+            model_name=model_name,
+            onnx_dir=config['onnx_dir'],
+            quantized=config['onnx_quantized'],
+            batch_size=config['batch_size'],
+            threads=config['threads'],
+            normalize=config['normalize']
+        )
+    return SentenceTransformerEmbedder(
+        model_name=model_name,
+        cache_dir=config['cache_dir'],
+        local_files_only=config['local_files_only'],
+        device=config['device'],
+        batch_size=config['batch_size'],
+        threads=config['threads'],
+        normalize=config['normalize']
+    )
+
+
+# Un modelo cargado por proceso, compartido por ambos módulos
+_embedding_functions: Dict[str, Any] = {}
+_registry_lock = threading.Lock()
+
+
+def get_embedding_function(model_name: Optional[str] = None) -> Any:
+    """
+    Obtiene la función de embeddings compartida de un modelo
+
+    Args:
+        model_name: Modelo (None = RAG_CONFIG['embedding_model'])
+
+    Returns:
+        Función de embeddings (el modelo se carga en la primera llamada)
+    """
+    model_name = model_name or get_embedding_config()['model']
+    with _registry_lock:
+        embedding_function = _embedding_functions.get(model_name)
+        if embedding_function is None:
+            embedding_function = build_embedding_function(model_name)
+            _embedding_functions[model_name] = embedding_function
+        return embedding_function
+
+
+def describe_embedding_function(embedding_function: Any) -> Dict[str, Any]:
+    """
+    Información de la función de embeddings activa (para get_model_info y stats)
+    """
+    if not isinstance(embedding_function, SentenceTransformerEmbedder):
+        return {
+            'embedding_model': get_embedding_model_name(embedding_function),
+            'provider': 'ChromaDB DefaultEmbeddingFunction (ONNX)',
+        }
+    if isinstance(embedding_function, OnnxEmbedder):
+        provider = f"onnxruntime ({'int8' if embedding_function.quantized else 'float32'})"
+    else:
+        provider = 'sentence-transformers'
+    return {
+        'embedding_model': embedding_function.model_name,
+        'provider': provider,
+        'device': embedding_function.device,
+        'batch_size': embedding_function.batch_size,
+        'threads': embedding_function.threads,
+        'normalized': embedding_function.normalize,
+        'embedding_stats': embedding_function.get_stats(),
+    }
+
+
+def reset_embedding_functions() -> None:
+    """
+    Olvida las funciones de embeddings creadas (para tests)
+    """
+    with _registry_lock:
+        _embedding_functions.clear()
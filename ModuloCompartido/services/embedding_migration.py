@@ -0,0 +1,177 @@
+"""
+Embedding Migration - Cambio de modelo de embeddings de una colección
+Los vectores de una colección solo son comparables con consultas embebidas
+por el mismo modelo. Al abrir una colección se usa el modelo con que se
+embebió (guardado en sus metadatos); si RAG_CONFIG['embedding_model'] es
+otro, reembed_collection vuelve a embeber los mismos chunks con el modelo
+nuevo, sin volver a leer ni dividir los archivos.
+
+La migración está protegida:
+- Antes de tocar la colección se prueba que el modelo nuevo carga y embebe
+  (sin red y sin el modelo en cache_dir no se borra nada).
+- Los chunks se respaldan en CHROMADB_PATH/<colección>.reembed.json; si el
+  proceso se interrumpe, la siguiente ejecución retoma desde el respaldo.
+- Al final se verifica que la colección tenga el mismo número de chunks.
+"""
+from pathlib import Path
+from typing import Any, Dict, Optional
+import json
+import logging
+import os
+import time
+
+from .chroma_registry import get_chroma_collection_info
+from .embedding_function import (
+    get_embedding_config,
+    get_embedding_function,
+    get_embedding_model_name,
+    get_stored_embedding_model,
+)
+from .vector_backends import NumpyCollection
+
+logger = logging.getLogger(__name__)
+
+# Chunks por llamada a collection.add (la función de embeddings los divide en lotes)
+ADD_BATCH_SIZE = 256
+
+
+def read_stored_embedding_model(chroma_path: Path, collection_name: str, backend: str) -> Optional[str]:
+    """
+    Modelo con el que se embebió una colección
+
+    Args:
+        chroma_path: Directorio de ChromaDB
+        collection_name: Nombre de la colección
+        backend: 'chroma' o 'numpy'
+
+    Returns:
+        Nombre del modelo, o None si la colección aún no existe
+    """
+    if backend == 'numpy':
+        metadata = NumpyCollection.read_metadata(Path(chroma_path) / f"{collection_name}.npz")
+        return None if metadata is None else get_stored_embedding_model(metadata)
+
+    info = get_chroma_collection_info(chroma_path, collection_name)
+    if info is None:
+        return None
+    return get_stored_embedding_model(info['metadata'], info['embedding_function'])
+
+
+def select_embedding_function(chroma_path: Path, collection_name: str, backend: str) -> Any:
+    """
+    Función de embeddings con la que se debe abrir una colección
+
+    Returns:
+        La del modelo configurado, o la del modelo guardado si la colección aún no se reembebe
+    """
+    configured = get_embedding_config()['model']
+    stored = read_stored_embedding_model(chroma_path, collection_name, backend)
+    if stored is not None and stored != configured:
+        logger.warning(
+            f"⚠️  {collection_name} está embebida con {stored} y RAG_CONFIG['embedding_model'] "
+            f"es {configured}: se sigue usando {stored} hasta ejecutar "
+            f"'python manage.py reembed_knowledge_base'"
+        )
+        return get_embedding_function(stored)
+    return get_embedding_function(configured)
+
+
+def get_reembed_status(vector_store: Any) -> Dict[str, Any]:
+    """
+    Modelo actual y configurado de la colección de un VectorStoreManager
+    """
+    current = get_embedding_model_name(vector_store.embedding_function)
+    target = get_embedding_config()['model']
+    backup_path = _backup_path(vector_store)
+    return {
+        'collection': vector_store.collection_name,
+        'current_model': current,
+        'target_model': target,
+        'document_count': vector_store.collection.count(),
+        'pending': current != target or backup_path.exists(),
+        'interrupted': backup_path.exists(),
+    }
+
+
+def _backup_path(vector_store: Any) -> Path:
+    return Path(vector_store.chroma_path) / f"{vector_store.collection_name}.reembed.json"
+
+
+def reembed_collection(vector_store: Any) -> Dict[str, Any]:
+    """
+    Reembebe la colección de un VectorStoreManager con el modelo configurado
+
+    Args:
+        vector_store: VectorStoreManager (Boletas o Emergencia)
+
+    Returns:
+        Dict con success, message, modelos, chunks y tiempos (ms)
+    """
+    started = time.perf_counter()
+    status = get_reembed_status(vector_store)
+    result = {
+        'collection': status['collection'],
+        'from_model': status['current_model'],
+        'to_model': status['target_model'],
+        'chunks': 0,
+        'resumed': status['interrupted'],
+    }
+    if not status['pending']:
+        return {**result, 'success': True, 'migrated': False, 'message': 'La colección ya usa el modelo configurado'}
+
+    # 1. Probar el modelo nuevo antes de tocar la colección
+    target = get_embedding_function(status['target_model'])
+    try:
+        probe_started = time.perf_counter()
+        target(['prueba de carga del modelo'])
+        result['load_ms'] = round((time.perf_counter() - probe_started) * 1000, 1)
+    except Exception as e:
+        logger.error(f"No se pudo cargar {status['target_model']}: {e}")
+        return {
+            **result, 'success': False, 'migrated': False,
+            'message': f"No se pudo cargar {status['target_model']} (la colección no se modificó): {e}"
+        }
+
+    # 2. Respaldar los chunks (o retomar una migración interrumpida)
+    backup_path = _backup_path(vector_store)
+    if backup_path.exists():
+        chunks = json.loads(backup_path.read_text(encoding='utf-8'))
+        logger.warning(f"Retomando migración interrumpida de {vector_store.collection_name}")
+    else:
+        data = vector_store.collection.get(include=['documents', 'metadatas'])
+        chunks = {'ids': data['ids'], 'documents': data['documents'], 'metadatas': data['metadatas']}
+        tmp_path = backup_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(chunks, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, backup_path)
+    result['chunks'] = len(chunks['ids'])
+
+    # 3. Recrear la colección (se abre con el modelo configurado) y embeber en lotes
+    embed_started = time.perf_counter()
+    if not vector_store.reset_collection():
+        return {**result, 'success': False, 'migrated': False, 'message': 'No se pudo reiniciar la colección'}
+    for start in range(0, len(chunks['ids']), ADD_BATCH_SIZE):
+        end = start + ADD_BATCH_SIZE
+        vector_store.collection.add(
+            documents=chunks['documents'][start:end],
+            metadatas=chunks['metadatas'][start:end],
+            ids=chunks['ids'][start:end]
+        )
+    result['embed_ms'] = round((time.perf_counter() - embed_started) * 1000, 1)
+
+    # 4. Verificar y limpiar
+    count = vector_store.collection.count()
+    if count != len(chunks['ids']):
+        return {
+            **result, 'success': False, 'migrated': False,
+            'message': f"La colección quedó con {count} de {len(chunks['ids'])} chunks; "
+                       f"el respaldo {backup_path.name} se conserva para reintentar"
+        }
+    vector_store.lexical_index.rebuild()
+    vector_store.bump_collection_version()
+    backup_path.unlink()
+    result['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(
+        f"✅ {vector_store.collection_name} reembebida con {status['target_model']}: "
+        f"{count} chunks en {result['total_ms']:.0f} ms"
+    )
+    return {**result, 'success': True, 'migrated': True, 'message': f"{count} chunks reembebidos"}
@@ -0,0 +1,314 @@
+"""
+KB Ingest - Ingesta incremental de la base de conocimientos
+Cada ingesta completa volvía a leer, dividir y embeber todos los archivos.
+Este ingestor guarda un manifiesto (<colección>.manifest.json junto a
+ChromaDB) con el hash de cada archivo y los IDs de sus chunks, y en cada
+corrida:
+
+- embebe solo los chunks nuevos de los archivos agregados o modificados,
+- elimina los chunks que ya no existen (archivos editados o borrados),
+- deja intactos los archivos sin cambios.
+
+Los IDs de chunk se derivan de (ruta relativa, índice, contenido), así que
+un chunk que no cambió conserva su ID y su embedding.
+"""
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.utils import timezone
+import hashlib
+import json
+import logging
+import os
+import time
+
+from .parallel_loader import load_files
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.txt', '.pdf', '.doc', '.docx', '.md')
+MANIFEST_VERSION = 1
+
+# (contenido, metadatos) de cada chunk de un archivo
+ChunkFile = Callable[[Path], List[Tuple[str, Dict[str, Any]]]]
+
+
+def file_sha256(path: Path) -> str:
+    """
+    Hash SHA-256 del contenido de un archivo
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_id(prefix: str, relative_path: str, index: int, content: str) -> str:
+    """
+    ID estable de un chunk: no cambia mientras no cambien su archivo, posición y texto
+    """
+    digest = hashlib.md5(f"{relative_path}\x00{index}\x00{content}".encode('utf-8')).hexdigest()
+    return f"{prefix}_{digest[:16]}"
+
+
+class IncrementalIngester:
+    """
+    Sincroniza una colección del vector store con su directorio knowledge_base
+    """
+
+    def __init__(
+        self,
+        vector_store: Any,
+        kb_path: Path,
+        chunk_file: ChunkFile,
+        id_prefix: str,
+        manifest_path: Optional[Path] = None
+    ):
+        """
+        Args:
+            vector_store: VectorStoreManager del módulo (upsert_documents, delete_documents, reset_collection)
+            kb_path: Directorio knowledge_base
+            chunk_file: Carga y divide un archivo en (contenido, metadatos); función de
+                módulo para poder ejecutarse en el pool de procesos
+            id_prefix: Prefijo de los IDs de chunk (ej: 'boleta_chunk')
+            manifest_path: Archivo del manifiesto (default: CHROMADB_PATH/<colección>.manifest.json)
+        """
+        self.vector_store = vector_store
+        self.kb_path = Path(kb_path)
+        self.chunk_file = chunk_file
+        self.id_prefix = id_prefix
+        self.manifest_path = Path(manifest_path) if manifest_path else (
+            Path(settings.CHROMADB_PATH) / f"{vector_store.collection_name}.manifest.json"
+        )
+
+    def _chunk_config(self) -> Dict[str, Any]:
+        # Si cambia la división en chunks, todos los IDs cambian: se reingesta todo
+        return {
+            'chunk_size': settings.RAG_CONFIG.get('chunk_size', 1000),
+            'chunk_overlap': settings.RAG_CONFIG.get('chunk_overlap', 200),
+        }
+
+    def load_manifest(self) -> Optional[Dict[str, Any]]:
+        """
+        Lee el manifiesto de la última ingesta (None si no existe o es inválido)
+        """
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Manifiesto de ingesta inválido ({self.manifest_path}): {e}")
+            return None
+        if manifest.get('version') != MANIFEST_VERSION:
+            return None
+        return manifest
+
+    def _save_manifest(self, files: Dict[str, Dict[str, Any]]) -> None:
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'collection': self.vector_store.collection_name,
+            'chunk_config': self._chunk_config(),
+            'updated_at': timezone.now().isoformat(),
+            'files': files,
+        }
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def scan(self) -> List[Path]:
+        """
+        Archivos soportados del directorio knowledge_base, en orden estable
+        """
+        return sorted(
+            path for path in self.kb_path.rglob('*')
+            if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS
+        )
+
+    def _needs_full_rebuild(self, manifest: Optional[Dict[str, Any]]) -> Optional[str]:
+        count = self.vector_store.collection.count()
+        if manifest is None:
+            return 'sin manifiesto' if count else None
+        if manifest.get('chunk_config') != self._chunk_config():
+            return 'cambió la configuración de chunks'
+        expected = sum(len(entry['chunk_ids']) for entry in manifest.get('files', {}).values())
+        if expected != count:
+            return f'la colección tiene {count} chunks y el manifiesto {expected}'
+        return None
+
+    def run(self, force_reset: bool = False, workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ejecuta la ingesta incremental
+
+        Args:
+            force_reset: Si True, reinicia la colección y reingesta todo
+            workers: Procesos para cargar archivos (None = RAG_CONFIG['ingest']['workers'])
+
+        Returns:
+            Dict con el resultado, conteos por tipo de cambio y tiempos por etapa (ms)
+        """
+        timings: Dict[str, float] = {}
+        started_total = time.perf_counter()
+
+        manifest = self.load_manifest()
+        reason = 'solicitado (--reset)' if force_reset else self._needs_full_rebuild(manifest)
+        if reason:
+            logger.info(f"Reingesta completa de {self.vector_store.collection_name}: {reason}")
+            started = time.perf_counter()
+            self.vector_store.reset_collection()
+            timings['reset_ms'] = (time.perf_counter() - started) * 1000
+            manifest = None
+        previous: Dict[str, Dict[str, Any]] = (manifest or {}).get('files', {})
+
+        # 1. Detectar cambios (tamaño y fecha primero; hash solo si difieren)
+        started = time.perf_counter()
+        current: Dict[str, Dict[str, Any]] = {}
+        changed: List[Tuple[str, Path]] = []
+        hashed = 0
+        for path in self.scan():
+            relative = path.relative_to(self.kb_path).as_posix()
+            stat = path.stat()
+            entry = previous.get(relative)
+            if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+                current[relative] = entry
+                continue
+            sha256 = file_sha256(path)
+            hashed += 1
+            if entry and entry.get('sha256') == sha256:
+                current[relative] = {**entry, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                continue
+            current[relative] = {'sha256': sha256, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            changed.append((relative, path))
+        removed = [relative for relative in previous if relative not in current]
+        unchanged = len(current) - len(changed)
+        timings['scan_ms'] = (time.perf_counter() - started) * 1000
+
+        # 2. Cargar y dividir los archivos modificados (en paralelo) y calcular IDs estables
+        started = time.perf_counter()
+        upserts: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        stale_ids: List[str] = []
+        failed: List[str] = []
+        file_errors: Dict[str, str] = {}
+        file_timings: Dict[str, float] = {}
+        loaded_files = load_files([path for _, path in changed], self.chunk_file, workers)
+        for (relative, path), loaded in zip(changed, loaded_files):
+            file_timings[relative] = loaded['ms']
+            chunks = loaded['result'] or []
+            if loaded['error'] or not chunks:
+                file_errors[relative] = loaded['error'] or 'No se generaron chunks'
+                # Se conserva lo anterior para reintentar en la próxima corrida
+                failed.append(relative)
+                if relative in previous:
+                    current[relative] = previous[relative]
+                else:
+                    del current[relative]
+                continue
+
+            old_ids = set(previous.get(relative, {}).get('chunk_ids', []))
+            chunk_ids = []
+            for index, (content, metadata) in enumerate(chunks):
+                chunk_id = make_chunk_id(self.id_prefix, relative, index, content)
+                chunk_ids.append(chunk_id)
+                if chunk_id not in old_ids:
+                    upserts[chunk_id] = (content, {
+                        **metadata,
+                        'source_file': path.name,
+                        'source_path': relative,
+                        'chunk_index': index,
+                        'chunk_id': chunk_id,
+                    })
+            stale_ids.extend(old_ids - set(chunk_ids))
+            current[relative]['chunk_ids'] = chunk_ids
+        for relative in removed:
+            stale_ids.extend(previous[relative].get('chunk_ids', []))
+        timings['chunk_ms'] = (time.perf_counter() - started) * 1000
+
+        # 3. Eliminar chunks obsoletos y embeber/insertar los nuevos
+        started = time.perf_counter()
+        if stale_ids and not self.vector_store.delete_documents(stale_ids):
+            return self._failure('Error al eliminar chunks obsoletos', timings, started_total)
+        timings['delete_ms'] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        if upserts:
+            ids = list(upserts)
+            if not self.vector_store.upsert_documents(
+                documents=[upserts[i][0] for i in ids],
+                metadatas=[upserts[i][1] for i in ids],
+                ids=ids
+            ):
+                return self._failure('Error al insertar chunks', timings, started_total)
+        timings['upsert_ms'] = (time.perf_counter() - started) * 1000
+
+        self._save_manifest(current)
+        timings['total_ms'] = (time.perf_counter() - started_total) * 1000
+
+        logger.info(
+            f"Ingesta de {self.vector_store.collection_name}: {len(changed) - len(failed)} archivos "
+            f"actualizados, {len(removed)} eliminados, {unchanged} sin cambios "
+            f"({len(upserts)} chunks embebidos, {len(stale_ids)} eliminados) en {timings['total_ms']:.0f} ms"
+        )
+        return {
+            'success': not failed,
+            'message': 'Ingesta incremental completada' if not failed else
+                       f"No se pudieron procesar: {', '.join(failed)}",
+            'full_rebuild': bool(reason),
+            'rebuild_reason': reason,
+            'files_total': len(current),
+            'files_changed': len(changed) - len(failed),
+            'files_unchanged': unchanged,
+            'files_removed': len(removed),
+            'files_failed': failed,
+            'file_errors': file_errors,
+            'file_timings_ms': file_timings,
+            'files_hashed': hashed,
+            'chunks_total': sum(len(entry.get('chunk_ids', [])) for entry in current.values()),
+            'chunks_upserted': len(upserts),
+            'chunks_deleted': len(stale_ids),
+            'timings_ms': {name: round(value, 1) for name, value in timings.items()},
+        }
+
+    def _failure(self, message: str, timings: Dict[str, float], started_total: float) -> Dict[str, Any]:
+        # El manifiesto no se actualiza: la próxima corrida reintenta los mismos cambios
+        timings['total_ms'] = (time.perf_counter() - started_total) * 1000
+        logger.error(f"{message} en {self.vector_store.collection_name}")
+        return {
+            'success': False,
+            'message': message,
+            'timings_ms': {name: round(value, 1) for name, value in timings.items()},
+        }
+
+
+def format_ingest_report(result: Dict[str, Any]) -> List[str]:
+    """
+    Líneas del reporte de una ingesta para los comandos de manage.py
+
+    Args:
+        result: Resultado de IncrementalIngester.run
+
+    Returns:
+        Lista de líneas
+    """
+    lines = []
+    if result.get('full_rebuild'):
+        lines.append(f"  🔄 Reingesta completa: {result.get('rebuild_reason')}")
+    lines.extend([
+        f"  📁 Archivos: {result.get('files_total', 0)} "
+        f"({result.get('files_changed', 0)} nuevos/modificados, "
+        f"{result.get('files_unchanged', 0)} sin cambios, {result.get('files_removed', 0)} eliminados)",
+        f"  📄 Chunks: {result.get('chunks_total', 0)} en la colección "
+        f"({result.get('chunks_upserted', 0)} embebidos, {result.get('chunks_deleted', 0)} eliminados)",
+    ])
+    for relative, ms in sorted(result.get('file_timings_ms', {}).items(), key=lambda item: -item[1]):
+        error = result.get('file_errors', {}).get(relative)
+        lines.append(f"     {'❌' if error else '·'} {relative}: {ms:.0f} ms" + (f" ({error})" if error else ''))
+    if result.get('files_failed'):
+        lines.append(f"  ⚠️  Sin procesar (se reintentan en la próxima corrida): {', '.join(result['files_failed'])}")
+    timings = result.get('timings_ms', {})
+    if timings:
+        stages = ', '.join(f"{name[:-3]} {value:.0f} ms" for name, value in timings.items() if name != 'total_ms')
+        lines.append(f"  ⏱️  Total {timings.get('total_ms', 0):.0f} ms ({stages})")
+    return lines
@@ -0,0 +1,78 @@
+"""
+Lazy Import - Importación diferida de dependencias pesadas
+google.generativeai, chromadb y los loaders de LangChain (con unstructured,
+nltk y torch detrás) tardan segundos en importarse. Como las vistas los
+importaban al cargar el URLconf, cada comando de manage.py, migración,
+petición al admin y corrida de tests pagaba ese costo aunque nunca usara el
+chatbot.
+
+lazy_module devuelve un módulo sustituto que importa el real en el primer
+acceso a un atributo. Sigue siendo un atributo del módulo que lo declara, de
+modo que patch('...chatbot_service.genai') funciona igual que antes.
+"""
+from typing import Any, Dict
+import importlib
+import logging
+import threading
+import time
+import types
+
+logger = logging.getLogger(__name__)
+
+_load_times: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    """
+    Módulo sustituto que importa el módulo real al primer uso
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__['_module']
+        if module is None:
+            with _lock:
+                module = self.__dict__['_module']
+                if module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    _load_times[self.__name__] = round(elapsed_ms, 1)
+                    self.__dict__['_module'] = module
+                    logger.info(f"Módulo {self.__name__} importado en {elapsed_ms:.0f} ms")
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = 'cargado' if self.__dict__['_module'] is not None else 'diferido'
+        return f"<módulo {self.__name__} ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    """
+    Declara un import diferido
+
+    Args:
+        name: Nombre completo del módulo (ej: 'google.generativeai')
+
+    Returns:
+        Sustituto que importa el módulo en el primer acceso a un atributo
+    """
+    return LazyModule(name)
+
+
+def get_lazy_import_stats() -> Dict[str, float]:
+    """
+    Módulos diferidos ya importados en el proceso y lo que tardó cada uno (ms)
+    """
+    with _lock:
+        return dict(_load_times)
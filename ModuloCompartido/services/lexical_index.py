@@ -0,0 +1,356 @@
+"""
+Lexical Index - Índice BM25 sobre los chunks de la base de conocimiento
+Los usuarios escriben términos exactos ("cargo fijo", "m³", nombres de
+sectores, teléfonos) que el embedding MiniLM ordena mal. Este índice léxico
+se construye al ingestar sobre los mismos chunks de la colección y se
+combina con la búsqueda vectorial mediante reciprocal-rank fusion (RRF) en
+RAGRetriever.retrieve.
+
+El índice se guarda junto a ChromaDB (<colección>.bm25.json) y cada worker lo
+recarga cuando otro proceso ingesta.
+"""
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from django.conf import settings
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from .vector_backends import matches_where
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r'[a-z0-9]+')
+# Separadores dentro de números: "600 123 4567" y "+56 9 1234-5678" quedan en un solo token
+_DIGIT_SEPARATORS = re.compile(r'(?<=\d)[\s\-.](?=\d)')
+_VOWELS = set('aeiou')
+
+_STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes como con contra cual cuales cuando de del
+desde donde e el ella ellas ellos en entre era es esa esas ese eso esos esta estan estas este esto
+estos fue ha hay la las le les lo los mas me mi mis muy no nos o os para pero por que se ser si sin
+sobre su sus te tengo ti tu tus un una unas uno unos y ya yo
+""".split())
+
+
+def _fold_plural(token: str) -> str:
+    # Plural regular del español: "boletas" -> "boleta", "sectores" -> "sector"
+    if len(token) > 5 and token.endswith('es') and token[-3] not in _VOWELS:
+        return token[:-2]
+    if len(token) > 4 and token.endswith('s') and not token[-2].isdigit():
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokeniza texto en español para el índice léxico
+
+    Minúsculas, sin tildes (NFKD: "m³" -> "m3"), números con separadores
+    unidos, sin stopwords y con el plural regular plegado.
+
+    Args:
+        text: Texto a tokenizar
+
+    Returns:
+        Lista de términos
+    """
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = _DIGIT_SEPARATORS.sub('', text)
+    return [_fold_plural(token) for token in _WORD.findall(text) if token not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    Índice invertido con puntaje Okapi BM25
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        k1: float = 1.5,
+        b: float = 0.75
+    ):
+        """
+        Args:
+            ids: IDs de los chunks (los mismos de la colección vectorial)
+            documents: Textos de los chunks
+            metadatas: Metadatos de los chunks (para filtros where)
+            k1: Saturación de la frecuencia de término
+            b: Normalización por largo del documento
+        """
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = [metadata or {} for metadata in metadatas]
+        self.k1 = k1
+        self.b = b
+
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        for index, document in enumerate(self.documents):
+            terms = tokenize(document or '')
+            self.doc_lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                self.postings.setdefault(term, []).append((index, frequency))
+
+        count = len(self.documents)
+        self.avg_length = (sum(self.doc_lengths) / count) if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(
+        self,
+        query: str,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, List[List[Any]]]:
+        """
+        Busca los chunks con mayor puntaje BM25
+
+        Args:
+            query: Consulta del usuario
+            n_results: Número máximo de resultados
+            where: Filtro de metadatos con la sintaxis de Chroma
+
+        Returns:
+            Dict con la forma de Chroma (ids, documents, metadatas, scores)
+        """
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, frequency in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[index] / (self.avg_length or 1))
+                scores[index] = scores.get(index, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        if where:
+            scores = {i: s for i, s in scores.items() if matches_where(self.metadatas[i], where)}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:n_results]
+        return {
+            'ids': [[self.ids[i] for i, _ in ranked]],
+            'documents': [[self.documents[i] for i, _ in ranked]],
+            'metadatas': [[self.metadatas[i] for i, _ in ranked]],
+            'scores': [[round(score, 4) for _, score in ranked]]
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'ids': self.ids,
+            'documents': self.documents,
+            'metadatas': self.metadatas,
+            'k1': self.k1,
+            'b': self.b
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'BM25Index':
+        return cls(data['ids'], data['documents'], data['metadatas'], data.get('k1', 1.5), data.get('b', 0.75))
+
+
+class LexicalIndexStore:
+    """
+    Índice BM25 persistido de una colección
+
+    rebuild() se llama al ingestar; search() recarga el archivo si otro
+    proceso lo reconstruyó y, si no existe pero la colección tiene chunks
+    (ingestas anteriores a este índice), lo construye una vez.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        load_chunks: Callable[[], Tuple[List[str], List[str], List[Dict[str, Any]]]]
+    ):
+        """
+        Args:
+            path: Archivo JSON del índice
+            load_chunks: Devuelve (ids, documentos, metadatos) de la colección
+        """
+        self.path = Path(path)
+        self._load_chunks = load_chunks
+        self._index: Optional[BM25Index] = None
+        self._mtime_ns: Optional[int] = None
+        self._lock = threading.Lock()
+
+        self.searches = 0
+        self.total_ms = 0.0
+
+    def rebuild(self) -> BM25Index:
+        """
+        Reconstruye el índice con los chunks actuales de la colección y lo guarda
+        """
+        ids, documents, metadatas = self._load_chunks()
+        index = BM25Index(ids, documents, metadatas)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._index = index
+            self._mtime_ns = self.path.stat().st_mtime_ns
+        logger.info(f"Índice léxico reconstruido: {len(ids)} chunks, {len(index.postings)} términos")
+        return index
+
+    def clear(self) -> None:
+        """
+        Elimina el índice (al reiniciar la colección)
+        """
+        with self._lock:
+            self._index = BM25Index([], [], [])
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+            self._mtime_ns = None
+
+    def search(
+        self,
+        query: str,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, List[List[Any]]]:
+        """
+        Busca en el índice léxico (ver BM25Index.search)
+        """
+        started = time.perf_counter()
+        results = self._get_index().search(query, n_results, where)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.searches += 1
+            self.total_ms += elapsed_ms
+        return results
+
+    def _get_index(self) -> BM25Index:
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+
+        with self._lock:
+            if self._index is not None and mtime_ns == self._mtime_ns:
+                return self._index
+            if mtime_ns is not None:
+                with open(self.path, encoding='utf-8') as f:
+                    self._index = BM25Index.from_dict(json.load(f))
+                self._mtime_ns = mtime_ns
+                return self._index
+
+        # Sin archivo: colección ingestada antes de existir el índice léxico
+        return self.rebuild()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene estadísticas del índice
+
+        Returns:
+            Dict con estadísticas
+        """
+        with self._lock:
+            index = self._index
+            return {
+                'documents': len(index.ids) if index else None,
+                'terms': len(index.postings) if index else None,
+                'searches': self.searches,
+                'avg_ms': round(self.total_ms / self.searches, 3) if self.searches else 0.0
+            }
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]],
+    k: int = 60,
+    weights: Optional[Sequence[float]] = None
+) -> List[Tuple[str, float]]:
+    """
+    Combina varios rankings con reciprocal-rank fusion
+
+    Cada documento suma weight / (k + posición) por cada ranking en que aparece.
+
+    Args:
+        rankings: Listas de IDs ordenadas de más a menos relevante
+        k: Constante de RRF (60 en la literatura)
+        weights: Peso de cada ranking (1.0 por defecto)
+
+    Returns:
+        Lista de (id, puntaje) ordenada por puntaje
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    first_seen: Dict[str, Tuple[int, int]] = {}
+    for ranking_index, (ranking, weight) in enumerate(zip(rankings, weights)):
+        for position, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + position)
+            first_seen.setdefault(doc_id, (position, ranking_index))
+    # Empates: se prefiere el que apareció antes (y en el primer ranking)
+    return sorted(scores.items(), key=lambda item: (-item[1], first_seen[item[0]]))
+
+
+def fuse_results(
+    vector_results: Dict[str, Any],
+    lexical_results: Dict[str, Any],
+    n_results: int,
+    rrf_k: int = 60,
+    weights: Optional[Sequence[float]] = None
+) -> Dict[str, List[List[Any]]]:
+    """
+    Fusiona resultados vectoriales y léxicos en un resultado con la forma de Chroma
+
+    Los chunks que solo encontró BM25 no tienen distancia vectorial: reciben
+    la mayor distancia entre los candidatos vectoriales (no se presentan como
+    más cercanos de lo que el vector store indicó).
+
+    Args:
+        vector_results: Resultado de VectorStoreManager.query
+        lexical_results: Resultado de LexicalIndexStore.search
+        n_results: Número de resultados finales
+        rrf_k: Constante de RRF
+        weights: Pesos (vectorial, léxico)
+
+    Returns:
+        Dict con ids, documents, metadatas y distances
+    """
+    chunks: Dict[str, Tuple[str, Dict[str, Any], Optional[float]]] = {}
+    rankings = []
+    for results, has_distance in ((vector_results, True), (lexical_results, False)):
+        ids = (results.get('ids') or [[]])[0]
+        documents = (results.get('documents') or [[]])[0]
+        metadatas = (results.get('metadatas') or [[]])[0]
+        distances = (results.get('distances') or [[]])[0] if has_distance else []
+        for i, doc_id in enumerate(ids):
+            distance = distances[i] if i < len(distances) else None
+            if doc_id not in chunks or chunks[doc_id][2] is None:
+                chunks[doc_id] = (documents[i], metadatas[i] if i < len(metadatas) else {}, distance)
+        rankings.append(ids)
+
+    known = [chunk[2] for chunk in chunks.values() if chunk[2] is not None]
+    fallback_distance = max(known) if known else 1.0
+
+    fused = reciprocal_rank_fusion(rankings, k=rrf_k, weights=weights)[:n_results]
+    return {
+        'ids': [[doc_id for doc_id, _ in fused]],
+        'documents': [[chunks[doc_id][0] for doc_id, _ in fused]],
+        'metadatas': [[chunks[doc_id][1] for doc_id, _ in fused]],
+        'distances': [[
+            chunks[doc_id][2] if chunks[doc_id][2] is not None else fallback_distance
+            for doc_id, _ in fused
+        ]]
+    }
+
+
+def get_hybrid_config() -> Dict[str, Any]:
+    """
+    Configuración de la búsqueda híbrida (RAG_CONFIG['hybrid_search'])
+    """
+    return getattr(settings, 'RAG_CONFIG', {}).get('hybrid_search', {})
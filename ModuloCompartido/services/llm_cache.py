@@ -0,0 +1,421 @@
+"""
+LLM Cache - Caché exacta de prompts/respuestas para Gemini
+Envuelve las llamadas a generate_content de ambos ChatbotService para que
+un prompt idéntico (mismo modelo, prompt y generation_config) no se pague
+dos veces, p.ej. en extracciones deterministas o reintentos del cliente.
+"""
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Dict, Any, Optional
+from django.conf import settings
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from .circuit_breaker import CircuitBreaker, build_circuit_breaker
+from .llm_providers import get_finish_reason
+from .quota import QuotaExceeded, estimate_tokens, get_quota_accountant, is_quota_error
+from .single_flight import single_flight, cross_process_lock
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCacheBackend:
+    """
+    Backend LRU en memoria del proceso
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoCacheBackend:
+    """
+    Backend sobre el framework de caché de Django (settings.CACHES)
+
+    El alias puede ser compartido (sesiones, throttles...), así que las
+    entradas llevan como versión un número de generación guardado en el
+    mismo alias: clear() lo incrementa y las entradas anteriores dejan de
+    leerse hasta que expiran por TTL, sin tocar el resto de la caché.
+    """
+
+    def __init__(self, alias: str = 'default', key_prefix: str = 'llm_cache'):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+        self._generation_key = f"{key_prefix}:generation"
+
+    def _generation(self) -> int:
+        generation = self.cache.get(self._generation_key)
+        if generation is None:
+            # add() no pisa la generación que otro worker acaba de crear
+            self.cache.add(self._generation_key, 1, timeout=None)
+            generation = self.cache.get(self._generation_key) or 1
+        return generation
+
+    def get(self, key: str) -> Optional[str]:
+        return self.cache.get(f"{self.key_prefix}:{key}", version=self._generation())
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self.cache.set(f"{self.key_prefix}:{key}", value, timeout=ttl, version=self._generation())
+
+    def clear(self) -> None:
+        try:
+            self.cache.incr(self._generation_key)
+        except ValueError:
+            # Sin generación guardada (nunca se usó o se desalojó): empezar otra
+            self.cache.set(self._generation_key, self._generation() + 1, timeout=None)
+
+
+class SQLiteCacheBackend:
+    """
+    Backend en un archivo SQLite compartido por todos los workers
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Una conexión por operación: seguro entre hilos y procesos
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl)
+            )
+            conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+
+class CachedResponse:
+    """
+    Respuesta servida desde la caché (expone .text como la de Gemini)
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.from_cache = True
+
+
+# Contadores de aciertos/fallos por punto de llamada (compartidos en el proceso)
+_stats: Dict[str, Dict[str, int]] = {}
+_stats_lock = threading.Lock()
+
+
+def _record(call_site: str, outcome: str) -> None:
+    with _stats_lock:
+        site = _stats.setdefault(call_site, {'hits': 0, 'misses': 0, 'bypassed': 0})
+        site[outcome] += 1
+
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    """
+    Obtiene los contadores de la caché de LLM
+
+    Returns:
+        Dict con totales y detalle por punto de llamada
+    """
+    with _stats_lock:
+        per_site = {site: dict(counts) for site, counts in _stats.items()}
+    hits = sum(c['hits'] for c in per_site.values())
+    misses = sum(c['misses'] for c in per_site.values())
+    total = hits + misses
+    return {
+        'backend': _get_config().get('backend', 'memory'),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 3) if total else 0.0,
+        'call_sites': per_site
+    }
+
+
+class CachedGenerativeModel:
+    """
+    Envoltorio de un GenerativeModel con caché exacta de respuestas
+
+    La clave es (modelo, hash del prompt, generation_config). Las llamadas en
+    streaming y las marcadas con bypass_cache=True van directo al modelo.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        model_name: str,
+        backend: Optional[Any] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        """
+        Args:
+            model: Modelo subyacente (google.generativeai.GenerativeModel)
+            model_name: Nombre del modelo (parte de la clave)
+            backend: Backend de caché; None deshabilita la caché
+            breaker: Circuit breaker de las llamadas de red (opcional)
+        """
+        self.model = model
+        self.model_name = model_name
+        self.backend = backend
+        self.breaker = breaker
+        config = _get_config()
+        self.default_ttl = config.get('default_ttl', 300)
+        self.ttls = config.get('ttls', {})
+
+    def generate_content(
+        self,
+        prompt: Any,
+        generation_config: Optional[Dict[str, Any]] = None,
+        call_site: str = 'default',
+        bypass_cache: bool = False,
+        **kwargs
+    ) -> Any:
+        """
+        Genera contenido usando la caché cuando es posible
+
+        Args:
+            prompt: Prompt para el modelo
+            generation_config: Configuración de generación
+            call_site: Nombre del punto de llamada (define el TTL y los contadores)
+            bypass_cache: Si True, ignora la caché para esta llamada
+            **kwargs: Argumentos adicionales para el modelo (p.ej. stream)
+
+        Returns:
+            Respuesta del modelo o CachedResponse
+        """
+        if generation_config is not None:
+            kwargs['generation_config'] = generation_config
+
+        if bypass_cache or kwargs.get('stream'):
+            _record(call_site, 'bypassed')
+            return self._call_model(prompt, kwargs)
+
+        key = self._make_key(prompt, generation_config)
+        cached = self._cache_get(key)
+        if cached is not None:
+            _record(call_site, 'hits')
+            logger.info(f"Respuesta de LLM servida desde caché ({call_site})")
+            return CachedResponse(cached)
+
+        _record(call_site, 'misses')
+        # Llamadas idénticas concurrentes comparten una sola generación
+        return single_flight(
+            f"llm:{key}",
+            lambda: self._generate_and_store(key, prompt, kwargs, call_site)
+        )
+
+    def _generate_and_store(
+        self,
+        key: str,
+        prompt: Any,
+        kwargs: Dict[str, Any],
+        call_site: str
+    ) -> Any:
+        """
+        Llama al modelo y guarda la respuesta en la caché
+
+        Con un backend compartido (django/sqlite) y single_flight.cross_process
+        activo, los workers se coordinan con un lock file: quien espera el lock
+        vuelve a consultar la caché antes de llamar al modelo.
+        """
+        with cross_process_lock(f"llm:{key}") if self.backend is not None else nullcontext():
+            cached = self._cache_get(key)
+            if cached is not None:
+                return CachedResponse(cached)
+
+            response = self._call_model(prompt, kwargs)
+
+            if self.backend is None:
+                return response
+
+            try:
+                text = response.text
+            except Exception:
+                # Respuestas bloqueadas o sin texto no se cachean
+                return response
+            
+            if get_finish_reason(response) == 'MAX_TOKENS':
+                # Respuestas truncadas tampoco: quien llama las continúa
+                return response
+
+            if isinstance(text, str) and text.strip():
+                ttl = self.ttls.get(call_site, self.default_ttl)
+                try:
+                    self.backend.set(key, text, ttl)
+                except Exception as e:
+                    logger.warning(f"Error escribiendo caché de LLM: {e}")
+
+            return response
+
+    def circuit_open(self) -> bool:
+        """
+        Indica si el circuito está abierto (las llamadas se rechazarían)
+        """
+        return self.breaker is not None and self.breaker.is_open()
+
+    def _call_model(self, prompt: Any, kwargs: Dict[str, Any]) -> Any:
+        """
+        Llama al modelo pasando por el circuit breaker y el control de cuota
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto (sin ir a la red)
+            QuotaExceeded: Si la llamada excedería RPM/TPM (sin ir a la red)
+        """
+        if self.breaker is not None:
+            self.breaker.before_call()
+
+        accountant = get_quota_accountant()
+        estimated = estimate_tokens(prompt, kwargs.get('generation_config'))
+        if accountant is not None:
+            try:
+                accountant.try_acquire(estimated)
+            except QuotaExceeded:
+                if self.breaker is not None:
+                    self.breaker.cancel_call()
+                raise
+
+        started = time.monotonic()
+        try:
+            response = self.model.generate_content(prompt, **kwargs)
+        except Exception as e:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            if accountant is not None and is_quota_error(e):
+                accountant.report_rate_limited()
+            raise
+
+        if kwargs.get('stream'):
+            if self.breaker is not None:
+                return self.breaker.track_stream(response, started)
+            return response
+
+        if self.breaker is not None:
+            self.breaker.record_success(time.monotonic() - started)
+        if accountant is not None:
+            usage = getattr(response, 'usage_metadata', None)
+            total = getattr(usage, 'total_token_count', None)
+            if isinstance(total, int):
+                accountant.record_usage(estimated, total)
+        return response
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        """
+        Lee la caché tolerando errores del backend
+        """
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Error leyendo caché de LLM: {e}")
+            return None
+
+    def _make_key(self, prompt: Any, generation_config: Optional[Dict[str, Any]]) -> str:
+        """
+        Construye la clave de caché a partir del modelo, prompt y configuración
+        """
+        prompt_hash = hashlib.sha256(
+            json.dumps(prompt, ensure_ascii=False, default=str).encode('utf-8')
+        ).hexdigest()
+        config_text = json.dumps(generation_config or {}, sort_keys=True, default=str)
+        raw = f"{self.model_name}|{prompt_hash}|{config_text}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def __getattr__(self, name: str) -> Any:
+        # Delegar el resto de atributos (model_name, count_tokens, ...) al modelo
+        return getattr(self.model, name)
+
+
+def _get_config() -> Dict[str, Any]:
+    return getattr(settings, 'RAG_CONFIG', {}).get('llm_cache', {})
+
+
+def build_llm_cache_backend() -> Optional[Any]:
+    """
+    Crea el backend de caché configurado en RAG_CONFIG['llm_cache']
+
+    Returns:
+        Backend de caché o None si está deshabilitada
+    """
+    config = _get_config()
+    if not config.get('enabled', True):
+        return None
+
+    backend = config.get('backend', 'memory')
+    try:
+        if backend == 'django':
+            return DjangoCacheBackend(alias=config.get('django_cache_alias', 'default'))
+        if backend == 'sqlite':
+            path = config.get('sqlite_path') or settings.BASE_DIR / 'llm_cache.sqlite3'
+            return SQLiteCacheBackend(path)
+        return MemoryCacheBackend(max_entries=config.get('max_entries', 512))
+    except Exception as e:
+        logger.warning(f"No se pudo inicializar la caché de LLM ({backend}): {e}")
+        return None
+
+
+def wrap_model(
+    model: Any,
+    model_name: str,
+    breaker_name: Optional[str] = None
+) -> CachedGenerativeModel:
+    """
+    Envuelve un modelo de Gemini con la caché y el circuit breaker configurados
+
+    Args:
+        model: Modelo de Gemini
+        model_name: Nombre del modelo
+        breaker_name: Nombre del circuito del servicio (None: sin circuito)
+
+    Returns:
+        CachedGenerativeModel
+    """
+    breaker = build_circuit_breaker(breaker_name) if breaker_name else None
+    return CachedGenerativeModel(model, model_name, build_llm_cache_backend(), breaker)
@@ -0,0 +1,322 @@
+"""
+LLM Providers - Backends intercambiables detrás de ChatbotService.model
+Todos exponen generate_content(prompt, generation_config=None, stream=False)
+como google.generativeai.GenerativeModel, de modo que la caché, el circuit
+breaker y el control de cuota funcionan igual con cualquiera de ellos:
+
+- gemini: google.generativeai (producción)
+- stub: servidor HTTP local con latencia y fallos configurables (pruebas de carga)
+- cassette: reproduce respuestas grabadas en un archivo (benchmarks sin red)
+
+El backend se elige en RAG_CONFIG['llm_provider']['backend'].
+"""
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, Optional
+from django.conf import settings
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+
+class LLMProviderError(Exception):
+    """
+    Error de un backend de LLM distinto de Gemini (stub o cassette)
+
+    El mensaje incluye el código HTTP equivalente ("429 ...", "503 ...") para
+    que is_quota_error y el circuit breaker lo traten como un error de Gemini.
+    """
+
+
+class CassetteMiss(LLMProviderError):
+    """
+    La cassette no tiene una respuesta grabada para la llamada
+    """
+
+
+class LLMResponse:
+    """
+    Respuesta con la forma de la de Gemini (.text, .candidates, .usage_metadata)
+    """
+
+    def __init__(
+        self,
+        text: str,
+        finish_reason: str = 'STOP',
+        usage: Optional[Dict[str, int]] = None
+    ):
+        self.text = text
+        self.candidates = [SimpleNamespace(finish_reason=finish_reason)]
+        self.usage_metadata = SimpleNamespace(**usage) if usage else None
+
+
+def _json_prompt(prompt: Any) -> Any:
+    return prompt if isinstance(prompt, str) else json.loads(json.dumps(prompt, default=str))
+
+
+class HTTPStubModel:
+    """
+    Cliente del servidor stub (manage.py run_llm_stub)
+
+    Protocolo: POST {url}/generate con {prompt, generation_config, stream}.
+    Sin stream responde {text, finish_reason, usage}; con stream responde una
+    línea JSON por fragmento ({text}) y cierra la conexión.
+    """
+
+    def __init__(self, url: str, model_name: str = 'stub', timeout: float = 30.0):
+        """
+        Args:
+            url: URL base del servidor stub
+            model_name: Nombre del modelo (informativo)
+            timeout: Timeout de la petición HTTP en segundos
+        """
+        self.url = url.rstrip('/')
+        self.model_name = model_name
+        self.timeout = timeout
+
+    def generate_content(
+        self,
+        prompt: Any,
+        generation_config: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
+        **kwargs
+    ) -> Any:
+        body = json.dumps({
+            'model': self.model_name,
+            'prompt': _json_prompt(prompt),
+            'generation_config': generation_config or {},
+            'stream': bool(stream)
+        }, ensure_ascii=False).encode('utf-8')
+        request = urllib.request.Request(
+            f"{self.url}/generate",
+            data=body,
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode('utf-8', errors='replace')
+            raise LLMProviderError(f"{e.code} stub error: {detail}") from e
+        except (urllib.error.URLError, OSError) as e:
+            raise LLMProviderError(f"503 stub unavailable: {e}") from e
+
+        if stream:
+            return self._iter_chunks(response)
+        with response:
+            data = json.loads(response.read().decode('utf-8'))
+        return LLMResponse(data['text'], data.get('finish_reason', 'STOP'), data.get('usage'))
+
+    def _iter_chunks(self, response: Any) -> Iterator[LLMResponse]:
+        with response:
+            for line in response:
+                if line.strip():
+                    data = json.loads(line)
+                    yield LLMResponse(data['text'], data.get('finish_reason', 'STOP'))
+
+
+class CassetteModel:
+    """
+    Backend de grabación/reproducción basado en un archivo de cassette
+
+    Modos:
+        replay: solo reproduce; una llamada no grabada lanza CassetteMiss
+        record: llama al modelo real y graba (sobrescribe) cada respuesta o error
+        auto: reproduce si existe la grabación y si no llama y graba
+              (los errores se propagan sin grabarse)
+
+    La clave de cada interacción es (modelo, prompt, generation_config, stream).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        model_name: str,
+        mode: str = 'replay',
+        inner_factory: Optional[Callable[[], Any]] = None,
+        replay_latency: bool = False
+    ):
+        """
+        Args:
+            path: Archivo JSON de la cassette
+            model_name: Nombre del modelo (parte de la clave)
+            mode: replay | record | auto
+            inner_factory: Crea el modelo real (solo record/auto)
+            replay_latency: Si True, la reproducción espera la latencia grabada
+        """
+        if mode not in ('replay', 'record', 'auto'):
+            raise ValueError(f"Modo de cassette inválido: {mode}")
+        self.path = Path(path)
+        self.model_name = model_name
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self._inner_factory = inner_factory
+        self._inner = None
+        self._lock = threading.Lock()
+        self._interactions: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                self._interactions = json.load(f).get('interactions', {})
+        elif mode == 'replay':
+            logger.warning(f"Cassette {self.path} no existe: todas las llamadas fallarán")
+
+    def generate_content(
+        self,
+        prompt: Any,
+        generation_config: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
+        **kwargs
+    ) -> Any:
+        key = self._make_key(prompt, generation_config, stream)
+        interaction = None if self.mode == 'record' else self._interactions.get(key)
+
+        recorded = False
+        if interaction is None:
+            if self.mode == 'replay':
+                raise CassetteMiss(f"503 cassette miss: no hay respuesta grabada para {key[:12]}")
+            interaction = self._record(key, prompt, generation_config, stream)
+            recorded = True
+
+        if self.replay_latency and not recorded:
+            time.sleep(interaction.get('latency_ms', 0) / 1000)
+
+        if interaction.get('error'):
+            raise LLMProviderError(interaction['error'])
+        if stream:
+            chunks = interaction['chunks']
+            # El último fragmento lleva el finish_reason grabado (MAX_TOKENS dispara continuaciones)
+            return iter([
+                LLMResponse(chunk, interaction.get('finish_reason', 'STOP') if i == len(chunks) - 1 else 'FINISH_REASON_UNSPECIFIED')
+                for i, chunk in enumerate(chunks)
+            ])
+        return LLMResponse(interaction['text'], interaction.get('finish_reason', 'STOP'), interaction.get('usage'))
+
+    def _record(
+        self,
+        key: str,
+        prompt: Any,
+        generation_config: Optional[Dict[str, Any]],
+        stream: bool
+    ) -> Dict[str, Any]:
+        """
+        Llama al modelo real y guarda la interacción en la cassette
+        """
+        if self._inner is None:
+            if self._inner_factory is None:
+                raise LLMProviderError("503 cassette sin modelo para grabar")
+            self._inner = self._inner_factory()
+
+        prompt_text = prompt if isinstance(prompt, str) else json.dumps(prompt, ensure_ascii=False, default=str)
+        interaction: Dict[str, Any] = {'prompt_preview': prompt_text[:200]}
+        started = time.monotonic()
+        kwargs = {'generation_config': generation_config} if generation_config else {}
+        try:
+            if stream:
+                interaction['chunks'] = []
+                last_chunk = None
+                for chunk in self._inner.generate_content(prompt, stream=True, **kwargs):
+                    interaction['chunks'].append(chunk.text)
+                    last_chunk = chunk
+                interaction['finish_reason'] = get_finish_reason(last_chunk)
+            else:
+                response = self._inner.generate_content(prompt, **kwargs)
+                interaction['text'] = response.text
+                interaction['finish_reason'] = get_finish_reason(response)
+                usage = getattr(response, 'usage_metadata', None)
+                total = getattr(usage, 'total_token_count', None)
+                if isinstance(total, int):
+                    interaction['usage'] = {'total_token_count': total}
+        except Exception as e:
+            # En modo record los errores se graban para reproducir escenarios de fallo;
+            # en auto un fallo transitorio (429, timeout) no debe quedar grabado
+            if self.mode != 'record':
+                raise
+            interaction['error'] = str(e)
+        interaction['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+
+        with self._lock:
+            self._interactions[key] = interaction
+            self._save()
+        return interaction
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'interactions': self._interactions}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def _make_key(self, prompt: Any, generation_config: Optional[Dict[str, Any]], stream: bool) -> str:
+        raw = json.dumps(
+            [self.model_name, prompt, generation_config or {}, bool(stream)],
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+# Valores numéricos de FinishReason en la API de Gemini
+_FINISH_REASONS = {0: 'FINISH_REASON_UNSPECIFIED', 1: 'STOP', 2: 'MAX_TOKENS', 3: 'SAFETY', 4: 'RECITATION', 5: 'OTHER'}
+
+
+def get_finish_reason(response: Any) -> str:
+    """
+    Nombre del finish_reason de una respuesta o fragmento
+
+    Args:
+        response: Respuesta de cualquier backend (o CachedResponse)
+
+    Returns:
+        'STOP', 'MAX_TOKENS', ... ('STOP' si la respuesta no lo informa)
+    """
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError, TypeError):
+        return 'STOP'
+    if isinstance(reason, int) and not hasattr(reason, 'name'):
+        return _FINISH_REASONS.get(reason, 'OTHER')
+    return getattr(reason, 'name', None) or str(reason)
+
+
+def _get_config() -> Dict[str, Any]:
+    return getattr(settings, 'RAG_CONFIG', {}).get('llm_provider', {})
+
+
+def build_llm_model(model_name: str, gemini_factory: Callable[[], Any]) -> Any:
+    """
+    Crea el modelo del backend configurado en RAG_CONFIG['llm_provider']
+
+    Args:
+        model_name: Nombre del modelo de Gemini
+        gemini_factory: Crea el GenerativeModel de Gemini (se llama solo si se usa)
+
+    Returns:
+        Modelo con la interfaz generate_content de Gemini
+    """
+    config = _get_config()
+    backend = config.get('backend', 'gemini')
+
+    if backend == 'stub':
+        url = config.get('stub_url', 'http://127.0.0.1:8765')
+        logger.info(f"🧪 LLM provider: stub HTTP en {url}")
+        return HTTPStubModel(url, model_name, timeout=config.get('stub_timeout', 30))
+
+    if backend == 'cassette':
+        path = config.get('cassette_path') or settings.BASE_DIR / 'cassettes' / 'llm.json'
+        mode = config.get('cassette_mode', 'replay')
+        logger.info(f"📼 LLM provider: cassette {path} ({mode})")
+        return CassetteModel(
+            path, model_name, mode=mode,
+            inner_factory=gemini_factory,
+            replay_latency=config.get('replay_latency', False)
+        )
+
+    if backend != 'gemini':
+        logger.warning(f"LLM provider desconocido '{backend}': usando Gemini")
+    return gemini_factory()
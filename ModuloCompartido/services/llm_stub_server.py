@@ -0,0 +1,179 @@
+"""
+LLM Stub Server - Servidor HTTP local que imita a Gemini para pruebas de carga
+Responde de forma determinista (la misma respuesta para el mismo prompt) con
+latencia y tasas de fallo configurables. Lo usa el backend 'stub' de
+llm_providers.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StubConfig:
+    """
+    Distribuciones de latencia y fallos del servidor stub
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 800.0,
+        latency_jitter_ms: float = 200.0,
+        latency_distribution: str = 'normal',
+        failure_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        chunk_delay_ms: float = 30.0,
+        seed: int = None
+    ):
+        """
+        Args:
+            latency_ms: Latencia media hasta el primer byte
+            latency_jitter_ms: Desviación estándar (normal) o sigma*media (lognormal)
+            latency_distribution: fixed | normal | lognormal
+            failure_rate: Probabilidad de responder 503
+            rate_limit_rate: Probabilidad de responder 429
+            chunk_delay_ms: Pausa entre fragmentos en streaming
+            seed: Semilla para reproducir la secuencia de latencias y fallos
+        """
+        if latency_distribution not in ('fixed', 'normal', 'lognormal'):
+            raise ValueError(f"Distribución de latencia inválida: {latency_distribution}")
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_distribution = latency_distribution
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.chunk_delay_ms = chunk_delay_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> Tuple[float, int]:
+        """
+        Sortea la latencia (ms) y el código HTTP de una petición
+        """
+        with self._lock:
+            if self.latency_distribution == 'fixed' or not self.latency_jitter_ms:
+                latency = self.latency_ms
+            elif self.latency_distribution == 'normal':
+                latency = self._random.gauss(self.latency_ms, self.latency_jitter_ms)
+            else:
+                sigma = self.latency_jitter_ms / max(self.latency_ms, 1.0)
+                latency = self.latency_ms * self._random.lognormvariate(0, sigma)
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return max(0.0, latency), 429
+        if roll < self.rate_limit_rate + self.failure_rate:
+            return max(0.0, latency), 503
+        return max(0.0, latency), 200
+
+
+def stub_completion(prompt: Any, generation_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Respuesta determinista para un prompt
+
+    Los prompts que piden JSON reciben "{}" (la extracción cae a los
+    extractores locales); el resto recibe un texto fijo derivado del hash.
+    """
+    text = prompt if isinstance(prompt, str) else json.dumps(prompt, ensure_ascii=False)
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:8]
+    prompt_tokens = len(text) // 4 + 1
+
+    if re.search(r'JSON:\s*$|SOLO con (un objeto )?JSON', text):
+        answer = '{}'
+    else:
+        answer = (
+            f"Respuesta simulada {digest}. Esta respuesta proviene del servidor stub "
+            f"y no de Gemini. Sirve para medir la latencia y el throughput del chat."
+        )
+
+    finish_reason = 'STOP'
+    max_output = int((generation_config or {}).get('max_output_tokens') or 0)
+    if max_output and len(answer) // 4 > max_output:
+        answer = answer[:max_output * 4]
+        finish_reason = 'MAX_TOKENS'
+
+    return {
+        'text': answer,
+        'finish_reason': finish_reason,
+        'usage': {
+            'prompt_token_count': prompt_tokens,
+            'candidates_token_count': len(answer) // 4 + 1,
+            'total_token_count': prompt_tokens + len(answer) // 4 + 1,
+        }
+    }
+
+
+def make_handler(config: StubConfig):
+    """
+    Crea la clase de handler HTTP ligada a una configuración
+    """
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/generate':
+                self._send_json(404, {'error': 'not found'})
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+
+            latency_ms, status = config.sample()
+            time.sleep(latency_ms / 1000)
+            if status == 429:
+                self._send_json(429, {'error': 'Resource exhausted: quota exceeded (stub)'})
+                return
+            if status != 200:
+                self._send_json(status, {'error': 'Service unavailable (stub)'})
+                return
+
+            completion = stub_completion(request.get('prompt', ''), request.get('generation_config', {}))
+            if not request.get('stream'):
+                self._send_json(200, completion)
+                return
+
+            # Streaming: una línea JSON por palabra
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            words = re.findall(r'\S+\s*', completion['text'])
+            for i, word in enumerate(words, 1):
+                chunk = {'text': word}
+                if i == len(words):
+                    chunk['finish_reason'] = completion['finish_reason']
+                self.wfile.write(json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.wfile.flush()
+                time.sleep(config.chunk_delay_ms / 1000)
+            self.close_connection = True
+
+        def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"LLM stub: {format % args}")
+
+    return StubHandler
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8765, config: StubConfig = None) -> ThreadingHTTPServer:
+    """
+    Crea el servidor stub (port=0 elige un puerto libre)
+
+    Returns:
+        ThreadingHTTPServer listo para serve_forever()
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(config or StubConfig()))
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,270 @@
+"""
+ONNX Embedding - Modelo de embeddings int8 con ONNX Runtime (solo CPU)
+Los workers web no tienen GPU y cargar el sentence-transformer completo trae
+torch a memoria (cientos de MB por worker) para embeber consultas cortas. El
+modelo se exporta una vez a ONNX con cuantización dinámica int8 y en los
+workers lo ejecuta onnxruntime con el tokenizador de Hugging Face (Rust), sin
+importar torch ni transformers.
+
+OnnxSentenceEncoder expone el mismo encode() que SentenceTransformer, así que
+SentenceTransformerEmbedder lo usa sin cambios (ver OnnxEmbedder). Los
+vectores son prácticamente iguales a los del modelo float (ver
+cosine_agreement y 'python manage.py benchmark_embeddings'), por lo que una
+colección no necesita reembeberse al cambiar de backend.
+
+Exportar (requiere torch, sentence-transformers y onnx; solo al construir):
+    python manage.py export_onnx_embeddings
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import json
+import logging
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from .lazy_import import lazy_module
+
+logger = logging.getLogger(__name__)
+
+onnxruntime = lazy_module('onnxruntime')
+tokenizers = lazy_module('tokenizers')
+
+MANIFEST_FILE = 'export.json'
+TOKENIZER_FILE = 'tokenizer.json'
+FLOAT_MODEL_FILE = 'model.onnx'
+INT8_MODEL_FILE = 'model_int8.onnx'
+
+# Consultas típicas de ambos chatbots (paridad y benchmark)
+SAMPLE_TEXTS = [
+    '¿Cuándo vence mi boleta?',
+    '¿Cómo se calcula el cargo fijo?',
+    'Quiero pagar mi cuenta de agua en línea',
+    '¿Por qué subió el consumo este mes?',
+    'Hay una rotura de matriz en mi calle',
+    'No tengo agua desde la mañana en el sector norte',
+    '¿Cuál es el teléfono de emergencias?',
+    'El medidor está filtrando agua',
+    'Necesito un convenio de pago por deuda atrasada',
+    'El agua sale con color café',
+]
+
+
+def get_onnx_model_dir(model_name: str, base_dir: Optional[str] = None) -> Path:
+    """
+    Directorio del modelo exportado (base_dir/<modelo con '/' → '__'>)
+
+    Args:
+        model_name: Modelo de sentence-transformers
+        base_dir: Directorio base de los modelos ONNX
+
+    Returns:
+        Ruta del directorio con export.json, tokenizer.json y los .onnx
+    """
+    return Path(base_dir) / model_name.replace('/', '__')
+
+
+def _pool(hidden: np.ndarray, attention_mask: np.ndarray, pooling: str) -> np.ndarray:
+    if pooling == 'cls':
+        return hidden[:, 0]
+    # Promedio de los tokens reales (el padding no cuenta)
+    mask = attention_mask[:, :, None].astype(np.float32)
+    return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+class OnnxSentenceEncoder:
+    """
+    Encoder de oraciones sobre onnxruntime con la interfaz de SentenceTransformer.encode
+    """
+
+    def __init__(self, model_dir: Path, threads: int = 0, quantized: bool = True):
+        """
+        Args:
+            model_dir: Directorio creado por export_onnx_model
+            threads: Hilos de onnxruntime (0 = uno por núcleo)
+            quantized: Si True usa el modelo int8; si False, el float32
+
+        Raises:
+            FileNotFoundError: Si el modelo no se ha exportado
+        """
+        self.model_dir = Path(model_dir)
+        manifest_path = self.model_dir / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(
+                f"No hay modelo ONNX en {self.model_dir}: ejecutar 'python manage.py export_onnx_embeddings'"
+            )
+        self.manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+        self.pooling = self.manifest.get('pooling', 'mean')
+        self.quantized = quantized
+
+        self.tokenizer = tokenizers.Tokenizer.from_file(str(self.model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.manifest.get('max_seq_length', 128))
+        self.tokenizer.enable_padding(
+            pad_id=self.manifest.get('pad_token_id', 0),
+            pad_token=self.manifest.get('pad_token', '[PAD]')
+        )
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        model_path = self.model_dir / (INT8_MODEL_FILE if quantized else FLOAT_MODEL_FILE)
+        self.session = onnxruntime.InferenceSession(
+            str(model_path),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def encode(
+        self,
+        sentences: Sequence[str],
+        batch_size: int = 32,
+        normalize_embeddings: bool = False,
+        convert_to_numpy: bool = True,
+        show_progress_bar: bool = False
+    ) -> np.ndarray:
+        """
+        Embebe textos en lotes (agrupados por largo para rellenar menos)
+
+        Returns:
+            Matriz float32 (textos x dimensiones) en el orden de entrada
+        """
+        sentences = list(sentences)
+        order = sorted(range(len(sentences)), key=lambda i: -len(sentences[i]))
+        vectors: List[Optional[np.ndarray]] = [None] * len(sentences)
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([sentences[i] for i in batch])
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            inputs = {
+                'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+                'attention_mask': attention_mask,
+                'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+            pooled = _pool(np.asarray(hidden, dtype=np.float32), attention_mask, self.pooling)
+            for row, index in enumerate(batch):
+                vectors[index] = pooled[row]
+
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        matrix = np.vstack(vectors).astype(np.float32)
+        if normalize_embeddings:
+            matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+        return matrix
+
+
+def cosine_agreement(reference: Sequence[Sequence[float]], candidate: Sequence[Sequence[float]]) -> Dict[str, float]:
+    """
+    Coseno fila a fila entre dos conjuntos de embeddings de los mismos textos
+
+    Args:
+        reference: Embeddings del modelo float
+        candidate: Embeddings del modelo cuantizado
+
+    Returns:
+        Dict con min, mean y p05 del coseno
+    """
+    a = np.asarray(reference, dtype=np.float64)
+    b = np.asarray(candidate, dtype=np.float64)
+    cosines = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return {
+        'min': round(float(cosines.min()), 4),
+        'mean': round(float(cosines.mean()), 4),
+        'p05': round(float(np.percentile(cosines, 5)), 4),
+    }
+
+
+def export_onnx_model(
+    model_name: str,
+    output_dir: Path,
+    cache_dir: Optional[str] = None,
+    quantize: bool = True,
+    opset: int = 14
+) -> Dict[str, Any]:
+    """
+    Exporta un sentence-transformer a ONNX y lo cuantiza a int8 (dinámico)
+
+    Requiere torch, sentence-transformers y onnx; se ejecuta al construir la
+    imagen, no en los workers.
+
+    Args:
+        model_name: Modelo de sentence-transformers
+        output_dir: Directorio de salida
+        cache_dir: Caché del modelo original
+        quantize: Si True genera también model_int8.onnx
+        opset: Versión de opset de ONNX
+
+    Returns:
+        Manifiesto del modelo exportado (export.json)
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    started = time.perf_counter()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    model = SentenceTransformer(model_name, device='cpu', cache_folder=cache_dir)
+    transformer = model[0]
+    hf_model = transformer.auto_model.eval()
+    hf_tokenizer = transformer.tokenizer
+    pooling = 'mean'
+    for module in model:
+        if hasattr(module, 'get_pooling_mode_str'):
+            pooling = 'cls' if module.get_pooling_mode_str() == 'cls' else 'mean'
+
+    sample = hf_tokenizer(SAMPLE_TEXTS[:2], return_tensors='pt', padding=True)
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, wrapped):
+            super().__init__()
+            self.wrapped = wrapped
+
+        def forward(self, *args):
+            return self.wrapped(**dict(zip(input_names, args))).last_hidden_state
+
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']}
+    float_path = output_dir / FLOAT_MODEL_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(hf_model),
+            tuple(sample[name] for name in input_names),
+            str(float_path),
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset
+        )
+    hf_tokenizer.backend_tokenizer.save(str(output_dir / TOKENIZER_FILE))
+
+    manifest = {
+        'model_name': model_name,
+        'max_seq_length': model.get_max_seq_length() or 128,
+        'pooling': pooling,
+        'pad_token': hf_tokenizer.pad_token,
+        'pad_token_id': hf_tokenizer.pad_token_id,
+        'input_names': input_names,
+        'opset': opset,
+        'float_mb': round(float_path.stat().st_size / 1e6, 1),
+    }
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # quantize_dynamic escribe archivos auxiliares junto al destino
+            tmp_path = Path(tmp) / INT8_MODEL_FILE
+            quantize_dynamic(str(float_path), str(tmp_path), weight_type=QuantType.QInt8)
+            shutil.move(str(tmp_path), output_dir / INT8_MODEL_FILE)
+        manifest['int8_mb'] = round((output_dir / INT8_MODEL_FILE).stat().st_size / 1e6, 1)
+
+    manifest['export_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    (output_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding='utf-8')
+    logger.info(f"Modelo {model_name} exportado a {output_dir}: {manifest}")
+    return manifest
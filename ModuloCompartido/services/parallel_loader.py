@@ -0,0 +1,115 @@
+"""
+Parallel Loader - Carga y división de documentos en un pool de procesos
+UnstructuredMarkdownLoader y PyPDFLoader usan CPU, así que con PDFs de
+tarifas y reglamentos escaneados la ingesta crecía linealmente con el número
+de archivos. load_files reparte los archivos en un ProcessPoolExecutor y
+devuelve los resultados en el mismo orden de entrada, con el tiempo de cada
+archivo y su error si falló (sin abortar el resto).
+
+Los workers se crean con 'spawn': el proceso que ingesta ya tiene el cliente
+de ChromaDB y sus hilos, y hacer fork de un proceso con hilos puede
+bloquearse. Cada worker configura Django al iniciar.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from django.conf import settings
+import logging
+import multiprocessing
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def get_ingest_workers() -> int:
+    """
+    Workers de carga configurados (RAG_CONFIG['ingest']['workers'])
+
+    Returns:
+        Número de procesos (0 = uno por CPU, 1 = sin pool)
+    """
+    workers = getattr(settings, 'RAG_CONFIG', {}).get('ingest', {}).get('workers', 1)
+    return int(workers)
+
+
+def _init_worker(settings_module: str) -> None:
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _load_one(load_file: Callable[[Path], Any], path: str) -> Dict[str, Any]:
+    # Se ejecuta en el worker: los errores se devuelven, no se propagan
+    started = time.perf_counter()
+    try:
+        result, error = load_file(Path(path)), None
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+    return {
+        'path': path,
+        'result': result,
+        'error': error,
+        'ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def load_files(
+    paths: Sequence[Path],
+    load_file: Callable[[Path], Any],
+    workers: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Carga archivos en paralelo y devuelve los resultados en el orden de entrada
+
+    Args:
+        paths: Archivos a cargar
+        load_file: Función de módulo (debe poder importarse desde los workers)
+        workers: Procesos (None = configuración, 0 = uno por CPU, 1 = en este proceso)
+
+    Returns:
+        Lista de dicts {'path', 'result', 'error', 'ms'} alineada con paths
+    """
+    paths = [str(path) for path in paths]
+    workers = get_ingest_workers() if workers is None else workers
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(paths))
+
+    started = time.perf_counter()
+    if workers <= 1:
+        results = [_load_one(load_file, path) for path in paths]
+    else:
+        results = _load_in_pool(paths, load_file, workers)
+
+    failed = sum(1 for r in results if r['error'])
+    logger.info(
+        f"Cargados {len(paths) - failed}/{len(paths)} archivos con {max(workers, 1)} "
+        f"worker(s) en {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+    for r in results:
+        if r['error']:
+            logger.error(f"Error cargando {r['path']}: {r['error']}")
+    return results
+
+
+def _load_in_pool(paths: List[str], load_file: Callable[[Path], Any], workers: int) -> List[Dict[str, Any]]:
+    settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'Core-Backend.settings')
+    results: List[Optional[Dict[str, Any]]] = [None] * len(paths)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(settings_module,)
+    ) as pool:
+        futures = [pool.submit(_load_one, load_file, path) for path in paths]
+        for index, future in enumerate(futures):
+            try:
+                results[index] = future.result()
+            except BrokenProcessPool as e:
+                # Un worker murió (p. ej. sin memoria): el archivo queda como fallido
+                results[index] = {'path': paths[index], 'result': None, 'error': f"Worker caído: {e}", 'ms': 0.0}
+            except Exception as e:
+                results[index] = {'path': paths[index], 'result': None, 'error': f"{type(e).__name__}: {e}", 'ms': 0.0}
+    return results
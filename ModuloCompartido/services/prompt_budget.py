@@ -0,0 +1,265 @@
+"""
+Prompt Budget - Armado de prompts con presupuesto de tokens por punto de llamada
+Cada prompt se compone de secciones con prioridad (instrucciones, datos de la
+boleta, historial reciente, fragmentos RAG). El ensamblador llena el
+presupuesto en orden de prioridad y descarta o recorta lo que no cabe, de modo
+que los tokens de entrada (y la latencia) de cada turno quedan acotados.
+"""
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+import logging
+import math
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Prioridades de las secciones (menor = se incluye primero)
+PRIORITY_INSTRUCTIONS = 0
+PRIORITY_FACTS = 1
+PRIORITY_HISTORY = 2
+PRIORITY_RAG = 3
+
+# Un fragmento se recorta solo si quedan al menos estos tokens para él
+MIN_TRUNCATE_TOKENS = 32
+
+_TOKEN_PIECE = re.compile(r'\w+|[^\w\s]')
+
+
+def _piece_tokens(piece: str) -> int:
+    if piece[0].isalnum() or piece[0] == '_':
+        return math.ceil(len(piece) / 4)
+    return 1
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estima los tokens de un texto sin llamar a la API
+
+    Aproxima un tokenizador de subpalabras: cada signo de puntuación es un
+    token y cada palabra aporta un token por cada 4 caracteres.
+
+    Args:
+        text: Texto a medir
+
+    Returns:
+        Tokens estimados
+    """
+    return sum(_piece_tokens(piece) for piece in _TOKEN_PIECE.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Recorta un texto al número de tokens indicado, en un límite de palabra
+    (incluido el marcador "..." final)
+    """
+    used = 0
+    for match in _TOKEN_PIECE.finditer(text):
+        used += _piece_tokens(match.group(0))
+        if used > max_tokens - 3:
+            return text[:match.start()].rstrip() + '...'
+    return text
+
+
+class _Section:
+    def __init__(self, name, items, priority, header, keep, separator, required, truncate):
+        self.name = name
+        self.items = [item for item in items if item]
+        self.priority = priority
+        self.header = header
+        self.keep = keep
+        self.separator = separator
+        self.required = required
+        self.truncate = truncate
+        self.kept: List[str] = []
+
+
+class PromptAssembler:
+    """
+    Ensambla un prompt respetando un presupuesto de tokens
+
+    Las secciones se presentan en el orden en que se agregan, pero el
+    presupuesto se asigna por prioridad. Las secciones obligatorias
+    (instrucciones, pregunta del usuario) siempre se incluyen.
+    """
+
+    def __init__(self, call_site: str, budget_tokens: Optional[int] = None):
+        """
+        Args:
+            call_site: Punto de llamada (p.ej. 'boletas_contextual'), para stats
+            budget_tokens: Presupuesto de tokens (None = según RAG_CONFIG)
+        """
+        self.call_site = call_site
+        self.budget_tokens = budget_tokens if budget_tokens is not None else get_budget(call_site)
+        self._sections: List[_Section] = []
+
+    def add(
+        self,
+        name: str,
+        text: str,
+        priority: int = PRIORITY_INSTRUCTIONS,
+        header: str = "",
+        required: bool = False,
+        truncate: bool = False
+    ) -> 'PromptAssembler':
+        """
+        Agrega una sección de un solo bloque
+
+        Args:
+            name: Nombre de la sección
+            text: Contenido
+            priority: Prioridad (PRIORITY_*)
+            header: Encabezado opcional (p.ej. "HISTORIAL DE CONVERSACIÓN:")
+            required: Si True se incluye aunque exceda el presupuesto
+            truncate: Si True se recorta cuando no cabe completa
+        """
+        self._sections.append(_Section(name, [text], priority, header, 'first', "", required, truncate))
+        return self
+
+    def add_items(
+        self,
+        name: str,
+        items: List[str],
+        priority: int,
+        header: str = "",
+        keep: str = 'first',
+        separator: str = "\n",
+        truncate: bool = False
+    ) -> 'PromptAssembler':
+        """
+        Agrega una sección de elementos descartables uno a uno
+
+        Args:
+            name: Nombre de la sección
+            items: Elementos (mensajes del historial, fragmentos RAG, boletas)
+            priority: Prioridad (PRIORITY_*)
+            header: Encabezado opcional
+            keep: 'first' conserva los primeros elementos, 'last' los últimos
+            separator: Separador entre elementos
+            truncate: Si True el último elemento que no cabe se recorta
+        """
+        self._sections.append(_Section(name, items, priority, header, keep, separator, False, truncate))
+        return self
+
+    def build(self) -> str:
+        """
+        Llena el presupuesto por prioridad y renderiza el prompt
+
+        Returns:
+            Prompt ensamblado
+        """
+        remaining = self.budget_tokens
+        dropped = 0
+        truncated = False
+
+        for section in sorted(self._sections, key=lambda s: s.priority):
+            if remaining is None:
+                section.kept = list(section.items)
+                continue
+
+            header_tokens = count_tokens(section.header) if section.header else 0
+            if section.required:
+                section.kept = list(section.items)
+                remaining -= header_tokens + sum(count_tokens(item) for item in section.items)
+                continue
+
+            ordered = section.items if section.keep == 'first' else list(reversed(section.items))
+            used = header_tokens
+            kept = []
+            for item in ordered:
+                # El separador entre elementos cuenta como un token
+                tokens = count_tokens(item) + (1 if kept else 0)
+                if used + tokens <= remaining:
+                    kept.append(item)
+                    used += tokens
+                    continue
+                available = remaining - used - (1 if kept else 0)
+                if section.truncate and available >= MIN_TRUNCATE_TOKENS:
+                    kept.append(truncate_to_tokens(item, available))
+                    used = remaining
+                    truncated = True
+                # El resto de la sección no se incluye (mantiene el orden)
+                break
+            dropped += len(ordered) - len(kept)
+
+            if kept:
+                remaining -= used
+            section.kept = kept if section.keep == 'first' else list(reversed(kept))
+
+        prompt = "\n\n".join(
+            (f"{section.header}\n" if section.header else "") + section.separator.join(section.kept)
+            for section in self._sections
+            if section.kept
+        )
+
+        total_tokens = count_tokens(prompt)
+        _record(self.call_site, total_tokens, dropped, truncated)
+        if self.budget_tokens is not None and total_tokens > self.budget_tokens:
+            logger.warning(
+                f"Prompt '{self.call_site}' excede su presupuesto: "
+                f"{total_tokens}/{self.budget_tokens} tokens (secciones obligatorias)"
+            )
+        return prompt
+
+
+def _get_config() -> Dict[str, Any]:
+    return getattr(settings, 'RAG_CONFIG', {}).get('prompt_budget', {})
+
+
+def get_budget(call_site: str) -> Optional[int]:
+    """
+    Presupuesto de tokens de un punto de llamada
+
+    Returns:
+        Tokens, o None si el presupuesto está deshabilitado
+    """
+    config = _get_config()
+    if not config.get('enabled', True):
+        return None
+    return config.get('budgets', {}).get(call_site, config.get('default_budget', 1500))
+
+
+def get_history_window() -> int:
+    """
+    Mensajes de historial candidatos por turno (el presupuesto decide cuántos entran)
+    """
+    return _get_config().get('history_messages', 10)
+
+
+# Tokens por punto de llamada en el proceso
+_budget_stats: Dict[str, Dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+
+def _record(call_site: str, tokens: int, dropped: int, truncated: bool) -> None:
+    with _stats_lock:
+        stats = _budget_stats.setdefault(
+            call_site,
+            {'prompts': 0, 'total_tokens': 0, 'max_tokens': 0, 'dropped_items': 0, 'truncated': 0}
+        )
+        stats['prompts'] += 1
+        stats['total_tokens'] += tokens
+        stats['max_tokens'] = max(stats['max_tokens'], tokens)
+        stats['dropped_items'] += dropped
+        stats['truncated'] += int(truncated)
+
+
+def get_prompt_budget_stats() -> Dict[str, Any]:
+    """
+    Obtiene los tokens de entrada por punto de llamada
+
+    Returns:
+        Dict punto de llamada → {prompts, budget, avg_tokens, max_tokens, dropped_items, truncated}
+    """
+    with _stats_lock:
+        return {
+            call_site: {
+                'prompts': int(stats['prompts']),
+                'budget': get_budget(call_site),
+                'avg_tokens': round(stats['total_tokens'] / stats['prompts'], 1),
+                'max_tokens': int(stats['max_tokens']),
+                'dropped_items': int(stats['dropped_items']),
+                'truncated': int(stats['truncated'])
+            }
+            for call_site, stats in _budget_stats.items()
+        }
@@ -0,0 +1,286 @@
+"""
+Gemini Quota - Control de admisión por token bucket compartido entre procesos
+Lleva la cuenta de requests por minuto (RPM) y tokens por minuto (TPM) en un
+archivo SQLite que comparten todos los workers y ambos módulos (Boletas y
+Emergencia). Si una llamada excedería el presupuesto se rechaza al instante
+con QuotaExceeded, sin esperar el 429 de la API.
+"""
+from typing import Any, Dict, Optional
+from django.conf import settings
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceeded(Exception):
+    """
+    La llamada excedería la cuota de Gemini (rechazo local, sin ir a la red)
+    """
+
+    def __init__(self, reason: str, retry_after: float = 0.0):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Gemini quota exceeded ({reason}), retry after {retry_after:.1f}s")
+
+
+def is_quota_error(error: Exception) -> bool:
+    """
+    Indica si un error corresponde a cuota/rate-limit (local o de la API)
+
+    Args:
+        error: Excepción capturada
+
+    Returns:
+        True si es un error de cuota
+    """
+    if isinstance(error, QuotaExceeded):
+        return True
+    msg = str(error).lower()
+    return 'quota' in msg or '429' in msg or 'rate limit' in msg or 'resource exhausted' in msg
+
+
+def estimate_tokens(prompt: Any, generation_config: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Estima los tokens de una llamada (prompt + salida máxima)
+
+    Usa ~4 caracteres por token, suficiente para el control de admisión.
+
+    Args:
+        prompt: Prompt enviado al modelo
+        generation_config: Configuración de generación
+
+    Returns:
+        Tokens estimados
+    """
+    text = prompt if isinstance(prompt, str) else json.dumps(prompt, ensure_ascii=False, default=str)
+    max_output = (generation_config or {}).get('max_output_tokens', 0) or 0
+    return len(text) // 4 + 1 + int(max_output)
+
+
+class GeminiQuotaAccountant:
+    """
+    Token bucket de RPM y TPM con estado en SQLite
+
+    Cada operación abre su propia conexión y usa BEGIN IMMEDIATE, de modo que
+    la recarga y el descuento de ambos buckets son atómicos entre procesos.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        requests_per_minute: int = 15,
+        tokens_per_minute: int = 1000000,
+        cooldown_seconds: float = 30.0
+    ):
+        """
+        Args:
+            path: Archivo SQLite compartido
+            requests_per_minute: Límite RPM del plan de Gemini
+            tokens_per_minute: Límite TPM del plan de Gemini
+            cooldown_seconds: Pausa global tras recibir un 429 real de la API
+        """
+        self.path = str(path)
+        self.capacities = {
+            'requests': float(requests_per_minute),
+            'tokens': float(tokens_per_minute),
+        }
+        self.cooldown_seconds = cooldown_seconds
+
+        self.admitted = 0
+        self.rejected = 0
+        self._stats_lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS gemini_quota ("
+                "name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _load(self, conn: sqlite3.Connection, now: float) -> Dict[str, float]:
+        """
+        Lee los buckets y aplica la recarga transcurrida desde la última operación
+        """
+        rows = {
+            name: (level, updated_at)
+            for name, level, updated_at in conn.execute(
+                "SELECT name, level, updated_at FROM gemini_quota"
+            )
+        }
+        levels = {}
+        for name, capacity in self.capacities.items():
+            level, updated_at = rows.get(name, (capacity, now))
+            refill = max(0.0, now - updated_at) * capacity / 60.0
+            levels[name] = min(capacity, level + refill)
+        levels['cooldown_until'] = rows.get('cooldown_until', (0.0, now))[0]
+        return levels
+
+    def _save(self, conn: sqlite3.Connection, levels: Dict[str, float], now: float) -> None:
+        conn.executemany(
+            "INSERT OR REPLACE INTO gemini_quota (name, level, updated_at) VALUES (?, ?, ?)",
+            [(name, level, now) for name, level in levels.items()]
+        )
+
+    def try_acquire(self, tokens: int) -> None:
+        """
+        Descuenta una request y los tokens estimados si hay presupuesto
+
+        Args:
+            tokens: Tokens estimados de la llamada
+
+        Raises:
+            QuotaExceeded: Si la llamada excedería RPM, TPM o hay cooldown activo
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            levels = self._load(conn, now)
+
+            error = None
+            if levels['cooldown_until'] > now:
+                error = QuotaExceeded('cooldown', levels['cooldown_until'] - now)
+            elif levels['requests'] < 1:
+                error = QuotaExceeded('rpm', (1 - levels['requests']) * 60.0 / self.capacities['requests'])
+            else:
+                cost = min(float(tokens), self.capacities['tokens'])
+                if levels['tokens'] < cost:
+                    error = QuotaExceeded('tpm', (cost - levels['tokens']) * 60.0 / self.capacities['tokens'])
+                else:
+                    levels['requests'] -= 1
+                    levels['tokens'] -= cost
+
+            self._save(conn, levels, now)
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            # Si el archivo de cuota falla, no bloquear el servicio
+            logger.warning(f"No se pudo consultar la cuota de Gemini: {e}")
+            return
+        finally:
+            conn.close()
+
+        with self._stats_lock:
+            if error is None:
+                self.admitted += 1
+            else:
+                self.rejected += 1
+        if error is not None:
+            logger.warning(f"⏳ Llamada a Gemini rechazada localmente: {error}")
+            raise error
+
+    def record_usage(self, estimated: int, actual: int) -> None:
+        """
+        Corrige el bucket TPM con los tokens reales informados por la API
+
+        Args:
+            estimated: Tokens descontados al admitir la llamada
+            actual: Tokens reales (usage_metadata.total_token_count)
+        """
+        delta = float(actual - estimated)
+        if not delta:
+            return
+        self._update(lambda levels: levels.__setitem__(
+            'tokens', min(self.capacities['tokens'], levels['tokens'] - delta)
+        ))
+
+    def report_rate_limited(self) -> None:
+        """
+        Registra un 429 real: todos los workers pausan durante el cooldown
+        """
+        until = time.time() + self.cooldown_seconds
+        self._update(lambda levels: levels.__setitem__(
+            'cooldown_until', max(levels['cooldown_until'], until)
+        ))
+        logger.warning(f"Gemini respondió 429: pausando llamadas {self.cooldown_seconds}s")
+
+    def _update(self, mutate) -> None:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            levels = self._load(conn, now)
+            mutate(levels)
+            self._save(conn, levels, now)
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo actualizar la cuota de Gemini: {e}")
+        finally:
+            conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene el estado de los buckets compartidos
+
+        Returns:
+            Dict con estadísticas
+        """
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                levels = self._load(conn, now)
+        except sqlite3.Error:
+            levels = {}
+        return {
+            'enabled': True,
+            'requests_per_minute': int(self.capacities['requests']),
+            'tokens_per_minute': int(self.capacities['tokens']),
+            'requests_available': round(levels.get('requests', 0.0), 2),
+            'tokens_available': int(levels.get('tokens', 0.0)),
+            'cooldown_remaining': round(max(0.0, levels.get('cooldown_until', 0.0) - now), 1),
+            'admitted': self.admitted,
+            'rejected': self.rejected
+        }
+
+
+def _get_config() -> Dict[str, Any]:
+    return getattr(settings, 'RAG_CONFIG', {}).get('gemini_quota', {})
+
+
+# Singleton
+_quota_accountant_instance = None
+
+
+def get_quota_accountant() -> Optional[GeminiQuotaAccountant]:
+    """
+    Obtiene la instancia singleton del contador de cuota
+
+    Returns:
+        GeminiQuotaAccountant o None si está deshabilitado en RAG_CONFIG
+    """
+    global _quota_accountant_instance
+    config = _get_config()
+    if not config.get('enabled', False):
+        return None
+    if _quota_accountant_instance is None:
+        try:
+            _quota_accountant_instance = GeminiQuotaAccountant(
+                path=config.get('path') or settings.BASE_DIR / 'gemini_quota.sqlite3',
+                requests_per_minute=config.get('requests_per_minute', 15),
+                tokens_per_minute=config.get('tokens_per_minute', 1000000),
+                cooldown_seconds=config.get('cooldown_seconds', 30)
+            )
+        except Exception as e:
+            logger.warning(f"No se pudo inicializar el contador de cuota de Gemini: {e}")
+            return None
+    return _quota_accountant_instance
+
+
+def get_quota_stats() -> Dict[str, Any]:
+    """
+    Obtiene estadísticas de cuota para los endpoints de stats
+
+    Returns:
+        Dict con estadísticas (o {'enabled': False})
+    """
+    accountant = get_quota_accountant()
+    if accountant is None:
+        return {'enabled': False}
+    return accountant.get_stats()
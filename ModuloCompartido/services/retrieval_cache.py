@@ -0,0 +1,120 @@
+"""
+Retrieval Cache - Caché de resultados de RAGRetriever.retrieve
+Los resultados de una búsqueda dependen solo de (consulta, top_k, filtros) y
+del contenido de la colección, que cambia únicamente al ingestar. Cada
+entrada se guarda junto a la versión de la colección (archivo compartido que
+el vector store regenera en cada add o reset), así que una ingesta en otro
+proceso invalida la caché de todos los workers sin comunicación adicional.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+import json
+import logging
+import threading
+
+from .embedding_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalCache:
+    """
+    Caché LRU de resultados formateados de búsqueda, invalidada por versión
+    """
+
+    def __init__(self, max_entries: int = 512):
+        """
+        Args:
+            max_entries: Búsquedas máximas guardadas antes de desalojar la menos usada
+        """
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, List[Dict[str, Any]]]' = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def make_key(self, query: str, top_k: int, filters: Optional[Dict[str, Any]]) -> str:
+        """
+        Clave de una búsqueda (la consulta se normaliza como en la caché de embeddings: solo espacios)
+        """
+        return json.dumps(
+            [normalize_query(query), top_k, filters],
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+
+    def get(self, key: str, version: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Obtiene los resultados de una búsqueda para la versión actual de la colección
+
+        Args:
+            key: Clave de make_key()
+            version: Versión actual de la colección
+
+        Returns:
+            Copia de los resultados, o None si no están en caché
+        """
+        with self._lock:
+            self._check_version(version)
+            results = self._entries.get(key)
+            if results is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Copia superficial: quien llama puede modificar los dicts de resultado
+        return [dict(result) for result in results]
+
+    def set(self, key: str, version: str, results: List[Dict[str, Any]]) -> None:
+        """
+        Guarda los resultados de una búsqueda hecha sobre la versión indicada
+        """
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = [dict(result) for result in results]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _check_version(self, version: str) -> None:
+        # Llamar con el lock tomado
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                logger.info(f"Caché de recuperación invalidada (versión {str(version)[:8]})")
+            self._entries.clear()
+            self._version = version
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene estadísticas de la caché
+
+        Returns:
+            Dict con estadísticas
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0
+            }
+
+
+def build_retrieval_cache() -> Optional[RetrievalCache]:
+    """
+    Crea la caché de resultados según RAG_CONFIG['retrieval_cache']
+
+    Returns:
+        RetrievalCache o None si está deshabilitada
+    """
+    config = getattr(settings, 'RAG_CONFIG', {}).get('retrieval_cache', {})
+    if not config.get('enabled', True):
+        return None
+    return RetrievalCache(max_entries=config.get('max_entries', 512))
@@ -0,0 +1,189 @@
+"""
+Single Flight - Coalescencia de llamadas idénticas concurrentes
+Cuando muchos usuarios preguntan lo mismo al mismo tiempo (p.ej. un corte
+de agua en un sector), solo una llamada a Gemini o al vector store se
+ejecuta y el resto de los hilos espera y recibe su resultado.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from django.conf import settings
+import hashlib
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """
+    Llamada en curso compartida por todos los hilos con la misma clave
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Ejecuta una sola vez cada clave en vuelo dentro del proceso
+    """
+
+    def __init__(self, wait_timeout: float = 30.0):
+        """
+        Args:
+            wait_timeout: Segundos que un hilo espera al líder antes de
+                ejecutar la llamada por su cuenta
+        """
+        self.wait_timeout = wait_timeout
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Ejecuta fn o espera el resultado de una ejecución idéntica en curso
+
+        Args:
+            key: Clave que identifica la llamada
+            fn: Función a ejecutar
+
+        Returns:
+            Tupla (resultado, compartido) donde compartido indica si el
+            resultado vino de la ejecución de otro hilo
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            if call.done.wait(self.wait_timeout):
+                with self._lock:
+                    self.coalesced += 1
+                if call.error is not None:
+                    raise call.error
+                return call.result, True
+            logger.warning("Single-flight: tiempo de espera agotado, ejecutando llamada propia")
+            return fn(), False
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self.executed += 1
+                self._calls.pop(key, None)
+            call.done.set()
+
+        return call.result, False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene estadísticas de coalescencia
+
+        Returns:
+            Dict con estadísticas
+        """
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': in_flight,
+            'cross_process': cross_process_enabled()
+        }
+
+
+def _get_config() -> Dict[str, Any]:
+    return getattr(settings, 'RAG_CONFIG', {}).get('single_flight', {})
+
+
+def cross_process_enabled() -> bool:
+    """
+    Indica si la coalescencia entre workers (lock file) está activa
+    """
+    return bool(_get_config().get('cross_process', False)) and fcntl is not None
+
+
+@contextmanager
+def cross_process_lock(key: str) -> Iterator[None]:
+    """
+    Bloqueo exclusivo por clave compartido entre procesos (lock file)
+
+    Si la coalescencia entre procesos está deshabilitada o el sistema no
+    soporta fcntl, no bloquea.
+
+    Args:
+        key: Clave de la llamada
+    """
+    if not cross_process_enabled():
+        yield
+        return
+
+    lock_dir = Path(_get_config().get('lock_dir') or settings.BASE_DIR / 'locks')
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    name = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+    lock_path = lock_dir / f"{name}.lock"
+
+    with open(lock_path, 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+# Singleton
+_single_flight_instance = None
+
+
+def get_single_flight() -> SingleFlight:
+    """
+    Obtiene la instancia singleton de SingleFlight
+
+    Returns:
+        SingleFlight: Instancia compartida por el proceso
+    """
+    global _single_flight_instance
+    if _single_flight_instance is None:
+        _single_flight_instance = SingleFlight(
+            wait_timeout=_get_config().get('wait_timeout', 30.0)
+        )
+    return _single_flight_instance
+
+
+def single_flight(key: str, fn: Callable[[], Any]) -> Any:
+    """
+    Atajo para ejecutar fn coalescida por clave
+
+    Si single_flight está deshabilitado en RAG_CONFIG, ejecuta fn directamente.
+
+    Args:
+        key: Clave de la llamada
+        fn: Función a ejecutar
+
+    Returns:
+        Resultado de fn
+    """
+    if not _get_config().get('enabled', True):
+        return fn()
+    result, _ = get_single_flight().do(key, fn)
+    return result
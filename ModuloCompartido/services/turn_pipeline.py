@@ -0,0 +1,169 @@
+"""
+Turn Pipeline - Ejecución concurrente de etapas independientes de un turno
+Las etapas de red (recuperación RAG, llamadas al LLM) corren en un pool de
+hilos acotado mientras el hilo de la petición hace las consultas a la base
+de datos, de modo que sus latencias se solapan en vez de sumarse. Cada
+etapa registra su duración.
+
+Las etapas enviadas al pool no deben usar el ORM: cada hilo abriría su
+propia conexión a la base de datos.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+from django.conf import settings
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _get_config() -> Dict[str, Any]:
+    return getattr(settings, 'RAG_CONFIG', {}).get('turn_pipeline', {})
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Pool de hilos compartido por todos los turnos del proceso
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_get_config().get('max_workers', 4),
+                thread_name_prefix='turn-stage'
+            )
+        return _executor
+
+
+# Duración acumulada por etapa ("pipeline.etapa") en el proceso
+_stage_stats: Dict[str, Dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+
+def _record(key: str, elapsed_ms: float) -> None:
+    with _stats_lock:
+        stats = _stage_stats.setdefault(key, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+
+def get_turn_pipeline_stats() -> Dict[str, Any]:
+    """
+    Obtiene la duración promedio y máxima de cada etapa
+
+    Returns:
+        Dict "pipeline.etapa" → {count, avg_ms, max_ms}
+    """
+    with _stats_lock:
+        return {
+            key: {
+                'count': int(stats['count']),
+                'avg_ms': round(stats['total_ms'] / stats['count'], 2),
+                'max_ms': round(stats['max_ms'], 2)
+            }
+            for key, stats in _stage_stats.items()
+        }
+
+
+class TurnPipeline:
+    """
+    Etapas de un turno: submit() las lanza en el pool, run() las ejecuta en
+    el hilo actual y result() espera las del pool
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Nombre del pipeline (prefijo de las estadísticas)
+        """
+        config = _get_config()
+        self.name = name
+        self.enabled = config.get('enabled', True)
+        self.stage_timeout = config.get('stage_timeout', 10.0)
+        self.timings: Dict[str, float] = {}
+        self._futures: Dict[str, Tuple[Future, Any, Optional[float]]] = {}
+        self._started = time.perf_counter()
+
+    def submit(
+        self,
+        stage: str,
+        fn: Callable[[], Any],
+        default: Any = None,
+        wait_forever: bool = False
+    ) -> None:
+        """
+        Lanza una etapa en el pool de hilos
+
+        Args:
+            stage: Nombre de la etapa
+            fn: Función de la etapa (sin acceso al ORM)
+            default: Valor si la etapa excede stage_timeout
+            wait_forever: Si True, result() espera sin límite (la etapa es imprescindible)
+        """
+        future: Optional[Future] = None
+        if self.enabled:
+            try:
+                future = _get_executor().submit(self._timed, stage, fn)
+            except RuntimeError:
+                # Pool cerrado (p.ej. al apagar el proceso): ejecutar en línea
+                future = None
+        if future is None:
+            future = Future()
+            try:
+                future.set_result(self._timed(stage, fn))
+            except Exception as e:
+                future.set_exception(e)
+        self._futures[stage] = (future, default, None if wait_forever else self.stage_timeout)
+
+    def run(self, stage: str, fn: Callable[[], Any]) -> Any:
+        """
+        Ejecuta una etapa en el hilo actual registrando su duración
+        """
+        return self._timed(stage, fn)
+
+    def result(self, stage: str) -> Any:
+        """
+        Espera el resultado de una etapa lanzada con submit()
+
+        Returns:
+            Resultado de la etapa, o su default si excede stage_timeout
+
+        Raises:
+            Exception: La excepción de la etapa, si falló
+        """
+        future, default, timeout = self._futures[stage]
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            logger.warning(
+                f"Etapa '{self.name}.{stage}' excedió {timeout}s; se continúa sin ella"
+            )
+            return default
+
+    def finish(self) -> Dict[str, float]:
+        """
+        Cierra el turno y registra la duración total
+
+        Returns:
+            Duración en ms de cada etapa y del total
+        """
+        total_ms = (time.perf_counter() - self._started) * 1000
+        _record(f"{self.name}.total", total_ms)
+        self.timings['total'] = round(total_ms, 2)
+        logger.debug(f"Turno '{self.name}': {self.timings}")
+        return self.timings
+
+    def _timed(self, stage: str, fn: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.timings[stage] = round(elapsed_ms, 2)
+            _record(f"{self.name}.{stage}", elapsed_ms)
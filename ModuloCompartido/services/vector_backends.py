@@ -0,0 +1,381 @@
+"""
+Vector Backends - Backends intercambiables detrás de VectorStoreManager
+Las bases de conocimiento son pequeñas (decenas de chunks), así que además
+de ChromaDB (SQLite + HNSW) se ofrece una colección en memoria con búsqueda
+exacta por fuerza bruta: una matriz float32 y una multiplicación por
+consulta.
+
+NumpyCollection implementa el subconjunto de la API de chromadb.Collection
+que usa VectorStoreManager (add, upsert, query, get, delete, count) con la misma
+distancia por defecto de Chroma (L2 al cuadrado) y los mismos filtros
+where, de modo que el resto del sistema no distingue el backend.
+
+El backend se elige en RAG_CONFIG['vector_store']['backend'].
+"""
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from django.conf import settings
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('chroma', 'numpy')
+
+
+def get_vector_backend_name() -> str:
+    """
+    Backend de vector store configurado en RAG_CONFIG['vector_store']
+
+    Returns:
+        'chroma' o 'numpy'
+    """
+    backend = getattr(settings, 'RAG_CONFIG', {}).get('vector_store', {}).get('backend', 'chroma')
+    if backend not in BACKENDS:
+        logger.warning(f"Backend de vector store desconocido '{backend}': usando chroma")
+        return 'chroma'
+    return backend
+
+
+def _compare(value: Any, operator: str, expected: Any) -> bool:
+    if operator == '$eq':
+        return value == expected
+    if operator == '$ne':
+        return value != expected
+    if operator == '$in':
+        return value in expected
+    if operator == '$nin':
+        return value not in expected
+    if value is None:
+        return False
+    if operator == '$gt':
+        return value > expected
+    if operator == '$gte':
+        return value >= expected
+    if operator == '$lt':
+        return value < expected
+    if operator == '$lte':
+        return value <= expected
+    raise ValueError(f"Operador where no soportado: {operator}")
+
+
+def matches_where(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evalúa un filtro where con la sintaxis de Chroma sobre los metadatos de un chunk
+
+    Soporta igualdad directa ({"category": "faq"}), operadores ($eq, $ne,
+    $gt, $gte, $lt, $lte, $in, $nin) y combinaciones $and / $or.
+
+    Args:
+        metadata: Metadatos del chunk
+        where: Filtro (None = sin filtro)
+
+    Returns:
+        True si el chunk cumple el filtro
+    """
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(matches_where(metadata, sub) for sub in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_where(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_compare(value, op, expected) for op, expected in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class NumpyCollection:
+    """
+    Colección en memoria con búsqueda exacta, persistida en un archivo .npz
+
+    La matriz de embeddings se guarda junto a ChromaDB para que los workers
+    carguen lo que ingestó otro proceso: cada operación revisa la fecha de
+    modificación del archivo y lo recarga si cambió.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: Path,
+        embedding_function: Callable[[List[str]], Sequence[Sequence[float]]],
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            name: Nombre de la colección
+            path: Archivo .npz donde se persiste la colección
+            embedding_function: Función de embeddings de documentos (la de la colección de Chroma)
+            metadata: Metadatos de la colección (si el archivo ya existe se usan los guardados)
+        """
+        self.name = name
+        self.path = Path(path)
+        self.metadata = metadata or {}
+        self._embedding_function = embedding_function
+        self._lock = threading.Lock()
+        self._mtime_ns: Optional[int] = None
+        # Instantánea inmutable: (ids, documentos, metadatos, matriz, normas al cuadrado)
+        self._data = self._empty()
+        self._reload_if_changed()
+
+    @staticmethod
+    def read_metadata(path: Path) -> Optional[Dict[str, Any]]:
+        """
+        Metadatos guardados en un archivo .npz sin cargar la matriz
+
+        Returns:
+            Metadatos (vacíos si el archivo es anterior a guardarlos) o None si no existe
+        """
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return json.loads(str(data['records'])).get('metadata', {})
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _empty() -> Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray, np.ndarray]:
+        return [], [], [], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+    def count(self) -> int:
+        self._reload_if_changed()
+        return len(self._data[0])
+
+    def add(
+        self,
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        embeddings: Optional[Sequence[Sequence[float]]] = None
+    ) -> None:
+        """
+        Agrega documentos (los IDs ya existentes se ignoran, como en Chroma)
+        """
+        if ids is None or len(ids) != len(documents):
+            raise ValueError("add requiere un ID por documento")
+        metadatas = metadatas or [{} for _ in documents]
+        if embeddings is None:
+            embeddings = self._embedding_function(list(documents))
+        new_vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(documents), -1)
+
+        with self._lock:
+            self._reload_if_changed(locked=True)
+            current_ids, current_docs, current_metas, matrix, _ = self._data
+            existing = set(current_ids)
+            keep = [i for i, doc_id in enumerate(ids) if doc_id not in existing]
+            if len(keep) < len(ids):
+                logger.warning(f"{len(ids) - len(keep)} IDs ya existen en {self.name} y se ignoran")
+            if not keep:
+                return
+            if matrix.size:
+                matrix = np.vstack([matrix, new_vectors[keep]])
+            else:
+                matrix = new_vectors[keep]
+            self._set_data(
+                current_ids + [ids[i] for i in keep],
+                current_docs + [documents[i] for i in keep],
+                current_metas + [dict(metadatas[i] or {}) for i in keep],
+                matrix
+            )
+            self._save()
+
+    def upsert(
+        self,
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        embeddings: Optional[Sequence[Sequence[float]]] = None
+    ) -> None:
+        """
+        Agrega documentos y reemplaza los que ya tengan el mismo ID
+        """
+        if ids is None or len(ids) != len(documents):
+            raise ValueError("upsert requiere un ID por documento")
+        metadatas = metadatas or [{} for _ in documents]
+        if embeddings is None:
+            embeddings = self._embedding_function(list(documents))
+        new_vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(documents), -1)
+
+        with self._lock:
+            self._reload_if_changed(locked=True)
+            current_ids, current_docs, current_metas, matrix, _ = self._data
+            replaced = set(ids)
+            keep = [i for i, doc_id in enumerate(current_ids) if doc_id not in replaced]
+            matrix = np.vstack([matrix[keep], new_vectors]) if keep else new_vectors
+            self._set_data(
+                [current_ids[i] for i in keep] + list(ids),
+                [current_docs[i] for i in keep] + list(documents),
+                [current_metas[i] for i in keep] + [dict(m or {}) for m in metadatas],
+                matrix
+            )
+            self._save()
+
+    def query(
+        self,
+        query_embeddings: Optional[Sequence[Sequence[float]]] = None,
+        query_texts: Optional[List[str]] = None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> Dict[str, List[List[Any]]]:
+        """
+        Búsqueda exacta: una multiplicación matriz-vector por consulta
+
+        Returns:
+            Dict con la forma de Chroma (ids, documents, metadatas, distances)
+        """
+        if query_embeddings is None:
+            query_embeddings = self._embedding_function(list(query_texts or []))
+        self._reload_if_changed()
+        ids, documents, metadatas, matrix, sq_norms = self._data
+
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        candidates = np.arange(len(ids))
+        if where:
+            candidates = np.array(
+                [i for i in candidates if matches_where(metadatas[i], where)], dtype=np.int64
+            )
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        for query_vector in queries:
+            if not len(candidates):
+                for field in results:
+                    results[field].append([])
+                continue
+            # ||d - q||² = ||d||² - 2 d·q + ||q||² (distancia 'l2' de Chroma)
+            distances = sq_norms[candidates] - 2.0 * (matrix[candidates] @ query_vector)
+            distances += float(query_vector @ query_vector)
+            np.maximum(distances, 0.0, out=distances)
+
+            k = min(n_results, len(candidates))
+            top = np.argpartition(distances, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+            top = top[np.argsort(distances[top], kind='stable')]
+            rows = candidates[top]
+            results['ids'].append([ids[i] for i in rows])
+            results['documents'].append([documents[i] for i in rows])
+            results['metadatas'].append([metadatas[i] for i in rows])
+            results['distances'].append([float(d) for d in distances[top]])
+        return results
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        **kwargs
+    ) -> Dict[str, List[Any]]:
+        """
+        Obtiene documentos por ID y/o filtro where
+
+        Returns:
+            Dict con la forma de Chroma (ids, documents, metadatas y, si se
+            pide en include, embeddings)
+        """
+        self._reload_if_changed()
+        all_ids, documents, metadatas, matrix, _ = self._data
+        rows = self._select(ids, where)
+        results = {
+            'ids': [all_ids[i] for i in rows],
+            'documents': [documents[i] for i in rows],
+            'metadatas': [metadatas[i] for i in rows]
+        }
+        if include and 'embeddings' in include:
+            results['embeddings'] = matrix[rows]
+        return results
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Elimina documentos por ID y/o filtro where
+        """
+        with self._lock:
+            self._reload_if_changed(locked=True)
+            all_ids, documents, metadatas, matrix, _ = self._data
+            remove = set(self._select(ids, where))
+            if not remove:
+                return
+            keep = [i for i in range(len(all_ids)) if i not in remove]
+            self._set_data(
+                [all_ids[i] for i in keep],
+                [documents[i] for i in keep],
+                [metadatas[i] for i in keep],
+                matrix[keep] if keep else np.zeros((0, 0), dtype=np.float32)
+            )
+            self._save()
+
+    def reset(self) -> None:
+        """
+        Vacía la colección y elimina su archivo
+        """
+        with self._lock:
+            self._data = self._empty()
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+            self._mtime_ns = None
+
+    def memory_bytes(self) -> int:
+        """
+        Memoria aproximada de la matriz de embeddings
+        """
+        return int(self._data[3].nbytes + self._data[4].nbytes)
+
+    def _select(self, ids: Optional[List[str]], where: Optional[Dict[str, Any]]) -> List[int]:
+        all_ids, _, metadatas, _, _ = self._data
+        wanted = set(ids) if ids is not None else None
+        return [
+            i for i, doc_id in enumerate(all_ids)
+            if (wanted is None or doc_id in wanted) and matches_where(metadatas[i], where)
+        ]
+
+    def _set_data(self, ids, documents, metadatas, matrix: np.ndarray) -> None:
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        sq_norms = np.einsum('ij,ij->i', matrix, matrix) if matrix.size else np.zeros(0, dtype=np.float32)
+        self._data = (ids, documents, metadatas, matrix, sq_norms)
+
+    def _reload_if_changed(self, locked: bool = False) -> None:
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if mtime_ns == self._mtime_ns:
+            return
+        if not locked:
+            with self._lock:
+                self._reload_if_changed(locked=True)
+            return
+        if mtime_ns is None:
+            self._data = self._empty()
+        else:
+            with np.load(self.path, allow_pickle=False) as data:
+                records = json.loads(str(data['records']))
+                self.metadata = records.get('metadata', {})
+                self._set_data(records['ids'], records['documents'], records['metadatas'], data['embeddings'])
+            logger.info(f"Colección en memoria {self.name} cargada: {len(self._data[0])} chunks")
+        self._mtime_ns = mtime_ns
+
+    def _save(self) -> None:
+        # Llamar con el lock tomado; escritura atómica para los otros procesos
+        ids, documents, metadatas, matrix, _ = self._data
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp.npz')
+        records = json.dumps(
+            {'ids': ids, 'documents': documents, 'metadatas': metadatas, 'metadata': self.metadata},
+            ensure_ascii=False
+        )
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, embeddings=matrix, records=np.array(records))
+        os.replace(tmp_path, self.path)
+        self._mtime_ns = self.path.stat().st_mtime_ns
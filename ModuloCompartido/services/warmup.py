@@ -0,0 +1,212 @@
+"""
+Warm-up - Inicialización anticipada del stack RAG/LLM de ambos módulos
+Los singletons (cliente de ChromaDB, colecciones, modelo de embeddings,
+índice léxico, genai.configure) se crean en la primera petición, así que el
+primer mensaje de cada worker tarda varios segundos. El warm-up los crea al
+arrancar (AppConfig.ready o `python manage.py warmup_rag`) y registra el
+estado y el tiempo de cada componente para el endpoint de readiness.
+
+Es opcional: RAG_CONFIG['warmup']['enabled'] (variable WARMUP_ON_STARTUP).
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from django.conf import settings
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WARMUP_QUERY = 'consulta de calentamiento del sistema'
+
+STATUS_PENDING = 'pending'
+STATUS_WARMING = 'warming'
+STATUS_READY = 'ready'
+STATUS_ERROR = 'error'
+
+
+def _boletas_vector_store():
+    from ModuloBoletas.RAG.vector_store import get_vector_store
+    return get_vector_store()
+
+
+def _emergencia_vector_store():
+    from ModuloEmergencia.RAG.vector_store import get_vector_store
+    return get_vector_store()
+
+
+def _warm_embeddings(get_store: Callable[[], Any]) -> Callable[[], None]:
+    # _compute_embedding carga el modelo sin dejar la consulta de prueba en la caché
+    return lambda: get_store()._compute_embedding(WARMUP_QUERY)
+
+
+def _warm_lexical_index(get_store: Callable[[], Any]) -> Callable[[], None]:
+    return lambda: get_store().lexical_index.search(WARMUP_QUERY, n_results=1)
+
+
+def _boletas_chatbot():
+    from ModuloBoletas.services.chatbot_service import get_chatbot_service
+    get_chatbot_service()
+
+
+def _emergencia_chatbot():
+    from ModuloEmergencia.services.chatbot_service import get_chatbot_service
+    get_chatbot_service()
+
+
+# Componentes en orden: cada uno reutiliza lo que inicializó el anterior
+COMPONENTS: List[Tuple[str, Callable[[], Any]]] = [
+    ('boletas_vector_store', _boletas_vector_store),
+    ('boletas_embeddings', _warm_embeddings(_boletas_vector_store)),
+    ('boletas_lexical_index', _warm_lexical_index(_boletas_vector_store)),
+    ('boletas_chatbot', _boletas_chatbot),
+    ('emergencia_vector_store', _emergencia_vector_store),
+    ('emergencia_embeddings', _warm_embeddings(_emergencia_vector_store)),
+    ('emergencia_lexical_index', _warm_lexical_index(_emergencia_vector_store)),
+    ('emergencia_chatbot', _emergencia_chatbot),
+]
+
+_state: Dict[str, Dict[str, Any]] = {}
+# PID del proceso que lanzó el warm-up: un worker creado con fork (gunicorn
+# --preload) hereda el estado del padre pero no su hilo de warm-up
+_started_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def get_warmup_config() -> Dict[str, Any]:
+    """
+    Configuración del warm-up (RAG_CONFIG['warmup'])
+    """
+    return getattr(settings, 'RAG_CONFIG', {}).get('warmup', {})
+
+
+def _set_state(name: str, **values) -> None:
+    with _lock:
+        _state.setdefault(name, {'status': STATUS_PENDING}).update(values)
+
+
+def run_warmup(components: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Inicializa los componentes en orden y registra su estado y duración
+
+    Un componente que falla queda en 'error' y el resto se sigue calentando.
+
+    Args:
+        components: Nombres a calentar (todos los de COMPONENTS si None)
+
+    Returns:
+        Dict con el estado de readiness (ver get_readiness)
+    """
+    selected = _select_components(components)
+    with _lock:
+        _mark_started(selected)
+    return _warm_components(selected)
+
+
+def _select_components(components: Optional[List[str]]) -> List[Tuple[str, Callable[[], Any]]]:
+    return [(name, warm) for name, warm in COMPONENTS if components is None or name in components]
+
+
+def _mark_started(selected: List[Tuple[str, Callable[[], Any]]]) -> None:
+    # Se llama con _lock tomado
+    global _started_pid
+    _started_pid = os.getpid()
+    for name, _ in selected:
+        _state[name] = {'status': STATUS_PENDING}
+
+
+def _warm_components(selected: List[Tuple[str, Callable[[], Any]]]) -> Dict[str, Any]:
+    started_total = time.perf_counter()
+    for name, warm in selected:
+        _set_state(name, status=STATUS_WARMING)
+        started = time.perf_counter()
+        try:
+            warm()
+            _set_state(name, status=STATUS_READY, init_ms=round((time.perf_counter() - started) * 1000, 1))
+        except Exception as e:
+            _set_state(
+                name,
+                status=STATUS_ERROR,
+                init_ms=round((time.perf_counter() - started) * 1000, 1),
+                error=str(e)
+            )
+            logger.error(f"Warm-up de {name} falló: {e}")
+
+    logger.info(f"🔥 Warm-up completado en {(time.perf_counter() - started_total) * 1000:.0f} ms")
+    return get_readiness()
+
+
+def start_warmup_in_background() -> Optional[threading.Thread]:
+    """
+    Lanza el warm-up en un hilo para no bloquear el arranque del worker
+
+    Returns:
+        El hilo lanzado, o None si el warm-up ya se inició en este proceso
+    """
+    selected = _select_components(None)
+    with _lock:
+        # El estado heredado de otro proceso (fork) no cuenta como iniciado
+        if _started_pid == os.getpid():
+            return None
+        _mark_started(selected)
+    thread = threading.Thread(target=_warm_components, args=(selected,), name='rag-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def should_warm_on_startup() -> bool:
+    """
+    Indica si AppConfig.ready debe lanzar el warm-up
+
+    Con manage.py solo se calienta el proceso que atiende runserver (no el
+    autoreloader ni comandos como migrate o test); bajo un servidor WSGI/ASGI
+    siempre.
+    """
+    if not get_warmup_config().get('enabled', False):
+        return False
+    if os.path.basename(sys.argv[0]) == 'manage.py':
+        return len(sys.argv) > 1 and sys.argv[1] == 'runserver' and os.environ.get('RUN_MAIN') == 'true'
+    return True
+
+
+def get_readiness() -> Dict[str, Any]:
+    """
+    Estado de readiness del worker
+
+    Sin warm-up habilitado ni ejecutado el worker se reporta listo (los
+    componentes se inicializan en la primera petición, como siempre).
+
+    Returns:
+        Dict con 'ready', 'warmup' y el estado/tiempo de cada componente
+    """
+    with _lock:
+        components = {name: dict(values) for name, values in _state.items()}
+        started = _started_pid == os.getpid()
+
+    if not started:
+        enabled = get_warmup_config().get('enabled', False)
+        return {
+            'ready': not enabled,
+            'warmup': 'pending' if enabled else 'disabled',
+            'components': {}
+        }
+
+    ready = all(values['status'] == STATUS_READY for values in components.values())
+    in_progress = any(values['status'] in (STATUS_PENDING, STATUS_WARMING) for values in components.values())
+    return {
+        'ready': ready,
+        'warmup': 'running' if in_progress else 'finished',
+        'init_ms': round(sum(values.get('init_ms', 0) for values in components.values()), 1),
+        'components': components
+    }
+
+
+def reset_warmup_state() -> None:
+    """
+    Olvida el estado del warm-up (tests)
+    """
+    global _started_pid
+    with _lock:
+        _state.clear()
+        _started_pid = None
@@ -0,0 +1,1345 @@
+"""
+Tests unitarios para el Módulo Compartido
+"""
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+import numpy as np
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from ModuloCompartido.services.chroma_registry import (
+    get_chroma_client,
+    get_chroma_collection,
+    get_chroma_registry_stats,
+    reset_chroma_registry,
+)
+from ModuloCompartido.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from ModuloCompartido.services.context_selection import (
+    merge_overlapping_text,
+    mmr_order,
+    select_context_documents,
+)
+from ModuloCompartido.services.embedding_cache import QueryEmbeddingCache, normalize_query
+from ModuloCompartido.services import embedding_function
+from ModuloCompartido.services.embedding_function import CHROMA_DEFAULT_MODEL, SentenceTransformerEmbedder
+from ModuloCompartido.services.embedding_migration import read_stored_embedding_model, reembed_collection
+from ModuloCompartido.services import onnx_embedding
+from ModuloCompartido.services.onnx_embedding import (
+    SAMPLE_TEXTS,
+    OnnxSentenceEncoder,
+    cosine_agreement,
+    get_onnx_model_dir,
+)
+from ModuloCompartido.services.kb_ingest import IncrementalIngester
+from ModuloCompartido.services.lexical_index import (
+    BM25Index,
+    LexicalIndexStore,
+    fuse_results,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+from ModuloCompartido.services.lazy_import import get_lazy_import_stats, lazy_module
+from ModuloCompartido.services.parallel_loader import load_files
+from ModuloCompartido.services.llm_cache import (
+    CachedGenerativeModel,
+    DjangoCacheBackend,
+    MemoryCacheBackend,
+    SQLiteCacheBackend,
+    get_llm_cache_stats,
+)
+from ModuloCompartido.services.llm_providers import (
+    CassetteMiss,
+    CassetteModel,
+    HTTPStubModel,
+    LLMProviderError,
+)
+from ModuloCompartido.services.llm_stub_server import StubConfig, make_server
+from ModuloCompartido.services.prompt_budget import (
+    PRIORITY_FACTS,
+    PRIORITY_HISTORY,
+    PRIORITY_RAG,
+    PromptAssembler,
+    count_tokens,
+)
+from ModuloCompartido.services.retrieval_cache import RetrievalCache
+from ModuloCompartido.services.quota import (
+    GeminiQuotaAccountant,
+    QuotaExceeded,
+    is_quota_error,
+)
+from ModuloCompartido.services.single_flight import SingleFlight
+from ModuloCompartido.services.vector_backends import NumpyCollection, matches_where
+from ModuloCompartido.services.turn_pipeline import TurnPipeline, get_turn_pipeline_stats
+from ModuloCompartido.services import warmup
+
+
+class LLMCacheTests(TestCase):
+    """Tests para la caché exacta de prompts/respuestas"""
+
+    def setUp(self):
+        self.inner = Mock()
+        self.inner.generate_content.return_value = Mock(text='{"rut": "12345678-9"}')
+        self.model = CachedGenerativeModel(self.inner, 'gemini-test', MemoryCacheBackend())
+
+    def test_prompt_repetido_usa_cache(self):
+        """Test: El mismo prompt y configuración solo llama al modelo una vez"""
+        config = {'temperature': 0.1}
+        first = self.model.generate_content('prompt', generation_config=config, call_site='test_repetido')
+        second = self.model.generate_content('prompt', generation_config=config, call_site='test_repetido')
+
+        self.assertEqual(self.inner.generate_content.call_count, 1)
+        self.assertEqual(first.text, second.text)
+        self.assertTrue(second.from_cache)
+        stats = get_llm_cache_stats()['call_sites']['test_repetido']
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_configuracion_distinta_no_comparte_entrada(self):
+        """Test: generation_config forma parte de la clave"""
+        self.model.generate_content('prompt', generation_config={'temperature': 0.1})
+        self.model.generate_content('prompt', generation_config={'temperature': 0.9})
+
+        self.assertEqual(self.inner.generate_content.call_count, 2)
+
+    def test_bypass_y_stream_no_usan_cache(self):
+        """Test: bypass_cache y stream=True siempre llaman al modelo"""
+        self.model.generate_content('prompt')
+        self.model.generate_content('prompt', bypass_cache=True)
+        self.model.generate_content('prompt', stream=True)
+
+        self.assertEqual(self.inner.generate_content.call_count, 3)
+
+    def test_errores_no_se_cachean(self):
+        """Test: Si el modelo falla, la siguiente llamada lo vuelve a intentar"""
+        self.inner.generate_content.side_effect = [Exception('429 quota'), Mock(text='ok')]
+
+        with self.assertRaises(Exception):
+            self.model.generate_content('prompt')
+        self.assertEqual(self.model.generate_content('prompt').text, 'ok')
+
+    def test_backend_sqlite(self):
+        """Test: El backend SQLite persiste y respeta el TTL"""
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = SQLiteCacheBackend(os.path.join(tmp, 'cache.sqlite3'))
+            backend.set('k', 'v', ttl=60)
+            backend.set('expirada', 'v', ttl=-1)
+
+            self.assertEqual(SQLiteCacheBackend(os.path.join(tmp, 'cache.sqlite3')).get('k'), 'v')
+            self.assertIsNone(backend.get('expirada'))
+
+    def test_backend_django_clear_no_vacia_el_alias(self):
+        """Test: clear() invalida solo las entradas LLM, no el resto de la caché de Django"""
+        from django.core.cache import caches
+        shared = caches['default']
+        shared.set('sesion:abc', 'datos de sesión', timeout=60)
+        backend = DjangoCacheBackend()
+        backend.set('k', 'v', ttl=60)
+
+        backend.clear()
+
+        self.assertIsNone(backend.get('k'))
+        self.assertIsNone(DjangoCacheBackend().get('k'))
+        self.assertEqual(shared.get('sesion:abc'), 'datos de sesión')
+        backend.set('k', 'nuevo', ttl=60)
+        self.assertEqual(backend.get('k'), 'nuevo')
+
+
+class SingleFlightTests(TestCase):
+    """Tests para la coalescencia de llamadas idénticas concurrentes"""
+
+    def _run_concurrently(self, flight, key, fn, n=5):
+        """Lanza n hilos con la misma clave mientras el líder está bloqueado"""
+        results, errors = [], []
+
+        def worker():
+            try:
+                results.append(flight.do(key, fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_llamadas_identicas_se_ejecutan_una_vez(self):
+        """Test: Los hilos con la misma clave comparten una sola ejecución"""
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return 'respuesta'
+
+        threads, results, _ = self._run_concurrently(flight, 'k', slow)
+        while flight.get_stats()['in_flight'] == 0:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result == 'respuesta' for result, _ in results))
+        self.assertEqual(len(calls) + flight.coalesced, 5)
+        self.assertEqual(flight.executed, len(calls))
+
+    def test_error_se_propaga_a_los_que_esperan(self):
+        """Test: Si la llamada falla, todos los hilos coalescidos reciben el error"""
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def failing():
+            release.wait(5)
+            raise ValueError('quota')
+
+        threads, results, errors = self._run_concurrently(flight, 'k', failing, n=3)
+        while flight.get_stats()['in_flight'] == 0:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+
+    def test_cache_llm_coalesce_misses_concurrentes(self):
+        """Test: Prompts idénticos concurrentes llaman a Gemini una sola vez"""
+        release = threading.Event()
+        inner = Mock()
+
+        def slow_generate(prompt, **kwargs):
+            release.wait(5)
+            return Mock(text='respuesta')
+
+        inner.generate_content.side_effect = slow_generate
+        model = CachedGenerativeModel(inner, 'gemini-test', MemoryCacheBackend())
+
+        threads = [
+            threading.Thread(target=model.generate_content, args=('mismo prompt',))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        while inner.generate_content.call_count == 0:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(inner.generate_content.call_count, 1)
+
+
+class GeminiQuotaTests(TestCase):
+    """Tests para el control de admisión por token bucket"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'quota.sqlite3')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rpm_agotado_rechaza_al_instante(self):
+        """Test: Superado el RPM la llamada se rechaza sin esperar"""
+        accountant = GeminiQuotaAccountant(self.path, requests_per_minute=2)
+        accountant.try_acquire(10)
+        accountant.try_acquire(10)
+
+        with self.assertRaises(QuotaExceeded) as ctx:
+            accountant.try_acquire(10)
+        self.assertEqual(ctx.exception.reason, 'rpm')
+        self.assertGreater(ctx.exception.retry_after, 0)
+        self.assertTrue(is_quota_error(ctx.exception))
+
+    def test_presupuesto_compartido_entre_instancias(self):
+        """Test: Dos workers sobre el mismo archivo comparten el presupuesto"""
+        worker_a = GeminiQuotaAccountant(self.path, requests_per_minute=10, tokens_per_minute=100)
+        worker_b = GeminiQuotaAccountant(self.path, requests_per_minute=10, tokens_per_minute=100)
+        worker_a.try_acquire(80)
+
+        with self.assertRaises(QuotaExceeded) as ctx:
+            worker_b.try_acquire(50)
+        self.assertEqual(ctx.exception.reason, 'tpm')
+
+    def test_429_real_activa_cooldown(self):
+        """Test: Un 429 de la API pausa las llamadas de todos los workers"""
+        accountant = GeminiQuotaAccountant(self.path, cooldown_seconds=30)
+        accountant.report_rate_limited()
+
+        with self.assertRaises(QuotaExceeded) as ctx:
+            GeminiQuotaAccountant(self.path).try_acquire(1)
+        self.assertEqual(ctx.exception.reason, 'cooldown')
+
+    def test_modelo_no_se_llama_si_excede(self):
+        """Test: El wrapper del modelo rechaza antes de ir a la red"""
+        accountant = GeminiQuotaAccountant(self.path, requests_per_minute=1)
+        inner = Mock()
+        inner.generate_content.return_value = Mock(text='ok')
+        model = CachedGenerativeModel(inner, 'gemini-test', None)
+
+        with patch('ModuloCompartido.services.llm_cache.get_quota_accountant', return_value=accountant):
+            model.generate_content('primero')
+            with self.assertRaises(QuotaExceeded):
+                model.generate_content('segundo')
+
+        self.assertEqual(inner.generate_content.call_count, 1)
+        self.assertEqual(accountant.get_stats()['rejected'], 1)
+
+
+class CircuitBreakerTests(TestCase):
+    """Tests para el circuit breaker del LLM"""
+
+    def _breaker(self, **kwargs):
+        options = {'minimum_calls': 4, 'open_seconds': 30}
+        options.update(kwargs)
+        return CircuitBreaker('test', **options)
+
+    def test_tasa_de_fallos_abre_el_circuito(self):
+        """Test: Superada la tasa de fallos el circuito rechaza sin llamar"""
+        breaker = self._breaker()
+        breaker.record_success(0.1)
+        breaker.record_success(0.1)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.STATE_CLOSED)
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.STATE_OPEN)
+        self.assertTrue(breaker.is_open())
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        self.assertEqual(breaker.get_status()['rejected'], 1)
+
+    def test_llamadas_lentas_abren_el_circuito(self):
+        """Test: Las llamadas que superan el umbral de latencia cuentan"""
+        breaker = self._breaker(slow_call_seconds=2.0, slow_call_rate_threshold=0.5)
+        for duration in (0.1, 0.1, 3.0, 3.0):
+            breaker.record_success(duration)
+
+        self.assertEqual(breaker.state, CircuitBreaker.STATE_OPEN)
+
+    def test_semiabierto_cierra_tras_prueba_exitosa(self):
+        """Test: Tras open_seconds una llamada de prueba exitosa cierra el circuito"""
+        breaker = self._breaker(open_seconds=0)
+        for _ in range(4):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.STATE_HALF_OPEN)
+
+        breaker.before_call()
+        self.assertTrue(breaker.is_open())  # Solo una prueba simultánea
+        breaker.record_success(0.1)
+        self.assertEqual(breaker.state, CircuitBreaker.STATE_CLOSED)
+
+    def test_semiabierto_reabre_si_la_prueba_falla(self):
+        """Test: Una prueba fallida vuelve a abrir el circuito"""
+        breaker = self._breaker(open_seconds=0)
+        for _ in range(4):
+            breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.get_status()['times_opened'], 2)
+
+    def test_modelo_no_se_llama_con_circuito_abierto(self):
+        """Test: El wrapper del modelo corta antes de ir a la red"""
+        inner = Mock()
+        inner.generate_content.side_effect = Exception('503 unavailable')
+        model = CachedGenerativeModel(inner, 'gemini-test', None, self._breaker())
+
+        for _ in range(4):
+            with self.assertRaises(Exception):
+                model.generate_content('prompt')
+        self.assertTrue(model.circuit_open())
+
+        with self.assertRaises(CircuitOpenError):
+            model.generate_content('prompt')
+        self.assertEqual(inner.generate_content.call_count, 4)
+
+
+class TurnPipelineTests(TestCase):
+    """Tests para la ejecución concurrente de etapas de un turno"""
+
+    def test_etapas_se_solapan(self):
+        """Test: Una etapa en el pool corre mientras otra corre en línea"""
+        pipeline = TurnPipeline('test_solape')
+        started = time.perf_counter()
+        pipeline.submit('rag', lambda: time.sleep(0.2) or 'contexto')
+        pipeline.run('history', lambda: time.sleep(0.2))
+        result = pipeline.result('rag')
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(result, 'contexto')
+        self.assertLess(elapsed, 0.35)
+
+    def test_registra_duracion_por_etapa(self):
+        """Test: Cada etapa y el total quedan en las estadísticas"""
+        pipeline = TurnPipeline('test_tiempos')
+        pipeline.run('boleta', lambda: None)
+        pipeline.submit('rag', lambda: None)
+        pipeline.result('rag')
+        timings = pipeline.finish()
+
+        self.assertEqual(set(timings), {'boleta', 'rag', 'total'})
+        stats = get_turn_pipeline_stats()
+        for key in ('test_tiempos.boleta', 'test_tiempos.rag', 'test_tiempos.total'):
+            self.assertGreaterEqual(stats[key]['count'], 1)
+
+    def test_etapa_lenta_devuelve_default(self):
+        """Test: Una etapa opcional que excede el timeout no bloquea el turno"""
+        pipeline = TurnPipeline('test_timeout')
+        pipeline.stage_timeout = 0.05
+        pipeline.submit('rag', lambda: time.sleep(0.3) or 'tarde', default='')
+
+        self.assertEqual(pipeline.result('rag'), '')
+
+    def test_excepcion_de_etapa_se_propaga(self):
+        """Test: result() relanza la excepción de la etapa"""
+        pipeline = TurnPipeline('test_error')
+        pipeline.submit('extraction', Mock(side_effect=ValueError('boom')), wait_forever=True)
+
+        with self.assertRaises(ValueError):
+            pipeline.result('extraction')
+
+    def test_deshabilitado_ejecuta_en_linea(self):
+        """Test: Con el pipeline deshabilitado las etapas corren en el hilo actual"""
+        pipeline = TurnPipeline('test_inline')
+        pipeline.enabled = False
+        thread_names = []
+        pipeline.submit('rag', lambda: thread_names.append(threading.current_thread().name))
+
+        pipeline.result('rag')
+        self.assertEqual(thread_names, [threading.current_thread().name])
+
+
+class PromptAssemblerTests(TestCase):
+    """Tests para el armado de prompts con presupuesto de tokens"""
+
+    def test_estimacion_local_de_tokens(self):
+        """Test: Palabras aportan un token por cada 4 caracteres y la puntuación uno"""
+        self.assertEqual(count_tokens(''), 0)
+        self.assertEqual(count_tokens('hola'), 1)
+        self.assertEqual(count_tokens('consumo, agua'), 4)
+
+    def test_sin_presupuesto_incluye_todo_en_orden(self):
+        """Test: Las secciones se renderizan en el orden en que se agregan"""
+        assembler = PromptAssembler('test_orden', budget_tokens=None)
+        assembler.add('rol', 'Eres un asistente.', required=True)
+        assembler.add_items('rag', ['[1] uno', '[2] dos'], PRIORITY_RAG, header='CONTEXTO:')
+        assembler.add('pregunta', '¿Cuánto debo?', header='PREGUNTA:', required=True)
+
+        self.assertEqual(
+            assembler.build(),
+            'Eres un asistente.\n\nCONTEXTO:\n[1] uno\n[2] dos\n\nPREGUNTA:\n¿Cuánto debo?'
+        )
+
+    def test_llena_el_presupuesto_por_prioridad(self):
+        """Test: Con poco presupuesto se descarta primero el RAG y luego el historial antiguo"""
+        historial = [f'usuario: mensaje {i}' for i in range(10)]
+        fragmentos = ['fragmento ' * 40 for _ in range(3)]
+        instrucciones = 'Responde en pocas líneas.'
+        budget = count_tokens(instrucciones) + count_tokens('datos de la boleta') + 3 * count_tokens(historial[0]) + 2
+
+        assembler = PromptAssembler('test_prioridad', budget_tokens=budget)
+        assembler.add('instrucciones', instrucciones, required=True)
+        assembler.add_items('rag', fragmentos, PRIORITY_RAG, truncate=True)
+        assembler.add('boleta', 'datos de la boleta', PRIORITY_FACTS)
+        assembler.add_items('historial', historial, PRIORITY_HISTORY, keep='last')
+        prompt = assembler.build()
+
+        self.assertLessEqual(count_tokens(prompt), budget)
+        self.assertIn('datos de la boleta', prompt)
+        self.assertIn('mensaje 9', prompt)
+        self.assertNotIn('mensaje 0', prompt)
+        self.assertNotIn('fragmento', prompt)
+
+    def test_recorta_ultimo_fragmento(self):
+        """Test: El fragmento que no cabe completo se recorta en vez de descartarse"""
+        assembler = PromptAssembler('test_recorte', budget_tokens=60)
+        assembler.add_items('rag', ['palabra ' * 100], PRIORITY_RAG, truncate=True)
+        prompt = assembler.build()
+
+        self.assertTrue(prompt.endswith('...'))
+        self.assertLessEqual(count_tokens(prompt), 60)
+
+
+class LLMProviderTests(TestCase):
+    """Tests para los backends de LLM (stub HTTP y cassette)"""
+
+    def _start_stub(self, **options):
+        options.setdefault('latency_ms', 0)
+        options.setdefault('chunk_delay_ms', 0)
+        server = make_server(port=0, config=StubConfig(seed=1, **options))
+        threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return HTTPStubModel(f"http://127.0.0.1:{server.server_address[1]}", timeout=5)
+
+    def test_stub_responde_de_forma_determinista(self):
+        """Test: El mismo prompt recibe la misma respuesta y los prompts JSON reciben {}"""
+        model = self._start_stub()
+        first = model.generate_content('¿Cómo pago mi boleta?')
+        second = model.generate_content('¿Cómo pago mi boleta?')
+
+        self.assertEqual(first.text, second.text)
+        self.assertEqual(first.candidates[0].finish_reason, 'STOP')
+        self.assertGreater(first.usage_metadata.total_token_count, 0)
+        self.assertEqual(model.generate_content('Extrae datos.\n\nJSON:').text, '{}')
+
+    def test_stub_streaming(self):
+        """Test: En streaming el stub envía un fragmento por palabra"""
+        model = self._start_stub()
+        chunks = [chunk.text for chunk in model.generate_content('Hola', stream=True)]
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), model.generate_content('Hola').text)
+
+    def test_stub_fallos_configurables(self):
+        """Test: Los 429 del stub se reconocen como errores de cuota"""
+        model = self._start_stub(rate_limit_rate=1.0)
+        with self.assertRaises(LLMProviderError) as ctx:
+            model.generate_content('Hola')
+        self.assertTrue(is_quota_error(ctx.exception))
+
+    def test_cassette_graba_y_reproduce(self):
+        """Test: Lo grabado se reproduce sin llamar al modelo real"""
+        path = os.path.join(tempfile.mkdtemp(), 'llm.json')
+        inner = Mock()
+        inner.generate_content.return_value = Mock(text='Respuesta grabada', usage_metadata=None)
+
+        recorder = CassetteModel(path, 'gemini-test', mode='record', inner_factory=lambda: inner)
+        recorder.generate_content('prompt', generation_config={'temperature': 0.1})
+
+        player = CassetteModel(path, 'gemini-test', mode='replay')
+        response = player.generate_content('prompt', generation_config={'temperature': 0.1})
+        self.assertEqual(response.text, 'Respuesta grabada')
+        self.assertEqual(inner.generate_content.call_count, 1)
+
+        with self.assertRaises(CassetteMiss):
+            player.generate_content('otro prompt')
+
+
+    def test_cassette_auto_no_graba_errores(self):
+        """Test: En modo auto un 429 se propaga sin quedar grabado; en record sí se graba"""
+        path = os.path.join(tempfile.mkdtemp(), 'llm.json')
+        inner = Mock()
+        inner.generate_content.side_effect = [
+            Exception('429 Resource exhausted'),
+            Mock(text='Respuesta tras reintento', usage_metadata=None),
+        ]
+        cassette = CassetteModel(path, 'gemini-test', mode='auto', inner_factory=lambda: inner)
+
+        with self.assertRaises(Exception):
+            cassette.generate_content('prompt')
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(cassette.generate_content('prompt').text, 'Respuesta tras reintento')
+
+        inner.generate_content.side_effect = Exception('429 Resource exhausted')
+        with self.assertRaises(LLMProviderError):
+            CassetteModel(path, 'gemini-test', mode='record', inner_factory=lambda: inner).generate_content('otro')
+        with self.assertRaises(LLMProviderError):
+            CassetteModel(path, 'gemini-test', mode='replay').generate_content('otro')
+
+
+class QueryEmbeddingCacheTests(TestCase):
+    """Tests para la caché LRU de embeddings de consultas"""
+
+    def test_normaliza_solo_espacios(self):
+        """Test: Solo los espacios se colapsan; mayúsculas y tildes cambian el embedding"""
+        self.assertEqual(normalize_query('  ¿Cómo  PAGO\tmi boleta? '), '¿Cómo PAGO mi boleta?')
+
+    def test_consulta_repetida_no_recalcula(self):
+        """Test: El embedding se calcula una sola vez por consulta normalizada"""
+        cache = QueryEmbeddingCache(max_entries=10)
+        compute = Mock(return_value=[0.1, 0.2])
+
+        first = cache.get_or_compute('Horario de atención', compute)
+        second = cache.get_or_compute(' Horario  de atención ', compute)
+
+        self.assertEqual(first, second)
+        compute.assert_called_once_with('Horario de atención')
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_tildes_y_mayusculas_no_comparten_embedding(self):
+        """Test: El vector no depende de qué variante de la consulta llegó primero"""
+        cache = QueryEmbeddingCache(max_entries=10)
+        compute = Mock(side_effect=lambda text: [float(len(text.encode('utf-8')))])
+
+        accented = cache.get_or_compute('¿Cuánto debo?', compute)
+        plain = cache.get_or_compute('cuanto debo', compute)
+
+        self.assertNotEqual(accented, plain)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_desaloja_la_menos_usada(self):
+        """Test: Al exceder max_entries se desaloja la consulta usada hace más tiempo"""
+        cache = QueryEmbeddingCache(max_entries=2)
+        compute = Mock(side_effect=lambda text: [len(text)])
+
+        cache.get_or_compute('a', compute)
+        cache.get_or_compute('bb', compute)
+        cache.get_or_compute('a', compute)  # 'a' pasa a ser la más reciente
+        cache.get_or_compute('ccc', compute)  # desaloja 'bb'
+        cache.get_or_compute('a', compute)
+        cache.get_or_compute('bb', compute)
+
+        self.assertEqual(compute.call_count, 4)
+        self.assertEqual(cache.get_stats()['evictions'], 2)
+
+
+class RetrievalCacheTests(TestCase):
+    """Tests para la caché de resultados de recuperación versionada"""
+
+    def test_misma_version_devuelve_copia(self):
+        """Test: Un acierto devuelve una copia que se puede modificar sin afectar la caché"""
+        cache = RetrievalCache()
+        key = cache.make_key('¿Horario?', 5, None)
+        cache.set(key, 'v1', [{'content': 'Lunes a viernes', 'rank': 1}])
+
+        results = cache.get(cache.make_key(' ¿Horario? ', 5, None), 'v1')
+        results[0]['content'] = 'modificado'
+
+        self.assertEqual(cache.get(key, 'v1')[0]['content'], 'Lunes a viernes')
+        self.assertEqual(cache.get_stats()['hits'], 2)
+
+    def test_nueva_version_invalida(self):
+        """Test: Al cambiar la versión de la colección la caché se vacía"""
+        cache = RetrievalCache()
+        key = cache.make_key('cortes', 5, {'category': 'protocolos'})
+        cache.set(key, 'v1', [{'content': 'x'}])
+
+        self.assertIsNone(cache.get(key, 'v2'))
+        stats = cache.get_stats()
+        self.assertEqual((stats['entries'], stats['invalidations']), (0, 1))
+
+    def test_top_k_y_filtros_son_parte_de_la_clave(self):
+        """Test: Otra cantidad de resultados u otros filtros no comparten entrada"""
+        cache = RetrievalCache()
+        cache.set(cache.make_key('cortes', 5, None), 'v1', [{'content': 'x'}])
+
+        self.assertIsNone(cache.get(cache.make_key('cortes', 3, None), 'v1'))
+        self.assertIsNone(cache.get(cache.make_key('cortes', 5, {'category': 'faq'}), 'v1'))
+
+
+class NumpyVectorBackendTests(TestCase):
+    """Tests para la colección en memoria con búsqueda exacta"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'kb.npz')
+        self.addCleanup(self.tmp.cleanup)
+
+    def _collection(self):
+        embed = Mock(side_effect=lambda texts: [[float(len(t)), 1.0] for t in texts])
+        return NumpyCollection('kb', self.path, embed)
+
+    def _filled(self):
+        collection = self._collection()
+        collection.add(
+            documents=['a', 'b', 'c'],
+            metadatas=[{'category': 'faq'}, {'category': 'tarifas'}, {'category': 'faq'}],
+            ids=['1', '2', '3'],
+            embeddings=[[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]]
+        )
+        return collection
+
+    def test_query_ordena_por_distancia_l2(self):
+        """Test: Devuelve los más cercanos con distancia L2 al cuadrado, como Chroma"""
+        results = self._filled().query(query_embeddings=[[1.0, 0.0]], n_results=2)
+
+        self.assertEqual(results['ids'], [['1', '3']])
+        self.assertAlmostEqual(results['distances'][0][0], 0.0, places=5)
+        self.assertAlmostEqual(results['distances'][0][1], 0.8, places=5)
+        self.assertEqual(results['metadatas'][0][1], {'category': 'faq'})
+
+    def test_filtros_where(self):
+        """Test: Soporta igualdad, operadores y combinaciones $and/$or"""
+        collection = self._filled()
+        results = collection.query(query_embeddings=[[0.0, 1.0]], n_results=5, where={'category': 'faq'})
+        self.assertEqual(results['ids'], [['3', '1']])
+
+        self.assertTrue(matches_where({'n': 3}, {'$and': [{'n': {'$gte': 3}}, {'n': {'$in': [1, 3]}}]}))
+        self.assertFalse(matches_where({'n': 3}, {'$or': [{'n': {'$lt': 3}}, {'m': 1}]}))
+        self.assertEqual(collection.query(query_embeddings=[[1.0, 0.0]], where={'category': 'x'})['ids'], [[]])
+
+    def test_persistencia_entre_procesos(self):
+        """Test: Otra instancia (otro worker) ve lo ingestado y los borrados"""
+        self._filled()
+        other = self._collection()
+        self.assertEqual(other.count(), 3)
+
+        other.delete(where={'category': 'faq'})
+        other.add(documents=['dddd'], metadatas=[{}], ids=['4'])
+        self.assertEqual(NumpyCollection('kb', self.path, Mock()).get()['ids'], ['2', '4'])
+
+    def test_get_devuelve_embeddings_guardados(self):
+        """Test: get(include=['embeddings']) entrega los vectores sin reembeber (para MMR)"""
+        results = self._filled().get(ids=['3', '1'], include=['embeddings'])
+
+        self.assertEqual(results['ids'], ['1', '3'])
+        np.testing.assert_allclose(results['embeddings'], [[1.0, 0.0], [0.6, 0.8]])
+        self.assertNotIn('embeddings', self._filled().get(ids=['1']))
+
+    def test_ids_repetidos_se_ignoran(self):
+        """Test: Agregar un ID existente no lo duplica"""
+        collection = self._filled()
+        collection.add(documents=['x'], metadatas=[{}], ids=['1'], embeddings=[[0.0, 0.0]])
+        self.assertEqual(collection.count(), 3)
+
+    def test_mismos_resultados_que_chroma(self):
+        """Test: Con los mismos embeddings coincide con una colección de Chroma"""
+        import chromadb
+        from chromadb.config import Settings
+
+        rng = np.random.default_rng(7)
+        embeddings = rng.standard_normal((30, 16)).tolist()
+        queries = rng.standard_normal((5, 16)).tolist()
+        ids = [str(i) for i in range(30)]
+        metadatas = [{'par': i % 2 == 0} for i in range(30)]
+
+        client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False, allow_reset=True))
+        self.addCleanup(client.reset)
+        chroma = client.create_collection(name='paridad', embedding_function=None)
+        chroma.add(documents=ids, metadatas=metadatas, ids=ids, embeddings=embeddings)
+        local = self._collection()
+        local.add(documents=ids, metadatas=metadatas, ids=ids, embeddings=embeddings)
+
+        for where in (None, {'par': True}):
+            expected = chroma.query(query_embeddings=queries, n_results=5, where=where)
+            actual = local.query(query_embeddings=queries, n_results=5, where=where)
+            self.assertEqual(actual['ids'], expected['ids'])
+            for got, want in zip(actual['distances'], expected['distances']):
+                for a, b in zip(got, want):
+                    self.assertAlmostEqual(a, b, places=3)
+
+
+class ChromaRegistryTests(TestCase):
+    """Tests para el registro de clientes de ChromaDB compartido"""
+
+    def setUp(self):
+        reset_chroma_registry()
+        self.addCleanup(reset_chroma_registry)
+
+    @patch('ModuloCompartido.services.chroma_registry.chromadb')
+    def test_un_cliente_por_ruta(self, mock_chromadb):
+        """Test: Ambos módulos reciben el mismo cliente para el mismo directorio"""
+        with tempfile.TemporaryDirectory() as tmp:
+            first = get_chroma_client(tmp)
+            second = get_chroma_client(os.path.join(tmp, '.'))
+
+        self.assertIs(first, second)
+        mock_chromadb.PersistentClient.assert_called_once()
+
+    @patch('ModuloCompartido.services.chroma_registry.chromadb')
+    def test_colecciones_por_nombre(self, mock_chromadb):
+        """Test: Cada colección se abre una vez y se crea si no existe"""
+        client = mock_chromadb.PersistentClient.return_value
+        client.get_collection.side_effect = [Mock(name='boletas'), Exception('no existe')]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            boletas = get_chroma_collection(tmp, 'boletas_knowledge_base')
+            self.assertIs(get_chroma_collection(tmp, 'boletas_knowledge_base'), boletas)
+            get_chroma_collection(tmp, 'emergencias_knowledge_base', metadata={'description': 'x'})
+
+        self.assertEqual(client.get_collection.call_count, 2)
+        client.create_collection.assert_called_once()
+        self.assertEqual(get_chroma_registry_stats(), {
+            'clients': 1,
+            'collections': ['boletas_knowledge_base', 'emergencias_knowledge_base']
+        })
+
+
+class HybridSearchTests(TestCase):
+    """Tests para el índice BM25 y la fusión con la búsqueda vectorial"""
+
+    CHUNKS = [
+        ('tarifas_0', 'El cargo fijo mensual es de $2.500 por medidor.', {'source_file': 'tarifas.md'}),
+        ('tarifas_1', 'El valor del m³ de agua consumida es de $650.', {'source_file': 'tarifas.md'}),
+        ('contacto_0', 'Para emergencias llame al 600 123 4567 las 24 horas.', {'source_file': 'contacto.md'}),
+        ('sectores_0', 'Atendemos los sectores Los Aromos y El Llano.', {'source_file': 'sectores.md'}),
+    ]
+
+    def _index(self):
+        ids, documents, metadatas = (list(column) for column in zip(*self.CHUNKS))
+        return BM25Index(ids, documents, metadatas)
+
+    def test_tokenize_pliega_tildes_unidades_y_telefonos(self):
+        """Test: El tokenizador iguala m³/m3, tildes, plurales y teléfonos con separadores"""
+        self.assertEqual(tokenize('m³'), tokenize('M3'))
+        self.assertEqual(tokenize('Cañería dañada'), ['caneria', 'danada'])
+        self.assertEqual(tokenize('los medidores'), ['medidor'])
+        self.assertEqual(tokenize('600-123-4567'), tokenize('600 123 4567'))
+
+    def test_bm25_prioriza_terminos_exactos(self):
+        """Test: BM25 encuentra el chunk con el término exacto y respeta filtros where"""
+        index = self._index()
+
+        self.assertEqual(index.search('¿cuánto cuesta el m3?', 1)['ids'][0], ['tarifas_1'])
+        self.assertEqual(index.search('cargo fijo', 1)['ids'][0], ['tarifas_0'])
+        self.assertEqual(index.search('6001234567', 1)['ids'][0], ['contacto_0'])
+        filtered = index.search('cargo fijo', 5, where={'source_file': 'contacto.md'})
+        self.assertEqual(filtered['ids'][0], [])
+
+    def test_rrf_combina_rankings(self):
+        """Test: Un documento bien ubicado en ambos rankings queda primero"""
+        fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'd']], k=60)
+
+        self.assertEqual([doc_id for doc_id, _ in fused], ['b', 'a', 'd', 'c'])
+        self.assertAlmostEqual(fused[0][1], 1 / 62 + 1 / 61)
+
+    def test_fuse_results_conserva_distancias_vectoriales(self):
+        """Test: La fusión devuelve la forma de Chroma y no inventa distancias menores"""
+        vector = {
+            'ids': [['sectores_0', 'tarifas_1']],
+            'documents': [['sectores', 'm3']],
+            'metadatas': [[{}, {}]],
+            'distances': [[0.4, 0.9]]
+        }
+        lexical = self._index().search('cargo fijo m³', 5)
+
+        results = fuse_results(vector, lexical, 2)
+
+        self.assertEqual(results['ids'][0], ['tarifas_1', 'sectores_0'])
+        self.assertEqual(results['distances'][0], [0.9, 0.4])
+        self.assertEqual(fuse_results(vector, lexical, 3)['distances'][0][2], 0.9)
+
+    def test_store_persiste_y_se_construye_si_falta(self):
+        """Test: El índice se construye desde la colección si no hay archivo y se recarga de disco"""
+        load_chunks = Mock(return_value=tuple(list(column) for column in zip(*self.CHUNKS)))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'kb.bm25.json')
+            store = LexicalIndexStore(path, load_chunks)
+            self.assertEqual(store.search('cargo fijo', 1)['ids'][0], ['tarifas_0'])
+            load_chunks.assert_called_once()
+
+            other = LexicalIndexStore(path, Mock(side_effect=AssertionError('no debe reconstruir')))
+            self.assertEqual(other.search('Los Aromos', 1)['ids'][0], ['sectores_0'])
+            self.assertEqual(other.get_stats()['documents'], 4)
+
+            store.clear()
+            self.assertEqual(store.search('cargo fijo', 1)['ids'][0], [])
+
+
+class WarmupTests(TestCase):
+    """Tests para el warm-up del stack RAG/LLM y el endpoint de readiness"""
+
+    def setUp(self):
+        warmup.reset_warmup_state()
+        self.addCleanup(warmup.reset_warmup_state)
+
+    def test_run_warmup_registra_estado_y_tiempos(self):
+        """Test: Cada componente queda listo o con error, sin detener a los demás"""
+        components = [
+            ('vector_store', Mock()),
+            ('embeddings', Mock(side_effect=RuntimeError('sin red'))),
+            ('chatbot', Mock()),
+        ]
+        with patch.object(warmup, 'COMPONENTS', components):
+            state = warmup.run_warmup()
+
+        self.assertFalse(state['ready'])
+        self.assertEqual(state['warmup'], 'finished')
+        self.assertEqual(state['components']['vector_store']['status'], 'ready')
+        self.assertEqual(state['components']['embeddings']['error'], 'sin red')
+        self.assertIn('init_ms', state['components']['chatbot'])
+        components[2][1].assert_called_once()
+
+    def test_readiness_endpoint(self):
+        """Test: /api/ready/ responde 503 hasta que el warm-up termina bien"""
+        with patch.object(warmup, 'get_warmup_config', return_value={'enabled': True}):
+            response = self.client.get('/api/ready/')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json()['warmup'], 'pending')
+
+            with patch.object(warmup, 'COMPONENTS', [('vector_store', Mock())]):
+                warmup.run_warmup()
+            response = self.client.get('/api/ready/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['components']['vector_store']['status'], 'ready')
+
+    def test_sin_warmup_habilitado_el_worker_esta_listo(self):
+        """Test: Sin opt-in se conserva la inicialización perezosa y el worker se reporta listo"""
+        with patch.object(warmup, 'get_warmup_config', return_value={}):
+            self.assertEqual(self.client.get('/api/ready/').json()['warmup'], 'disabled')
+            self.assertFalse(warmup.should_warm_on_startup())
+
+        with patch.object(warmup, 'get_warmup_config', return_value={'enabled': True}), \
+                patch.object(warmup.sys, 'argv', ['manage.py', 'migrate']):
+            self.assertFalse(warmup.should_warm_on_startup())
+
+
+    def test_inicio_en_segundo_plano_una_vez_por_proceso(self):
+        """Test: Un segundo inicio no lanza otro hilo; un worker hijo (otro PID) sí relanza"""
+        release = threading.Event()
+        component = Mock(side_effect=lambda: release.wait(5))
+        with patch.object(warmup, 'COMPONENTS', [('vector_store', component)]):
+            thread = warmup.start_warmup_in_background()
+            self.assertIsNotNone(thread)
+            self.assertIsNone(warmup.start_warmup_in_background())
+            self.assertEqual(warmup.get_readiness()['warmup'], 'running')
+            release.set()
+            thread.join(5)
+
+            with patch.object(warmup.os, 'getpid', return_value=os.getpid() + 1):
+                self.assertEqual(warmup.get_readiness()['components'], {})
+                child_thread = warmup.start_warmup_in_background()
+                self.assertIsNotNone(child_thread)
+                child_thread.join(5)
+                self.assertTrue(warmup.get_readiness()['ready'])
+
+        self.assertEqual(component.call_count, 2)
+
+
+class LazyImportTests(TestCase):
+    """Tests para la importación diferida de dependencias pesadas"""
+
+    def test_lazy_module_importa_al_primer_uso(self):
+        """Test: El módulo real se importa recién al acceder a un atributo"""
+        module = lazy_module('json')
+
+        self.assertIn('diferido', repr(module))
+        self.assertEqual(module.dumps([1]), '[1]')
+        self.assertIn('cargado', repr(module))
+        self.assertIn('json', get_lazy_import_stats())
+
+    def test_urlconf_no_importa_dependencias_pesadas(self):
+        """Test: Cargar el URLconf no importa Gemini, ChromaDB ni LangChain"""
+        import subprocess
+        import sys
+        from django.conf import settings
+
+        script = (
+            "import importlib, sys, django; django.setup(); "
+            "importlib.import_module('Core-Backend.urls'); "
+            "print(','.join(m for m in ('google.generativeai', 'chromadb', 'langchain_community') "
+            "if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script],
+            cwd=str(settings.BASE_DIR),
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='Core-Backend.settings'),
+            capture_output=True,
+            text=True,
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr[-1000:])
+        self.assertEqual(result.stdout.strip(), '')
+
+
+class IncrementalIngestTests(TestCase):
+    """Tests para la ingesta incremental con manifiesto"""
+
+    class FakeVectorStore:
+        collection_name = 'test_kb'
+
+        def __init__(self, path):
+            embed = lambda texts: [[float(len(t)), 1.0] for t in texts]
+            self.collection = NumpyCollection('test_kb', path, embed)
+            self.upserted, self.deleted = [], []
+
+        def upsert_documents(self, documents, metadatas, ids):
+            self.upserted.append(ids)
+            self.collection.upsert(documents=documents, metadatas=metadatas, ids=ids)
+            return True
+
+        def delete_documents(self, ids):
+            self.deleted.append(ids)
+            self.collection.delete(ids=ids)
+            return True
+
+        def reset_collection(self):
+            self.collection.reset()
+            return True
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.kb = os.path.join(self.tmp.name, 'kb')
+        os.makedirs(self.kb)
+        for name, text in (('faq.md', 'uno\ndos\ntres'), ('tarifas.txt', 'cargo fijo\nm3')):
+            with open(os.path.join(self.kb, name), 'w', encoding='utf-8') as f:
+                f.write(text)
+
+        self.store = self.FakeVectorStore(os.path.join(self.tmp.name, 'kb.npz'))
+        self.chunk_file = Mock(side_effect=lambda path: [
+            (line, {}) for line in path.read_text(encoding='utf-8').splitlines()
+        ])
+        self.ingester = IncrementalIngester(
+            self.store, self.kb, self.chunk_file, 'test_chunk',
+            manifest_path=os.path.join(self.tmp.name, 'kb.manifest.json')
+        )
+
+    def _write(self, name, text):
+        path = os.path.join(self.kb, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        # Forzar una fecha distinta aunque el sistema de archivos tenga poca resolución
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    def test_segunda_corrida_sin_cambios_no_reembebe(self):
+        """Test: Solo la primera corrida embebe; la segunda no lee ningún archivo"""
+        first = self.ingester.run()
+        self.assertEqual(first['chunks_upserted'], 5)
+        self.assertEqual(self.store.collection.count(), 5)
+
+        self.chunk_file.reset_mock()
+        second = self.ingester.run()
+
+        self.assertTrue(second['success'])
+        self.assertEqual(second['files_unchanged'], 2)
+        self.assertEqual(second['chunks_upserted'], 0)
+        self.chunk_file.assert_not_called()
+        self.assertIn('total_ms', second['timings_ms'])
+
+    def test_edicion_y_eliminacion_de_archivos(self):
+        """Test: Una edición embebe solo el chunk nuevo; un archivo borrado elimina sus chunks"""
+        self.ingester.run()
+        self._write('faq.md', 'uno\ndos editado\ntres')
+        os.remove(os.path.join(self.kb, 'tarifas.txt'))
+
+        result = self.ingester.run()
+
+        self.assertEqual((result['files_changed'], result['files_removed']), (1, 1))
+        self.assertEqual(result['chunks_upserted'], 1)
+        self.assertEqual(result['chunks_deleted'], 3)
+        documents = sorted(self.store.collection.get()['documents'])
+        self.assertEqual(documents, ['dos editado', 'tres', 'uno'])
+        self.assertLess(result['timings_ms']['total_ms'], 1000)
+
+    def test_coleccion_desincronizada_se_reingesta_completa(self):
+        """Test: Si la colección no coincide con el manifiesto se reinicia y se ingesta todo"""
+        self.ingester.run()
+        self.store.collection.delete(ids=self.store.collection.get()['ids'][:1])
+
+        result = self.ingester.run()
+
+        self.assertTrue(result['full_rebuild'])
+        self.assertEqual(result['chunks_upserted'], 5)
+        self.assertEqual(self.store.collection.count(), 5)
+
+
+def _split_lines(path):
+    # Función de módulo: los workers del pool la importan por nombre
+    lines = path.read_text(encoding='utf-8').splitlines()
+    if not lines:
+        raise ValueError("No se generaron chunks")
+    return [(line, {'pid': os.getpid()}) for line in lines]
+
+
+class ParallelLoaderTests(TestCase):
+    """Tests para la carga de archivos en el pool de procesos"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.paths = []
+        for i in range(4):
+            path = os.path.join(self.tmp.name, f'doc{i}.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('' if i == 2 else f'a{i}\nb{i}')
+            self.paths.append(path)
+
+    def test_pool_conserva_el_orden_y_reporta_fallos(self):
+        """Test: Con 2 workers los resultados siguen el orden de entrada y un fallo no aborta"""
+        results = load_files(self.paths + [os.path.join(self.tmp.name, 'no_existe.txt')], _split_lines, workers=2)
+
+        self.assertEqual([r['path'] for r in results][:4], self.paths)
+        contents = [[content for content, _ in r['result']] for r in results if not r['error']]
+        self.assertEqual(contents, [['a0', 'b0'], ['a1', 'b1'], ['a3', 'b3']])
+        self.assertIn('No se generaron chunks', results[2]['error'])
+        self.assertIn('FileNotFoundError', results[4]['error'])
+        self.assertNotEqual(results[0]['result'][0][1]['pid'], os.getpid())
+        self.assertTrue(all(r['ms'] >= 0 for r in results))
+
+    def test_un_worker_carga_en_el_mismo_proceso(self):
+        """Test: workers=1 no crea pool y da el mismo resultado"""
+        results = load_files(self.paths, _split_lines, workers=1)
+
+        self.assertEqual(results[1]['result'], [('a1', {'pid': os.getpid()}), ('b1', {'pid': os.getpid()})])
+        self.assertIsNotNone(results[2]['error'])
+
+
+class _FakeSentenceModel:
+    """Modelo de sentence-transformers de prueba: vector por letras, sin torch"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def encode(self, texts, batch_size, normalize_embeddings, convert_to_numpy, show_progress_bar):
+        if self.fail:
+            raise OSError('modelo no encontrado en cache_dir')
+        self.calls.append((len(texts), batch_size, normalize_embeddings))
+        vectors = np.array([[t.count(c) + 0.1 for c in 'aeiou'] for t in texts], dtype=np.float32)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+class EmbeddingFunctionTests(TestCase):
+    """Tests para la función de embeddings configurable y el reembebido de colecciones"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        embedding_function.reset_embedding_functions()
+        self.addCleanup(embedding_function.reset_embedding_functions)
+        reset_chroma_registry()
+        self.addCleanup(reset_chroma_registry)
+
+        self.models = {}
+
+        def build(model_name):
+            embedder = SentenceTransformerEmbedder(model_name, batch_size=2)
+            embedder._model = self.models.setdefault(model_name, _FakeSentenceModel())
+            return embedder
+
+        builder = patch.object(embedding_function, 'build_embedding_function', side_effect=build)
+        builder.start()
+        self.addCleanup(builder.stop)
+
+    def _settings(self, model='test/multilingual-mini'):
+        rag_config = {
+            **settings.RAG_CONFIG,
+            'embedding_model': model,
+            'vector_store': {'backend': 'numpy'},
+        }
+        return override_settings(CHROMADB_PATH=Path(self.tmp.name), RAG_CONFIG=rag_config)
+
+    def test_embebe_en_lotes_normalizados(self):
+        """Test: Se respeta batch_size, los vectores tienen norma 1 y se cuentan los lotes"""
+        embedder = SentenceTransformerEmbedder('test/modelo', batch_size=2)
+        embedder._model = _FakeSentenceModel()
+
+        vectors = embedder(['agua', 'corte de agua', 'boleta'])
+
+        self.assertEqual(embedder._model.calls, [(3, 2, True)])
+        self.assertAlmostEqual(float(np.linalg.norm(vectors[1])), 1.0, places=5)
+        self.assertEqual(embedder.get_stats()['batches'], 2)
+        self.assertEqual(embedder.get_config()['model_name'], 'test/modelo')
+
+    def test_modelo_guardado_en_chroma(self):
+        """Test: La colección guarda el modelo; las anteriores se reconocen como el default de Chroma"""
+        embedder = embedding_function.get_embedding_function('test/multilingual-mini')
+        collection = get_chroma_collection(
+            self.tmp.name, 'nueva', embedding_function=embedder,
+            metadata={'embedding_model': embedder.model_name}
+        )
+        collection.add(documents=['corte de agua'], ids=['1'])
+        legacy = get_chroma_client(self.tmp.name).create_collection('anterior', embedding_function=None)
+        legacy.add(ids=['1'], documents=['x'], embeddings=[[1.0, 0.0, 0.0]])
+
+        self.assertEqual(read_stored_embedding_model(self.tmp.name, 'nueva', 'chroma'), 'test/multilingual-mini')
+        self.assertEqual(read_stored_embedding_model(self.tmp.name, 'anterior', 'chroma'), CHROMA_DEFAULT_MODEL)
+        self.assertIsNone(read_stored_embedding_model(self.tmp.name, 'no_existe', 'chroma'))
+
+    def test_reembebe_coleccion_con_el_modelo_configurado(self):
+        """Test: Una colección anterior se abre con su modelo y se reembebe sin perder chunks"""
+        from ModuloBoletas.RAG.vector_store import VectorStoreManager
+
+        legacy_path = Path(self.tmp.name) / 'boletas_knowledge_base.npz'
+        legacy = NumpyCollection('boletas_knowledge_base', legacy_path, embedding_function.get_embedding_function(CHROMA_DEFAULT_MODEL))
+        legacy.add(documents=['cargo fijo', 'corte de agua', 'pago en línea'], ids=['a', 'b', 'c'])
+
+        with self._settings():
+            store = VectorStoreManager()
+            info = store.get_embedding_info()
+            self.assertEqual(info['embedding_model'], CHROMA_DEFAULT_MODEL)
+            self.assertTrue(info['reembed_pending'])
+
+            result = reembed_collection(store)
+
+            self.assertTrue(result['migrated'], result['message'])
+            self.assertEqual(result['chunks'], 3)
+            self.assertFalse(store.get_embedding_info()['reembed_pending'])
+            self.assertEqual(store.collection.count(), 3)
+            self.assertEqual(NumpyCollection.read_metadata(legacy_path)['embedding_model'], 'test/multilingual-mini')
+            self.assertFalse((Path(self.tmp.name) / 'boletas_knowledge_base.reembed.json').exists())
+            store.query('corte de agua', n_results=1)
+            self.assertEqual(self.models['test/multilingual-mini'].calls[-1], (1, 2, True))
+            self.assertFalse(reembed_collection(store)['migrated'])
+
+    def test_reembebido_no_toca_la_coleccion_si_el_modelo_no_carga(self):
+        """Test: Si el modelo nuevo no carga (sin red) la colección queda intacta"""
+        from ModuloBoletas.RAG.vector_store import VectorStoreManager
+
+        legacy_path = Path(self.tmp.name) / 'boletas_knowledge_base.npz'
+        legacy = NumpyCollection('boletas_knowledge_base', legacy_path, embedding_function.get_embedding_function(CHROMA_DEFAULT_MODEL))
+        legacy.add(documents=['cargo fijo', 'corte de agua'], ids=['a', 'b'])
+        self.models['test/sin-descargar'] = _FakeSentenceModel(fail=True)
+
+        with self._settings(model='test/sin-descargar'):
+            store = VectorStoreManager()
+            result = reembed_collection(store)
+
+        self.assertFalse(result['success'])
+        self.assertIn('no se modificó', result['message'])
+        self.assertEqual(store.collection.count(), 2)
+        self.assertEqual(store.get_embedding_info()['embedding_model'], CHROMA_DEFAULT_MODEL)
+
+
+class _FakeOnnxSession:
+    """Sesión de onnxruntime de prueba: last_hidden_state = tabla fija de vectores por token"""
+
+    def __init__(self, path, sess_options=None, providers=None):
+        self.path = path
+        self.table = np.random.default_rng(7).standard_normal((64, 8)).astype(np.float32)
+
+    def get_inputs(self):
+        return [SimpleNamespace(name='input_ids'), SimpleNamespace(name='attention_mask')]
+
+    def run(self, output_names, feeds):
+        return [self.table[feeds['input_ids']]]
+
+
+def _onnx_export_available():
+    config = embedding_function.get_embedding_config()
+    model_dir = get_onnx_model_dir(config['model'], config['onnx_dir'])
+    return (model_dir / 'model_int8.onnx').exists() and importlib.util.find_spec('sentence_transformers') is not None
+
+
+class OnnxEmbeddingTests(TestCase):
+    """Tests para el backend de embeddings ONNX int8"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        embedding_function.reset_embedding_functions()
+        self.addCleanup(embedding_function.reset_embedding_functions)
+
+    def _export_fake_model(self, model_name):
+        # Tokenizador real (WordLevel) y manifiesto como los que deja export_onnx_model
+        from tokenizers import Tokenizer
+        from tokenizers.models import WordLevel
+        from tokenizers.pre_tokenizers import Whitespace
+
+        words = sorted({w for text in SAMPLE_TEXTS for w in text.lower().split()})
+        vocab = {'[PAD]': 0, '[UNK]': 1, **{w: i + 2 for i, w in enumerate(words[:60])}}
+        tokenizer = Tokenizer(WordLevel(vocab, unk_token='[UNK]'))
+        tokenizer.pre_tokenizer = Whitespace()
+        model_dir = get_onnx_model_dir(model_name, self.tmp.name)
+        model_dir.mkdir(parents=True)
+        tokenizer.save(str(model_dir / 'tokenizer.json'))
+        (model_dir / 'export.json').write_text(json.dumps({
+            'model_name': model_name, 'max_seq_length': 16, 'pooling': 'mean',
+            'pad_token': '[PAD]', 'pad_token_id': 0,
+        }))
+        return model_dir
+
+    def test_lotes_con_padding_dan_los_mismos_vectores(self):
+        """Test: El padding no cambia el vector y el orden de salida es el de entrada"""
+        model_dir = self._export_fake_model('test/mini')
+        fake_runtime = Mock(InferenceSession=_FakeOnnxSession)
+        with patch.object(onnx_embedding, 'onnxruntime', fake_runtime):
+            encoder = OnnxSentenceEncoder(model_dir)
+            texts = SAMPLE_TEXTS[:6]
+            batched = encoder.encode(texts, batch_size=4, normalize_embeddings=True)
+            single = np.vstack([encoder.encode([text], normalize_embeddings=True) for text in texts])
+
+        self.assertTrue(encoder.session.path.endswith('model_int8.onnx'))
+        self.assertEqual(batched.shape, (6, 8))
+        self.assertGreater(cosine_agreement(single, batched)['min'], 0.9999)
+        self.assertAlmostEqual(float(np.linalg.norm(batched[3])), 1.0, places=5)
+
+    def test_backend_onnx_compatible_con_la_coleccion(self):
+        """Test: Con backend onnx se usa OnnxEmbedder con el mismo nombre/modelo para Chroma"""
+        self._export_fake_model('test/mini')
+        rag_config = {
+            **settings.RAG_CONFIG,
+            'embedding_model': 'test/mini',
+            'embedding': {'backend': 'onnx', 'onnx_dir': self.tmp.name, 'batch_size': 4},
+        }
+        with override_settings(RAG_CONFIG=rag_config), \
+                patch.object(onnx_embedding, 'onnxruntime', Mock(InferenceSession=_FakeOnnxSession)):
+            embedder = embedding_function.get_embedding_function()
+            vectors = embedder(['¿Cuándo vence mi boleta?'])
+            info = embedding_function.describe_embedding_function(embedder)
+            missing = embedding_function.get_embedding_function('test/sin-exportar')
+
+            self.assertIsInstance(embedder, embedding_function.OnnxEmbedder)
+            self.assertEqual((embedder.name(), embedder.get_config()['model_name']), ('sentence_transformer', 'test/mini'))
+            self.assertEqual(len(vectors[0]), 8)
+            self.assertEqual(info['provider'], 'onnxruntime (int8)')
+            with self.assertRaisesRegex(FileNotFoundError, 'export_onnx_embeddings'):
+                missing(['hola'])
+
+    @skipUnless(_onnx_export_available(), 'requiere el modelo exportado (export_onnx_embeddings) y sentence-transformers')
+    def test_paridad_int8_contra_modelo_float(self):
+        """Test: Los vectores int8 coinciden con los del modelo float (coseno >= 0.99)"""
+        config = embedding_function.get_embedding_config()
+        reference = embedding_function.SentenceTransformerEmbedder(config['model'], cache_dir=config['cache_dir'])
+        quantized = embedding_function.OnnxEmbedder(config['model'], onnx_dir=config['onnx_dir'])
+
+        agreement = cosine_agreement(reference(SAMPLE_TEXTS), quantized(SAMPLE_TEXTS))
+
+        self.assertGreaterEqual(agreement['min'], 0.99)
+
+
+
+def _chunk(chunk_id, content, source='tarifas.md', index=0):
+    return {'id': chunk_id, 'content': content, 'metadata': {'source_file': source, 'chunk_index': index}}
+
+
+class ContextSelectionTests(TestCase):
+    """Tests para la selección de contexto (MMR, duplicados y chunks contiguos)"""
+
+    def setUp(self):
+        self.config = {'enabled': True, 'fetch_k': 10, 'mmr_lambda': 0.7, 'max_overlap': 0.6, 'merge_adjacent': True}
+
+    def test_mmr_prefiere_un_candidato_distinto_al_casi_duplicado(self):
+        """Test: El segundo elegido es el diverso, no la copia del primero"""
+        order = mmr_order([1.0, 0.2], [[1.0, 0.0], [0.99, 0.05], [0.6, 0.8]], lambda_mult=0.5)
+
+        self.assertEqual(order, [0, 2, 1])
+
+    def test_une_chunks_contiguos_sin_repetir_el_solape(self):
+        """Test: Dos chunks consecutivos del mismo archivo quedan en un fragmento sin el texto repetido"""
+        first = 'El cargo fijo mensual es de $2.500 y se cobra aunque no haya consumo en el periodo.'
+        second = 'aunque no haya consumo en el periodo. El IVA es de 19% sobre el total de la boleta.'
+        candidates = [
+            _chunk('a', first, index=3),
+            _chunk('b', 'Los pagos se pueden hacer en línea o en oficinas comerciales.', source='pagos.md'),
+            _chunk('c', second, index=4),
+        ]
+
+        documents, stats = select_context_documents(candidates, 3, config=self.config)
+
+        self.assertEqual(merge_overlapping_text(first, second).count('aunque no haya consumo'), 1)
+        self.assertEqual(len(documents), 2)
+        self.assertEqual(documents[0]['merged_ids'], ['a', 'c'])
+        self.assertEqual(documents[0]['metadata']['chunk_index'], 3)
+        self.assertTrue(documents[0]['content'].endswith('total de la boleta.'))
+        self.assertEqual([doc['rank'] for doc in documents], [1, 2])
+        self.assertEqual((stats['merged'], stats['chars_saved']), (1, len('aunque no haya consumo en el periodo.')))
+
+    def test_descarta_duplicados_y_completa_top_k_con_los_siguientes(self):
+        """Test: Un chunk casi idéntico a uno elegido se salta y se usa el siguiente candidato"""
+        text = 'Para reportar una rotura de matriz llame al teléfono de emergencias disponible las 24 horas.'
+        candidates = [
+            _chunk('a', text, source='emergencias.md'),
+            _chunk('b', text + ' Indique su dirección.', source='faq.md'),
+            _chunk('c', 'Los cortes programados se avisan con 48 horas de anticipación.', source='cortes.md'),
+        ]
+        embeddings = {'a': [1.0, 0.0], 'b': [0.98, 0.1], 'c': [0.3, 0.9]}
+
+        documents, stats = select_context_documents(candidates, 2, [1.0, 0.1], embeddings, self.config)
+        without_embeddings, fallback_stats = select_context_documents(candidates, 2, config=self.config)
+
+        self.assertEqual([doc['id'] for doc in documents], ['a', 'c'])
+        self.assertEqual((stats['mmr'], fallback_stats['mmr']), (1, 0))
+        self.assertEqual([doc['id'] for doc in without_embeddings], ['a', 'c'])
+        self.assertEqual(fallback_stats['duplicates'], 1)
@@ -0,0 +1,33 @@
+"""
+Vistas compartidas entre módulos
+"""
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from .services.warmup import get_readiness
+
+
+@api_view(['GET'])
+def readiness(request):
+    """
+    Readiness del worker para el balanceador de carga
+    
+    GET /api/ready/
+    
+    Response (200 si está listo, 503 si no):
+    {
+        "ready": true,
+        "warmup": "finished",
+        "init_ms": 5321.4,
+        "components": {
+            "boletas_vector_store": {"status": "ready", "init_ms": 812.3},
+            ...
+        }
+    }
+    """
+    state = get_readiness()
+    return Response(
+        state,
+        status=status.HTTP_200_OK if state['ready'] else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
@@ -2,20 +2,18 @@
 Document Embeddings Manager
 Procesa y genera embeddings para documentos
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import hashlib
 import logging
 from django.conf import settings
 
-# Document loaders
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import (
-    TextLoader,
-    PyPDFLoader,
-    Docx2txtLoader,
-    UnstructuredMarkdownLoader
-)
+from ModuloCompartido.services.lazy_import import lazy_module
+from ModuloCompartido.services.parallel_loader import load_files
+
+# Document loaders (diferidos: LangChain arrastra unstructured, nltk y torch)
+text_splitters = lazy_module('langchain_text_splitters')
+document_loaders = lazy_module('langchain_community.document_loaders')
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +30,7 @@ class DocumentProcessor:
         self.chunk_size = settings.RAG_CONFIG.get('chunk_size', 1000)
         self.chunk_overlap = settings.RAG_CONFIG.get('chunk_overlap', 200)
         
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        self.text_splitter = text_splitters.RecursiveCharacterTextSplitter(
             chunk_size=self.chunk_size,
             chunk_overlap=self.chunk_overlap,
             length_function=len,
@@ -51,36 +49,41 @@ class DocumentProcessor:
         Returns:
             Lista de documentos procesados
         """
-        path = Path(file_path)
-        
-        if not path.exists():
-            logger.error(f"Archivo no encontrado: {file_path}")
-            return []
-        
         try:
-            # Seleccionar el loader apropiado
-            if path.suffix == '.txt':
-                loader = TextLoader(str(path), encoding='utf-8')
-            elif path.suffix == '.pdf':
-                loader = PyPDFLoader(str(path))
-            elif path.suffix in ['.doc', '.docx']:
-                loader = Docx2txtLoader(str(path))
-            elif path.suffix == '.md':
-                loader = UnstructuredMarkdownLoader(str(path))
-            else:
-                logger.warning(f"Tipo de archivo no soportado: {path.suffix}")
-                return []
-            
-            # Cargar documentos
-            documents = loader.load()
-            logger.info(f"Documento cargado: {file_path} ({len(documents)} páginas/secciones)")
-            
-            return documents
-            
+            return self._load(Path(file_path))
         except Exception as e:
             logger.error(f"Error al cargar documento {file_path}: {e}")
             return []
     
+    def _load(self, path: Path) -> List[Any]:
+        """
+        Carga un documento propagando los errores (para reportarlos por archivo)
+        
+        Raises:
+            FileNotFoundError: Si el archivo no existe
+            ValueError: Si el tipo de archivo no está soportado
+        """
+        if not path.exists():
+            raise FileNotFoundError(f"Archivo no encontrado: {path}")
+        
+        # Seleccionar el loader apropiado
+        if path.suffix == '.txt':
+            loader = document_loaders.TextLoader(str(path), encoding='utf-8')
+        elif path.suffix == '.pdf':
+            loader = document_loaders.PyPDFLoader(str(path))
+        elif path.suffix in ['.doc', '.docx']:
+            loader = document_loaders.Docx2txtLoader(str(path))
+        elif path.suffix == '.md':
+            loader = document_loaders.UnstructuredMarkdownLoader(str(path))
+        else:
+            raise ValueError(f"Tipo de archivo no soportado: {path.suffix}")
+        
+        # Cargar documentos
+        documents = loader.load()
+        logger.info(f"Documento cargado: {path} ({len(documents)} páginas/secciones)")
+        
+        return documents
+    
     def split_documents(self, documents: List[Any]) -> List[Dict[str, Any]]:
         """
         Divide documentos en chunks más pequeños
@@ -156,14 +159,20 @@ class DocumentProcessor:
     def process_directory(
         self,
         directory_path: str,
-        file_pattern: str = "*"
+        file_pattern: str = "*",
+        workers: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Procesa todos los archivos en un directorio
         
+        Los archivos se cargan y dividen en paralelo (RAG_CONFIG['ingest']['workers'])
+        y los chunks se devuelven en orden de ruta. Un archivo que falla se
+        reporta y no detiene al resto.
+        
         Args:
             directory_path: Ruta al directorio
             file_pattern: Patrón de archivos a procesar (ej: "*.txt")
+            workers: Procesos de carga (None = configuración)
             
         Returns:
             Lista de todos los chunks procesados
@@ -174,23 +183,18 @@ class DocumentProcessor:
             logger.error(f"Directorio no encontrado: {directory_path}")
             return []
         
-        all_chunks = []
+        file_paths = sorted(p for p in directory.rglob(file_pattern) if p.is_file())
         
-        # Buscar archivos
-        for file_path in directory.rglob(file_pattern):
-            if file_path.is_file():
-                # Cargar documento
-                documents = self.load_document(str(file_path))
-                
-                if documents:
-                    # Dividir en chunks
-                    chunks = self.split_documents(documents)
-                    
-                    # Agregar metadato del archivo fuente
-                    for chunk in chunks:
-                        chunk['metadata']['source_file'] = str(file_path)
-                    
-                    all_chunks.extend(chunks)
+        all_chunks = []
+        for loaded in load_files(file_paths, load_and_split_file, workers):
+            if loaded['error']:
+                continue
+            file_path = Path(loaded['path'])
+            logger.info(f"Procesado: {file_path.name} ({len(loaded['result'])} chunks, {loaded['ms']:.0f} ms)")
+            for text, metadata in loaded['result']:
+                # Agregar metadato del archivo fuente
+                metadata['source_file'] = str(file_path)
+                all_chunks.append({'text': text, 'metadata': metadata})
         
         logger.info(f"Directorio procesado: {len(all_chunks)} chunks totales")
         return all_chunks
@@ -214,7 +218,7 @@ class DocumentProcessor:
 class EmbeddingsManager:
     """
     Gestiona la generación de embeddings
-    Nota: ChromaDB genera embeddings automáticamente usando sentence-transformers
+    Nota: Los embeddings los genera la función de la colección (ModuloCompartido/services/embedding_function.py)
     """
     
     def __init__(self):
@@ -227,17 +231,24 @@ class EmbeddingsManager:
         )
         logger.info(f"EmbeddingsManager inicializado con modelo: {self.model_name}")
     
-    def get_model_info(self) -> Dict[str, str]:
+    def get_model_info(self) -> Dict[str, Any]:
         """
-        Obtiene información sobre el modelo de embeddings
+        Obtiene información sobre el modelo de embeddings que usa la colección
+        (puede diferir del configurado mientras no se reembeba)
         
         Returns:
             Dict con información del modelo
         """
+        from .vector_store import get_vector_store
+        
+        info = get_vector_store().get_embedding_info()
+        multilingual = 'multilingual' in info['embedding_model'].lower()
         return {
-            "model_name": self.model_name,
-            "provider": "ChromaDB (sentence-transformers)",
-            "language_support": "Multilingual (incluye español)"
+            "model_name": info['embedding_model'],
+            "configured_model": self.model_name,
+            "reembed_pending": info['reembed_pending'],
+            "provider": info['provider'],
+            "language_support": "Multilingual (incluye español)" if multilingual else "Inglés"
         }
 
 
@@ -259,6 +270,22 @@ def get_document_processor() -> DocumentProcessor:
     return _document_processor_instance
 
 
+def load_and_split_file(file_path: Path) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Carga y divide un archivo en (texto, metadatos) por chunk
+    
+    Función de módulo para poder ejecutarse en los workers del pool de carga.
+    
+    Raises:
+        Exception: El error del loader, o ValueError si no se generaron chunks
+    """
+    processor = get_document_processor()
+    chunks = processor.split_documents(processor._load(Path(file_path)))
+    if not chunks:
+        raise ValueError("No se generaron chunks")
+    return [(chunk['text'], chunk['metadata']) for chunk in chunks]
+
+
 def get_embeddings_manager() -> EmbeddingsManager:
     """
     Obtiene la instancia singleton del EmbeddingsManager
@@ -1,80 +1,118 @@
 """
-Script para ingestar documentos a la base de conocimiento RAG
-Ejecutar con: python manage.py shell < ModuloEmergencia/RAG/ingest_documents.py
+Ingest Documents - Procesa y carga documentos en la base de datos vectorial
+Ingesta incremental de la base de conocimientos de emergencias
+
+Ejecutar desde la raíz del proyecto Backend con:
+    python manage.py ingest_emergencia_knowledge_base
+    python ModuloEmergencia/RAG/ingest_documents.py
 """
-import os
-import django
+from pathlib import Path
+from typing import Any, Dict, Optional
+import logging
 
-# Setup Django
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chatbot_backend.settings')
-django.setup()
+if __name__ == "__main__":
+    # Ejecución directa: configurar Django (el settings del proyecto es Core-Backend)
+    import os
+    import sys
+    import django
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Core-Backend.settings')
+    django.setup()
 
-from ModuloEmergencia.RAG.embeddings import get_document_processor
+from ModuloCompartido.services.kb_ingest import IncrementalIngester
+from ModuloEmergencia.RAG.embeddings import get_document_processor, load_and_split_file
 from ModuloEmergencia.RAG.vector_store import get_vector_store
-from django.conf import settings
-import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+KB_PATH = Path(__file__).parent / 'knowledge_base'
 
-def ingest_knowledge_base():
+
+class DocumentIngester:
+    """
+    Gestiona la ingesta de documentos a la base de datos vectorial
+    """
+
+    def __init__(self):
+        """
+        Inicializa el ingestor de documentos
+        """
+        self.vector_store = get_vector_store()
+        self.document_processor = get_document_processor()
+        self.incremental_ingester = IncrementalIngester(
+            vector_store=self.vector_store,
+            kb_path=KB_PATH,
+            chunk_file=load_and_split_file,
+            id_prefix='emergencia_chunk'
+        )
+
+        logger.info("DocumentIngester (Emergencia) inicializado")
+
+    def ingest_knowledge_base(self, force_reset: bool = False, workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ingesta el directorio knowledge_base de forma incremental
+
+        Args:
+            force_reset: Si True, reinicia la colección antes de ingestar
+            workers: Procesos para cargar archivos (None = RAG_CONFIG['ingest']['workers'])
+
+        Returns:
+            Dict con resultados de la ingesta
+        """
+        if not KB_PATH.exists():
+            logger.error(f"Directorio no encontrado: {KB_PATH}")
+            return {'success': False, 'message': f'Directorio no encontrado: {KB_PATH}'}
+
+        # Una carpeta vacía no borra la colección
+        if not self.incremental_ingester.scan():
+            logger.warning("No se encontraron documentos en knowledge_base")
+            return {'success': False, 'message': 'No se encontraron documentos para procesar'}
+
+        try:
+            return self.incremental_ingester.run(force_reset=force_reset, workers=workers)
+        except Exception as e:
+            logger.error(f"Error en ingesta: {e}")
+            return {'success': False, 'message': f'Error: {str(e)}'}
+
+
+# Singleton
+_document_ingester_instance = None
+
+
+def get_document_ingester() -> DocumentIngester:
+    """
+    Obtiene la instancia singleton del DocumentIngester
+
+    Returns:
+        DocumentIngester: Instancia del ingestor
+    """
+    global _document_ingester_instance
+    if _document_ingester_instance is None:
+        _document_ingester_instance = DocumentIngester()
+    return _document_ingester_instance
+
+
+def ingest_knowledge_base(force_reset: bool = False, workers: Optional[int] = None) -> Dict[str, Any]:
     """
     Ingesta todos los documentos de la carpeta knowledge_base
+
+    Args:
+        force_reset: Si True, reinicia la colección
+        workers: Procesos para cargar archivos
+
+    Returns:
+        Dict con resultados
     """
     logger.info("=== Iniciando ingesta de documentos ===")
-    
-    # Obtener instancias
-    processor = get_document_processor()
-    vector_store = get_vector_store()
-    
-    # Ruta a knowledge_base
-    kb_path = settings.BASE_DIR / 'ModuloEmergencia' / 'RAG' / 'knowledge_base'
-    
-    if not kb_path.exists():
-        logger.error(f"Directorio no encontrado: {kb_path}")
-        return
-    
-    logger.info(f"Procesando documentos de: {kb_path}")
-    
-    # Procesar directorio completo
-    chunks = processor.process_directory(
-        directory_path=str(kb_path),
-        file_pattern="*.md"
-    )
-    
-    if not chunks:
-        logger.warning("No se procesaron documentos")
-        return
-    
-    logger.info(f"Total de chunks procesados: {len(chunks)}")
-    
-    # Preparar datos para ChromaDB
-    documents = []
-    metadatas = []
-    ids = []
-    
-    for chunk in chunks:
-        documents.append(chunk['text'])
-        metadatas.append(chunk['metadata'])
-        ids.append(chunk['metadata']['chunk_id'])
-    
-    # Agregar a vector store
-    logger.info("Agregando documentos a ChromaDB...")
-    success = vector_store.add_documents(
-        documents=documents,
-        metadatas=metadatas,
-        ids=ids
-    )
-    
-    if success:
+    result = get_document_ingester().ingest_knowledge_base(force_reset=force_reset, workers=workers)
+
+    if result['success']:
         logger.info("✅ Documentos ingresados exitosamente")
-        
-        # Mostrar estadísticas
-        info = vector_store.get_collection_info()
+        info = get_vector_store().get_collection_info()
         logger.info(f"📊 Total de documentos en colección: {info.get('count', 0)}")
     else:
-        logger.error("❌ Error al ingestar documentos")
+        logger.error(f"❌ Error al ingestar documentos: {result.get('message')}")
+    return result
 
 
 def test_retrieval():
@@ -82,11 +120,11 @@ def test_retrieval():
     Prueba la recuperación de documentos
     """
     logger.info("\n=== Probando recuperación de documentos ===")
-    
+
     from ModuloEmergencia.RAG.retriever import get_rag_retriever
-    
+
     retriever = get_rag_retriever()
-    
+
     # Pruebas de consulta
     test_queries = [
         "¿Qué hacer en caso de rotura de matriz?",
@@ -94,11 +132,11 @@ def test_retrieval():
         "¿Cuál es el teléfono de emergencias?",
         "¿Cómo se calcula la prioridad de una emergencia?"
     ]
-    
+
     for query in test_queries:
         logger.info(f"\n🔍 Consulta: {query}")
         results = retriever.retrieve(query, top_k=2)
-        
+
         if results:
             logger.info(f"✅ Encontrados {len(results)} resultados")
             for i, result in enumerate(results, 1):
@@ -109,6 +147,7 @@ def test_retrieval():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     try:
         ingest_knowledge_base()
         test_retrieval()
@@ -3,9 +3,16 @@ RAG Retriever - Sistema de recuperación de información
 Combina búsqueda vectorial con contexto para el chatbot
 """
 from typing import List, Dict, Any, Optional
+import json
 import logging
+import time
 from django.conf import settings
 
+from ModuloCompartido.services.context_selection import get_context_selection_config, select_context_documents
+from ModuloCompartido.services.lexical_index import fuse_results, get_hybrid_config
+from ModuloCompartido.services.retrieval_cache import build_retrieval_cache
+from ModuloCompartido.services.single_flight import single_flight
+
 from .vector_store import get_vector_store
 from .embeddings import get_document_processor
 
@@ -25,6 +32,15 @@ class RAGRetriever:
         self.document_processor = get_document_processor()
         self.top_k = settings.RAG_CONFIG.get('top_k_results', 5)
         
+        # Resultados de búsquedas anteriores, por versión de la colección
+        self.result_cache = build_retrieval_cache()
+        
+        # Búsqueda híbrida: vectorial + BM25 combinadas con RRF
+        self.hybrid_config = get_hybrid_config()
+        
+        # Selección de los fragmentos que van al prompt (MMR, duplicados, contiguos)
+        self.context_config = get_context_selection_config()
+        
         logger.info("RAGRetriever inicializado")
     
     def retrieve(
@@ -47,16 +63,34 @@ class RAGRetriever:
         k = top_k if top_k is not None else self.top_k
         
         try:
-            # Realizar búsqueda vectorial
-            results = self.vector_store.query(
-                query_text=query,
-                n_results=k,
-                where=filters
+            # Consultas repetidas sobre la misma versión de la colección no
+            # vuelven a buscar ni a formatear
+            if self.result_cache is not None:
+                cache_key = self.result_cache.make_key(query, k, filters)
+                version = self.vector_store.get_collection_version()
+                cached = self.result_cache.get(cache_key, version)
+                if cached is not None:
+                    logger.info(f"Recuperados {len(cached)} documentos (caché) para: '{query[:50]}...'")
+                    return cached
+            
+            # Realizar búsqueda (consultas idénticas concurrentes comparten
+            # una sola búsqueda)
+            flight_key = json.dumps(
+                [self.vector_store.collection_name, query, k, filters],
+                ensure_ascii=False, sort_keys=True, default=str
+            )
+            results = single_flight(
+                f"rag:{flight_key}",
+                lambda: self._search(query, k, filters)
             )
             
             # Formatear resultados
             formatted_results = self._format_results(results)
             
+            # Un resultado vacío puede venir de un error del vector store: no se cachea
+            if self.result_cache is not None and formatted_results:
+                self.result_cache.set(cache_key, version, formatted_results)
+            
             logger.info(f"Recuperados {len(formatted_results)} documentos para: '{query[:50]}...'")
             return formatted_results
             
@@ -64,6 +98,48 @@ class RAGRetriever:
             logger.error(f"Error en recuperación: {e}")
             return []
     
+    def _search(
+        self,
+        query: str,
+        k: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Busca en el vector store y, con búsqueda híbrida, en el índice BM25
+        
+        Ambos rankings se combinan con reciprocal-rank fusion, de modo que
+        teléfonos, sectores y otros términos exactos no dependan solo del
+        embedding.
+        
+        Args:
+            query: Consulta del usuario
+            k: Número de resultados a retornar
+            filters: Filtros de metadatos opcionales
+            
+        Returns:
+            Resultados con la forma de ChromaDB
+        """
+        if not self.hybrid_config.get('enabled', True):
+            return self.vector_store.query(query_text=query, n_results=k, where=filters)
+        
+        started = time.perf_counter()
+        candidates = max(k, self.hybrid_config.get('candidates', 10))
+        vector_results = self.vector_store.query(query_text=query, n_results=candidates, where=filters)
+        lexical_results = self.vector_store.lexical_search(query, n_results=candidates, where=filters)
+        results = fuse_results(
+            vector_results,
+            lexical_results,
+            k,
+            rrf_k=self.hybrid_config.get('rrf_k', 60),
+            weights=self.hybrid_config.get('weights')
+        )
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        budget_ms = self.hybrid_config.get('latency_budget_ms')
+        if budget_ms and elapsed_ms > budget_ms:
+            logger.warning(f"Búsqueda híbrida tomó {elapsed_ms:.1f} ms (presupuesto {budget_ms} ms)")
+        return results
+    
     def retrieve_with_context(
         self,
         query: str,
@@ -93,6 +169,50 @@ class RAGRetriever:
         
         return context
     
+    def retrieve_for_context(
+        self,
+        query: str,
+        top_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Recupera los documentos que irán al prompt
+        
+        Trae RAG_CONFIG['context_selection']['fetch_k'] candidatos y elige top_k
+        con MMR sobre los embeddings guardados, sin chunks casi duplicados y con
+        los chunks contiguos del mismo archivo unidos (ver context_selection).
+        
+        Args:
+            query: Consulta del usuario
+            top_k: Número de fragmentos a elegir (usa default si None)
+            
+        Returns:
+            Lista de documentos en el formato de retrieve()
+        """
+        k = top_k if top_k is not None else self.top_k
+        if not self.context_config['enabled']:
+            return self.retrieve(query, k)
+        
+        candidates = self.retrieve(query, max(k, self.context_config['fetch_k']))
+        if not candidates:
+            return []
+        
+        try:
+            query_embedding = self.vector_store.embed_query(query)
+            embeddings = self.vector_store.get_embeddings([doc['id'] for doc in candidates if doc.get('id')])
+            documents, stats = select_context_documents(
+                candidates, k, query_embedding, embeddings, self.context_config
+            )
+        except Exception as e:
+            logger.warning(f"Selección de contexto sin MMR: {e}")
+            documents, stats = select_context_documents(candidates, k, config=self.context_config)
+        
+        logger.info(
+            f"Contexto: {stats['candidates']} candidatos → {stats['selected']} fragmentos "
+            f"({stats['duplicates']} duplicados, {stats['merged']} chunks unidos, "
+            f"{stats['chars_saved']} caracteres ahorrados)"
+        )
+        return documents
+    
     def _format_results(self, raw_results: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Formatea los resultados de ChromaDB
@@ -184,7 +304,7 @@ class RAGRetriever:
         Returns:
             Texto de contexto formateado
         """
-        documents = self.retrieve(query)
+        documents = self.retrieve_for_context(query)
         
         context_parts = []
         current_length = 0
@@ -237,7 +357,10 @@ class RAGRetriever:
         Returns:
             Dict con estadísticas
         """
-        return self.vector_store.get_collection_info()
+        info = self.vector_store.get_collection_info()
+        if self.result_cache is not None:
+            info['retrieval_cache'] = self.result_cache.get_stats()
+        return info
 
 
 # Singleton
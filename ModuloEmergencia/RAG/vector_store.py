@@ -2,11 +2,25 @@
 Vector Store Manager - ChromaDB Integration
 Gestiona la base de datos vectorial para el sistema RAG
 """
-import chromadb
-from chromadb.config import Settings
 from django.conf import settings
 from typing import List, Dict, Any
 import logging
+import uuid
+
+from ModuloCompartido.services.chroma_registry import (
+    delete_chroma_collection,
+    get_chroma_client,
+    get_chroma_collection,
+)
+from ModuloCompartido.services.embedding_cache import build_query_embedding_cache
+from ModuloCompartido.services.embedding_function import (
+    describe_embedding_function,
+    get_embedding_config,
+    get_embedding_model_name,
+)
+from ModuloCompartido.services.embedding_migration import select_embedding_function
+from ModuloCompartido.services.lexical_index import LexicalIndexStore
+from ModuloCompartido.services.vector_backends import NumpyCollection, get_vector_backend_name
 
 logger = logging.getLogger(__name__)
 
@@ -23,35 +37,62 @@ class VectorStoreManager:
         self.chroma_path = settings.CHROMADB_PATH
         self.chroma_path.mkdir(parents=True, exist_ok=True)
         
-        self.client = chromadb.PersistentClient(
-            path=str(self.chroma_path),
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
+        # Backend: ChromaDB (por defecto) o colección en memoria con NumPy
+        self.backend = get_vector_backend_name()
+        self.client = None
+        if self.backend == 'chroma':
+            # Cliente compartido con el otro módulo (mismo CHROMADB_PATH)
+            self.client = get_chroma_client(self.chroma_path)
+        
+        # Función de embeddings: se elige al abrir la colección (_get_or_create_collection)
+        self.embedding_function = None
+        
+        # Embeddings de consultas ya calculados (None si está deshabilitada)
+        self.query_embedding_cache = build_query_embedding_cache()
         
         # Colección para documentos de emergencias
         self.collection_name = "emergencias_knowledge_base"
         self.collection = self._get_or_create_collection()
         
+        # Archivo con la versión de la colección (cambia en cada ingesta)
+        self.version_path = self.chroma_path / f"{self.collection_name}.version"
+        
+        # Índice BM25 sobre los mismos chunks (búsqueda híbrida)
+        self.lexical_index = LexicalIndexStore(
+            self.chroma_path / f"{self.collection_name}.bm25.json",
+            self._get_all_chunks
+        )
+        
         logger.info(f"VectorStoreManager inicializado con colección: {self.collection_name}")
     
     def _get_or_create_collection(self):
         """
-        Obtiene o crea la colección en ChromaDB
+        Obtiene o crea la colección en ChromaDB (o en memoria con el backend numpy)
         """
-        try:
-            collection = self.client.get_collection(name=self.collection_name)
-            logger.info(f"Colección existente cargada: {self.collection_name}")
-        except Exception:
-            collection = self.client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "Base de conocimiento para emergencias de agua potable"}
+        # Modelo configurado, o el que embebió la colección si aún no se reembebe
+        embedding_function = select_embedding_function(self.chroma_path, self.collection_name, self.backend)
+        if self.query_embedding_cache is not None and embedding_function is not self.embedding_function:
+            self.query_embedding_cache.clear()
+        self.embedding_function = embedding_function
+        
+        metadata = {
+            "description": "Base de conocimiento para emergencias de agua potable",
+            "embedding_model": get_embedding_model_name(embedding_function)
+        }
+        if self.backend == 'numpy':
+            return NumpyCollection(
+                self.collection_name,
+                self.chroma_path / f"{self.collection_name}.npz",
+                self.embedding_function,
+                metadata=metadata
             )
-            logger.info(f"Nueva colección creada: {self.collection_name}")
         
-        return collection
+        return get_chroma_collection(
+            self.chroma_path,
+            self.collection_name,
+            embedding_function=self.embedding_function,
+            metadata=metadata
+        )
     
     def add_documents(
         self,
@@ -76,12 +117,65 @@ class VectorStoreManager:
                 metadatas=metadatas,
                 ids=ids
             )
+            self.lexical_index.rebuild()
+            self.bump_collection_version()
             logger.info(f"Agregados {len(documents)} documentos a la colección")
             return True
         except Exception as e:
             logger.error(f"Error al agregar documentos: {e}")
             return False
     
+    def upsert_documents(
+        self,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: List[str]
+    ) -> bool:
+        """
+        Inserta o reemplaza documentos (los IDs existentes se actualizan)
+        
+        Args:
+            documents: Lista de textos a almacenar
+            metadatas: Lista de metadatos asociados a cada documento
+            ids: Lista de IDs únicos para cada documento
+            
+        Returns:
+            bool: True si se guardaron correctamente
+        """
+        try:
+            self.collection.upsert(
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids
+            )
+            self.lexical_index.rebuild()
+            self.bump_collection_version()
+            logger.info(f"Actualizados {len(documents)} documentos en la colección")
+            return True
+        except Exception as e:
+            logger.error(f"Error al actualizar documentos: {e}")
+            return False
+    
+    def delete_documents(self, ids: List[str]) -> bool:
+        """
+        Elimina documentos por ID
+        
+        Args:
+            ids: IDs de los documentos a eliminar
+            
+        Returns:
+            bool: True si se eliminaron correctamente
+        """
+        try:
+            self.collection.delete(ids=ids)
+            self.lexical_index.rebuild()
+            self.bump_collection_version()
+            logger.info(f"Eliminados {len(ids)} documentos de la colección")
+            return True
+        except Exception as e:
+            logger.error(f"Error al eliminar documentos: {e}")
+            return False
+    
     def query(
         self,
         query_text: str,
@@ -101,7 +195,7 @@ class VectorStoreManager:
         """
         try:
             results = self.collection.query(
-                query_texts=[query_text],
+                query_embeddings=[self.embed_query(query_text)],
                 n_results=n_results,
                 where=where
             )
@@ -111,6 +205,120 @@ class VectorStoreManager:
             logger.error(f"Error en la búsqueda: {e}")
             return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
     
+    def lexical_search(
+        self,
+        query_text: str,
+        n_results: int = 10,
+        where: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """
+        Realiza una búsqueda léxica (BM25) sobre los chunks de la colección
+        
+        Args:
+            query_text: Texto de la consulta
+            n_results: Número de resultados a retornar
+            where: Filtros de metadatos (opcional)
+            
+        Returns:
+            Dict con los resultados de la búsqueda (ids, documents, metadatas, scores)
+        """
+        try:
+            return self.lexical_index.search(query_text, n_results=n_results, where=where)
+        except Exception as e:
+            logger.error(f"Error en la búsqueda léxica: {e}")
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "scores": [[]]}
+    
+    def _get_all_chunks(self):
+        results = self.collection.get(include=['documents', 'metadatas'])
+        return results.get('ids', []), results.get('documents', []), results.get('metadatas', [])
+    
+    def embed_query(self, query_text: str) -> List[float]:
+        """
+        Genera el embedding de una consulta con la función de la colección
+        (o lo toma de la caché de embeddings de consultas)
+        
+        Args:
+            query_text: Texto de la consulta
+            
+        Returns:
+            Vector de embedding
+        """
+        if self.query_embedding_cache is None:
+            return self._compute_embedding(query_text)
+        return self.query_embedding_cache.get_or_compute(query_text, self._compute_embedding)
+    
+    def _compute_embedding(self, query_text: str) -> List[float]:
+        return list(self.embedding_function([query_text])[0])
+    
+    def get_embeddings(self, ids: List[str]) -> Dict[str, List[float]]:
+        """
+        Obtiene los embeddings guardados de los chunks indicados (sin reembeber)
+        
+        Args:
+            ids: IDs de los chunks
+            
+        Returns:
+            Dict id -> vector (los IDs inexistentes no aparecen)
+        """
+        if not ids:
+            return {}
+        try:
+            results = self.collection.get(ids=list(ids), include=['embeddings'])
+            embeddings = results.get('embeddings')
+            if embeddings is None:
+                return {}
+            return {doc_id: list(vector) for doc_id, vector in zip(results.get('ids', []), embeddings)}
+        except Exception as e:
+            logger.error(f"Error al obtener embeddings: {e}")
+            return {}
+    
+    def get_embedding_info(self) -> Dict[str, Any]:
+        """
+        Obtiene el modelo de embeddings en uso y el configurado
+        
+        Returns:
+            Dict con el modelo activo, su configuración de lotes/hilos y si falta reembeber
+        """
+        configured_model = get_embedding_config()['model']
+        info = describe_embedding_function(self.embedding_function)
+        info['configured_embedding_model'] = configured_model
+        info['reembed_pending'] = info['embedding_model'] != configured_model
+        return info
+    
+    def get_collection_version(self) -> str:
+        """
+        Obtiene la versión actual de la colección
+        
+        La versión se guarda en un archivo junto a ChromaDB para que todos
+        los procesos (workers y scripts de ingesta) la compartan.
+        
+        Returns:
+            str: Identificador de versión ('0' si nunca se ha ingestado)
+        """
+        try:
+            return self.version_path.read_text(encoding='utf-8').strip() or '0'
+        except FileNotFoundError:
+            return '0'
+        except Exception as e:
+            logger.warning(f"No se pudo leer la versión de la colección: {e}")
+            return '0'
+    
+    def bump_collection_version(self) -> str:
+        """
+        Marca la colección como modificada generando una nueva versión
+        
+        Returns:
+            str: Nueva versión
+        """
+        version = uuid.uuid4().hex
+        try:
+            tmp_path = self.version_path.with_suffix('.version.tmp')
+            tmp_path.write_text(version, encoding='utf-8')
+            tmp_path.replace(self.version_path)
+        except Exception as e:
+            logger.warning(f"No se pudo actualizar la versión de la colección: {e}")
+        return version
+    
     def get_all_documents(self) -> Dict[str, Any]:
         """
         Obtiene todos los documentos de la colección
@@ -138,14 +346,28 @@ class VectorStoreManager:
             bool: True si se eliminó correctamente
         """
         try:
-            self.client.delete_collection(name=self.collection_name)
+            if self.backend == 'numpy':
+                self.collection.reset()
+            else:
+                delete_chroma_collection(self.chroma_path, self.collection_name)
             self.collection = self._get_or_create_collection()
+            self.lexical_index.clear()
+            self.bump_collection_version()
             logger.warning(f"Colección eliminada y recreada: {self.collection_name}")
             return True
         except Exception as e:
             logger.error(f"Error al eliminar colección: {e}")
             return False
     
+    def reset_collection(self) -> bool:
+        """
+        Reinicia la colección (elimina y recrea)
+        
+        Returns:
+            bool: True si se reinició correctamente
+        """
+        return self.delete_collection()
+    
     def get_collection_info(self) -> Dict[str, Any]:
         """
         Obtiene información sobre la colección
@@ -155,11 +377,16 @@ class VectorStoreManager:
         """
         try:
             count = self.collection.count()
-            return {
+            info = {
                 "name": self.collection_name,
                 "count": count,
+                "backend": self.backend,
                 "metadata": self.collection.metadata
             }
+            if self.query_embedding_cache is not None:
+                info["query_embedding_cache"] = self.query_embedding_cache.get_stats()
+            info["lexical_index"] = self.lexical_index.get_stats()
+            return info
         except Exception as e:
             logger.error(f"Error al obtener info de colección: {e}")
             return {}
@@ -0,0 +1,79 @@
+"""
+Management command para poblar la base de conocimientos RAG de emergencias.
+
+Uso:
+    python manage.py ingest_emergencia_knowledge_base           # Ingesta incremental (solo archivos modificados)
+    python manage.py ingest_emergencia_knowledge_base --reset   # Resetea y vuelve a ingerir
+    python manage.py ingest_emergencia_knowledge_base --stats   # Muestra estadísticas solamente
+    python manage.py ingest_emergencia_knowledge_base --workers 4
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from ModuloCompartido.services.kb_ingest import format_ingest_report
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Ingesta documentos de la base de conocimientos de emergencias en el vector store'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Resetea la colección antes de ingerir (elimina todos los documentos existentes)',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Muestra estadísticas de la colección sin ingerir',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Procesos para cargar y dividir archivos (0 = uno por CPU; default: RAG_CONFIG)',
+        )
+        parser.add_argument(
+            '--no-input',
+            action='store_true',
+            help='No pide confirmación para --reset',
+        )
+
+    def handle(self, *args, **options):
+        from ModuloEmergencia.RAG.ingest_documents import get_document_ingester
+        from ModuloEmergencia.RAG.vector_store import get_vector_store
+
+        # Modo estadísticas
+        if options['stats']:
+            info = get_vector_store().get_collection_info()
+            self.stdout.write(self.style.HTTP_INFO('\n📊 Estadísticas de la base de conocimientos:\n'))
+            self.stdout.write(f"  🗄️  Colección: {info.get('name', 'N/A')}")
+            self.stdout.write(f"  📄 Documentos: {info.get('count', 0)}")
+            self.stdout.write(f"  🧩 Backend: {info.get('backend', 'N/A')}")
+            return
+
+        force_reset = options['reset']
+        if force_reset and not options['no_input']:
+            self.stdout.write(
+                self.style.WARNING('\n⚠️  Modo RESET activado: Se eliminarán todos los documentos existentes\n')
+            )
+            confirm = input('¿Estás seguro? (y/N): ')
+            if confirm.lower() != 'y':
+                self.stdout.write(self.style.ERROR('❌ Operación cancelada\n'))
+                return
+
+        self.stdout.write(
+            self.style.HTTP_INFO(f'\n🚀 Iniciando ingesta de documentos (force_reset={force_reset})...\n')
+        )
+        result = get_document_ingester().ingest_knowledge_base(
+            force_reset=force_reset,
+            workers=options['workers']
+        )
+
+        for line in format_ingest_report(result):
+            self.stdout.write(line)
+        if not result['success']:
+            raise CommandError(f"Ingesta fallida: {result.get('message', 'Error desconocido')}")
+        self.stdout.write(self.style.SUCCESS('\n✅ Base de conocimientos de emergencias actualizada\n'))
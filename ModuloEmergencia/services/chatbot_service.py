@@ -2,18 +2,26 @@
 Chatbot Service - Lógica conversacional para emergencias
 Implementa el flujo del diagrama: entrevista → recolección de datos → cálculo de prioridad
 """
-import google.generativeai as genai
 from typing import Dict, Any, List, Optional, Tuple
 from django.conf import settings
 from django.utils import timezone
 import logging
 import json
+import re
 
 from ..models import ChatConversation, ChatMessage, Emergencia
 from ..RAG.retriever import get_rag_retriever
+from ModuloCompartido.services.lazy_import import lazy_module
+from ModuloCompartido.services.llm_cache import wrap_model
+from ModuloCompartido.services.llm_providers import build_llm_model
+from ModuloCompartido.services.quota import is_quota_error
 
 logger = logging.getLogger(__name__)
 
+# Diferido hasta crear el ChatbotService: importar el SDK toma ~1 s y las
+# vistas cargan este módulo en cada comando de manage.py
+genai = lazy_module('google.generativeai')
+
 
 class ChatbotService:
     """
@@ -38,6 +46,27 @@ class ChatbotService:
         'telefono': 'X7: Teléfono'
     }
     
+    # Sectores en el orden en que se ofrecen al usuario
+    SECTOR_MAP = {
+        '1': 'anibana',
+        '2': 'el_molino',
+        '3': 'la_compania',
+        '4': 'el_maiten_1',
+        '5': 'la_morera',
+        '6': 'el_maiten_2',
+        '7': 'santa_margarita'
+    }
+    
+    # Palabras clave para el tipo de emergencia (extracción local)
+    TIPO_EMERGENCIA_KEYWORDS = {
+        'rotura_matriz': ['matriz'],
+        'agua_contaminada': ['contaminad', 'sucia', 'turbia', 'mal olor'],
+        'sin_agua': ['sin agua', 'no hay agua', 'no tengo agua', 'corte de agua'],
+        'baja_presion': ['baja presión', 'baja presion', 'poca presión', 'poca presion'],
+        'caneria_rota': ['cañería', 'caneria', 'tubería rota', 'tuberia rota'],
+        'fuga_agua': ['fuga', 'filtración', 'filtracion'],
+    }
+    
     def __init__(self):
         """
         Inicializa el servicio del chatbot
@@ -50,7 +79,10 @@ class ChatbotService:
         genai.configure(api_key=api_key)
         # Usar Gemini 2.5 Flash desde configuración
         gemini_model = getattr(settings, 'RAG_CONFIG', {}).get('gemini_model', 'gemini-2.5-flash')
-        self.model = genai.GenerativeModel(gemini_model)
+        # Backend configurable (gemini | stub | cassette) detrás de la misma interfaz
+        llm = build_llm_model(gemini_model, lambda: genai.GenerativeModel(gemini_model))
+        # Envolver con la caché exacta de prompts/respuestas y el circuit breaker
+        self.model = wrap_model(llm, gemini_model, 'emergencias')
         
         # Inicializar RAG
         self.rag_retriever = get_rag_retriever()
@@ -219,6 +251,10 @@ class ChatbotService:
         Returns:
             Dict con datos extraídos
         """
+        if self.model.circuit_open():
+            logger.info("⚡ Circuito de Gemini abierto: usando extracción local")
+            return self._extract_data_locally(user_message, current_data)
+        
         # Obtener contexto relevante del RAG
         context = self.rag_retriever.get_relevant_context_text(
             query=user_message,
@@ -238,7 +274,7 @@ class ChatbotService:
         
         try:
             # Llamar a Gemini
-            response = self.model.generate_content(prompt)
+            response = self.model.generate_content(prompt, call_site='emergencias_extraction')
             
             # Limpiar respuesta (quitar markdown, espacios, etc)
             response_text = response.text.strip()
@@ -260,8 +296,61 @@ class ChatbotService:
             logger.warning(f"Respuesta de LLM no es JSON válido: {response.text[:200]}")
             return {}
         except Exception as e:
-            logger.error(f"Error en extracción con LLM: {e}")
-            return {}
+            if is_quota_error(e):
+                logger.warning(f"Extracción con LLM omitida por cuota/rate-limit: {e}")
+            else:
+                logger.error(f"Error en extracción con LLM: {e}")
+            return self._extract_data_locally(user_message, current_data)
+    
+    def _extract_data_locally(
+        self,
+        user_message: str,
+        current_data: Dict
+    ) -> Dict[str, Any]:
+        """
+        Extrae datos sin LLM (Gemini caído o circuito abierto)
+        
+        Reconoce sector, teléfono y tipo de emergencia por patrones; si el
+        mensaje no contiene ninguno, se toma como respuesta a la pregunta
+        pendiente (nombre, dirección o descripción).
+        
+        Args:
+            user_message: Mensaje del usuario
+            current_data: Datos ya recolectados
+            
+        Returns:
+            Dict con datos extraídos
+        """
+        extracted = {}
+        message = user_message.strip()
+        lower = message.lower()
+        
+        sector_number = re.fullmatch(r'[1-7]', message)
+        if sector_number:
+            extracted['sector'] = self.SECTOR_MAP[message]
+        else:
+            folded = lower.replace('á', 'a').replace('é', 'e').replace('í', 'i').replace('ñ', 'n')
+            for sector in self.SECTOR_MAP.values():
+                if sector.replace('_', ' ') in folded or sector in folded:
+                    extracted['sector'] = sector
+                    break
+        
+        phone = re.search(r'(?:\+?56\s?)?9[\s-]?\d{4}[\s-]?\d{4}', message)
+        if phone:
+            extracted['telefono'] = re.sub(r'[\s-]', '', phone.group(0))
+        
+        for tipo, keywords in self.TIPO_EMERGENCIA_KEYWORDS.items():
+            if any(keyword in lower for keyword in keywords):
+                extracted['tipo_emergencia'] = tipo
+                break
+        
+        if not extracted:
+            missing = self._get_missing_data(current_data)
+            if missing and missing[0] in ('nombre_usuario', 'direccion', 'descripcion'):
+                extracted[missing[0]] = message
+        
+        logger.info(f"Datos extraídos localmente: {list(extracted.keys())}")
+        return extracted
     
     def _build_extraction_prompt(
         self,
@@ -280,21 +369,10 @@ class ChatbotService:
         
         current_data_text = json.dumps(current_data, indent=2, ensure_ascii=False)
         
-        # Mapeo de números a sectores
-        sector_map = {
-            '1': 'anibana',
-            '2': 'el_molino', 
-            '3': 'la_compania',
-            '4': 'el_maiten_1',
-            '5': 'la_morera',
-            '6': 'el_maiten_2',
-            '7': 'santa_margarita'
-        }
-        
         # Pre-procesar el mensaje para convertir números a sectores
         processed_message = user_message.strip()
-        if processed_message in sector_map:
-            processed_message = sector_map[processed_message]
+        if processed_message in self.SECTOR_MAP:
+            processed_message = self.SECTOR_MAP[processed_message]
         
         prompt = f"""Extrae información del mensaje del usuario.
 
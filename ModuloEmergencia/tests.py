@@ -238,6 +238,35 @@ class ChatbotServiceTests(TestCase):
         self.assertEqual(conversation.estado, 'recolectando_datos')
 
 
+    @patch('ModuloEmergencia.services.chatbot_service.genai')
+    @patch('ModuloEmergencia.services.chatbot_service.get_rag_retriever')
+    def test_circuito_abierto_extrae_localmente(self, mock_rag, mock_genai):
+        """Test: Con el circuito abierto se extraen datos sin llamar a Gemini"""
+        mock_rag.return_value = Mock()
+        mock_model = Mock()
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        service = ChatbotService()
+        service.model.breaker.open_seconds = 60
+        for _ in range(service.model.breaker.minimum_calls):
+            service.model.breaker.record_failure()
+
+        conversation = ChatConversation.objects.create(session_id=self.session_id)
+        datos = service._extract_data_with_llm(
+            'Hay una fuga en El Molino, mi fono es +56 9 8765 4321', {}, conversation
+        )
+        self.assertEqual(datos['sector'], 'el_molino')
+        self.assertEqual(datos['telefono'], '+56987654321')
+        self.assertEqual(datos['tipo_emergencia'], 'fuga_agua')
+
+        datos = service._extract_data_with_llm('3', {}, conversation)
+        self.assertEqual(datos, {'sector': 'la_compania'})
+
+        datos = service._extract_data_with_llm('Juan Pérez', {'sector': 'anibana'}, conversation)
+        self.assertEqual(datos, {'nombre_usuario': 'Juan Pérez'})
+        mock_model.generate_content.assert_not_called()
+
+
 class ChatAPITests(APITestCase):
     """Tests para los endpoints de la API"""
 
@@ -483,7 +512,13 @@ class IntegrationTests(APITestCase):
 class RAGSystemTests(TestCase):
     """Tests para el sistema RAG (solo si está configurado)"""
 
-    @patch('ModuloEmergencia.RAG.vector_store.chromadb')
+    def setUp(self):
+        """El registro de clientes de ChromaDB es por proceso: cada test parte vacío"""
+        from ModuloCompartido.services.chroma_registry import reset_chroma_registry
+        reset_chroma_registry()
+        self.addCleanup(reset_chroma_registry)
+
+    @patch('ModuloCompartido.services.chroma_registry.chromadb')
     def test_vector_store_initialization(self, mock_chromadb):
         """Test: Vector store se puede inicializar"""
         from ModuloEmergencia.RAG.vector_store import VectorStoreManager
@@ -494,6 +529,83 @@ class RAGSystemTests(TestCase):
         manager = VectorStoreManager()
         self.assertIsNotNone(manager)
 
+    @patch('ModuloCompartido.services.chroma_registry.chromadb')
+    def test_query_usa_embedding_cacheado(self, mock_chromadb):
+        """Test: Consultas equivalentes reutilizan el embedding y se envían como query_embeddings"""
+        from ModuloEmergencia.RAG.vector_store import VectorStoreManager
+        
+        mock_collection = Mock()
+        mock_collection.query.return_value = {'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+        mock_chromadb.PersistentClient.return_value.get_collection.return_value = mock_collection
+        
+        manager = VectorStoreManager()
+        manager.embedding_function = Mock(return_value=[[0.5, 0.5]])
+        manager.query('Corte de agua en mi sector')
+        manager.query(' Corte de agua en mi  sector')
+        
+        manager.embedding_function.assert_called_once()
+        _, kwargs = mock_collection.query.call_args
+        self.assertEqual(kwargs['query_embeddings'], [[0.5, 0.5]])
+        self.assertNotIn('query_texts', kwargs)
+        self.assertEqual(manager.get_collection_info()['query_embedding_cache']['hits'], 1)
+
+    @patch('ModuloEmergencia.RAG.retriever.get_document_processor')
+    @patch('ModuloEmergencia.RAG.retriever.get_vector_store')
+    def test_retrieve_cachea_por_version_de_coleccion(self, mock_get_store, mock_processor):
+        """Test: Búsquedas repetidas no consultan el vector store hasta la siguiente ingesta"""
+        from ModuloEmergencia.RAG.retriever import RAGRetriever
+        
+        store = Mock(collection_name='emergencias_knowledge_base')
+        store.get_collection_version.return_value = 'v1'
+        store.query.return_value = {
+            'ids': [['protocolos_0']],
+            'documents': [['Cierre la llave de paso.']],
+            'metadatas': [[{'source_file': 'protocolos.md'}]],
+            'distances': [[0.2]]
+        }
+        store.lexical_search.return_value = {'ids': [[]], 'documents': [[]], 'metadatas': [[]]}
+        mock_get_store.return_value = store
+        retriever = RAGRetriever()
+        
+        first = retriever.retrieve('fuga de agua')
+        second = retriever.retrieve('fuga  de agua ')
+        self.assertEqual(first, second)
+        self.assertEqual(store.query.call_count, 1)
+        
+        store.get_collection_version.return_value = 'v2'
+        retriever.retrieve('fuga de agua')
+        self.assertEqual(store.query.call_count, 2)
+
+    @patch('ModuloEmergencia.RAG.retriever.get_document_processor')
+    @patch('ModuloEmergencia.RAG.retriever.get_vector_store')
+    def test_retrieve_fusiona_busqueda_vectorial_y_lexica(self, mock_get_store, mock_processor):
+        """Test: Un chunk con el teléfono exacto entra al top-k aunque el embedding no lo traiga"""
+        from ModuloEmergencia.RAG.retriever import RAGRetriever
+        
+        store = Mock(collection_name='emergencias_knowledge_base')
+        store.get_collection_version.return_value = 'v1'
+        store.query.return_value = {
+            'ids': [['sectores_0', 'protocolos_0']],
+            'documents': [['Sectores atendidos', 'Cierre la llave de paso.']],
+            'metadatas': [[{'source_file': 'sectores.md'}, {'source_file': 'protocolos.md'}]],
+            'distances': [[0.3, 0.5]]
+        }
+        store.lexical_search.return_value = {
+            'ids': [['contacto_0']],
+            'documents': [['Emergencias: 600 123 4567']],
+            'metadatas': [[{'source_file': 'contacto.md'}]]
+        }
+        mock_get_store.return_value = store
+        retriever = RAGRetriever()
+        retriever.hybrid_config = {'enabled': True, 'candidates': 10, 'rrf_k': 60}
+        
+        results = retriever.retrieve('600 123 4567', top_k=2)
+        
+        self.assertEqual([r['id'] for r in results], ['sectores_0', 'contacto_0'])
+        self.assertEqual(results[1]['distance'], 0.5)
+        _, kwargs = store.query.call_args
+        self.assertEqual(kwargs['n_results'], 10)
+
     def test_document_processor_can_split_text(self):
         """Test: Document processor puede dividir texto"""
         from ModuloEmergencia.RAG.embeddings import DocumentProcessor
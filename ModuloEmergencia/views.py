@@ -21,6 +21,11 @@ from .serializers import (
     InitChatResponseSerializer
 )
 from .services.chatbot_service import get_chatbot_service
+from ModuloCompartido.services.chroma_registry import get_chroma_registry_stats
+from ModuloCompartido.services.circuit_breaker import get_circuit_breaker_status
+from ModuloCompartido.services.llm_cache import get_llm_cache_stats
+from ModuloCompartido.services.quota import get_quota_stats
+from ModuloCompartido.services.single_flight import get_single_flight
 
 logger = logging.getLogger(__name__)
 
@@ -336,7 +341,12 @@ def rag_stats(request):
         
         return Response({
             **collection_info,
-            **embedding_info
+            **embedding_info,
+            'llm_cache': get_llm_cache_stats(),
+            'single_flight': get_single_flight().get_stats(),
+            'gemini_quota': get_quota_stats(),
+            'circuit_breakers': get_circuit_breaker_status(),
+            'chroma_registry': get_chroma_registry_stats()
         })
         
     except Exception as e:
@@ -190,7 +190,7 @@ def main():
         if not results["Configuración"]:
             logger.info("   - Configurar GEMINI_API_KEY en .env")
         if not results["Sistema RAG"]:
-            logger.info("   - Ejecutar: python manage.py shell < ModuloEmergencia/RAG/ingest_documents.py")
+            logger.info("   - Ejecutar: python manage.py ingest_emergencia_knowledge_base")
         if not results["Base de Datos"]:
             logger.info("   - Ejecutar: python manage.py migrate")
     